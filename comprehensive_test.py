@@ -4,9 +4,15 @@
 - N+1クエリ問題検査
 - バックエンド処理検証
 - データベース処理
+
+ビューごとのクエリ数・処理時間は RequestMetricsMiddleware が本番でも常時計測し、
+settings.REQUEST_METRICS_BUDGETS の上限を超えると WARNING ログを出力する。
 """
 import os
 import django
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'school_project.settings')
 django.setup()
 
@@ -51,7 +57,7 @@ class TestResults:
                 self.results['summary']['issues'].append(f"{name}: {details}")
     
     def save(self):
-        with open('/home/noebo/job_projects/grades/TEST_RESULTS.json', 'w') as f:
+        with open(BASE_DIR / 'TEST_RESULTS.json', 'w') as f:
             json.dump(self.results, f, indent=2, ensure_ascii=False)
         print(f"\n✅ テスト結果: {self.results['summary']['passed']}/{self.results['summary']['total']} 成功")
 
@@ -225,7 +231,7 @@ print("=" * 60)
 
 print("\n🔍 Test 5.1: ベーステンプレートCSS")
 try:
-    with open('/home/noebo/job_projects/grades/school_management/templates/school_management/base.html', 'r') as f:
+    with open(BASE_DIR / 'school_management/templates/school_management/base.html', 'r') as f:
         content = f.read()
     has_viewport = 'viewport' in content
     has_bootstrap = 'bootstrap' in content
@@ -240,7 +246,7 @@ except Exception as e:
 
 print("\n🔍 Test 5.2: 静的ファイル検査")
 try:
-    css_path = '/home/noebo/job_projects/grades/school_management/static/school_management/css'
+    css_path = BASE_DIR / 'school_management/static/school_management/css'
     if os.path.exists(css_path):
         css_files = [f for f in os.listdir(css_path) if f.endswith('.css')]
         print(f"   ✅ CSSファイル数: {len(css_files)}")
@@ -253,4 +259,4 @@ except Exception as e:
 # 結果保存
 print("\n" + "=" * 60)
 results.save()
-print(f"\n📄 詳細結果: /home/noebo/job_projects/grades/TEST_RESULTS.json")
+print(f"\n📄 詳細結果: {BASE_DIR / 'TEST_RESULTS.json'}")
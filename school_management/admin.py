@@ -6,8 +6,13 @@ from .models import (
     PeerEvaluation, ContributionEvaluation,
     StudentQRCode, QRCodeScan, StudentLessonPoints,
     StudentClassPoints, PeerEvaluationSettings,
-    ClassRoomEnrollment, TeacherStudentAssignment,
+    ClassRoomEnrollment, TeacherStudentAssignment, GroupVoteTally,
+    StudentSessionScore, StudentImportJob, PeerEvaluationSimulation,
 )
+from .grade_cache import bump_classroom_grade_versions, bump_student_points_versions
+from .grade_engine import recalculate_class_points
+from .session_scores import rebuild_session_scores
+from .vote_tally import finalize_group_vote_tallies
 
 @admin.register(CustomUser)
 class CustomUserAdmin(UserAdmin):
@@ -72,9 +77,25 @@ class LessonSessionAdmin(admin.ModelAdmin):
 
     @admin.action(description='選択した授業回のピア評価を締め切る')
     def close_peer_evaluations(self, request, queryset):
-        updated = queryset.exclude(
+        target_ids = list(queryset.exclude(
             peer_evaluation_status=LessonSession.PeerEvaluationStatus.CLOSED
-        ).update(peer_evaluation_status=LessonSession.PeerEvaluationStatus.CLOSED)
+        ).values_list('id', flat=True))
+        updated = LessonSession.objects.filter(id__in=target_ids).update(
+            peer_evaluation_status=LessonSession.PeerEvaluationStatus.CLOSED
+        )
+        # update() はシグナルを発火しないため、グループ投票の付与ポイントをここで確定する
+        for session_id in target_ids:
+            finalize_group_vote_tallies(session_id)
+        # 集計方式のグループ投票は締切後に付与されるため、授業回別の得点と総合ポイントも計算し直す
+        classrooms = list(ClassRoom.objects.filter(lessonsession__id__in=target_ids).distinct())
+        for classroom in classrooms:
+            rebuild_session_scores(classroom)
+            recalculate_class_points(classroom, invalidate_cache=False)
+        # ポイント一覧・評価一覧・学生ダッシュボードのキャッシュに締切前の集計が残らないよう無効化する
+        bump_classroom_grade_versions([classroom.id for classroom in classrooms])
+        bump_student_points_versions(
+            StudentClassPoints.objects.filter(classroom__in=classrooms).values_list('student_id', flat=True)
+        )
         self.message_user(request, f'{updated}件の授業回を締切状態に更新しました。')
 
 @admin.register(Group)
@@ -186,3 +207,36 @@ class StudentClassPointsAdmin(admin.ModelAdmin):
     list_filter = ('classroom', 'points', 'created_at')
     search_fields = ('student__full_name', 'classroom__class_name')
     readonly_fields = ('created_at', 'updated_at')
+
+
+@admin.register(GroupVoteTally)
+class GroupVoteTallyAdmin(admin.ModelAdmin):
+    """グループ投票集計管理画面"""
+    list_display = ('lesson_session', 'group', 'internal_points', 'awarded_points', 'is_finalized', 'updated_at')
+    list_filter = ('is_finalized', 'lesson_session__classroom')
+    readonly_fields = ('rank_counts', 'internal_points', 'awarded_points', 'is_finalized', 'updated_at')
+
+@admin.register(StudentSessionScore)
+class StudentSessionScoreAdmin(admin.ModelAdmin):
+    """授業回別得点管理画面"""
+    list_display = ('student', 'lesson_session', 'quiz_total', 'lesson_points', 'contrib', 'vote', 'custom_total', 'updated_at')
+    list_filter = ('classroom',)
+    search_fields = ('student__full_name', 'student__student_number')
+    readonly_fields = ('quiz_total', 'quiz_count', 'lesson_points', 'contrib', 'vote', 'custom_total', 'updated_at')
+
+
+@admin.register(StudentImportJob)
+class StudentImportJobAdmin(admin.ModelAdmin):
+    """学生一括取り込みジョブ管理画面"""
+    list_display = ('id', 'teacher', 'classroom', 'source', 'status', 'total_rows', 'created_count', 'linked_count', 'failed_count', 'created_at')
+    list_filter = ('status', 'source')
+    search_fields = ('teacher__full_name', 'classroom__class_name')
+    readonly_fields = ('validated_rows', 'created_count', 'linked_count', 'failed_count', 'errors', 'started_at', 'finished_at')
+
+
+@admin.register(PeerEvaluationSimulation)
+class PeerEvaluationSimulationAdmin(admin.ModelAdmin):
+    """ピア評価シミュレーション管理画面"""
+    list_display = ('teacher', 'lesson_session', 'point_mode', 'updated_at')
+    list_filter = ('classroom',)
+    search_fields = ('teacher__full_name', 'classroom__class_name')
@@ -0,0 +1,229 @@
+"""
+成績まわりの処理のベンチマーク
+
+合成クラス（synthetic_data）を人数ごとに作成し、主要な処理の
+処理時間・クエリ数・DB時間・ピークメモリを測る。
+
+- class_points / class_evaluation: ポイント一覧・評価一覧（キャッシュなし・キャッシュあり）
+- peer_evaluation_results: ピア評価の結果表示（最終授業回）
+- close_peer_evaluation: ピア評価の締切（集計と全学生の再計算）
+- signal_cascade: 1授業回分の小テストを全学生に保存し、シグナル経由の再計算を反映するまで
+
+人数ごとの計測はトランザクション内で行い、最後にロールバックする（合成データも残らない）。
+処理時間は repeat 回の中央値。ピークメモリは tracemalloc の計測が処理時間に影響するため、
+別に1回だけ実行して測る。結果は JSON（キーをソート）で保存し、コミット間で diff できる。
+
+explain=True のときは、成績計算でよく使う絞り込み（explain_grade_queries）の実行計画も記録する。
+インデックスの追加・見直しの際は、SQLite と PostgreSQL の両方でこの出力を確認する。
+"""
+import gc
+import statistics
+import subprocess
+import tracemalloc
+
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.contrib.sessions.backends.base import SessionBase
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.test import RequestFactory
+from django.urls import reverse
+
+from .grade_cache import bump_classroom_grade_versions
+from .grade_queue import deferred_recalculation, flush_pending_recalculations
+from .models import (
+    ContributionEvaluation,
+    LessonSession,
+    PeerEvaluation,
+    QRCodeScan,
+    Quiz,
+    QuizScore,
+    StudentLessonPoints,
+)
+from .request_metrics import RequestMetrics
+from .synthetic_data import generate_synthetic_classroom
+from .views.grades.class_evaluation import class_evaluation_view
+from .views.grades.class_points import class_points_view
+from .views.peer_eval.improved import close_peer_evaluation, peer_evaluation_results
+
+DEFAULT_SIZES = (50, 200, 1000)
+
+
+class _Rollback(Exception):
+    """計測後にトランザクションをロールバックするための例外"""
+
+
+def _build_request(method, path, user):
+    """ビュー関数を直接呼ぶためのリクエスト（ログイン済み・セッション・メッセージ付き）"""
+    request = getattr(RequestFactory(), method)(path)
+    request.user = user
+    request.session = SessionBase()
+    request._messages = FallbackStorage(request)
+    return request
+
+
+def _run_rolled_back(func):
+    """func を実行し、変更をロールバックする（締切など更新を伴う処理を繰り返し測るため）"""
+    try:
+        with transaction.atomic():
+            func()
+            raise _Rollback
+    except _Rollback:
+        pass
+
+
+def measure(func, repeat=3, setup=None):
+    """func の処理時間（中央値）・クエリ数・DB時間・ピークメモリを測る
+
+    setup は計測の前に毎回呼ばれる（計測には含めない）。
+    """
+    runs = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        metrics = RequestMetrics()
+        metrics.start()
+        with metrics.wrap_connections():
+            func()
+        metrics.stop()
+        runs.append(metrics)
+
+    if setup:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'wall_ms': round(statistics.median(m.total_ms for m in runs), 2),
+        'db_ms': round(statistics.median(m.db_ms for m in runs), 2),
+        'queries': runs[-1].query_count,
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def _benchmark_classroom(classroom, repeat):
+    teacher = classroom.teachers.first()
+    sessions = list(LessonSession.objects.filter(classroom=classroom).order_by('session_number'))
+    last_session = sessions[-1]
+    student_ids = list(classroom.students.values_list('id', flat=True))
+
+    def invalidate_cache():
+        bump_classroom_grade_versions([classroom.id], immediate=True)
+
+    def view_runner(view, name, **kwargs):
+        path = reverse(f'school_management:{name}', kwargs=kwargs)
+        return lambda: view(_build_request('get', path, teacher), **kwargs)
+
+    class_points = view_runner(class_points_view, 'class_points', class_id=classroom.id)
+    class_evaluation = view_runner(class_evaluation_view, 'class_evaluation', class_id=classroom.id)
+    results_view = view_runner(
+        peer_evaluation_results, 'peer_evaluation_results', session_id=last_session.id
+    )
+
+    close_path = reverse('school_management:close_peer_evaluation', kwargs={'session_id': last_session.id})
+
+    def close():
+        _run_rolled_back(
+            lambda: close_peer_evaluation(_build_request('post', close_path, teacher), session_id=last_session.id)
+        )
+
+    def signal_cascade():
+        def save_scores():
+            quiz = Quiz.objects.create(lesson_session=sessions[0], quiz_name='ベンチマーク', max_score=10)
+            with deferred_recalculation():
+                for i, student_id in enumerate(student_ids):
+                    QuizScore.objects.create(
+                        quiz=quiz, student_id=student_id, score=i % 11, graded_by=teacher
+                    )
+            # トランザクション内では on_commit が実行されないため、反映処理をその場で呼ぶ
+            flush_pending_recalculations()
+        _run_rolled_back(save_scores)
+
+    return {
+        'class_points': measure(class_points, repeat, setup=invalidate_cache),
+        'class_points_cached': measure(class_points, repeat),
+        'class_evaluation': measure(class_evaluation, repeat, setup=invalidate_cache),
+        'class_evaluation_cached': measure(class_evaluation, repeat),
+        'peer_evaluation_results': measure(results_view, repeat),
+        'close_peer_evaluation': measure(close, repeat),
+        'signal_cascade': measure(signal_cascade, repeat),
+    }
+
+
+def explain_grade_queries(classroom):
+    """成績計算でよく使う絞り込みの実行計画を {名前: EXPLAIN の出力} で返す"""
+    session = LessonSession.objects.filter(classroom=classroom).order_by('session_number').first()
+    student = classroom.students.order_by('id').first()
+    queries = {
+        # クラス全体の小テスト合計（grade_engine.compute_quiz_totals）
+        'quiz_totals_by_class': QuizScore.objects.filter(
+            quiz__lesson_session__classroom=classroom, is_cancelled=False
+        ).values('student_id').annotate(total=Sum('score'), count=Count('id')),
+        # 学生1人の小テスト（quiz_stats・学生詳細）
+        'quiz_scores_by_student': QuizScore.objects.filter(
+            student=student, quiz__lesson_session__classroom=classroom, is_cancelled=False
+        ),
+        # QRスキャンからの小テスト点の再集計（update_quiz_score_from_qr）
+        'qr_scan_total': QRCodeScan.objects.filter(
+            lesson_session=session, qr_code__in=student.qr_codes.all(), point_column__isnull=True
+        ).values('lesson_session_id').annotate(total=Sum('points_awarded')),
+        'lesson_points_by_student': StudentLessonPoints.objects.filter(
+            student=student, lesson_session__classroom=classroom
+        ),
+        'contributions_by_student': ContributionEvaluation.objects.filter(
+            evaluatee=student, peer_evaluation__lesson_session=session
+        ),
+        'peer_evaluations_by_session': PeerEvaluation.objects.filter(lesson_session=session),
+    }
+    return {name: queryset.explain() for name, queryset in queries.items()}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, session_count=15, group_size=4, seed=0, repeat=3, progress=None,
+                   explain=False):
+    """人数ごとに合成クラスを作って計測し、結果を辞書で返す（データはロールバックされる）"""
+    results = {}
+    plans = {}
+    for size in sizes:
+        if progress:
+            progress(f'{size}人: 合成データを作成しています')
+
+        def run(size=size):
+            classroom = generate_synthetic_classroom(
+                size, session_count=session_count, group_size=group_size, seed=seed
+            )
+            if progress:
+                progress(f'{size}人: 計測しています')
+            results[str(size)] = _benchmark_classroom(classroom, repeat)
+            if explain:
+                plans[str(size)] = explain_grade_queries(classroom)
+
+        _run_rolled_back(run)
+
+    result = {
+        'meta': {
+            'git_commit': _git_commit(),
+            'database': connection.vendor,
+            'sessions': session_count,
+            'group_size': group_size,
+            'seed': seed,
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+    if explain:
+        result['explain'] = plans
+    return result
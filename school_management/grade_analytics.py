@@ -0,0 +1,99 @@
+"""
+成績の集計・統計
+
+統計（平均・中央値・パーセンタイル・ヒストグラム・足切りと100点換算）は
+得点の一覧を1回だけソートして求め、評価一覧・ポイント一覧・学部全体の集計で共用する。
+1クラスの得点は高々数百件のため、標準ライブラリだけで実装している。
+"""
+from bisect import bisect_right
+
+
+def _percentile_sorted(sorted_values, q):
+    """ソート済みの一覧の q パーセンタイル（0〜100、隣接値の線形補間）"""
+    if not sorted_values:
+        return 0
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    fraction = position - lower
+    if fraction == 0:
+        return sorted_values[lower]
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * fraction
+
+
+def _median_sorted(sorted_values):
+    """ソート済みの一覧の中央値（statistics.median と同じ値を返す）"""
+    if not sorted_values:
+        return 0
+    mid = len(sorted_values) // 2
+    if len(sorted_values) % 2:
+        return sorted_values[mid]
+    return (sorted_values[mid - 1] + sorted_values[mid]) / 2
+
+
+def histogram(values, bins=10, value_range=None):
+    """等幅のヒストグラムを (counts, edges) で返す（最後の区間は上端を含む）"""
+    values = list(values)
+    low, high = value_range if value_range else ((min(values), max(values)) if values else (0, 0))
+    if high <= low:
+        high = low + 1
+    width = (high - low) / bins
+    edges = [low + width * i for i in range(bins)] + [high]
+    counts = [0] * bins
+    for value in values:
+        if value < low or value > high:
+            continue
+        counts[min(int((value - low) / width), bins - 1)] += 1
+    return counts, edges
+
+
+def summarize(values):
+    """件数・平均・最小・最大・四分位（中央値を含む）を返す"""
+    sorted_values = sorted(values)
+    count = len(sorted_values)
+    if not count:
+        return {'count': 0, 'average': 0, 'min': 0, 'max': 0, 'p25': 0, 'median': 0, 'p75': 0}
+    return {
+        'count': count,
+        'average': round(sum(sorted_values) / count, 1),
+        'min': sorted_values[0],
+        'max': sorted_values[-1],
+        'p25': _percentile_sorted(sorted_values, 25),
+        'median': _median_sorted(sorted_values),
+        'p75': _percentile_sorted(sorted_values, 75),
+    }
+
+
+def cutoff_statistics(values):
+    """足切りと100点換算に使う統計（中央値・足切りライン・換算基準の最高点・平均点）を返す
+
+    足切りラインは中央値の半分。換算基準は足切りラインを超えた得点の最高点
+    （ソート済みなので全体の最高点が足切りラインを超えていればそれが基準になる）。
+    """
+    sorted_values = sorted(values)
+    if not sorted_values:
+        return {'median': 0, 'cutoff_line': 0, 'max_val': 0, 'class_average_points': 0.0}
+    median_val = _median_sorted(sorted_values)
+    cutoff_line = median_val / 2
+    max_val = sorted_values[-1] if sorted_values[-1] > cutoff_line else 0
+    return {
+        'median': median_val,
+        'cutoff_line': cutoff_line,
+        'max_val': max_val,
+        'class_average_points': round(sum(sorted_values) / len(sorted_values), 1),
+    }
+
+
+def curve_score(raw, stats):
+    """足切りと100点換算を適用した (最終成績, 足切り対象か) を返す"""
+    if raw <= stats['cutoff_line']:
+        return 0, True
+    if stats['max_val'] > 0:
+        return round((raw / stats['max_val']) * 100, 1), False
+    return 0, False
+
+
+def count_passed(values, stats):
+    """足切りラインを超えた人数"""
+    sorted_values = sorted(values)
+    return len(sorted_values) - bisect_right(sorted_values, stats['cutoff_line'])
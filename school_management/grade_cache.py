@@ -0,0 +1,167 @@
+"""
+成績表示のキャッシュ（バージョンキー方式）
+
+学生ダッシュボードや教員の成績画面（ポイント一覧・評価一覧）のように
+何度も開かれる画面の集計結果を Django のキャッシュに保存する。
+キャッシュキーにはバージョン番号を含め、成績や在籍が変わったときはバージョンを
+更新する（古いキーは参照されなくなり、期限切れで消える）ことで無効化する。
+
+バージョン番号は GradeCacheVersion（DB）に置く。キャッシュはプロセスごとのため、
+Gunicorn の別ワーカーや取り込みワーカーで成績が変わったことを全プロセスに伝えるにはDBで共有する必要がある。
+集計結果そのものは各プロセスのキャッシュに置き、バージョンが変わればキーが変わって使われなくなる。
+"""
+import hashlib
+import json
+import time
+
+from django.db import transaction
+
+
+# 学生ダッシュボードの集計結果の保存期間（秒）。在籍変更以外のクラス情報の変更はこの間だけ遅れて反映される
+STUDENT_DASHBOARD_TIMEOUT = 300
+
+# 教員の成績画面の集計結果の保存期間（秒）。学生の氏名など成績以外の変更はこの間だけ遅れて反映される
+CLASS_GRADES_TIMEOUT = 600
+
+
+def _new_version():
+    return time.time_ns()
+
+
+def _get_shared_versions(keys):
+    """DB上のバージョン番号を {key: version} でまとめて読む（未採番のキーは採番する）"""
+    # models が grade_cache を読み込むため、モデルは呼び出し時に読み込む
+    from .models import GradeCacheVersion
+
+    keys = list(keys)
+    versions = dict(GradeCacheVersion.objects.filter(key__in=keys).values_list('key', 'version'))
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        version = _new_version()
+        GradeCacheVersion.objects.bulk_create(
+            [GradeCacheVersion(key=key, version=version) for key in missing], ignore_conflicts=True
+        )
+        versions.update(GradeCacheVersion.objects.filter(key__in=missing).values_list('key', 'version'))
+    return versions
+
+
+def _get_shared_version(key):
+    return _get_shared_versions([key])[key]
+
+
+def _bump_shared_versions(keys):
+    """DB上のバージョン番号を1回の書き込みでまとめて更新する"""
+    from .models import GradeCacheVersion
+
+    version = _new_version()
+    GradeCacheVersion.objects.bulk_create(
+        [GradeCacheVersion(key=key, version=version) for key in sorted(keys)],
+        update_conflicts=True,
+        unique_fields=['key'],
+        update_fields=['version'],
+    )
+
+
+def _student_points_version_key(student_id):
+    return f'student_points_version:{student_id}'
+
+
+def student_points_version(student_id):
+    """学生の成績・在籍のバージョン番号"""
+    return _get_shared_version(_student_points_version_key(student_id))
+
+
+def bump_student_points_versions(student_ids, immediate=False):
+    """学生の成績・在籍が変わったことを記録する（コミット後に反映）
+
+    コミット前に更新すると、並行するリクエストが変更前のデータを
+    新しいバージョンでキャッシュしてしまうため、on_commit で更新する。
+    コミット後の処理から呼ぶ場合は immediate=True でその場で更新する。
+    """
+    keys = {_student_points_version_key(student_id) for student_id in student_ids if student_id}
+    if not keys:
+        return
+    if immediate:
+        _bump_shared_versions(keys)
+    else:
+        transaction.on_commit(lambda: _bump_shared_versions(keys))
+
+
+def student_dashboard_cache_key(student):
+    """学生ダッシュボードの集計結果のキャッシュキー
+
+    ID が再利用された場合（削除後に同じIDが採番される等）に別の学生の
+    キャッシュを返さないよう、登録日時もキーに含める。
+    """
+    return 'student_dashboard:{}:{}:{}'.format(
+        student.id,
+        int(student.created_at.timestamp() * 1_000_000),
+        student_points_version(student.id),
+    )
+
+
+def _classroom_grade_version_key(classroom_id):
+    return f'classroom_grade_version:{classroom_id}'
+
+
+def classroom_grade_version(classroom_id):
+    """クラスの成績（採点・授業回・評価項目・在籍・設定）のバージョン番号"""
+    return _get_shared_version(_classroom_grade_version_key(classroom_id))
+
+
+def bump_classroom_grade_versions(classroom_ids, immediate=False):
+    """クラスの成績が変わったことを記録する
+
+    同じリクエスト内の再表示に変更前のキャッシュを返さないようその場で更新し、
+    コミット前のデータが並行するリクエストにキャッシュされた場合に備えて
+    コミット後にもう一度更新する。コミット後の処理から呼ぶ場合は immediate=True にする。
+    """
+    keys = {_classroom_grade_version_key(classroom_id) for classroom_id in classroom_ids if classroom_id}
+    if not keys:
+        return
+    _bump_shared_versions(keys)
+    if not immediate:
+        transaction.on_commit(lambda: _bump_shared_versions(keys))
+
+
+def _class_grades_cache_key(name, classroom, version, test_mode=False, sim_data=None):
+    sim_digest = ''
+    if sim_data:
+        sim_digest = hashlib.sha1(
+            json.dumps(sim_data, sort_keys=True, default=str).encode('utf-8')
+        ).hexdigest()
+    return 'class_grades:{}:{}:{}:{}:{}:{}'.format(
+        name,
+        classroom.id,
+        int(classroom.created_at.timestamp() * 1_000_000),
+        version,
+        int(bool(test_mode)),
+        sim_digest,
+    )
+
+
+def class_grades_cache_key(name, classroom, test_mode=False, sim_data=None):
+    """教員の成績画面の集計結果のキャッシュキー
+
+    name は画面（集計）の種類。テストモードのシミュレーション点数はセッションごとに
+    異なるため、内容のハッシュをキーに含める（シミュレーションが無ければ共通のキー）。
+    """
+    return _class_grades_cache_key(
+        name, classroom, classroom_grade_version(classroom.id), test_mode, sim_data
+    )
+
+
+def class_grades_cache_keys(name, classrooms):
+    """複数クラスの class_grades_cache_key（テストモードなし）を {classroom_id: key} で返す
+
+    バージョン番号はまとめて1回で読む（学部全体の集計など、多数のクラスを扱う処理用）。
+    """
+    versions = _get_shared_versions(
+        _classroom_grade_version_key(classroom.id) for classroom in classrooms
+    )
+    return {
+        classroom.id: _class_grades_cache_key(
+            name, classroom, versions[_classroom_grade_version_key(classroom.id)]
+        )
+        for classroom in classrooms
+    }
@@ -0,0 +1,283 @@
+"""
+クラス単位の成績計算エンジン
+
+StudentClassPoints.calculate_points_internal は学生1人ごとに小テスト・授業ポイント・
+貢献度・グループ投票・独自評価項目をそれぞれ別クエリで集計していたため、
+200人のクラスを再計算すると数千回のDB往復が発生していた。
+
+このモジュールではクラス全体（または指定した学生の集合）をまとめて扱い、
+学生数に依存しない固定回数のグループ化クエリで全員分の内訳を算出し、
+結果を bulk_update で1回に書き戻す。
+"""
+from collections import defaultdict
+
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .grade_cache import bump_classroom_grade_versions, bump_student_points_versions
+from .models import (
+    ContributionEvaluation,
+    Group,
+    GroupMember,
+    GroupVoteTally,
+    LessonSession,
+    PeerEvaluationSettings,
+    QuizScore,
+    SelfEvaluation,
+    StudentClassPoints,
+    StudentColumnScore,
+    StudentLessonPoints,
+)
+from .scoring import build_group_vote_point_map_from_counts
+
+
+# 積み上げポイントの内訳キー
+ACTIVITY_COMPONENTS = ('quiz', 'lesson', 'contrib', 'vote', 'custom')
+
+
+def _filter_students(queryset, field, student_ids):
+    """student_ids が None の場合はクラス全体、それ以外は指定学生のみに絞り込む"""
+    if student_ids is None:
+        return queryset
+    return queryset.filter(**{f'{field}__in': student_ids})
+
+
+def compute_session_group_point_maps(session_ids):
+    """授業回ごとのグループ投票ポイントを {session_id: {group_id: points}} で返す
+
+    提出ごとの response_json ではなく GroupVoteTally（グループごとの得票数）を読むため、
+    読み込む行数はグループ数に比例する。クエリ数は授業回数に関係なく最大3回。
+    グループ評価が無効な授業回は含まない。
+    """
+    session_settings = {}
+    for session_id, method, score_points, peer_status in PeerEvaluationSettings.objects.filter(
+        lesson_session_id__in=session_ids,
+        enable_group_evaluation=True,
+    ).values_list(
+        'lesson_session_id', 'group_evaluation_method', 'group_scores',
+        'lesson_session__peer_evaluation_status',
+    ):
+        if score_points:
+            session_settings[session_id] = (method, score_points, peer_status)
+    if not session_settings:
+        return {}
+
+    session_groups = defaultdict(list)
+    for group_id, session_id in Group.objects.filter(
+        lesson_session_id__in=session_settings.keys()
+    ).values_list('id', 'lesson_session_id'):
+        session_groups[session_id].append(group_id)
+
+    session_tallies = defaultdict(dict)
+    for tally in GroupVoteTally.objects.filter(lesson_session_id__in=session_settings.keys()):
+        session_tallies[tally.lesson_session_id][tally.group_id] = tally
+
+    session_group_point_maps = {}
+    for session_id, (method, score_points, peer_status) in session_settings.items():
+        group_ids = session_groups.get(session_id, [])
+        tallies = session_tallies.get(session_id, {})
+        is_finalized = (
+            peer_status == LessonSession.PeerEvaluationStatus.CLOSED
+            and bool(group_ids)
+            and all(gid in tallies and tallies[gid].is_finalized for gid in group_ids)
+        )
+        if is_finalized:
+            # 締切時に確定した付与ポイントをそのまま使う
+            session_group_point_maps[session_id] = {
+                gid: tallies[gid].awarded_points for gid in group_ids
+            }
+        else:
+            session_group_point_maps[session_id] = build_group_vote_point_map_from_counts(
+                group_ids,
+                {gid: tally.get_rank_counts() for gid, tally in tallies.items()},
+                method,
+                score_points,
+                peer_status,
+            )
+    return session_group_point_maps
+
+
+def compute_group_vote_points(classroom, student_ids=None):
+    """学生ごとのグループ投票ポイント合計を {student_id: points} で返す
+
+    クエリ数は学生数・授業回数に関係なく最大4回。
+    """
+    memberships = list(
+        _filter_students(
+            GroupMember.objects.filter(group__lesson_session__classroom=classroom),
+            'student_id',
+            student_ids,
+        ).values_list('student_id', 'group_id', 'group__lesson_session_id')
+    )
+    if not memberships:
+        return {}
+
+    session_group_point_maps = compute_session_group_point_maps(
+        {session_id for _, _, session_id in memberships}
+    )
+
+    vote_totals = defaultdict(int)
+    for student_id, group_id, session_id in memberships:
+        my_points = session_group_point_maps.get(session_id, {}).get(group_id, 0)
+        if my_points > 0:
+            vote_totals[student_id] += my_points
+    return dict(vote_totals)
+
+
+def compute_quiz_totals(classroom, student_ids=None):
+    """学生ごとの小テスト合計と受験数を {student_id: (total, count)} で返す
+
+    取り消されていないスコアはクイズ・学生ごとに1件（unique_current_quiz_score）なので、
+    重複を除かずにそのまま SQL で集計する。
+    """
+    rows = _filter_students(
+        QuizScore.objects.filter(
+            quiz__lesson_session__classroom=classroom,
+            is_cancelled=False,
+        ),
+        'student_id',
+        student_ids,
+    ).values('student_id').annotate(total=Sum('score'), count=Count('id'))
+    return {row['student_id']: (row['total'] or 0, row['count']) for row in rows}
+
+
+def _sum_by_student(queryset, student_field, value_field, student_ids):
+    rows = _filter_students(queryset, student_field, student_ids).values(student_field).annotate(
+        total=Sum(value_field)
+    )
+    return {row[student_field]: row['total'] or 0 for row in rows}
+
+
+def compute_activity_breakdowns(classroom, student_ids=None):
+    """学生ごとの積み上げポイントの内訳を返す
+
+    戻り値: {student_id: {'quiz', 'lesson', 'contrib', 'vote', 'custom', 'total'}}
+    student_ids を指定した場合はその全員分のキーを必ず含む。
+    """
+    quiz_totals = compute_quiz_totals(classroom, student_ids)
+    lesson_totals = _sum_by_student(
+        StudentLessonPoints.objects.filter(lesson_session__classroom=classroom),
+        'student_id', 'points', student_ids,
+    )
+    contrib_totals = _sum_by_student(
+        ContributionEvaluation.objects.filter(peer_evaluation__lesson_session__classroom=classroom),
+        'evaluatee_id', 'contribution_score', student_ids,
+    )
+    custom_totals = _sum_by_student(
+        StudentColumnScore.objects.filter(column__classroom=classroom),
+        'student_id', 'score', student_ids,
+    )
+    vote_totals = compute_group_vote_points(classroom, student_ids)
+
+    if student_ids is None:
+        target_ids = (
+            set(quiz_totals) | set(lesson_totals) | set(contrib_totals)
+            | set(custom_totals) | set(vote_totals)
+        )
+    else:
+        target_ids = set(student_ids)
+
+    breakdowns = {}
+    for student_id in target_ids:
+        breakdown = {
+            'quiz': quiz_totals.get(student_id, (0, 0))[0],
+            'lesson': lesson_totals.get(student_id, 0),
+            'contrib': contrib_totals.get(student_id, 0),
+            'vote': vote_totals.get(student_id, 0),
+            'custom': custom_totals.get(student_id, 0),
+        }
+        breakdown['total'] = int(sum(breakdown[key] for key in ACTIVITY_COMPONENTS))
+        breakdowns[student_id] = breakdown
+    return breakdowns
+
+
+def calculate_points(classroom, attendance_points_by_student):
+    """学生ごとの合計ポイント（StudentClassPoints.points に保存する値）を計算する
+
+    attendance_points_by_student: {student_id: attendance_points}
+    戻り値: {student_id: points}
+
+    - 目標管理モード: 講師評価点 + 出席点
+    - それ以外: (小テスト + ピア評価 + 授業内ポイント + 独自評価項目) * 2 + 出席点
+    """
+    student_ids = list(attendance_points_by_student)
+    if not student_ids:
+        return {}
+
+    if classroom.grading_system == 'goal':
+        teacher_scores = dict(
+            SelfEvaluation.objects.filter(
+                classroom=classroom,
+                student_id__in=student_ids,
+                teacher_score__isnull=False,
+            ).values_list('student_id', 'teacher_score')
+        )
+        return {
+            student_id: int(teacher_scores.get(student_id, 0) + attendance_points)
+            for student_id, attendance_points in attendance_points_by_student.items()
+        }
+
+    breakdowns = compute_activity_breakdowns(classroom, student_ids)
+    return {
+        student_id: int((breakdowns[student_id]['total'] * 2) + attendance_points)
+        for student_id, attendance_points in attendance_points_by_student.items()
+    }
+
+
+def rescale_attendance_points(classroom):
+    """出席点満点の変更に合わせて、クラス全員の出席点（出席率 × 満点 / 100）を1回の UPDATE で書き換える
+
+    update() はシグナルを発火しないため、合計ポイントの再計算とキャッシュの無効化は呼び出し側で行う。
+    戻り値: 更新したレコード数
+    """
+    return StudentClassPoints.objects.filter(classroom=classroom).update(
+        attendance_points=F('attendance_rate') * classroom.attendance_max_points / 100.0
+    )
+
+
+def recalculate_class_points(classroom, student_ids=None, create_for=None, invalidate_cache=True):
+    """クラスの StudentClassPoints をまとめて再計算し、変更分を bulk_update で保存する
+
+    student_ids を省略した場合はクラスの全レコードが対象。
+    create_for に学生IDを渡すと、その学生のレコードが無い場合は作成してから計算する。
+    invalidate_cache=False の場合、学生ダッシュボード・成績画面のキャッシュの無効化は呼び出し側で行う。
+    戻り値: 更新したレコード数
+    """
+    queryset = _filter_students(
+        StudentClassPoints.objects.filter(classroom=classroom), 'student_id', student_ids
+    )
+    rows = list(queryset.all())
+
+    if create_for:
+        existing_ids = {row.student_id for row in rows}
+        missing = [
+            StudentClassPoints(student_id=student_id, classroom=classroom)
+            for student_id in set(create_for) - existing_ids
+        ]
+        if missing:
+            StudentClassPoints.objects.bulk_create(missing, ignore_conflicts=True)
+            rows = list(queryset.all())
+
+    if not rows:
+        return 0
+
+    new_points = calculate_points(
+        classroom, {row.student_id: row.attendance_points for row in rows}
+    )
+
+    now = timezone.now()
+    changed = []
+    for row in rows:
+        points = new_points[row.student_id]
+        if row.points != points:
+            row.points = points
+            row.updated_at = now
+            changed.append(row)
+
+    if changed:
+        StudentClassPoints.objects.bulk_update(changed, ['points', 'updated_at'])
+        if invalidate_cache:
+            # bulk_update はシグナルを発火しないため、ダッシュボード・成績画面のキャッシュはここで無効化する
+            bump_student_points_versions([row.student_id for row in changed])
+            bump_classroom_grade_versions([classroom.id])
+    return len(changed)
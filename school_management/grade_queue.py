@@ -0,0 +1,160 @@
+"""
+成績再計算の遅延・集約キュー
+
+QuizScore などの post_save / post_delete シグナルは、以前は保存のたびに
+その場で StudentClassPoints.recalculate_total() を実行していた。
+そのため40人分の採点を保存すると40回、グループマスタのコピーでは
+メンバー数だけ再計算が走っていた。
+
+ここではシグナルから (student_id, classroom_id) の組を「要再計算」として
+スレッドローカルな集合に記録するだけにし、トランザクションのコミット時
+（transaction.on_commit）に組ごと1回だけ、クラス単位の成績計算エンジンで
+まとめて再計算する。同時に、成績画面が読む授業回別の得点スナップショット
+（StudentSessionScore）も同じ学生分だけ作り直し、成績表示のキャッシュを無効化する。
+
+一括処理のビューや管理コマンドでは deferred_recalculation() で
+再計算を保留し、ブロックを抜けた時点でまとめて反映できる。
+"""
+import threading
+import weakref
+from contextlib import contextmanager
+
+from django.db import transaction
+
+from .grade_cache import bump_classroom_grade_versions, bump_student_points_versions
+
+
+_local = threading.local()
+
+
+def _get_pending():
+    """{classroom_id: {student_id: create}} の形で保留中の再計算対象を返す"""
+    pending = getattr(_local, 'pending', None)
+    if pending is None:
+        pending = _local.pending = {}
+    return pending
+
+
+def _suspend_depth():
+    return getattr(_local, 'suspend_depth', 0)
+
+
+def _flush_is_scheduled():
+    """現在のトランザクションに反映処理が予約済みかどうか
+
+    予約した関数は弱参照で持ち、反映処理の実行時に解除する。ロールバック（セーブポイントを含む）
+    されると予約は破棄されて関数への参照が無くなるため、弱参照が切れていれば予約は失われている。
+    """
+    callback_ref = getattr(_local, 'flush_callback', None)
+    return callback_ref is not None and callback_ref() is not None
+
+
+def _discard_stale_pending():
+    """予約が失われた（ロールバックされた）記録を破棄する"""
+    if not _flush_is_scheduled():
+        _local.pending = {}
+
+
+def _schedule_flush():
+    if _flush_is_scheduled():
+        return
+
+    def callback():
+        flush_pending_recalculations()
+
+    _local.flush_callback = weakref.ref(callback)
+    # トランザクション外（autocommit）ではその場で実行される
+    transaction.on_commit(callback)
+
+
+def mark_dirty(student_id, classroom_id, create=False):
+    """学生×クラスの成績を再計算対象として記録する
+
+    create=True の場合、StudentClassPoints が存在しなければ再計算時に作成する
+    （post_save 時のみ作成し、post_delete 時はレコードを復活させない）。
+    """
+    if not student_id or not classroom_id:
+        return
+
+    suspended = _suspend_depth() > 0
+    if not suspended:
+        _discard_stale_pending()
+
+    students = _get_pending().setdefault(classroom_id, {})
+    students[student_id] = students.get(student_id, False) or create
+
+    # 反映処理はトランザクションごとに1回だけ予約する
+    if not suspended:
+        _schedule_flush()
+
+
+def mark_many_dirty(student_ids, classroom_id, create=False):
+    """複数学生をまとめて再計算対象として記録する"""
+    for student_id in student_ids:
+        mark_dirty(student_id, classroom_id, create=create)
+
+
+def flush_pending_recalculations():
+    """保留中の再計算をクラスごとに1回ずつ実行する"""
+    _local.flush_callback = None
+    pending = _get_pending()
+    if not pending:
+        return
+    _local.pending = {}
+
+    # 遅延インポートで循環参照を回避
+    from .grade_engine import recalculate_class_points
+    from .models import ClassRoom, CustomUser
+    from .session_scores import rebuild_session_scores
+
+    classrooms = ClassRoom.objects.in_bulk(list(pending))
+    all_ids = {student_id for students in pending.values() for student_id in students}
+    existing_ids = set(
+        CustomUser.objects.filter(id__in=all_ids).values_list('id', flat=True)
+    )
+
+    for classroom_id, students in pending.items():
+        classroom = classrooms.get(classroom_id)
+        if classroom is None:
+            # 再計算前にクラス自体が削除された場合
+            continue
+        recalculate_class_points(
+            classroom,
+            list(students),
+            create_for=[
+                student_id for student_id, create in students.items()
+                if create and student_id in existing_ids
+            ],
+            invalidate_cache=False,
+        )
+        # 削除済みの学生はスナップショットを作らない（カスケード削除で消える）
+        rebuild_session_scores(
+            classroom, [student_id for student_id in students if student_id in existing_ids]
+        )
+    # 授業ポイント履歴など総合ポイント以外の表示も変わるため、対象の学生全員のキャッシュを無効化する
+    # （コミット後に実行されているため、その場で反映する）
+    bump_student_points_versions(existing_ids, immediate=True)
+    # 教員の成績画面（ポイント一覧・評価一覧）はクラス単位でキャッシュしているため、クラスごとに無効化する
+    bump_classroom_grade_versions(pending, immediate=True)
+
+
+@contextmanager
+def deferred_recalculation():
+    """ブロック内で発生した成績再計算を保留し、抜けた時点でまとめて実行する
+
+    入れ子にした場合は最も外側のブロックを抜けた時にだけ反映する。
+    トランザクション内で使った場合はコミット時に反映される。
+
+        with deferred_recalculation():
+            for student in students:
+                QuizScore.objects.create(...)
+    """
+    if _suspend_depth() == 0:
+        _discard_stale_pending()
+    _local.suspend_depth = _suspend_depth() + 1
+    try:
+        yield
+    finally:
+        _local.suspend_depth -= 1
+        if _local.suspend_depth == 0 and _get_pending():
+            _schedule_flush()
@@ -0,0 +1,17 @@
+"""
+一括登録用のパスワードハッシャー
+
+学生の一括登録では初期パスワード（student_<学籍番号>）を全員分ハッシュ化するが、
+既定の PBKDF2 は1件ごとに数百ミリ秒かかるため、数百人分で1ワーカーを長時間占有してしまう。
+
+そこで一括登録時だけ反復回数を抑えたハッシャーで保存し、初回ログイン時に
+Django 標準の仕組み（check_password の setter）で既定のハッシャーへ再ハッシュする。
+初期パスワードは学籍番号から推測できる値のため、保存時の強度を下げても失うものは小さい。
+"""
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class BulkImportPasswordHasher(PBKDF2PasswordHasher):
+    """一括登録の初期パスワード用（初回ログイン時に既定のハッシャーへ移行する）"""
+    algorithm = 'bulk_import_pbkdf2_sha256'
+    iterations = 1000
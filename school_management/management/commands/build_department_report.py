@@ -0,0 +1,52 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from school_management.models import ClassRoom
+from school_management.views.grades.department_report import (
+    build_department_report, iter_department_report_zip,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        '指定した年度・学期の全クラスの成績を集計します。'
+        '（--output を指定するとクラス一覧・成績分布・クラスごとの評価一覧をZIPで保存します）'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, required=True, help='年度')
+        parser.add_argument(
+            '--semester', choices=[value for value, _ in ClassRoom.SEMESTER_CHOICES], required=True,
+            help='学期（first: 前期 / second: 後期）',
+        )
+        parser.add_argument('--output', help='レポートを保存するZIPファイル（省略時は集計結果のみ表示）')
+
+    def _progress(self, index, total, classroom):
+        self.stderr.write(f'[{index}/{total}] {classroom.class_name}')
+
+    def handle(self, *args, **options):
+        year, semester = options['year'], options['semester']
+
+        if options['output']:
+            path = Path(options['output'])
+            try:
+                with path.open('wb') as output:
+                    for chunk in iter_department_report_zip(year, semester, progress=self._progress):
+                        output.write(chunk)
+            except OSError as e:
+                raise CommandError(f'レポートを保存できませんでした: {e}')
+            self.stdout.write(self.style.SUCCESS(f'成績レポートを保存しました: {path}'))
+            return
+
+        report = build_department_report(year, semester, progress=self._progress)
+        for item in report['classes']:
+            self.stdout.write(
+                f'{item["classroom"].class_name:<20} {item["student_count"]:>5}人  '
+                f'平均 {item["average"]:>6}  中央値 {item["median"]:>6}  足切り {item["cutoff_count"]:>4}人'
+            )
+        summary = report['summary']
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(report["classes"])} クラス / {summary["count"]}人  '
+            f'平均 {summary["average"]}  中央値 {summary["median"]}  足切り {report["cutoff_count"]}人'
+        ))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from school_management.synthetic_data import (
+    delete_synthetic_classroom,
+    generate_synthetic_classroom,
+    synthetic_label,
+)
+
+
+class Command(BaseCommand):
+    help = 'ベンチマーク用の合成クラス（学生・授業回・グループ・ピア評価・QRスキャン）を作成します。'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=200, help='学生数')
+        parser.add_argument('--sessions', type=int, default=15, help='授業回数')
+        parser.add_argument('--group-size', type=int, default=4, help='1グループの人数')
+        parser.add_argument('--seed', type=int, default=0, help='乱数シード（同じ値なら同じ構成になる）')
+        parser.add_argument('--label', help='クラス名（省略時は bench-<学生数>-<シード>）')
+        parser.add_argument(
+            '--replace',
+            action='store_true',
+            help='同じクラス名の合成クラスと、その教員・学生を削除してから作成する',
+        )
+
+    def handle(self, *args, **options):
+        label = options['label'] or synthetic_label(options['students'], options['seed'])
+        if options['replace']:
+            delete_synthetic_classroom(label)
+
+        classroom = generate_synthetic_classroom(
+            options['students'],
+            session_count=options['sessions'],
+            group_size=options['group_size'],
+            seed=options['seed'],
+            label=label,
+        )
+        teacher = classroom.teachers.first()
+        self.stdout.write(self.style.SUCCESS(
+            f'合成クラスを作成しました: {classroom.class_name}（ID: {classroom.id}、'
+            f'学生 {options["students"]} 人、授業回 {options["sessions"]} 回、教員 {teacher.email}）'
+        ))
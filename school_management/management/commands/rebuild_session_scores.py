@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from school_management.models import ClassRoom
+from school_management.session_scores import rebuild_session_scores
+
+
+class Command(BaseCommand):
+    help = '授業回別の得点スナップショット（StudentSessionScore）を再構築します。'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--class-id',
+            type=int,
+            help='対象のクラスID（省略時は全クラス）',
+        )
+
+    def handle(self, *args, **options):
+        classrooms = ClassRoom.objects.all().order_by('id')
+        if options['class_id']:
+            classrooms = classrooms.filter(id=options['class_id'])
+
+        class_count = 0
+        row_count = 0
+        for classroom in classrooms.iterator():
+            row_count += rebuild_session_scores(classroom)
+            class_count += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'授業回別の得点を再構築しました: {class_count} クラス / {row_count} 件'
+            )
+        )
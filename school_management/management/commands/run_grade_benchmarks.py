@@ -0,0 +1,52 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from school_management.benchmarks import DEFAULT_SIZES, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        '合成クラスを人数ごとに作成し、成績まわりの処理の処理時間・クエリ数・ピークメモリを計測します。'
+        '（計測後にロールバックするため、データベースにデータは残りません）'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help='計測する学生数（複数指定可）'
+        )
+        parser.add_argument('--sessions', type=int, default=15, help='授業回数')
+        parser.add_argument('--group-size', type=int, default=4, help='1グループの人数')
+        parser.add_argument('--seed', type=int, default=0, help='乱数シード')
+        parser.add_argument('--repeat', type=int, default=3, help='処理時間の計測回数（中央値を記録）')
+        parser.add_argument('--output', help='結果を保存するJSONファイル（省略時は標準出力）')
+        parser.add_argument(
+            '--explain', action='store_true', help='主要な絞り込みの実行計画（EXPLAIN）も記録する'
+        )
+
+    def handle(self, *args, **options):
+        result = run_benchmarks(
+            sizes=options['sizes'],
+            session_count=options['sessions'],
+            group_size=options['group_size'],
+            seed=options['seed'],
+            repeat=options['repeat'],
+            explain=options['explain'],
+            progress=lambda message: self.stderr.write(message),
+        )
+        text = json.dumps(result, ensure_ascii=False, indent=2, sort_keys=True) + '\n'
+
+        if not options['output']:
+            self.stdout.write(text, ending='')
+            return
+
+        Path(options['output']).write_text(text, encoding='utf-8')
+        for size, paths in result['results'].items():
+            self.stdout.write(f'--- {size}人 ---')
+            for name, values in paths.items():
+                self.stdout.write(
+                    f'{name:<26} {values["wall_ms"]:>10.1f} ms  {values["queries"]:>6} queries  '
+                    f'{values["peak_kb"]:>10.1f} KB'
+                )
+        self.stdout.write(self.style.SUCCESS(f'計測結果を保存しました: {options["output"]}'))
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from school_management.student_imports import claim_next_job, run_import_job
+
+
+class Command(BaseCommand):
+    help = '学生一括取り込みジョブ（StudentImportJob）を順に処理します。'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='待機中のジョブを処理したら終了する（省略時は新しいジョブを待ち続ける）',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2.0,
+            help='待機中のジョブが無いときの確認間隔（秒）',
+        )
+
+    def handle(self, *args, **options):
+        processed = 0
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+                continue
+
+            run_import_job(job)
+            processed += 1
+            self.stdout.write(
+                f'ジョブ {job.id}: {job.get_status_display()}'
+                f'（新規作成: {job.created_count} / 既存紐づけ: {job.linked_count} / エラー: {job.failed_count}）'
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'学生一括取り込みジョブを処理しました: {processed} 件'))
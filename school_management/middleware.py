@@ -0,0 +1,53 @@
+"""
+school_management 用ミドルウェア
+"""
+from django.conf import settings
+
+from .grade_queue import deferred_recalculation
+from .request_metrics import RequestMetrics, log_request_metrics, server_timing_header
+
+
+class RequestMetricsMiddleware:
+    """リクエストごとのクエリ数・DB時間・処理時間を計測する
+
+    他のミドルウェア（セッション・認証・成績の再計算）のクエリも含めるため、
+    MIDDLEWARE の先頭近くに置く。結果は Server-Timing ヘッダーと構造化ログに出力し、
+    request.request_metrics からも参照できる（テストでの上限チェックに使用）。
+    StreamingHttpResponse の本文を送り出す間のクエリは含まれない。
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'REQUEST_METRICS_ENABLED', True):
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        request.request_metrics = metrics
+        metrics.start()
+        with metrics.wrap_connections():
+            response = self.get_response(request)
+        metrics.stop()
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        metrics.view_name = resolver_match.view_name if resolver_match else None
+        if getattr(settings, 'REQUEST_METRICS_SERVER_TIMING', True):
+            response['Server-Timing'] = server_timing_header(metrics)
+        log_request_metrics(request, response, metrics)
+        return response
+
+
+class GradeRecalculationMiddleware:
+    """リクエスト中に発生した成績再計算をレスポンス生成後にまとめて実行する
+
+    採点や名簿取込のように1リクエストで多数のレコードを保存するビューでも、
+    学生×クラスごとの再計算は1回だけになる。
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with deferred_recalculation():
+            return self.get_response(request)
@@ -0,0 +1,90 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:36
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def _safe_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def build_group_vote_tallies(apps, schema_editor):
+    """
+    既存のピア評価の response_json から順位別得票数を集計し、GroupVoteTally を作成する。
+    付与ポイントは未確定（is_finalized=False）のままにしておき、
+    成績計算側で得票数から算出させる（締切操作時に確定される）。
+    """
+    Group = apps.get_model('school_management', 'Group')
+    GroupVoteTally = apps.get_model('school_management', 'GroupVoteTally')
+    PeerEvaluation = apps.get_model('school_management', 'PeerEvaluation')
+
+    session_ids = set(PeerEvaluation.objects.values_list('lesson_session_id', flat=True))
+    if not session_ids:
+        return
+
+    session_groups = defaultdict(list)
+    for group_id, session_id in Group.objects.filter(
+        lesson_session_id__in=session_ids
+    ).values_list('id', 'lesson_session_id'):
+        session_groups[session_id].append(group_id)
+
+    rank_counts = defaultdict(lambda: defaultdict(int))
+    for session_id, response in PeerEvaluation.objects.values_list(
+        'lesson_session_id', 'response_json'
+    ).iterator():
+        session_group_ids = session_groups.get(session_id, [])
+        for entry in (response or {}).get('other_group_eval', []):
+            gid = _safe_int(entry.get('group_id'))
+            rank = _safe_int(entry.get('rank'))
+            if gid in session_group_ids and rank is not None and rank >= 1:
+                rank_counts[gid][rank] += 1
+
+    tallies = []
+    for session_id, group_ids in session_groups.items():
+        group_count = len(group_ids)
+        for group_id in group_ids:
+            counts = rank_counts.get(group_id, {})
+            tallies.append(GroupVoteTally(
+                lesson_session_id=session_id,
+                group_id=group_id,
+                rank_counts={str(rank): count for rank, count in sorted(counts.items())},
+                internal_points=sum(
+                    count * (group_count - rank)
+                    for rank, count in counts.items()
+                    if rank <= group_count
+                ),
+            ))
+    GroupVoteTally.objects.bulk_create(tallies, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0048_customuser_unique_student_number_for_students'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupVoteTally',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank_counts', models.JSONField(blank=True, default=dict, help_text='例: {"1": 3, "2": 1} → 1位3票, 2位1票', verbose_name='順位別得票数')),
+                ('internal_points', models.IntegerField(default=0, verbose_name='内部ポイント(G-N)')),
+                ('awarded_points', models.IntegerField(default=0, verbose_name='付与ポイント')),
+                ('is_finalized', models.BooleanField(default=False, verbose_name='確定済み')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='vote_tally', to='school_management.group', verbose_name='グループ')),
+                ('lesson_session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='group_vote_tallies', to='school_management.lessonsession', verbose_name='授業回')),
+            ],
+            options={
+                'verbose_name': 'グループ投票集計',
+                'verbose_name_plural': 'グループ投票集計',
+            },
+        ),
+        migrations.RunPython(build_group_vote_tallies, reverse_code=migrations.RunPython.noop),
+    ]
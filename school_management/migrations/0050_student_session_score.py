@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0049_group_vote_tally'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentSessionScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quiz_total', models.IntegerField(default=0, verbose_name='小テスト合計')),
+                ('quiz_count', models.IntegerField(default=0, verbose_name='小テスト受験数')),
+                ('lesson_points', models.IntegerField(default=0, verbose_name='授業内ポイント')),
+                ('contrib', models.IntegerField(default=0, verbose_name='ピア評価(貢献度)')),
+                ('vote', models.IntegerField(default=0, verbose_name='ピア評価(グループ投票)')),
+                ('custom_total', models.IntegerField(default=0, verbose_name='独自評価項目合計')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+                ('classroom', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_session_scores', to='school_management.classroom', verbose_name='クラス')),
+                ('lesson_session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_scores', to='school_management.lessonsession', verbose_name='授業回')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='session_scores', to=settings.AUTH_USER_MODEL, verbose_name='学生')),
+            ],
+            options={
+                'verbose_name': '授業回別得点',
+                'verbose_name_plural': '授業回別得点',
+                'indexes': [models.Index(fields=['classroom', 'student'], name='session_score_class_student')],
+                'unique_together': {('student', 'lesson_session')},
+            },
+        ),
+    ]
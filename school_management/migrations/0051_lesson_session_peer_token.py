@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:02
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def fill_peer_tokens(apps, schema_editor):
+    """既存の授業回に旧形式の匿名ピア評価トークン（md5("peer_{id}")）を設定する"""
+    LessonSession = apps.get_model('school_management', 'LessonSession')
+
+    sessions = []
+    for session in LessonSession.objects.only('id').iterator():
+        session.peer_token = hashlib.md5(f"peer_{session.id}".encode()).hexdigest()
+        sessions.append(session)
+    LessonSession.objects.bulk_update(sessions, ['peer_token'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0050_student_session_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lessonsession',
+            name='peer_token',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=32, verbose_name='ピア評価トークン'),
+        ),
+        migrations.RunPython(fill_peer_tokens, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0051_lesson_session_peer_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='qrcodescan',
+            name='client_scan_id',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True, verbose_name='クライアントスキャンID'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0052_qrcodescan_client_scan_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('class_csv', 'クラスへのCSV追加'), ('student_create', '学生の一括登録')], max_length=20, verbose_name='取り込み元')),
+                ('raw_data', models.TextField(verbose_name='入力データ')),
+                ('status', models.CharField(choices=[('pending', '待機中'), ('running', '処理中'), ('completed', '完了'), ('failed', '失敗')], default='pending', max_length=10, verbose_name='状態')),
+                ('total_rows', models.IntegerField(default=0, verbose_name='入力行数')),
+                ('validated_rows', models.IntegerField(default=0, verbose_name='チェック済み行数')),
+                ('created_count', models.IntegerField(default=0, verbose_name='新規作成数')),
+                ('linked_count', models.IntegerField(default=0, verbose_name='既存紐づけ数')),
+                ('failed_count', models.IntegerField(default=0, verbose_name='エラー数')),
+                ('errors', models.JSONField(blank=True, default=list, verbose_name='エラー内容')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='登録日時')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='開始日時')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='終了日時')),
+                ('classroom', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='student_import_jobs', to='school_management.classroom', verbose_name='クラス')),
+                ('teacher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_import_jobs', to=settings.AUTH_USER_MODEL, verbose_name='教員')),
+            ],
+            options={
+                'verbose_name': '学生一括取り込みジョブ',
+                'verbose_name_plural': '学生一括取り込みジョブ',
+                'indexes': [models.Index(fields=['status', 'id'], name='import_job_status_id')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:07
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def compact_current_quiz_scores(apps, schema_editor):
+    """
+    同一の小テスト・学生に取り消されていないスコアが複数ある場合、最新
+    （graded_at, id の最大）だけを残し、それ以外を取り消し済みにする。
+    成績計算はもともと最新のスコアだけを採用していたため、合計点は変わらない。
+    """
+    QuizScore = apps.get_model('school_management', 'QuizScore')
+
+    duplicated = (
+        QuizScore.objects.filter(is_cancelled=False)
+        .values('quiz_id', 'student_id')
+        .annotate(current_count=Count('id'))
+        .filter(current_count__gt=1)
+    )
+    stale_ids = []
+    for row in duplicated.iterator():
+        score_ids = list(
+            QuizScore.objects.filter(
+                quiz_id=row['quiz_id'], student_id=row['student_id'], is_cancelled=False
+            ).order_by('-graded_at', '-id').values_list('id', flat=True)
+        )
+        stale_ids.extend(score_ids[1:])
+
+    for start in range(0, len(stale_ids), 500):
+        QuizScore.objects.filter(id__in=stale_ids[start:start + 500]).update(is_cancelled=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0053_student_import_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(compact_current_quiz_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0054_compact_current_quiz_scores'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='quizscore',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_cancelled', False)), fields=('quiz', 'student'), name='unique_current_quiz_score'),
+        ),
+    ]
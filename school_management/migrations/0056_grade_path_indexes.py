@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0055_quizscore_unique_current_quiz_score'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='qrcodescan',
+            index=models.Index(fields=['qr_code', 'lesson_session', 'point_column'], name='qrscan_code_session_column'),
+        ),
+        migrations.AddIndex(
+            model_name='quizscore',
+            index=models.Index(fields=['quiz', 'is_cancelled', 'student', 'score'], name='quizscore_quiz_current_cover'),
+        ),
+    ]
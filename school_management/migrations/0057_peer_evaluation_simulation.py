@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0056_grade_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PeerEvaluationSimulation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('point_mode', models.CharField(default='settings', max_length=10, verbose_name='配点の計算方法')),
+                ('student_points', models.JSONField(default=dict, verbose_name='学生ごとの入力値')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+                ('classroom', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='peer_evaluation_simulations', to='school_management.classroom', verbose_name='クラス')),
+                ('lesson_session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='peer_evaluation_simulations', to='school_management.lessonsession', verbose_name='授業回')),
+                ('teacher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='peer_evaluation_simulations', to=settings.AUTH_USER_MODEL, verbose_name='教員')),
+            ],
+            options={
+                'verbose_name': 'ピア評価シミュレーション',
+                'verbose_name_plural': 'ピア評価シミュレーション',
+                'indexes': [models.Index(fields=['teacher', 'classroom'], name='peer_sim_teacher_class')],
+                'unique_together': {('teacher', 'lesson_session')},
+            },
+        ),
+    ]
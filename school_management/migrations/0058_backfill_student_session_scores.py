@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    以前は StudentSessionScore を既存クラスの全学生×全授業回分で埋めていた（RunPython）。
+    集計には現在のモデルとアプリのコードが必要で、後のモデル変更で migrate が壊れるため、
+    バックフィルはデプロイ後に `python manage.py rebuild_session_scores` で行う。
+    実行前でも、成績画面が ensure_session_scores で欠けている学生の分を作成する。
+    適用済みのデータベースとの整合のため、マイグレーション自体は残している。
+    """
+
+    dependencies = [
+        ('school_management', '0057_peer_evaluation_simulation'),
+    ]
+
+    operations = []
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0058_backfill_student_session_scores'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradeCacheVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True, verbose_name='キー')),
+                ('version', models.BigIntegerField(verbose_name='バージョン')),
+            ],
+            options={
+                'verbose_name': '成績キャッシュのバージョン',
+                'verbose_name_plural': '成績キャッシュのバージョン',
+            },
+        ),
+    ]
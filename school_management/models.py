@@ -1,14 +1,18 @@
+import hashlib
 import uuid
 
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
-from django.db.models import Sum, Q
+from django.db.models import Count, Sum, Q
 from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 
+from .grade_cache import bump_classroom_grade_versions, bump_student_points_versions
+from .grade_queue import mark_dirty, mark_many_dirty
+
 
 class CustomUserManager(BaseUserManager):
     """カスタムユーザーマネージャー"""
@@ -201,12 +205,46 @@ class TeacherStudentAssignment(models.Model):
             obj.unlinked_at = None
             obj.save(update_fields=['is_active', 'unlinked_at'])
 
-        ClassRoomEnrollment.objects.filter(
+        restored = ClassRoomEnrollment.objects.filter(
             student=student, classroom__teachers=teacher, is_active=False
         ).update(is_active=True, unlinked_at=None)
+        if restored:
+            bump_student_points_versions([student.id])
+            bump_classroom_grade_versions(
+                ClassRoom.objects.filter(teachers=teacher).values_list('id', flat=True)
+            )
 
         return obj
 
+    @classmethod
+    def bulk_assign(cls, teacher, students):
+        """複数学生をまとめて教員の担当にする（assign と同じく解除済みの担当関係・在籍を復元する）"""
+        students = list(students)
+        if not students:
+            return
+        existing = {
+            a.student_id: a
+            for a in cls.objects.filter(teacher=teacher, student__in=students)
+        }
+        to_reactivate_ids = [a.id for a in existing.values() if not a.is_active]
+        to_create = [
+            cls(teacher=teacher, student=s, is_active=True)
+            for s in students if s.id not in existing
+        ]
+        if to_reactivate_ids:
+            cls.objects.filter(id__in=to_reactivate_ids).update(is_active=True, unlinked_at=None)
+        if to_create:
+            cls.objects.bulk_create(to_create, batch_size=500, ignore_conflicts=True)
+
+        restored = ClassRoomEnrollment.objects.filter(
+            student__in=students, classroom__teachers=teacher, is_active=False
+        ).update(is_active=True, unlinked_at=None)
+        if restored:
+            bump_student_points_versions([s.id for s in students])
+            bump_classroom_grade_versions(
+                ClassRoom.objects.filter(teachers=teacher).values_list('id', flat=True)
+            )
+
     @classmethod
     def unassign(cls, teacher, student):
         """教員をこの学生の担当から外す（履歴として is_active=False で保持）"""
@@ -329,6 +367,8 @@ class ClassRoomEnrollment(models.Model):
             obj.is_active = True
             obj.unlinked_at = None
             obj.save(update_fields=['is_active', 'unlinked_at'])
+        bump_student_points_versions([student.id])
+        bump_classroom_grade_versions([classroom.id])
         return obj
 
     @classmethod
@@ -337,6 +377,8 @@ class ClassRoomEnrollment(models.Model):
         cls.objects.filter(classroom=classroom, student=student, is_active=True).update(
             is_active=False, unlinked_at=timezone.now()
         )
+        bump_student_points_versions([student.id])
+        bump_classroom_grade_versions([classroom.id])
 
     @classmethod
     def bulk_enroll(cls, classroom, students):
@@ -357,13 +399,18 @@ class ClassRoomEnrollment(models.Model):
             cls.objects.filter(id__in=to_reactivate_ids).update(is_active=True, unlinked_at=None)
         if to_create:
             cls.objects.bulk_create(to_create, ignore_conflicts=True)
+        bump_student_points_versions([s.id for s in students])
+        bump_classroom_grade_versions([classroom.id])
 
     @classmethod
     def bulk_unenroll(cls, classrooms, students):
         """複数学生をまとめて複数クラスから除籍する"""
+        students = list(students)
         cls.objects.filter(
             classroom__in=classrooms, student__in=students, is_active=True
         ).update(is_active=False, unlinked_at=timezone.now())
+        bump_student_points_versions([s.id for s in students])
+        bump_classroom_grade_versions([classroom.id for classroom in classrooms])
 
 
 class PointColumn(models.Model):
@@ -418,6 +465,8 @@ class LessonSession(models.Model):
     )
     enable_comments = models.BooleanField(default=False, verbose_name='コメント機能有効')
     enable_feedback = models.BooleanField(default=False, verbose_name='感想欄有効')
+    # 旧形式の匿名ピア評価リンク用トークン（保存時に自動設定、トークンから1回の索引検索で引く）
+    peer_token = models.CharField(max_length=32, blank=True, db_index=True, editable=False, verbose_name='ピア評価トークン')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -429,6 +478,19 @@ class LessonSession(models.Model):
 
     def __str__(self):
         return f"{self.classroom.class_name} 第{self.session_number}回"
+
+    @staticmethod
+    def build_peer_token(session_id):
+        """旧形式の匿名ピア評価リンクのトークン（授業回IDから決まる）"""
+        return hashlib.md5(f"peer_{session_id}".encode()).hexdigest()
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # トークンはIDから決まるため、新規作成時はINSERT後に設定する
+        token = self.build_peer_token(self.pk)
+        if self.peer_token != token:
+            self.peer_token = token
+            LessonSession.objects.filter(pk=self.pk).update(peer_token=token)
     
     @property
     def peer_evaluation_configured(self):
@@ -710,6 +772,19 @@ class QuizScore(models.Model):
     class Meta:
         verbose_name = '小テスト結果'
         verbose_name_plural = '小テスト結果'
+        constraints = [
+            # 取り消されていない（現在の）スコアは1つのクイズ・学生につき1件だけ。
+            # 採点のやり直しは旧スコアを取り消してから新しいスコアを作成する
+            models.UniqueConstraint(
+                fields=['quiz', 'student'],
+                condition=Q(is_cancelled=False),
+                name='unique_current_quiz_score',
+            ),
+        ]
+        indexes = [
+            # クラス全体の小テスト集計（クイズ→学生ごとの合計）を表を読まずに索引だけで済ませる
+            models.Index(fields=['quiz', 'is_cancelled', 'student', 'score'], name='quizscore_quiz_current_cover'),
+        ]
 
     def __str__(self):
         return f"{self.quiz} - {self.student.full_name}: {self.score}点"
@@ -799,6 +874,52 @@ class ContributionEvaluation(models.Model):
         return f"{self.peer_evaluation} - {self.evaluatee.full_name}: {self.contribution_score}点"
 
 
+class GroupVoteTally(models.Model):
+    """グループ投票の集計（授業回×グループ）
+
+    PeerEvaluation の提出・削除のたびに順位別の得票数を差分更新し、
+    ピア評価の締切時に付与ポイントを確定する。成績計算や結果画面は
+    response_json を毎回読み直す代わりにこの集計を参照する。
+    """
+    lesson_session = models.ForeignKey(
+        LessonSession,
+        on_delete=models.CASCADE,
+        related_name='group_vote_tallies',
+        verbose_name='授業回'
+    )
+    group = models.OneToOneField(
+        Group,
+        on_delete=models.CASCADE,
+        related_name='vote_tally',
+        verbose_name='グループ'
+    )
+    rank_counts = models.JSONField(
+        default=dict, blank=True, verbose_name='順位別得票数',
+        help_text='例: {"1": 3, "2": 1} → 1位3票, 2位1票'
+    )
+    internal_points = models.IntegerField(default=0, verbose_name='内部ポイント(G-N)')
+    awarded_points = models.IntegerField(default=0, verbose_name='付与ポイント')
+    is_finalized = models.BooleanField(default=False, verbose_name='確定済み')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'グループ投票集計'
+        verbose_name_plural = 'グループ投票集計'
+
+    def __str__(self):
+        return f"{self.group} 投票集計"
+
+    def get_rank_counts(self):
+        """順位別得票数を {rank(int): count} で返す"""
+        counts = {}
+        for rank, count in (self.rank_counts or {}).items():
+            try:
+                counts[int(rank)] = int(count)
+            except (TypeError, ValueError):
+                continue
+        return counts
+
+
 class GoogleOAuthSession(models.Model):
     """Google OAuth認証済みセッション（匿名フォーム向け）"""
     session_id = models.CharField(max_length=128, unique=True, verbose_name='セッションID')
@@ -873,12 +994,18 @@ class QRCodeScan(models.Model):
     lesson_session = models.ForeignKey(LessonSession, on_delete=models.CASCADE, verbose_name='授業セッション', related_name='qr_scans', null=True, blank=True)
     point_column = models.ForeignKey(PointColumn, on_delete=models.CASCADE, verbose_name='独自評価項目', related_name='qr_scans', null=True, blank=True)
     points_awarded = models.IntegerField(default=1, verbose_name='付与ポイント')
+    # 端末側で生成するスキャンID（オフライン時の再送で二重計上しないための冪等キー）
+    client_scan_id = models.UUIDField(null=True, blank=True, unique=True, editable=False, verbose_name='クライアントスキャンID')
     scanned_at = models.DateTimeField(auto_now_add=True, verbose_name='スキャン日時')
     
     class Meta:
         verbose_name = 'QRコードスキャン'
         verbose_name_plural = 'QRコードスキャン'
         # unique_together制約を削除 - 何度でもスキャン可能にする
+        indexes = [
+            # 学生×授業回のQRポイント再集計（授業回の全スキャンではなく学生のQRコードから引く）
+            models.Index(fields=['qr_code', 'lesson_session', 'point_column'], name='qrscan_code_session_column'),
+        ]
     
     def __str__(self):
         return f"{self.qr_code.student.full_name}のQRコードを{self.scanned_by.full_name}がスキャン"
@@ -920,81 +1047,35 @@ class StudentClassPoints(models.Model):
         return f"{self.student.full_name} - {self.classroom.class_name} - {self.points}pt"
 
     def calculate_points_internal(self):
-        """内部計算用: 各種スコアを集計してpointsフィールドを更新する"""
-        # 目標管理モードの場合
-        if self.classroom.grading_system == 'goal':
-            # 遅延インポートで循環参照を回避
-            from django.apps import apps
-            SelfEvaluation = apps.get_model('school_management', 'SelfEvaluation')
-            self_eval = SelfEvaluation.objects.filter(student=self.student, classroom=self.classroom).first()
-            
-            # 講師評価点を取得（なければ0）
-            teacher_score = 0
-            if self_eval and self_eval.teacher_score is not None:
-                teacher_score = self_eval.teacher_score
-            
-            # 合計 = 講師評価点 + 出席点
-            self.points = int(teacher_score + self.attendance_points)
-            return
+        """内部計算用: 各種スコアを集計してpointsフィールドを更新する
 
-        # 小テストの合計
-        # 重複データ対策: 同一クイズのスコアが複数ある場合は最新のみ採用
-        all_quiz_scores = QuizScore.objects.filter(
-            student=self.student,
-            quiz__lesson_session__classroom=self.classroom,
-            is_cancelled=False
-        ).order_by('graded_at')
-        
-        # 辞書で上書きすることで最新のスコアのみを残す
-        quiz_total = sum({qs.quiz_id: qs.score for qs in all_quiz_scores}.values())
-        
-        # 授業ポイントの合計
-        lesson_total = StudentLessonPoints.objects.filter(
-            student=self.student,
-            lesson_session__classroom=self.classroom
-        ).aggregate(total=Sum('points'))['total'] or 0
-        
-        # ピア評価ポイント (貢献度 + グループ投票)
-        peer_total = 0
-        
-        # 1. 貢献度評価 (5段階評価の合計)
-        contrib_evals = ContributionEvaluation.objects.filter(
-            evaluatee=self.student,
-            peer_evaluation__lesson_session__classroom=self.classroom
-        )
-        peer_total += contrib_evals.aggregate(total=Sum('contribution_score'))['total'] or 0
-        
-        # 2. グループ投票ポイント（response_jsonベース）
-        peer_total += self._calculate_group_vote_points()
-                
-        #  新規追加: 独自評価項目（列）の合計得点を計算
-        custom_columns_total = StudentColumnScore.objects.filter(
-            student=self.student,
-            column__classroom=self.classroom
-        ).aggregate(total=Sum('score'))['total'] or 0
+        集計はクラス単位の成績計算エンジン（grade_engine）に委譲し、
+        学生数に依存しない固定回数のクエリで計算する。
+        """
+        # 遅延インポートで循環参照を回避
+        from .grade_engine import calculate_points
 
-        # 合計を計算
         # 式: (小テスト(QR含む) + ピア評価 + 授業内ポイント + 独自評価項目) * 倍率(2) + 出席点
-        class_only_points = quiz_total + peer_total + lesson_total + custom_columns_total
-        self.points = int((class_only_points * 2) + self.attendance_points)
+        # 目標管理モードの場合は 講師評価点 + 出席点
+        self.points = calculate_points(
+            self.classroom, {self.student_id: self.attendance_points}
+        )[self.student_id]
 
     @property
     def quiz_stats(self):
-        """重複を除外したクイズ統計を返す（回数と平均点）"""
-        all_quiz_scores = QuizScore.objects.filter(
+        """クイズ統計を返す（回数・合計点・平均点）"""
+        # 現在のスコアはクイズごとに1件（unique_current_quiz_score）なのでそのまま集計できる
+        stats = QuizScore.objects.filter(
             student=self.student,
             quiz__lesson_session__classroom=self.classroom,
             is_cancelled=False
-        ).order_by('graded_at')
+        ).aggregate(total=Sum('score'), count=Count('id'))
         
-        # 辞書で上書きすることで最新のスコアのみを残す（重複対策）
-        unique_scores = {qs.quiz_id: qs.score for qs in all_quiz_scores}
-        
-        count = len(unique_scores)
-        total = sum(unique_scores.values())
+        count = stats['count']
+        total = stats['total'] or 0
         avg = round(total / count, 1) if count > 0 else 0
         
-        return {'count': count, 'average': avg}
+        return {'count': count, 'total': total, 'average': avg}
 
     @property
     def peer_eval_stats(self):
@@ -1012,142 +1093,15 @@ class StudentClassPoints(models.Model):
 
     def _calculate_group_vote_points(self):
         """response_jsonベースでグループ投票ポイントを計算"""
-        student_groups = list(GroupMember.objects.filter(
-            student=self.student,
-            group__lesson_session__classroom=self.classroom
-        ).select_related('group__lesson_session'))
-        if not student_groups:
-            return 0
-
-        session_settings = {}
-        target_session_ids = set()
-        for membership in student_groups:
-            session = membership.group.lesson_session
-            if session.id in session_settings:
-                continue
-            try:
-                pe_settings = session.peer_evaluation_settings
-            except PeerEvaluationSettings.DoesNotExist:
-                session_settings[session.id] = None
-                continue
-
-            score_points = pe_settings.group_scores or []
-            if not pe_settings.enable_group_evaluation or not score_points:
-                session_settings[session.id] = None
-                continue
-
-            session_settings[session.id] = {
-                'method': pe_settings.group_evaluation_method,
-                'score_points': score_points,
-                'peer_status': session.peer_evaluation_status,
-            }
-            target_session_ids.add(session.id)
-
-        if not target_session_ids:
-            return 0
-
-        session_groups = {}
-        for group in Group.objects.filter(lesson_session_id__in=target_session_ids).values('id', 'lesson_session_id'):
-            session_groups.setdefault(group['lesson_session_id'], []).append(group['id'])
-
-        session_eval_responses = {}
-        eval_rows = PeerEvaluation.objects.filter(
-            lesson_session_id__in=target_session_ids
-        ).values_list('lesson_session_id', 'response_json')
-        for session_id, response_json in eval_rows:
-            session_eval_responses.setdefault(session_id, []).append(response_json or {})
-
-        session_group_point_maps = {}
-        for session_id in target_session_ids:
-            settings = session_settings.get(session_id)
-            group_ids = session_groups.get(session_id, [])
-            group_point_map = {group_id: 0 for group_id in group_ids}
-
-            if not settings or not group_ids:
-                session_group_point_maps[session_id] = group_point_map
-                continue
+        from .grade_engine import compute_group_vote_points
 
-            score_points = settings['score_points']
-            eval_responses = session_eval_responses.get(session_id, [])
-
-            if settings['method'] == PeerEvaluationSettings.EvaluationMethod.AGGREGATE:
-                if settings['peer_status'] == LessonSession.PeerEvaluationStatus.CLOSED:
-                    # 締切時に内部ポイント(G-N)で集計し、順位配点を付与
-                    group_internal_points = {group_id: 0 for group_id in group_ids}
-                    group_count = len(group_ids)
-                    for response in eval_responses:
-                        for entry in response.get('other_group_eval', []):
-                            gid = entry.get('group_id')
-                            rank = entry.get('rank')
-                            if gid in group_internal_points and rank and 1 <= rank <= group_count:
-                                group_internal_points[gid] += (group_count - rank)
-
-                    sorted_groups = sorted(
-                        group_internal_points.items(),
-                        key=lambda x: x[1],
-                        reverse=True,
-                    )
-                    current_rank = 0
-                    prev_points = None
-                    for idx, (gid, internal_points) in enumerate(sorted_groups):
-                        if internal_points != prev_points:
-                            current_rank = idx
-                            prev_points = internal_points
-                        if current_rank < len(score_points):
-                            group_point_map[gid] = score_points[current_rank]
-            else:
-                # 直接付与: 各回答の順位配点をそのまま加算
-                for response in eval_responses:
-                    for entry in response.get('other_group_eval', []):
-                        gid = entry.get('group_id')
-                        rank = entry.get('rank')
-                        if gid and rank and 1 <= rank <= len(score_points):
-                            if gid in group_point_map:
-                                group_point_map[gid] += score_points[rank - 1]
-
-            session_group_point_maps[session_id] = group_point_map
-
-        vote_total = 0
-        for membership in student_groups:
-            group = membership.group
-            group_point_map = session_group_point_maps.get(group.lesson_session_id, {})
-            my_points = group_point_map.get(group.id, 0)
-            if my_points > 0:
-                vote_total += my_points
-        
-        return vote_total
+        return compute_group_vote_points(self.classroom, [self.student_id]).get(self.student_id, 0)
 
     def get_activity_points(self):
         """モードに関係なく、純粋な積み上げポイント（授業点相当）を計算して返す"""
-        # 小テスト (重複対策)
-        all_quiz_scores = QuizScore.objects.filter(
-            student=self.student,
-            quiz__lesson_session__classroom=self.classroom,
-            is_cancelled=False
-        ).order_by('graded_at')
-        quiz_total = sum({qs.quiz_id: qs.score for qs in all_quiz_scores}.values())
-        
-        lesson_total = StudentLessonPoints.objects.filter(
-            student=self.student,
-            lesson_session__classroom=self.classroom
-        ).aggregate(total=Sum('points'))['total'] or 0
-        
-        # ピア評価
-        peer_total = 0
-        contrib_evals = ContributionEvaluation.objects.filter(
-            evaluatee=self.student,
-            peer_evaluation__lesson_session__classroom=self.classroom
-        )
-        peer_total += contrib_evals.aggregate(total=Sum('contribution_score'))['total'] or 0
-        peer_total += self._calculate_group_vote_points()
-                
-        # 独自評価項目（列）の合計得点を計算
-        custom_columns_total = StudentColumnScore.objects.filter(
-            student=self.student,
-            column__classroom=self.classroom
-        ).aggregate(total=Sum('score'))['total'] or 0
-        
-        return int(quiz_total + lesson_total + peer_total + custom_columns_total)
+        from .grade_engine import compute_activity_breakdowns
+
+        return compute_activity_breakdowns(self.classroom, [self.student_id])[self.student_id]['total']
 
     @property
     def class_points(self):
@@ -1183,74 +1137,43 @@ class StudentClassPoints(models.Model):
 
     def get_peer_history(self):
         """ピア評価の獲得ポイント履歴（貢献度、投票点、合計）を返す"""
-        from .models import ContributionEvaluation, GroupMember, PeerEvaluation, Group, PeerEvaluationSettings
-        from django.db.models import Sum
+        from .grade_engine import compute_session_group_point_maps
+
+        sessions = list(
+            self.classroom.lessonsession_set.filter(has_peer_evaluation=True).order_by('-session_number')
+        )
+        if not sessions:
+            return []
+        session_ids = [session.id for session in sessions]
+
+        contrib_scores = dict(
+            ContributionEvaluation.objects.filter(
+                evaluatee=self.student,
+                peer_evaluation__lesson_session_id__in=session_ids,
+            ).values('peer_evaluation__lesson_session_id').annotate(
+                total=Sum('contribution_score')
+            ).values_list('peer_evaluation__lesson_session_id', 'total')
+        )
+
+        # 授業回ごとの所属グループ（複数ある場合は最初の1件）
+        session_group_ids = {}
+        for group_id, session_id in GroupMember.objects.filter(
+            student=self.student,
+            group__lesson_session_id__in=session_ids,
+        ).order_by('id').values_list('group_id', 'group__lesson_session_id'):
+            session_group_ids.setdefault(session_id, group_id)
+
+        # グループ投票ポイントは集計テーブル（GroupVoteTally）から求める
+        session_group_point_maps = compute_session_group_point_maps(list(session_group_ids))
 
         history = []
-        sessions = self.classroom.lessonsession_set.filter(has_peer_evaluation=True).order_by('-session_number')
-        
         for session in sessions:
-            contrib_score = ContributionEvaluation.objects.filter(
-                evaluatee=self.student,
-                peer_evaluation__lesson_session=session
-            ).aggregate(total=Sum('contribution_score'))['total'] or 0
-            
+            contrib_score = contrib_scores.get(session.id) or 0
             vote_score = 0
-            membership = GroupMember.objects.filter(
-                student=self.student,
-                group__lesson_session=session
-            ).first()
-            
-            if membership:
-                group = membership.group
-                try:
-                    pe_settings = session.peer_evaluation_settings
-                except PeerEvaluationSettings.DoesNotExist:
-                    pe_settings = None
-                
-                if pe_settings and pe_settings.enable_group_evaluation:
-                    score_points = pe_settings.group_scores or []
-                    if score_points:
-                        session_groups = list(Group.objects.filter(lesson_session=session))
-                        group_point_map = {g.id: 0 for g in session_groups}
-                        
-                        evals = PeerEvaluation.objects.filter(lesson_session=session)
-                        if pe_settings.group_evaluation_method == PeerEvaluationSettings.EvaluationMethod.AGGREGATE:
-                            if session.peer_evaluation_status == LessonSession.PeerEvaluationStatus.CLOSED:
-                                group_internal_points = {g.id: 0 for g in session_groups}
-                                group_count = len(session_groups)
-                                for ev in evals:
-                                    response = ev.response_json or {}
-                                    for entry in response.get('other_group_eval', []):
-                                        gid = entry.get('group_id')
-                                        rank = entry.get('rank')
-                                        if gid in group_internal_points and rank and 1 <= rank <= group_count:
-                                            group_internal_points[gid] += (group_count - rank)
-                                sorted_groups = sorted(
-                                    group_internal_points.items(),
-                                    key=lambda x: x[1],
-                                    reverse=True,
-                                )
-                                current_rank = 0
-                                prev_points = None
-                                for idx, (gid, internal_points) in enumerate(sorted_groups):
-                                    if internal_points != prev_points:
-                                        current_rank = idx
-                                        prev_points = internal_points
-                                    if current_rank < len(score_points):
-                                        group_point_map[gid] = score_points[current_rank]
-                        else:
-                            for ev in evals:
-                                response = ev.response_json or {}
-                                for entry in response.get('other_group_eval', []):
-                                    gid = entry.get('group_id')
-                                    rank = entry.get('rank')
-                                    if gid and rank and 1 <= rank <= len(score_points):
-                                        if gid in group_point_map:
-                                            group_point_map[gid] += score_points[rank - 1]
-                        
-                        vote_score = group_point_map.get(group.id, 0)
-            
+            group_id = session_group_ids.get(session.id)
+            if group_id is not None:
+                vote_score = session_group_point_maps.get(session.id, {}).get(group_id, 0)
+
             total_score = contrib_score + vote_score
             if total_score > 0:
                 history.append({
@@ -1263,6 +1186,100 @@ class StudentClassPoints(models.Model):
         return history[:10]
 
 
+class StudentSessionScore(models.Model):
+    """学生×授業回ごとの得点スナップショット（成績画面の読み取り用）
+
+    小テスト・授業内ポイント・ピア評価（貢献度／投票）・独自評価項目の授業回別の
+    合計を非正規化して保持する。元データの変更時はシグナル経由で
+    成績の再計算と一緒に更新され、rebuild_session_scores コマンドで再構築できる。
+    """
+    student = models.ForeignKey(CustomUser, on_delete=models.CASCADE, verbose_name='学生', related_name='session_scores')
+    lesson_session = models.ForeignKey(LessonSession, on_delete=models.CASCADE, verbose_name='授業回', related_name='student_scores')
+    classroom = models.ForeignKey(ClassRoom, on_delete=models.CASCADE, verbose_name='クラス', related_name='student_session_scores')
+    quiz_total = models.IntegerField(default=0, verbose_name='小テスト合計')
+    quiz_count = models.IntegerField(default=0, verbose_name='小テスト受験数')
+    lesson_points = models.IntegerField(default=0, verbose_name='授業内ポイント')
+    contrib = models.IntegerField(default=0, verbose_name='ピア評価(貢献度)')
+    vote = models.IntegerField(default=0, verbose_name='ピア評価(グループ投票)')
+    custom_total = models.IntegerField(default=0, verbose_name='独自評価項目合計')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新日時')
+
+    class Meta:
+        verbose_name = '授業回別得点'
+        verbose_name_plural = '授業回別得点'
+        unique_together = ['student', 'lesson_session']
+        indexes = [
+            models.Index(fields=['classroom', 'student'], name='session_score_class_student'),
+        ]
+
+    def __str__(self):
+        return f"{self.student.full_name} - {self.lesson_session}"
+
+    @property
+    def peer_total(self):
+        return self.contrib + self.vote
+
+
+class GradeCacheVersion(models.Model):
+    """成績キャッシュ（grade_cache）のバージョン番号
+
+    キャッシュはプロセスごと（LocMemCache）のため、バージョン番号だけはDBに置き、
+    Gunicorn の別ワーカーや取り込みワーカーで成績が変わっても全プロセスのキャッシュが無効になるようにする。
+    """
+    key = models.CharField(max_length=100, unique=True, verbose_name='キー')
+    version = models.BigIntegerField(verbose_name='バージョン')
+
+    class Meta:
+        verbose_name = '成績キャッシュのバージョン'
+        verbose_name_plural = '成績キャッシュのバージョン'
+
+    def __str__(self):
+        return f"{self.key}: {self.version}"
+
+
+class PeerEvaluationSimulation(models.Model):
+    """ピア評価のシミュレーション（テストモード用）の入力値
+
+    教員ごと・授業回ごとに1件保存する。student_points は {学生ID(文字列): 入力値の辞書}。
+    成績画面ではテストモードのときだけ読み込む（ログインセッションには保存しない）。
+    """
+    teacher = models.ForeignKey(CustomUser, on_delete=models.CASCADE, verbose_name='教員', related_name='peer_evaluation_simulations')
+    classroom = models.ForeignKey(ClassRoom, on_delete=models.CASCADE, verbose_name='クラス', related_name='peer_evaluation_simulations')
+    lesson_session = models.ForeignKey(LessonSession, on_delete=models.CASCADE, verbose_name='授業回', related_name='peer_evaluation_simulations')
+    point_mode = models.CharField(max_length=10, default='settings', verbose_name='配点の計算方法')
+    student_points = models.JSONField(default=dict, verbose_name='学生ごとの入力値')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新日時')
+
+    class Meta:
+        verbose_name = 'ピア評価シミュレーション'
+        verbose_name_plural = 'ピア評価シミュレーション'
+        unique_together = ['teacher', 'lesson_session']
+        indexes = [
+            models.Index(fields=['teacher', 'classroom'], name='peer_sim_teacher_class'),
+        ]
+
+    def __str__(self):
+        return f"{self.teacher.full_name} - {self.lesson_session}"
+
+    def as_session_data(self):
+        """授業回1回分の入力値を {'point_mode': ..., 学生ID(文字列): 入力値} で返す"""
+        return {'point_mode': self.point_mode, **self.student_points}
+
+    @classmethod
+    def load_class_data(cls, teacher, classroom):
+        """クラスの全授業回分の入力値を {授業回ID(文字列): as_session_data()} で返す（クエリ1回）"""
+        return {
+            str(simulation.lesson_session_id): simulation.as_session_data()
+            for simulation in cls.objects.filter(teacher=teacher, classroom=classroom)
+        }
+
+    @classmethod
+    def load_session_data(cls, teacher, lesson_session):
+        """授業回1回分の入力値（未保存なら None）"""
+        simulation = cls.objects.filter(teacher=teacher, lesson_session=lesson_session).first()
+        return simulation.as_session_data() if simulation else None
+
+
 class StudentGoal(models.Model):
     """学生のクラス目標（学期ごとに先生が設定）"""
     student = models.ForeignKey(CustomUser, on_delete=models.CASCADE, verbose_name='学生', related_name='goals')
@@ -1327,58 +1344,116 @@ class SelfEvaluation(models.Model):
         return f"{self.student.full_name} - {self.classroom.class_name} 自己評価"
 
 
+class StudentImportJob(models.Model):
+    """学生名簿の一括取り込みジョブ（run_student_import_jobs コマンドで処理する）"""
+    SOURCE_CLASS_CSV = 'class_csv'
+    SOURCE_STUDENT_CREATE = 'student_create'
+    SOURCE_CHOICES = [
+        (SOURCE_CLASS_CSV, 'クラスへのCSV追加'),
+        (SOURCE_STUDENT_CREATE, '学生の一括登録'),
+    ]
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, '待機中'),
+        (STATUS_RUNNING, '処理中'),
+        (STATUS_COMPLETED, '完了'),
+        (STATUS_FAILED, '失敗'),
+    ]
+
+    teacher = models.ForeignKey(CustomUser, on_delete=models.CASCADE, verbose_name='教員', related_name='student_import_jobs')
+    classroom = models.ForeignKey(ClassRoom, on_delete=models.CASCADE, null=True, blank=True, verbose_name='クラス', related_name='student_import_jobs')
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES, verbose_name='取り込み元')
+    raw_data = models.TextField(verbose_name='入力データ')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name='状態')
+    total_rows = models.IntegerField(default=0, verbose_name='入力行数')
+    validated_rows = models.IntegerField(default=0, verbose_name='チェック済み行数')
+    created_count = models.IntegerField(default=0, verbose_name='新規作成数')
+    linked_count = models.IntegerField(default=0, verbose_name='既存紐づけ数')
+    failed_count = models.IntegerField(default=0, verbose_name='エラー数')
+    errors = models.JSONField(default=list, blank=True, verbose_name='エラー内容')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='登録日時')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='開始日時')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='終了日時')
+
+    class Meta:
+        verbose_name = '学生一括取り込みジョブ'
+        verbose_name_plural = '学生一括取り込みジョブ'
+        indexes = [
+            models.Index(fields=['status', 'id'], name='import_job_status_id'),
+        ]
+
+    def __str__(self):
+        return f"{self.teacher.full_name} - {self.get_source_display()} ({self.get_status_display()})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_COMPLETED, self.STATUS_FAILED)
+
+    def finish(self, status, errors=None):
+        """ジョブを終了状態にする"""
+        self.status = status
+        self.errors = errors or []
+        self.failed_count = len(self.errors)
+        self.finished_at = timezone.now()
+        self.save(update_fields=[
+            'status', 'errors', 'failed_count', 'created_count', 'linked_count', 'finished_at',
+        ])
+
+
 # --- Signals ---
+def _mark_class_points_dirty(student_id, classroom_id, signal):
+    """成績の再計算を予約する（コミット時に学生×クラスごと1回だけまとめて実行される）
+
+    StudentClassPoints が無い場合、保存時のみ作成し、削除時は作成しない。
+    """
+    mark_dirty(student_id, classroom_id, create=signal == post_save)
+
+@receiver([post_save, post_delete], sender=StudentClassPoints)
+def bump_points_version_on_class_points_change(sender, instance, **kwargs):
+    """クラスの総合ポイント・出席点が保存・削除されたら学生ダッシュボード・成績画面のキャッシュを無効化する"""
+    bump_student_points_versions([instance.student_id])
+    bump_classroom_grade_versions([instance.classroom_id])
+
+@receiver([post_save, post_delete], sender=ClassRoom)
+def bump_grade_version_on_classroom_change(sender, instance, **kwargs):
+    """クラス設定（評価システム等）の変更時に成績画面のキャッシュを無効化する"""
+    bump_classroom_grade_versions([instance.id])
+
+@receiver([post_save, post_delete], sender=LessonSession)
+@receiver([post_save, post_delete], sender=PointColumn)
+def bump_grade_version_on_class_structure_change(sender, instance, **kwargs):
+    """授業回・独自評価項目（成績表の列）の変更時に成績画面のキャッシュを無効化する"""
+    bump_classroom_grade_versions([instance.classroom_id])
+
+@receiver([post_save, post_delete], sender=PeerEvaluationSettings)
+def bump_grade_version_on_peer_settings_change(sender, instance, **kwargs):
+    """ピア評価設定の変更時に成績画面のキャッシュを無効化する（グループ未作成で再計算対象がいない場合も含む）"""
+    try:
+        classroom_id = instance.lesson_session.classroom_id
+    except LessonSession.DoesNotExist:
+        # 授業回ごと削除された場合は授業回側のシグナルで無効化される
+        return
+    bump_classroom_grade_versions([classroom_id])
+
 @receiver([post_save, post_delete], sender=QuizScore)
 def update_class_points_from_quiz(sender, instance, **kwargs):
-    if instance.quiz.lesson_session.classroom:
-        try:
-            scp = StudentClassPoints.objects.get(
-                student=instance.student,
-                classroom=instance.quiz.lesson_session.classroom
-            )
-            scp.recalculate_total()
-        except StudentClassPoints.DoesNotExist:
-            if kwargs.get('signal') == post_save:
-                scp = StudentClassPoints.objects.create(
-                    student=instance.student,
-                    classroom=instance.quiz.lesson_session.classroom
-                )
-                scp.recalculate_total()
+    _mark_class_points_dirty(
+        instance.student_id, instance.quiz.lesson_session.classroom_id, kwargs.get('signal')
+    )
 
 @receiver([post_save, post_delete], sender=StudentLessonPoints)
 def update_class_points_from_lesson(sender, instance, **kwargs):
-    if instance.lesson_session.classroom:
-        try:
-            scp = StudentClassPoints.objects.get(
-                student=instance.student,
-                classroom=instance.lesson_session.classroom
-            )
-            scp.recalculate_total()
-        except StudentClassPoints.DoesNotExist:
-            if kwargs.get('signal') == post_save:
-                scp = StudentClassPoints.objects.create(
-                    student=instance.student,
-                    classroom=instance.lesson_session.classroom
-                )
-                scp.recalculate_total()
+    _mark_class_points_dirty(
+        instance.student_id, instance.lesson_session.classroom_id, kwargs.get('signal')
+    )
 
 @receiver([post_save, post_delete], sender=SelfEvaluation)
 def update_class_points_from_self_eval(sender, instance, **kwargs):
     """自己評価・教師評価更新時に成績を再計算"""
-    if instance.classroom:
-        try:
-            scp = StudentClassPoints.objects.get(
-                student=instance.student,
-                classroom=instance.classroom
-            )
-            scp.recalculate_total()
-        except StudentClassPoints.DoesNotExist:
-            if kwargs.get('signal') == post_save:
-                scp = StudentClassPoints.objects.create(
-                    student=instance.student,
-                    classroom=instance.classroom
-                )
-                scp.recalculate_total()
+    _mark_class_points_dirty(instance.student_id, instance.classroom_id, kwargs.get('signal'))
 
 @receiver(post_save, sender=LessonSession)
 def create_qr_quiz_for_session(sender, instance, created, **kwargs):
@@ -1399,7 +1474,13 @@ def update_quiz_score_from_qr(sender, instance, **kwargs):
         return
         
     # 独自評価項目のスキャン履歴の場合は、QuizScoreの集計対象から除外する
+    # （授業回別の得点スナップショットだけ更新する）
     if getattr(instance, 'point_column_id', None) is not None:
+        try:
+            student_id = instance.qr_code.student_id
+        except Exception:
+            return
+        _mark_class_points_dirty(student_id, instance.lesson_session.classroom_id, kwargs.get('signal'))
         return
 
     # 連携小テストを探す
@@ -1432,20 +1513,17 @@ def update_quiz_score_from_qr(sender, instance, **kwargs):
         return
 
     # 合計ポイントを再集計（集計元をQRCodeScanに一本化）
+    # 学生のQRコードから引くことで、授業回の全スキャンではなく複合インデックスで絞り込む
     total_points = QRCodeScan.objects.filter(
         lesson_session=instance.lesson_session,
-        qr_code__student=student,
+        qr_code__in=student.qr_codes.all(),
         point_column__isnull=True
     ).aggregate(total=Sum('points_awarded'))['total'] or 0
     
-    # QuizScoreを取得または作成
-    scores = QuizScore.objects.filter(quiz=quiz, student=student).order_by('-id')
+    # 現在のスコア（取り消されていないもの。1件に制約されている）を取得または作成
+    score_obj = QuizScore.objects.filter(quiz=quiz, student=student, is_cancelled=False).first()
     
-    if scores.exists():
-        score_obj = scores.first()
-        if scores.count() > 1:
-            scores.exclude(id=score_obj.id).delete()
-        
+    if score_obj:
         # 点数を更新（変更がある場合のみ保存して再計算シグナルを発火）
         if score_obj.score != total_points:
             score_obj.score = total_points
@@ -1477,76 +1555,88 @@ def set_peer_evaluation_group_numbers(sender, instance, **kwargs):
 @receiver([post_save, post_delete], sender=ContributionEvaluation)
 def update_class_points_from_contribution(sender, instance, **kwargs):
     """貢献度評価更新時に成績を再計算"""
-    if instance.peer_evaluation.lesson_session.classroom:
-        try:
-            scp = StudentClassPoints.objects.get(
-                student=instance.evaluatee,
-                classroom=instance.peer_evaluation.lesson_session.classroom
-            )
-            scp.recalculate_total()
-        except StudentClassPoints.DoesNotExist:
-            if kwargs.get('signal') == post_save:
-                scp = StudentClassPoints.objects.create(
-                    student=instance.evaluatee,
-                    classroom=instance.peer_evaluation.lesson_session.classroom
-                )
-                scp.recalculate_total()
+    _mark_class_points_dirty(
+        instance.evaluatee_id,
+        instance.peer_evaluation.lesson_session.classroom_id,
+        kwargs.get('signal'),
+    )
+
+@receiver(pre_save, sender=PeerEvaluation)
+def remember_previous_peer_vote(sender, instance, **kwargs):
+    """回答の更新時に、得票数の差分計算用に変更前の response_json を保持する"""
+    instance._previous_response_json = None
+    if instance.pk:
+        instance._previous_response_json = PeerEvaluation.objects.filter(
+            pk=instance.pk
+        ).values_list('response_json', flat=True).first()
+
+@receiver([post_save, post_delete], sender=PeerEvaluation)
+def update_group_vote_tally(sender, instance, **kwargs):
+    """ピア評価の提出・削除時にグループ投票集計を差分更新"""
+    from .vote_tally import diff_group_votes, refresh_group_vote_tallies
+
+    if kwargs.get('signal') == post_delete:
+        delta = diff_group_votes(old_response=instance.response_json)
+    else:
+        delta = diff_group_votes(
+            new_response=instance.response_json,
+            old_response=getattr(instance, '_previous_response_json', None),
+        )
+    if any(any(counts.values()) for counts in delta.values()):
+        refresh_group_vote_tallies(
+            instance.lesson_session_id,
+            delta,
+            create_missing=kwargs.get('signal') == post_save,
+        )
 
 @receiver([post_save, post_delete], sender=PeerEvaluation)
 def update_class_points_from_peer_vote(sender, instance, **kwargs):
     """ピア評価（投票）更新時に成績を再計算"""
     try:
-        if instance.lesson_session.classroom:
-            # response_jsonからグループ評価を取得して再計算
-            groups = []
-            response = instance.response_json or {}
-            other_group_eval = response.get('other_group_eval', [])
-            for entry in other_group_eval:
-                group_id = entry.get('group_id')
-                if group_id:
-                    try:
-                        g = Group.objects.get(id=group_id, lesson_session=instance.lesson_session)
-                        groups.append(g)
-                    except Group.DoesNotExist:
-                        pass
-            
-            for group in groups:
-                members = GroupMember.objects.filter(group=group)
-                for member in members:
-                    try:
-                        scp = StudentClassPoints.objects.get(
-                            student=member.student,
-                            classroom=instance.lesson_session.classroom
-                        )
-                        scp.recalculate_total()
-                    except StudentClassPoints.DoesNotExist:
-                        if kwargs.get('signal') == post_save:
-                            scp = StudentClassPoints.objects.create(
-                                student=member.student,
-                                classroom=instance.lesson_session.classroom
-                            )
-                            scp.recalculate_total()
+        # response_jsonから投票先グループを取得し、そのメンバー全員を再計算対象にする
+        response = instance.response_json or {}
+        group_ids = [
+            entry.get('group_id')
+            for entry in response.get('other_group_eval', [])
+            if entry.get('group_id')
+        ]
+        member_ids = []
+        if group_ids:
+            member_ids = list(GroupMember.objects.filter(
+                group_id__in=group_ids,
+                group__lesson_session_id=instance.lesson_session_id,
+            ).values_list('student_id', flat=True))
+        # DIRECTモードの貢献度は回答内のメンバー順位から求めるため、評価された学生も対象にする
+        member_ids += [
+            entry.get('member_id')
+            for entry in response.get('group_members_eval', [])
+            if entry.get('member_id')
+        ]
+        if not member_ids:
+            return
+        mark_many_dirty(
+            {int(member_id) for member_id in member_ids},
+            instance.lesson_session.classroom_id,
+            create=kwargs.get('signal') == post_save,
+        )
     except Exception:
         pass
 
+@receiver(post_save, sender=PeerEvaluationSettings)
+def update_class_points_from_peer_settings(sender, instance, **kwargs):
+    """ピア評価設定（配点・方式）の変更時に、その授業回のグループメンバーの成績を再計算"""
+    member_ids = GroupMember.objects.filter(
+        group__lesson_session_id=instance.lesson_session_id
+    ).values_list('student_id', flat=True)
+    mark_many_dirty(set(member_ids), instance.lesson_session.classroom_id)
+
 @receiver([post_save, post_delete], sender=GroupMember)
 def update_class_points_from_group_member(sender, instance, **kwargs):
     """グループメンバー変更時に成績を再計算"""
     try:
-        if instance.group.lesson_session.classroom:
-            try:
-                scp = StudentClassPoints.objects.get(
-                    student=instance.student,
-                    classroom=instance.group.lesson_session.classroom
-                )
-                scp.recalculate_total()
-            except StudentClassPoints.DoesNotExist:
-                if kwargs.get('signal') == post_save:
-                    scp = StudentClassPoints.objects.create(
-                        student=instance.student,
-                        classroom=instance.group.lesson_session.classroom
-                    )
-                    scp.recalculate_total()
+        _mark_class_points_dirty(
+            instance.student_id, instance.group.lesson_session.classroom_id, kwargs.get('signal')
+        )
     except Exception:
         pass
 
@@ -1554,17 +1644,4 @@ def update_class_points_from_group_member(sender, instance, **kwargs):
 @receiver([post_save, post_delete], sender=StudentColumnScore)
 def update_class_points_from_column_score(sender, instance, **kwargs):
     """独自評価項目の得点更新時に成績を再計算"""
-    if instance.column.classroom:
-        try:
-            scp = StudentClassPoints.objects.get(
-                student=instance.student,
-                classroom=instance.column.classroom
-            )
-            scp.recalculate_total()
-        except StudentClassPoints.DoesNotExist:
-            if kwargs.get('signal') == post_save:
-                scp = StudentClassPoints.objects.create(
-                    student=instance.student,
-                    classroom=instance.column.classroom
-                )
-                scp.recalculate_total()
+    _mark_class_points_dirty(instance.student_id, instance.column.classroom_id, kwargs.get('signal'))
@@ -0,0 +1,318 @@
+"""
+QRスキャンの一括記録
+
+スキャン画面（qr_code_scan）は1回のスキャンごとに QRCodeScan の作成・再保存、
+update_quiz_score_from_qr シグナルによる再集計、成績の再計算を行うため、
+教室を回りながら連続でスキャンすると待ち時間が積み重なる。
+
+ここでは複数件のスキャンをまとめて受け取り、
+- 参照データ（QRコード・授業回・独自評価項目・QR連携小テスト）を種類ごとに1回で取得
+- QRCodeScan は bulk_create で一括作成
+- QuizScore / StudentColumnScore は (小テスト/項目, 学生) ごとにまとめ、F() と CASE で1回の UPDATE で加算
+  （同時スキャンでも取りこぼさない）
+- 成績の再計算は grade_queue に記録し、コミット時にまとめて実行
+する。
+"""
+import uuid
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from .grade_queue import deferred_recalculation, mark_many_dirty
+from .models import (
+    LessonSession,
+    PointColumn,
+    QRCodeScan,
+    Quiz,
+    QuizScore,
+    StudentColumnScore,
+    StudentQRCode,
+)
+
+
+# 1回のリクエストで受け付けるスキャン件数の上限
+MAX_SCANS_PER_REQUEST = 500
+
+QR_ACTION = 'qr_action'
+
+
+class ScanError(ValueError):
+    """スキャン1件分の入力エラー"""
+
+
+def _parse_point_type(point_type):
+    """point_type を (種別, 独自評価項目ID) に変換する"""
+    point_type = point_type or QR_ACTION
+    if point_type == QR_ACTION:
+        return QR_ACTION, None
+    if point_type.startswith('custom_'):
+        try:
+            return 'custom', int(point_type.split('_', 1)[1])
+        except ValueError:
+            pass
+    raise ScanError('無効なポイント種別です。')
+
+
+def _parse_entry(entry):
+    if not isinstance(entry, dict):
+        raise ScanError('スキャンデータの形式が正しくありません。')
+    try:
+        qr_code_id = uuid.UUID(str(entry.get('qr_code_id') or '').strip())
+    except ValueError:
+        raise ScanError('無効なQRコードです。')
+    try:
+        session_id = int(entry.get('session_id'))
+    except (TypeError, ValueError):
+        raise ScanError('対象の授業回を選択してください。')
+    client_scan_id = entry.get('client_scan_id')
+    if client_scan_id:
+        try:
+            client_scan_id = uuid.UUID(str(client_scan_id).strip())
+        except ValueError:
+            raise ScanError('無効なスキャンIDです。')
+    else:
+        client_scan_id = None
+    kind, column_id = _parse_point_type(entry.get('point_type'))
+    points = entry.get('points')
+    if points is not None:
+        try:
+            points = int(points)
+        except (TypeError, ValueError):
+            raise ScanError('ポイントは数値で指定してください。')
+    return {
+        'qr_code_id': qr_code_id,
+        'session_id': session_id,
+        'kind': kind,
+        'column_id': column_id,
+        'points': points,
+        'client_scan_id': client_scan_id,
+    }
+
+
+def _get_qr_linked_quizzes(sessions):
+    """授業回ごとのQR連携小テストを返す（無い場合は update_quiz_score_from_qr と同様に用意する）"""
+    quizzes = {}
+    fallback = {}
+    for quiz in Quiz.objects.filter(lesson_session__in=sessions).order_by('id'):
+        if quiz.is_qr_linked:
+            quizzes.setdefault(quiz.lesson_session_id, quiz)
+        else:
+            fallback.setdefault(quiz.lesson_session_id, quiz)
+    for session in sessions:
+        if session.id in quizzes:
+            continue
+        quiz = fallback.get(session.id)
+        if quiz:
+            quiz.is_qr_linked = True
+            quiz.save()
+        else:
+            quiz = Quiz.objects.create(
+                lesson_session=session,
+                quiz_name="QRアクション点",
+                max_score=100,
+                grading_method='qr_mobile',
+                is_qr_linked=True
+            )
+        quizzes[session.id] = quiz
+    return quizzes
+
+
+def _add_points(queryset, increments):
+    """queryset の行の score に {Q条件: 加算点} を1回の UPDATE で加算する"""
+    queryset.update(
+        score=F('score') + Case(
+            *(When(condition, then=Value(points)) for condition, points in increments.items()),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    )
+
+
+def _increment_quiz_scores(teacher, quizzes, increments):
+    """QR連携小テストの得点に加算する {(session_id, student_id): points}"""
+    quiz_ids = {quizzes[session_id].id for session_id, _ in increments}
+    student_ids = {student_id for _, student_id in increments}
+    # 取り消されていない現在のスコア（クイズ・学生ごとに1件）に加算する（シグナル側と同じ扱い）
+    current_score_ids = {
+        (quiz_id, student_id): score_id
+        for score_id, quiz_id, student_id in QuizScore.objects.filter(
+            quiz_id__in=quiz_ids, student_id__in=student_ids, is_cancelled=False
+        ).values_list('id', 'quiz_id', 'student_id')
+    }
+
+    to_create = []
+    to_update = {}
+    for (session_id, student_id), points in increments.items():
+        quiz_id = quizzes[session_id].id
+        score_id = current_score_ids.get((quiz_id, student_id))
+        if score_id is None:
+            to_create.append(QuizScore(quiz_id=quiz_id, student_id=student_id, score=points, graded_by=teacher))
+        else:
+            to_update[score_id] = points
+    if to_update:
+        _add_points(
+            QuizScore.objects.filter(id__in=to_update),
+            {Q(id=score_id): points for score_id, points in to_update.items()},
+        )
+    if to_create:
+        QuizScore.objects.bulk_create(to_create)
+
+
+def _increment_column_scores(increments):
+    """独自評価項目の得点に加算する {(column_id, student_id): points}"""
+    StudentColumnScore.objects.bulk_create(
+        [
+            StudentColumnScore(column_id=column_id, student_id=student_id, score=0)
+            for column_id, student_id in increments
+        ],
+        ignore_conflicts=True,
+    )
+    _add_points(
+        StudentColumnScore.objects.filter(
+            column_id__in={column_id for column_id, _ in increments},
+            student_id__in={student_id for _, student_id in increments},
+        ),
+        {
+            Q(column_id=column_id, student_id=student_id): points
+            for (column_id, student_id), points in increments.items()
+        },
+    )
+
+
+def _store_scans(teacher, scans, sessions):
+    """検証済みのスキャンを保存し、集計先（小テスト・独自評価項目）へ加算する"""
+    quiz_increments = defaultdict(int)
+    column_increments = defaultdict(int)
+    dirty_students = defaultdict(set)
+    for scan in scans:
+        student_id = scan.qr_code.student_id
+        if scan.point_column is None:
+            quiz_increments[(scan.lesson_session_id, student_id)] += scan.points_awarded
+        else:
+            column_increments[(scan.point_column_id, student_id)] += scan.points_awarded
+        dirty_students[scan.lesson_session.classroom_id].add(student_id)
+
+    with transaction.atomic(), deferred_recalculation():
+        # bulk_create はシグナルを発火しないため、集計先への加算はここで行う
+        QRCodeScan.objects.bulk_create(scans)
+        if quiz_increments:
+            quizzes = _get_qr_linked_quizzes(
+                [sessions[session_id] for session_id in {key[0] for key in quiz_increments}]
+            )
+            _increment_quiz_scores(teacher, quizzes, quiz_increments)
+        if column_increments:
+            _increment_column_scores(column_increments)
+        StudentQRCode.objects.filter(id__in={scan.qr_code_id for scan in scans}).update(
+            last_used_at=timezone.now()
+        )
+        for classroom_id, student_ids in dirty_students.items():
+            mark_many_dirty(student_ids, classroom_id, create=True)
+
+
+def record_qr_scans(teacher, entries):
+    """QRスキャンをまとめて記録する
+
+    entries: [{'qr_code_id', 'session_id', 'point_type', 'points', 'client_scan_id'}, ...]
+        point_type は 'qr_action'（既定）または 'custom_<独自評価項目ID>'。
+        points を省略した場合、QRアクションはクラス設定の点数、独自評価項目は1点。
+        client_scan_id は端末側で生成したUUID（任意）。同じIDのスキャンは1回だけ記録する。
+    戻り値: 入力と同じ順序の結果リスト
+        成功: {'status': 'ok', 'scan_id': ..., 'student_id': ..., 'points': ...}
+        記録済み: {'status': 'duplicate', 'scan_id': ...}（再送されたスキャン）
+        失敗: {'status': 'error', 'error': メッセージ}
+    不正なスキャンは個別にエラーとし、残りは記録する。
+    """
+    results = [None] * len(entries)
+    parsed = {}
+    for index, entry in enumerate(entries):
+        try:
+            parsed[index] = _parse_entry(entry)
+        except ScanError as e:
+            results[index] = {'status': 'error', 'error': str(e)}
+
+    qr_codes = {
+        qr_code.qr_code_id: qr_code
+        for qr_code in StudentQRCode.objects.filter(
+            qr_code_id__in={item['qr_code_id'] for item in parsed.values()}, is_active=True
+        )
+    } if parsed else {}
+    sessions = LessonSession.objects.select_related('classroom').in_bulk(
+        {item['session_id'] for item in parsed.values()}
+    ) if parsed else {}
+    # 担当クラスの授業回のみ受け付ける
+    teacher_classroom_ids = set(
+        teacher.classrooms.filter(id__in={s.classroom_id for s in sessions.values()}).values_list('id', flat=True)
+    ) if sessions else set()
+    column_ids = {item['column_id'] for item in parsed.values() if item['column_id']}
+    columns = PointColumn.objects.in_bulk(column_ids) if column_ids else {}
+
+    candidates = {}
+    batch_duplicates = {}
+    first_index_by_scan_id = {}
+    for index, item in parsed.items():
+        qr_code = qr_codes.get(item['qr_code_id'])
+        session = sessions.get(item['session_id'])
+        if qr_code is None:
+            results[index] = {'status': 'error', 'error': '無効なQRコードです。'}
+            continue
+        if session is None or session.classroom_id not in teacher_classroom_ids:
+            results[index] = {'status': 'error', 'error': '無効な授業回です。'}
+            continue
+        column = None
+        if item['kind'] == 'custom':
+            column = columns.get(item['column_id'])
+            if column is None or column.classroom_id != session.classroom_id:
+                results[index] = {'status': 'error', 'error': '無効な評価項目です。'}
+                continue
+        client_scan_id = item['client_scan_id']
+        if client_scan_id is not None:
+            # 同じバッチ内で同じスキャンIDが重複している場合は最初の1件だけ記録する
+            if client_scan_id in first_index_by_scan_id:
+                batch_duplicates[index] = first_index_by_scan_id[client_scan_id]
+                continue
+            first_index_by_scan_id[client_scan_id] = index
+        points = item['points']
+        if points is None:
+            points = session.classroom.qr_point_value if column is None else 1
+        candidates[index] = QRCodeScan(
+            qr_code=qr_code,
+            scanned_by=teacher,
+            lesson_session=session,
+            point_column=column,
+            points_awarded=points,
+            client_scan_id=client_scan_id,
+        )
+
+    client_scan_ids = [scan.client_scan_id for scan in candidates.values() if scan.client_scan_id]
+    recorded = {}
+    for attempt in range(2):
+        # 再送されたスキャン（記録済みのスキャンID）は加算しない
+        recorded = dict(
+            QRCodeScan.objects.filter(client_scan_id__in=client_scan_ids).values_list('client_scan_id', 'id')
+        ) if client_scan_ids else {}
+        new_scans = [scan for scan in candidates.values() if scan.client_scan_id not in recorded]
+        if not new_scans:
+            break
+        try:
+            _store_scans(teacher, new_scans, sessions)
+            break
+        except IntegrityError:
+            # 同じスキャンIDが並行して送信された場合は、記録済みのものを除いてやり直す
+            if attempt:
+                raise
+
+    for index, scan in candidates.items():
+        if scan.client_scan_id in recorded:
+            results[index] = {'status': 'duplicate', 'scan_id': recorded[scan.client_scan_id]}
+        else:
+            results[index] = {
+                'status': 'ok',
+                'scan_id': scan.id,
+                'student_id': scan.qr_code.student_id,
+                'points': scan.points_awarded,
+            }
+    for index, first_index in batch_duplicates.items():
+        results[index] = {'status': 'duplicate', 'scan_id': results[first_index]['scan_id']}
+    return results
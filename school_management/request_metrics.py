@@ -0,0 +1,136 @@
+"""
+リクエストごとのクエリ数・DB時間・処理時間の計測
+
+RequestMetricsMiddleware がリクエストの処理中に発行されたクエリを数え、
+URL名（school_management:class_evaluation など）ごとに settings.REQUEST_METRICS_BUDGETS の
+上限と比較する。結果は Server-Timing ヘッダーと構造化ログ（JSON）で出力する。
+
+上限の書式:
+    'school_management:class_evaluation': {
+        'queries': 20,          # 1リクエストのクエリ数の上限
+        'queries_per_row': 0,   # 行数（学生数など）に比例して許容する追加クエリ数（省略時 0）
+        'total_ms': 1500,       # 処理時間の上限（ミリ秒、省略時は判定しない）
+    }
+
+queries_per_row を使うビューは set_request_rows() で行数を記録する。ミドルウェアは記録された行数
+（未記録なら 0）で判定し、テストでは tests/helpers.py の ViewBudgetMixin で行数を指定して判定することもできる。
+"""
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class RequestMetrics:
+    """1リクエスト分の計測値（connection.execute_wrapper として全クエリを数える）"""
+
+    def __init__(self):
+        self.view_name = None
+        self.rows = 0
+        self.query_count = 0
+        self.db_time = 0.0
+        self.total_time = 0.0
+        self._started = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.query_count += 1
+
+    def start(self):
+        self._started = time.perf_counter()
+
+    def stop(self):
+        self.total_time = time.perf_counter() - self._started
+
+    def wrap_connections(self):
+        """全データベース接続のクエリを計測するコンテキストを返す"""
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self))
+        return stack
+
+    @property
+    def db_ms(self):
+        return round(self.db_time * 1000, 2)
+
+    @property
+    def total_ms(self):
+        return round(self.total_time * 1000, 2)
+
+    def as_dict(self):
+        return {
+            'view': self.view_name,
+            'rows': self.rows,
+            'queries': self.query_count,
+            'db_ms': self.db_ms,
+            'total_ms': self.total_ms,
+        }
+
+
+def set_request_rows(request, rows):
+    """ビューが表示する行数（学生数など）を記録する（queries_per_row の判定に使う）"""
+    metrics = getattr(request, 'request_metrics', None)
+    if metrics is not None:
+        metrics.rows = rows
+
+
+def get_view_budget(view_name):
+    """URL名の上限設定を返す（未設定の場合は None）"""
+    if not view_name:
+        return None
+    return getattr(settings, 'REQUEST_METRICS_BUDGETS', {}).get(view_name)
+
+
+def query_budget(budget, rows=0):
+    """行数 rows のときに許容するクエリ数"""
+    return budget['queries'] + budget.get('queries_per_row', 0) * rows
+
+
+def budget_violations(metrics, budget, rows=0):
+    """上限を超えた項目の説明のリスト（超えていなければ空）"""
+    if not budget:
+        return []
+    violations = []
+    allowed_queries = query_budget(budget, rows)
+    if metrics.query_count > allowed_queries:
+        violations.append(f'queries {metrics.query_count} > {allowed_queries}')
+    total_ms = budget.get('total_ms')
+    if total_ms is not None and metrics.total_ms > total_ms:
+        violations.append(f'total_ms {metrics.total_ms} > {total_ms}')
+    return violations
+
+
+def server_timing_header(metrics):
+    """Server-Timing ヘッダーの値（ブラウザの開発者ツールで確認できる）"""
+    return (
+        f'db;dur={metrics.db_ms};desc="{metrics.query_count} queries", '
+        f'total;dur={metrics.total_ms}'
+    )
+
+
+def log_request_metrics(request, response, metrics):
+    """計測値を構造化ログとして出力する（上限を超えた場合は WARNING）"""
+    violations = budget_violations(metrics, get_view_budget(metrics.view_name), metrics.rows)
+    record = {
+        **metrics.as_dict(),
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'over_budget': violations,
+    }
+    level = logging.WARNING if violations else logging.INFO
+    if logger.isEnabledFor(level):
+        logger.log(
+            level,
+            json.dumps(record, ensure_ascii=False),
+            extra={'request_metrics': record},
+        )
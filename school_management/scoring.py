@@ -0,0 +1,196 @@
+"""
+ピア評価の配点計算（DBアクセスなし）
+
+グループ投票・メンバー評価の配点は、成績計算エンジン・グループ投票集計・
+ピア評価の締切と結果画面・成績画面のシミュレーションから呼ばれる。
+ここには読み込み済みの値（グループ/メンバーのID・回答の response_json・
+順位別得票数・配点リスト）だけを受け取る純粋な関数を置き、
+クエリは呼び出し側でまとめて発行する。
+
+- AGGREGATE: 内部ポイント(G-N)の降順に順位配点を付与する（同点は同順位。Gは人数/グループ数）
+- DIRECT: 各順位の得票数 × 順位配点を加算する
+"""
+from collections import defaultdict
+
+from .models import LessonSession, PeerEvaluationSettings
+
+
+def _safe_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _count_votes(responses, list_key, id_key, target_ids=None):
+    rank_counts = defaultdict(lambda: defaultdict(int))
+    for response in responses:
+        for entry in (response or {}).get(list_key, []):
+            target_id = _safe_int(entry.get(id_key))
+            rank = _safe_int(entry.get('rank'))
+            if target_id is None or rank is None or rank < 1:
+                continue
+            if target_ids is not None and target_id not in target_ids:
+                continue
+            rank_counts[target_id][rank] += 1
+    return {target_id: dict(counts) for target_id, counts in rank_counts.items()}
+
+
+def count_group_votes(responses):
+    """回答の other_group_eval から順位別得票数を {group_id: {rank: count}} で数える"""
+    return _count_votes(responses, 'other_group_eval', 'group_id')
+
+
+def count_member_votes(responses, member_ids=None):
+    """回答の group_members_eval から順位別得票数を {member_id: {rank: count}} で数える
+
+    member_ids を指定した場合、それ以外（集計時点でグループにいないメンバー）への票は数えない。
+    """
+    target_ids = None if member_ids is None else set(member_ids)
+    return _count_votes(responses, 'group_members_eval', 'member_id', target_ids)
+
+
+def compute_internal_points(ids, rank_counts):
+    """得票数から内部ポイント(G-N)を {id: points} で返す（Gは ids の件数）"""
+    size = len(ids)
+    return {
+        target_id: sum(
+            count * (size - rank)
+            for rank, count in rank_counts.get(target_id, {}).items()
+            if 1 <= rank <= size
+        )
+        for target_id in ids
+    }
+
+
+def rank_points_with_ties(internal_points, score_points):
+    """内部ポイントの降順に順位配点を {id: points} で返す
+
+    同点は同じ順位（先頭の順位）として扱い、配点のない順位は0点。
+    同点の並びは internal_points の順序を保つ。
+    """
+    point_map = {}
+    current_rank = 0
+    prev_points = None
+    for idx, (target_id, points) in enumerate(
+        sorted(internal_points.items(), key=lambda x: x[1], reverse=True)
+    ):
+        if points != prev_points:
+            current_rank = idx
+            prev_points = points
+        point_map[target_id] = score_points[current_rank] if current_rank < len(score_points) else 0
+    return point_map
+
+
+def direct_rank_points(ids, rank_counts, score_points):
+    """各順位の得票数 × 順位配点の合計を {id: points} で返す"""
+    point_map = {target_id: 0 for target_id in ids}
+    for target_id in ids:
+        for rank, count in rank_counts.get(target_id, {}).items():
+            if 1 <= rank <= len(score_points):
+                point_map[target_id] += score_points[rank - 1] * count
+    return point_map
+
+
+def build_group_vote_point_map_from_counts(group_ids, rank_counts, method, score_points, peer_status):
+    """1授業回分のグループ投票ポイントを得票数から {group_id: points} で返す
+
+    AGGREGATE は締切後のみ付与する（締切前は全グループ0点）。
+    """
+    if not group_ids or not score_points:
+        return {group_id: 0 for group_id in group_ids}
+
+    if method == PeerEvaluationSettings.EvaluationMethod.AGGREGATE:
+        if peer_status != LessonSession.PeerEvaluationStatus.CLOSED:
+            return {group_id: 0 for group_id in group_ids}
+        return rank_points_with_ties(compute_internal_points(group_ids, rank_counts), score_points)
+
+    return direct_rank_points(group_ids, rank_counts, score_points)
+
+
+def build_group_vote_point_map(group_ids, responses, method, score_points, peer_status):
+    """1授業回分のグループ投票ポイントを回答(response_json)の一覧から {group_id: points} で返す"""
+    return build_group_vote_point_map_from_counts(
+        group_ids, count_group_votes(responses), method, score_points, peer_status
+    )
+
+
+def build_member_aggregate_points(member_ids, responses, score_points):
+    """グループ1つ分のメンバー評価（AGGREGATE）の配点を {member_id: points} で返す
+
+    member_ids は集計時点のグループメンバー、responses はそのグループの回答。
+    1人以下のグループは順位が付かないため空の辞書を返す。
+    """
+    if len(member_ids) <= 1 or not score_points:
+        return {}
+    rank_counts = count_member_votes(responses, member_ids)
+    return rank_points_with_ties(compute_internal_points(member_ids, rank_counts), score_points)
+
+
+def _sum_rank_inputs(sim_data, prefix, score_points):
+    total = 0
+    for rank, points in enumerate(score_points or [], 1):
+        count = sim_data.get(f'{prefix}_rank_{rank}')
+        if count:
+            total += float(count) * points
+    return total
+
+
+def simulate_peer_points(sim_data, pe_settings, point_mode='settings'):
+    """成績画面のシミュレーション入力から (貢献度, 投票ポイント) を返す
+
+    sim_data: 学生1人・授業回1回分の入力（順位別の人数/票数、または手入力の点数）
+    pe_settings: 授業回のピア評価設定（未設定なら None）
+    point_mode: 'settings'（設定の配点で計算）または 'manual'（手入力の点数）
+    旧形式（数値のみ・member/group キー）の入力もそのまま扱う。
+    """
+    if not isinstance(sim_data, dict):
+        return float(sim_data), 0
+
+    member_enabled = bool(pe_settings and pe_settings.enable_member_evaluation)
+    group_enabled = bool(pe_settings and pe_settings.enable_group_evaluation)
+
+    contrib = 0
+    if member_enabled:
+        if point_mode == 'settings':
+            contrib = _sum_rank_inputs(sim_data, 'member', pe_settings.member_scores)
+        elif point_mode == 'manual' and sim_data.get('contrib'):
+            contrib = float(sim_data['contrib'])
+    elif not group_enabled:
+        # メンバー評価・グループ評価がどちらも無効な場合は貢献度の手入力を使う
+        contrib_val = sim_data.get('contrib', sim_data.get('member'))
+        if contrib_val:
+            contrib = float(contrib_val)
+
+    vote = 0
+    if group_enabled:
+        if point_mode == 'settings':
+            vote = _sum_rank_inputs(sim_data, 'group', pe_settings.group_scores)
+        elif point_mode == 'manual' and sim_data.get('group_manual'):
+            vote = float(sim_data['group_manual'])
+
+    # 互換性フォールバック (member, group)
+    if contrib == 0 and vote == 0 and ('member' in sim_data or 'group' in sim_data):
+        return sim_data.get('member', 0), sim_data.get('group', 0)
+    return contrib, vote
+
+
+def simulate_class_peer_points(sim_data_class, session_settings):
+    """クラス全体のシミュレーション入力を一括で計算し {(学生ID, 授業回ID): (貢献度, 投票ポイント)} で返す
+
+    sim_data_class: {授業回ID(文字列): {'point_mode': ..., 学生ID(文字列): 入力値}}
+    session_settings: {授業回ID: ピア評価設定（未設定なら None）}。ここに無い授業回の入力は無視する。
+    """
+    overlay = {}
+    for session_key, session_sim in sim_data_class.items():
+        session_id = _safe_int(session_key)
+        if session_id not in session_settings or not isinstance(session_sim, dict):
+            continue
+        pe_settings = session_settings[session_id]
+        point_mode = session_sim.get('point_mode', 'settings')
+        for student_key, sim_data in session_sim.items():
+            student_id = _safe_int(student_key)
+            if student_id is None:
+                continue
+            overlay[(student_id, session_id)] = simulate_peer_points(sim_data, pe_settings, point_mode)
+    return overlay
@@ -0,0 +1,224 @@
+"""
+学生×授業回の得点スナップショット（StudentSessionScore）の再構築
+
+成績画面は授業回ごとの小テスト・授業内ポイント・ピア評価・独自評価項目を
+表示のたびに生データから集計していた。ここではクラス単位のグループ化クエリで
+全員分をまとめて計算し、StudentSessionScore に書き戻す。
+
+ピア評価は画面の表示と同じ規則で求める（ピア評価なしの授業回は0）。
+貢献度:
+- メンバー評価が無効: 0
+- DIRECT: 回答(group_members_eval)の順位 × 配点
+- AGGREGATE: 締切時に作成された ContributionEvaluation の合計
+グループ投票: 授業回ごとに最初に所属したグループの付与ポイント
+"""
+from collections import defaultdict
+
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .grade_engine import _filter_students, compute_session_group_point_maps
+from .models import (
+    ClassRoomEnrollment,
+    ContributionEvaluation,
+    GroupMember,
+    LessonSession,
+    PeerEvaluation,
+    PeerEvaluationSettings,
+    QRCodeScan,
+    QuizScore,
+    StudentLessonPoints,
+    StudentSessionScore,
+)
+from .scoring import count_member_votes, direct_rank_points
+
+
+SCORE_FIELDS = ('quiz_total', 'quiz_count', 'lesson_points', 'contrib', 'vote', 'custom_total')
+
+
+def compute_session_scores(classroom, student_ids=None):
+    """学生×授業回ごとの得点を {(student_id, session_id): {field: value}} で返す
+
+    クエリ数は学生数・授業回数に関係なく一定。
+    student_ids を指定した場合は、その全員×全授業回分のキーを必ず含む。
+    """
+    sessions = list(
+        LessonSession.objects.filter(classroom=classroom).select_related('peer_evaluation_settings')
+    )
+    session_ids = [session.id for session in sessions]
+    scores = defaultdict(lambda: dict.fromkeys(SCORE_FIELDS, 0))
+    if not session_ids:
+        return {}
+
+    # 小テスト: 現在のスコアはクイズごとに1件なので授業回単位で SQL 集計する
+    for row in _filter_students(
+        QuizScore.objects.filter(quiz__lesson_session_id__in=session_ids, is_cancelled=False),
+        'student_id',
+        student_ids,
+    ).values('student_id', 'quiz__lesson_session_id').annotate(total=Sum('score'), count=Count('id')):
+        key = (row['student_id'], row['quiz__lesson_session_id'])
+        scores[key]['quiz_total'] = row['total'] or 0
+        scores[key]['quiz_count'] = row['count']
+
+    # 授業内手動ポイント
+    for student_id, session_id, points in _filter_students(
+        StudentLessonPoints.objects.filter(lesson_session_id__in=session_ids),
+        'student_id',
+        student_ids,
+    ).values_list('student_id', 'lesson_session_id', 'points'):
+        scores[(student_id, session_id)]['lesson_points'] = points
+
+    # ピア評価（貢献度）
+    peer_session_ids = [session.id for session in sessions if session.has_peer_evaluation]
+    direct_session_scores = {}
+    aggregate_session_ids = set()
+    for session in sessions:
+        if not session.has_peer_evaluation:
+            continue
+        try:
+            pe_settings = session.peer_evaluation_settings
+        except PeerEvaluationSettings.DoesNotExist:
+            continue
+        if not pe_settings.enable_member_evaluation:
+            continue
+        if pe_settings.evaluation_method == PeerEvaluationSettings.EvaluationMethod.DIRECT:
+            if pe_settings.member_scores:
+                direct_session_scores[session.id] = pe_settings.member_scores
+        else:
+            aggregate_session_ids.add(session.id)
+
+    if direct_session_scores:
+        session_responses = defaultdict(list)
+        for session_id, response in PeerEvaluation.objects.filter(
+            lesson_session_id__in=direct_session_scores.keys()
+        ).values_list('lesson_session_id', 'response_json'):
+            session_responses[session_id].append(response)
+        for session_id, responses in session_responses.items():
+            rank_counts = count_member_votes(responses, student_ids)
+            for member_id, points in direct_rank_points(
+                rank_counts.keys(), rank_counts, direct_session_scores[session_id]
+            ).items():
+                scores[(member_id, session_id)]['contrib'] += points
+
+    if aggregate_session_ids:
+        for row in _filter_students(
+            ContributionEvaluation.objects.filter(
+                peer_evaluation__lesson_session_id__in=aggregate_session_ids
+            ),
+            'evaluatee_id',
+            student_ids,
+        ).values('evaluatee_id', 'peer_evaluation__lesson_session_id').annotate(
+            total=Sum('contribution_score')
+        ):
+            key = (row['evaluatee_id'], row['peer_evaluation__lesson_session_id'])
+            scores[key]['contrib'] = row['total'] or 0
+
+    # ピア評価（グループ投票）
+    session_group_point_maps = compute_session_group_point_maps(peer_session_ids)
+    if session_group_point_maps:
+        seen = set()
+        for student_id, session_id, group_id in _filter_students(
+            GroupMember.objects.filter(group__lesson_session_id__in=session_group_point_maps.keys()),
+            'student_id',
+            student_ids,
+        ).order_by('id').values_list('student_id', 'group__lesson_session_id', 'group_id'):
+            if (student_id, session_id) in seen:
+                continue
+            seen.add((student_id, session_id))
+            points = session_group_point_maps[session_id].get(group_id, 0)
+            if points:
+                scores[(student_id, session_id)]['vote'] = points
+
+    # 独自評価項目（QRスキャン・手動加点の授業回別合計）
+    for row in _filter_students(
+        QRCodeScan.objects.filter(lesson_session_id__in=session_ids, point_column__isnull=False),
+        'qr_code__student_id',
+        student_ids,
+    ).values('qr_code__student_id', 'lesson_session_id').annotate(total=Sum('points_awarded')):
+        key = (row['qr_code__student_id'], row['lesson_session_id'])
+        scores[key]['custom_total'] = row['total'] or 0
+
+    if student_ids is not None:
+        for student_id in student_ids:
+            for session_id in session_ids:
+                scores[(student_id, session_id)]
+    return {key: dict(values) for key, values in scores.items()}
+
+
+def rebuild_session_scores(classroom, student_ids=None):
+    """クラス（または指定学生）の StudentSessionScore を再構築する
+
+    student_ids を省略した場合は在籍中の学生と、得点データを持つ学生すべてが対象。
+    戻り値: 書き込んだ行数
+    """
+    if student_ids is None:
+        scores = compute_session_scores(classroom)
+        enrolled_ids = list(classroom.students.values_list('id', flat=True))
+        session_ids = list(LessonSession.objects.filter(classroom=classroom).values_list('id', flat=True))
+        for student_id in enrolled_ids:
+            for session_id in session_ids:
+                scores.setdefault((student_id, session_id), dict.fromkeys(SCORE_FIELDS, 0))
+    else:
+        student_ids = list(student_ids)
+        if not student_ids:
+            return 0
+        scores = compute_session_scores(classroom, student_ids)
+    if not scores:
+        return 0
+
+    now = timezone.now()
+    rows = [
+        StudentSessionScore(
+            student_id=student_id,
+            lesson_session_id=session_id,
+            classroom=classroom,
+            updated_at=now,
+            **values,
+        )
+        for (student_id, session_id), values in scores.items()
+    ]
+    StudentSessionScore.objects.bulk_create(
+        rows,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['student', 'lesson_session'],
+        update_fields=[*SCORE_FIELDS, 'updated_at'],
+    )
+    return len(rows)
+
+
+def ensure_session_scores(classroom):
+    """在籍学生×授業回のスナップショットに欠けがあれば、欠けている学生の分だけ作成する
+
+    シグナルは変更のあった学生の行しか作らないため、クラスに行が1件でもあるかでは判定できない。
+    在籍学生ごとにこのクラスの行数を数え、授業回数に満たない学生を再構築する。
+    """
+    ensure_session_scores_many([classroom])
+
+
+def ensure_session_scores_many(classrooms):
+    """複数クラスの ensure_session_scores
+
+    欠けの確認は2クエリでまとめて行う（再構築が必要なクラスだけ、クラスごとに作り直す）。
+    """
+    classrooms = {classroom.id: classroom for classroom in classrooms}
+    session_counts = dict(
+        LessonSession.objects.filter(classroom_id__in=classrooms)
+        .values('classroom_id').annotate(count=Count('id')).values_list('classroom_id', 'count')
+    )
+    if not session_counts:
+        return
+    missing_ids = defaultdict(list)
+    for classroom_id, student_id, score_rows in ClassRoomEnrollment.objects.filter(
+        classroom_id__in=session_counts, is_active=True
+    ).annotate(
+        score_rows=Count(
+            'student__session_scores',
+            filter=Q(student__session_scores__classroom_id=F('classroom_id')),
+            distinct=True,
+        )
+    ).values_list('classroom_id', 'student_id', 'score_rows'):
+        if score_rows < session_counts[classroom_id]:
+            missing_ids[classroom_id].append(student_id)
+    for classroom_id, student_ids in missing_ids.items():
+        rebuild_session_scores(classrooms[classroom_id], student_ids)
@@ -0,0 +1,118 @@
+/*
+ * QRスキャンの送信キュー（オフライン対応）
+ *
+ * 電波の弱い教室でもスキャンを取りこぼさないよう、通信状態にかかわらずスキャンを端末（localStorage）に
+ * 保存してから一括登録API（qr_scan_api）へまとめて送信する（オンライン時は保存直後に送信する）。
+ * 各スキャンには端末側でUUID（client_scan_id）を付けるため、
+ * 通信が途中で切れて同じスキャンを再送してもサーバー側で二重に加算されない。
+ */
+(function (window) {
+    'use strict';
+
+    var STORAGE_KEY = 'qrScanQueue';
+    var BATCH_SIZE = 50;
+    var FLUSH_INTERVAL = 30000;
+    var flushing = false;
+
+    function generateId() {
+        if (window.crypto && window.crypto.randomUUID) {
+            return window.crypto.randomUUID();
+        }
+        return 'xxxxxxxx-xxxx-4xxx-yxxx-xxxxxxxxxxxx'.replace(/[xy]/g, function (c) {
+            var r = Math.random() * 16 | 0;
+            return (c === 'x' ? r : (r & 0x3 | 0x8)).toString(16);
+        });
+    }
+
+    function load() {
+        try {
+            return JSON.parse(window.localStorage.getItem(STORAGE_KEY)) || [];
+        } catch (e) {
+            return [];
+        }
+    }
+
+    function save(queue) {
+        window.localStorage.setItem(STORAGE_KEY, JSON.stringify(queue));
+    }
+
+    function getCookie(name) {
+        var match = document.cookie.match(new RegExp('(?:^|; )' + name + '=([^;]*)'));
+        return match ? decodeURIComponent(match[1]) : null;
+    }
+
+    function notify(detail) {
+        window.dispatchEvent(new CustomEvent('qrscanqueue:change', { detail: detail }));
+    }
+
+    var QRScanQueue = {
+        endpoint: null,
+
+        init: function (endpoint) {
+            this.endpoint = endpoint;
+            var self = this;
+            window.addEventListener('online', function () { self.flush(); });
+            window.setInterval(function () { self.flush(); }, FLUSH_INTERVAL);
+            return this.flush();
+        },
+
+        size: function () {
+            return load().length;
+        },
+
+        enqueue: function (scan) {
+            var queue = load();
+            var entry = Object.assign({ client_scan_id: generateId() }, scan);
+            queue.push(entry);
+            save(queue);
+            notify({ pending: queue.length });
+            return entry;
+        },
+
+        flush: function () {
+            var self = this;
+            if (flushing || !self.endpoint || !navigator.onLine) {
+                return Promise.resolve(false);
+            }
+            var batch = load().slice(0, BATCH_SIZE);
+            if (!batch.length) {
+                return Promise.resolve(true);
+            }
+            flushing = true;
+            return fetch(self.endpoint, {
+                method: 'POST',
+                credentials: 'same-origin',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': getCookie('csrftoken') || ''
+                },
+                body: JSON.stringify({ scans: batch })
+            }).then(function (response) {
+                // 形式エラー（400）は再送しても通らないため破棄する。
+                // ログイン切れ（302/403）やサーバーエラーはキューに残して次回に再送する
+                if (response.status === 400) {
+                    return { results: [] };
+                }
+                if (!response.ok || response.redirected) {
+                    throw new Error('HTTP ' + response.status);
+                }
+                return response.json();
+            }).then(function (data) {
+                // 送信済み（記録済み・重複・入力エラー）のスキャンをキューから取り除く
+                var sent = {};
+                batch.forEach(function (scan) { sent[scan.client_scan_id] = true; });
+                var queue = load().filter(function (scan) { return !sent[scan.client_scan_id]; });
+                save(queue);
+                flushing = false;
+                notify({ pending: queue.length, results: data.results || [] });
+                return queue.length ? self.flush() : true;
+            }).catch(function () {
+                flushing = false;
+                notify({ pending: load().length, failed: true });
+                return false;
+            });
+        }
+    };
+
+    window.QRScanQueue = QRScanQueue;
+})(window);
@@ -0,0 +1,74 @@
+"""
+学生アカウントの一括作成
+
+create_user を1行ずつ呼ぶと、行ごとに INSERT と既定ハッシャーでのパスワードハッシュ化が走り、
+数百人規模のCSV取り込みがリクエストのタイムアウトを超えてしまう。
+
+ここでは
+- 初期パスワードは BulkImportPasswordHasher で軽量にハッシュ化し、初回ログイン時に再ハッシュ
+- ユーザーは bulk_create でバッチごとに INSERT
+- 既存学生との重複チェックは学籍番号・メールアドレスごとに1回の __in クエリで行う
+する。
+"""
+from django.contrib.auth.hashers import make_password
+
+from .models import CustomUser
+
+BULK_IMPORT_HASHER = 'bulk_import_pbkdf2_sha256'
+BATCH_SIZE = 500
+
+
+def default_student_password(student_number):
+    """学生の初期パスワード"""
+    return f"student_{student_number}"
+
+
+def bulk_create_students(rows, batch_size=BATCH_SIZE):
+    """学生アカウントをまとめて作成する
+
+    rows: [{'student_number', 'full_name', 'email', 'furigana', 'memo'}, ...]
+        （furigana / memo は任意。学籍番号・メールアドレスは create_user と同様に正規化する）
+    戻り値: 作成した学生のリスト（rows と同じ順序、id 設定済み）
+    """
+    students = []
+    for row in rows:
+        student_number = CustomUser.clean_student_number(row['student_number'])
+        student = CustomUser(
+            email=CustomUser.clean_email(row.get('email')),
+            full_name=row['full_name'],
+            furigana=row.get('furigana') or '',
+            memo=row.get('memo') or '',
+            role='student',
+            student_number=student_number,
+        )
+        student.password = make_password(
+            default_student_password(student_number), hasher=BULK_IMPORT_HASHER
+        )
+        students.append(student)
+    return CustomUser.objects.bulk_create(students, batch_size=batch_size)
+
+
+def find_existing_students(rows):
+    """入力行の学籍番号・メールアドレスに一致する既存の学生をまとめて取得する
+
+    戻り値: ({学籍番号: 学生}, {メールアドレス: 学生})
+        同じ値の学生が複数いる場合は1行ずつ .first() で引いていた時と同じく id が最小の学生を返す。
+    """
+    student_numbers = {row['student_number'] for row in rows if row.get('student_number')}
+    emails = {row['email'] for row in rows if row.get('email')}
+    by_number = {}
+    by_email = {}
+    if student_numbers:
+        for student in CustomUser.objects.filter(
+            role='student', student_number__in=student_numbers
+        ).order_by('-id'):
+            by_number[student.student_number] = student
+    if emails:
+        for student in CustomUser.objects.filter(role='student', email__in=emails).order_by('-id'):
+            by_email[student.email] = student
+    # 学籍番号とメールアドレスの両方で見つかった学生は同じインスタンスを使う
+    for email, student in by_email.items():
+        same = by_number.get(student.student_number)
+        if same is not None and same.id == student.id:
+            by_email[email] = same
+    return by_number, by_email
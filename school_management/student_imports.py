@@ -0,0 +1,367 @@
+"""
+学生名簿の一括取り込み
+
+クラスへのCSV追加（bulk_student_add_csv）と学生作成画面の一括登録（student_create_view）で
+共通の処理（入力の解析・既存学生との整合性チェック・登録）をまとめる。
+
+件数の多い取り込みはリクエスト内で処理するとワーカーを長時間占有するため、
+StudentImportJob として保存し、run_student_import_jobs コマンド（ワーカー）で処理する。
+ワーカーはチェック・新規作成を BATCH_SIZE 行ずつ進め、バッチごとに進捗をジョブに記録する。
+どちらの経路でも、エラーが1件でもあれば全件中止する（一部だけ登録することはない）。
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import (
+    ClassRoomEnrollment,
+    CustomUser,
+    StudentClassPoints,
+    StudentImportJob,
+    TeacherStudentAssignment,
+)
+from .student_accounts import BATCH_SIZE, bulk_create_students, find_existing_students
+
+logger = logging.getLogger(__name__)
+
+
+def count_rows(text):
+    """空行を除いた入力行数"""
+    return sum(1 for line in text.split('\n') if line.strip())
+
+
+def is_large_import(text):
+    """リクエスト内ではなくジョブとしてワーカーで処理すべき件数か"""
+    return count_rows(text) > settings.STUDENT_IMPORT_ASYNC_THRESHOLD
+
+
+def _check_in_batch_duplicates(row, line_num, seen_student_numbers, seen_emails, number_label='学籍番号'):
+    """入力内での学籍番号・メールアドレスの重複をチェックする（エラーメッセージ、問題なければ None）
+
+    number_label はエラーメッセージでの学籍番号の呼び方（クラスへのCSV追加は従来どおり「学生番号」）。
+    """
+    student_number = row['student_number']
+    email = row['email']
+    duplicate_student_line = seen_student_numbers.get(student_number)
+    if duplicate_student_line is not None:
+        return f'行{line_num}: {number_label} "{student_number}" が入力内で重複しています（行{duplicate_student_line}）'
+    seen_student_numbers[student_number] = line_num
+
+    if email:
+        seen_email_data = seen_emails.get(email)
+        if seen_email_data:
+            seen_student_number, seen_line_num = seen_email_data
+            if seen_student_number != student_number:
+                return f'行{line_num}: メールアドレス "{email}" が入力内で学籍番号の異なる学生（行{seen_line_num}）に使われています。'
+        seen_emails[email] = (student_number, line_num)
+    return None
+
+
+def parse_class_roster(text):
+    """クラスへのCSV追加の入力（学籍番号,氏名[,メールアドレス]、タブ区切りも可）を解析する
+
+    戻り値: (行データのリスト, エラーメッセージのリスト)
+    """
+    errors = []
+    rows = []
+    seen_student_numbers = {}
+    seen_emails = {}
+
+    for line_num, line in enumerate(text.split('\n'), 1):
+        line = line.strip()
+        if not line:
+            continue
+
+        # タブまたはカンマで分割
+        parts = line.replace('\t', ',').split(',')
+        if len(parts) < 2:
+            errors.append(f'行{line_num}: 形式が正しくありません - {line}')
+            continue
+
+        student_number = CustomUser.clean_student_number(parts[0])
+        full_name = parts[1].strip() if len(parts) > 1 else ""
+        email = CustomUser.clean_email(parts[2]) if len(parts) > 2 else None
+
+        if not student_number:
+            errors.append(f'行{line_num}: 学生番号が入力されていません')
+            continue
+
+        # 名前が空っぽ（必須エラー）の場合、スキップしてエラーにする
+        if not full_name:
+            errors.append(f'行{line_num}: 氏名が入力されていません - {student_number}')
+            continue
+
+        row = {
+            'line_num': line_num,
+            'student_number': student_number,
+            'full_name': full_name,
+            'furigana': '',
+            'email': email,
+        }
+        error = _check_in_batch_duplicates(row, line_num, seen_student_numbers, seen_emails, '学生番号')
+        if error:
+            errors.append(error)
+            continue
+        rows.append(row)
+    return rows, errors
+
+
+def parse_student_roster(text):
+    """学生作成画面の一括登録の入力（学籍番号,氏名,ふりがな,メールアドレス）を解析する
+
+    戻り値: (行データのリスト, エラーメッセージのリスト)
+    """
+    errors = []
+    rows = []
+    seen_student_numbers = {}
+    seen_emails = {}
+
+    for line_num, line in enumerate(text.split('\n'), 1):
+        line = line.strip()
+        if not line:
+            continue
+
+        parts = [part.strip() for part in line.split(',')]
+        if len(parts) < 4:
+            errors.append(f'行{line_num}: 必要な項目が不足しています（学籍番号,氏名,ふりがな,メールアドレス） - {line}')
+            continue
+
+        student_number = CustomUser.clean_student_number(parts[0])
+        full_name = parts[1]
+        furigana = parts[2]
+        email = CustomUser.clean_email(parts[3] if parts[3].strip() else None)
+
+        if not student_number or not full_name or not furigana or not email:
+            errors.append(f'行{line_num}: 学籍番号・氏名・ふりがな・メールアドレスは必須です')
+            continue
+
+        row = {
+            'line_num': line_num,
+            'student_number': student_number,
+            'full_name': full_name,
+            'furigana': furigana,
+            'email': email,
+        }
+        error = _check_in_batch_duplicates(row, line_num, seen_student_numbers, seen_emails)
+        if error:
+            errors.append(error)
+            continue
+        rows.append(row)
+    return rows, errors
+
+
+def check_existing_students(rows, teacher, classroom=None):
+    """既存の学生との重複・不整合をチェックし、各行に existing_student を設定する
+
+    classroom があればそのクラスへの在籍済み、無ければ教員の担当済みをエラーとする。
+    既存学生・在籍（担当）状況はそれぞれ1回のクエリでまとめて取得する。
+    戻り値: エラーメッセージのリスト
+    """
+    errors = []
+    if not rows:
+        return errors
+
+    students_by_number, students_by_email = find_existing_students(rows)
+    found_students = [*students_by_number.values(), *students_by_email.values()]
+    if classroom:
+        linked_ids = set(
+            ClassRoomEnrollment.objects.filter(
+                classroom=classroom, is_active=True, student__in=found_students
+            ).values_list('student_id', flat=True)
+        )
+    else:
+        linked_ids = set(
+            TeacherStudentAssignment.objects.filter(
+                teacher=teacher, is_active=True, student__in=found_students
+            ).values_list('student_id', flat=True)
+        )
+
+    for row in rows:
+        sn = row['student_number']
+        em = row['email']
+        line_num = row['line_num']
+
+        student_by_number = students_by_number.get(sn)
+        student_by_email = students_by_email.get(em) if em else None
+
+        # パターンC: 不整合エラー
+        if student_by_number and student_by_email and student_by_number.id != student_by_email.id:
+            errors.append(
+                f'行{line_num}: 学籍番号 "{sn}" とメールアドレス "{em}" は、それぞれ別の既存の学生に使用されています。'
+            )
+        elif student_by_number and em and student_by_number.email != em:
+            errors.append(
+                f'行{line_num}: 学籍番号 "{sn}" は既に別のメールアドレス（例: "{student_by_number.email or "登録なし"}"）で登録されています。'
+            )
+        elif student_by_email and student_by_email.student_number != sn:
+            errors.append(
+                f'行{line_num}: メールアドレス "{em}" は既に別の学籍番号（例: "{student_by_email.student_number}"）で登録されています。'
+            )
+        else:
+            # エラーがない場合、既存の紐付け重複をチェック
+            existing_student = student_by_number or student_by_email
+            if existing_student and existing_student.id in linked_ids:
+                if classroom:
+                    errors.append(
+                        f'行{line_num}: 学生 "{existing_student.full_name}"（学籍番号: {sn}）は既にこのクラスに登録されています'
+                    )
+                else:
+                    errors.append(
+                        f'行{line_num}: 学籍番号 "{sn}" は既にあなたの管理下に登録されています'
+                    )
+            row['existing_student'] = existing_student
+    return errors
+
+
+def _link_students(rows, new_students, teacher, classroom=None):
+    """作成済みの新規学生と既存の学生を担当教員として紐づけ、classroom があれば在籍させる
+
+    呼び出し側のトランザクション内で実行する。
+    戻り値: (新規作成数, 既存紐づけ数)
+    """
+    linked_students = []
+    linked_ids = set()
+    for row in rows:
+        student = row.get('existing_student')
+        if not student or student.id in linked_ids:
+            continue
+        furigana = row.get('furigana')
+        if not student.furigana and furigana:
+            student.furigana = furigana
+            student.save(update_fields=['furigana'])
+        linked_students.append(student)
+        linked_ids.add(student.id)
+
+    target_students = new_students + linked_students
+    TeacherStudentAssignment.bulk_assign(teacher, target_students)
+
+    if classroom:
+        ClassRoomEnrollment.bulk_enroll(classroom, target_students)
+        StudentClassPoints.objects.bulk_create([
+            StudentClassPoints(student=student, classroom=classroom, points=0)
+            for student in target_students
+        ], batch_size=500, ignore_conflicts=True)
+    return len(new_students), len(linked_students)
+
+
+def import_students(rows, teacher, classroom=None):
+    """チェック済みの行を登録する（1トランザクションで全件、失敗時は全件ロールバック）
+
+    新規の学生は作成し、既存の学生は担当教員として紐づける。classroom があれば在籍させる。
+    戻り値: (新規作成数, 既存紐づけ数)
+    """
+    with transaction.atomic():
+        # 新規の学生はまとめて作成する（初期パスワードのハッシュ化は初回ログイン時に本番用へ移行）
+        new_students = bulk_create_students(
+            [row for row in rows if not row.get('existing_student')]
+        )
+        return _link_students(rows, new_students, teacher, classroom)
+
+
+def _import_job_students(job, rows):
+    """ジョブの登録処理（import_students のバッチ版）
+
+    1トランザクションで全件作成すると、コミットまで進捗画面に作成数が出ないため、
+    新規の学生は BATCH_SIZE 人ずつコミットし、そのたびに作成数をジョブに記録する。
+    途中で失敗した場合は、このジョブで作成した学生を削除して全件取り消す。
+    ワーカーが止まって作成済みの学生が残った場合も、やり直し時に既存の学生として紐づけられる。
+    戻り値: (新規作成数, 既存紐づけ数)
+    """
+    new_rows = [row for row in rows if not row.get('existing_student')]
+    new_students = []
+    try:
+        for start in range(0, len(new_rows), BATCH_SIZE):
+            with transaction.atomic():
+                new_students += bulk_create_students(new_rows[start:start + BATCH_SIZE])
+            job.created_count = len(new_students)
+            job.save(update_fields=['created_count'])
+        with transaction.atomic():
+            return _link_students(rows, new_students, job.teacher, job.classroom)
+    except Exception:
+        CustomUser.objects.filter(id__in=[student.id for student in new_students]).delete()
+        job.created_count = 0
+        raise
+
+
+PARSERS = {
+    StudentImportJob.SOURCE_CLASS_CSV: parse_class_roster,
+    StudentImportJob.SOURCE_STUDENT_CREATE: parse_student_roster,
+}
+
+
+def enqueue_import(teacher, source, text, classroom=None):
+    """取り込みをジョブとして登録する（処理は run_student_import_jobs コマンドが行う）"""
+    return StudentImportJob.objects.create(
+        teacher=teacher,
+        classroom=classroom,
+        source=source,
+        raw_data=text,
+        total_rows=count_rows(text),
+    )
+
+
+def requeue_stale_jobs():
+    """処理中のまま STUDENT_IMPORT_JOB_TIMEOUT_MINUTES を過ぎたジョブを待機中に戻す
+
+    ワーカーが再起動・強制終了された場合、処理中のジョブは誰にも拾われなくなる。
+    登録はトランザクション内で行うため、途中で止まったジョブは最初からやり直してよい。
+    戻り値: 待機中に戻した件数
+    """
+    deadline = timezone.now() - timedelta(minutes=settings.STUDENT_IMPORT_JOB_TIMEOUT_MINUTES)
+    return StudentImportJob.objects.filter(
+        status=StudentImportJob.STATUS_RUNNING, started_at__lt=deadline
+    ).update(status=StudentImportJob.STATUS_PENDING, started_at=None, validated_rows=0, created_count=0)
+
+
+def claim_next_job():
+    """待機中のジョブを1件取り出して処理中にする（複数ワーカーでも同じジョブを二重に処理しない）
+
+    止まったワーカーが処理中のまま残したジョブも、タイムアウト後に取り出し直す。
+    """
+    requeued = requeue_stale_jobs()
+    if requeued:
+        logger.warning('処理中のまま止まっていた学生一括取り込みジョブを待機中に戻しました: %s 件', requeued)
+    for job_id in StudentImportJob.objects.filter(
+        status=StudentImportJob.STATUS_PENDING
+    ).order_by('id').values_list('id', flat=True)[:10]:
+        claimed = StudentImportJob.objects.filter(
+            id=job_id, status=StudentImportJob.STATUS_PENDING
+        ).update(status=StudentImportJob.STATUS_RUNNING, started_at=timezone.now())
+        if claimed:
+            return StudentImportJob.objects.select_related('teacher', 'classroom').get(id=job_id)
+    return None
+
+
+def run_import_job(job):
+    """ジョブを処理し、進捗（バッチごと）と結果をジョブに記録する"""
+    rows, errors = PARSERS[job.source](job.raw_data)
+    for start in range(0, len(rows), BATCH_SIZE):
+        errors += check_existing_students(rows[start:start + BATCH_SIZE], job.teacher, job.classroom)
+        job.validated_rows = min(start + BATCH_SIZE, len(rows))
+        job.save(update_fields=['validated_rows'])
+
+    if errors:
+        job.finish(StudentImportJob.STATUS_FAILED, errors=errors)
+        return job
+
+    try:
+        created_count, linked_count = _import_job_students(job, rows)
+    except IntegrityError:
+        job.finish(
+            StudentImportJob.STATUS_FAILED,
+            errors=['同時更新により重複が発生したため、一括登録をロールバックしました。再度実行してください。'],
+        )
+    except Exception:
+        logger.exception('学生一括登録ジョブでエラーが発生しました: job_id=%s', job.id)
+        job.finish(
+            StudentImportJob.STATUS_FAILED,
+            errors=['一括登録中にエラーが発生したため、処理を中止してロールバックしました。'],
+        )
+    else:
+        job.created_count = created_count
+        job.linked_count = linked_count
+        job.finish(StudentImportJob.STATUS_COMPLETED)
+    return job
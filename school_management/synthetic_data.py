@@ -0,0 +1,252 @@
+"""
+ベンチマーク用の合成データ生成
+
+成績まわりの処理（ポイント一覧・評価一覧・ピア評価の集計・締切・シグナル経由の再計算）が
+クラスの人数に対してどう伸びるかを測るため、実運用に近い構成のクラスを再現可能な形で作る。
+
+- 学生 N 人（授業回ごとにシャッフルしたグループに所属）
+- 授業回（既定15回）ごとに、ピア評価設定・グループ・学生の回答（メンバー順位・他グループ順位）
+- QRスキャン（小テストのQRアクション点・独自評価項目）と授業内ポイント
+
+同じ seed なら同じ構成になる（IDは DB の採番による）。件数の多い行は bulk_create で作成し、
+シグナルを経由しない集計値（小テスト点・独自評価項目の合計・グループ投票集計・総合ポイント・
+授業回別の得点スナップショット）は最後にまとめて作り直す。
+"""
+import random
+import uuid
+from datetime import date, timedelta
+
+from django.db import transaction
+
+from .grade_engine import recalculate_class_points
+from .grade_queue import deferred_recalculation
+from .models import (
+    ClassRoom,
+    ClassRoomEnrollment,
+    CustomUser,
+    Group,
+    GroupMember,
+    LessonSession,
+    PeerEvaluation,
+    PeerEvaluationSettings,
+    PointColumn,
+    QRCodeScan,
+    Quiz,
+    QuizScore,
+    StudentClassPoints,
+    StudentColumnScore,
+    StudentLessonPoints,
+    StudentQRCode,
+    TeacherStudentAssignment,
+)
+from .scoring import count_group_votes
+from .session_scores import rebuild_session_scores
+from .student_accounts import bulk_create_students
+from .vote_tally import refresh_group_vote_tallies
+
+SYNTHETIC_EMAIL_DOMAIN = 'synthetic.example.com'
+BATCH_SIZE = 1000
+
+# 学生がピア評価に回答する割合・QRアクション点を獲得する割合
+RESPONSE_RATE = 0.9
+QR_SCAN_RATE = 0.6
+
+MEMBER_SCORES = [3, 2, 1]
+GROUP_SCORES = [5, 3, 1]
+CUSTOM_COLUMN_TITLES = ['発表', 'レポート']
+
+
+def synthetic_label(student_count, seed=0):
+    """合成クラスの既定の名前（クラス名・メールアドレスの接頭辞に使う）"""
+    return f'bench-{student_count}-{seed}'
+
+
+def delete_synthetic_classroom(label):
+    """同じ名前で作成済みの合成クラスと、その教員・学生を削除する"""
+    ClassRoom.objects.filter(class_name=label).delete()
+    CustomUser.objects.filter(
+        email__startswith=f'{label}-', email__endswith=f'@{SYNTHETIC_EMAIL_DOMAIN}'
+    ).delete()
+
+
+def _email(label, name):
+    return f'{label}-{name}@{SYNTHETIC_EMAIL_DOMAIN}'
+
+
+def _build_groups(rng, students, group_size):
+    """学生をシャッフルして group_size 人ずつのグループに分ける（端数は最後のグループに入れる）"""
+    shuffled = list(students)
+    rng.shuffle(shuffled)
+    chunks = [shuffled[i:i + group_size] for i in range(0, len(shuffled), group_size)]
+    if len(chunks) > 1 and len(chunks[-1]) < 2:
+        chunks[-2].extend(chunks.pop())
+    return chunks
+
+
+def _build_response(rng, student, members, group, groups):
+    """学生1人分のピア評価の回答（自分以外のメンバーの順位・他グループの順位）"""
+    others = [member for member in members if member.id != student.id]
+    rng.shuffle(others)
+    other_groups = [g for g in groups if g.id != group.id]
+    rng.shuffle(other_groups)
+    return {
+        'group_members_eval': [
+            {'rank': rank, 'member_id': member.id}
+            for rank, member in enumerate(others[:len(MEMBER_SCORES)], 1)
+        ],
+        'other_group_eval': [
+            {'rank': rank, 'group_id': other.id}
+            for rank, other in enumerate(other_groups[:len(GROUP_SCORES)], 1)
+        ],
+    }
+
+
+def _create_session(rng, classroom, teacher, number, start_date, students, group_size, qr_codes, columns):
+    """授業回1回分（ピア評価・QRスキャン・授業内ポイント）を作成する"""
+    session = LessonSession.objects.create(
+        classroom=classroom,
+        session_number=number,
+        date=start_date + timedelta(weeks=number - 1),
+        topic=f'第{number}回',
+        has_peer_evaluation=True,
+        peer_evaluation_status=LessonSession.PeerEvaluationStatus.OPEN,
+    )
+    PeerEvaluationSettings.objects.create(
+        lesson_session=session,
+        enable_member_evaluation=True,
+        member_scores=MEMBER_SCORES,
+        enable_group_evaluation=True,
+        group_scores=GROUP_SCORES,
+    )
+
+    chunks = _build_groups(rng, students, group_size)
+    groups = Group.objects.bulk_create([
+        Group(lesson_session=session, group_number=i) for i in range(1, len(chunks) + 1)
+    ])
+    GroupMember.objects.bulk_create([
+        GroupMember(group=group, student=student)
+        for group, members in zip(groups, chunks)
+        for student in members
+    ], batch_size=BATCH_SIZE)
+
+    evaluations = []
+    for group, members in zip(groups, chunks):
+        for student in members:
+            if rng.random() >= RESPONSE_RATE:
+                continue
+            evaluations.append(PeerEvaluation(
+                lesson_session=session,
+                student=student,
+                email=student.email,
+                evaluator_token=uuid.UUID(int=rng.getrandbits(128)),
+                evaluator_group=group,
+                evaluator_group_number=group.group_number,
+                response_json=_build_response(rng, student, members, group, groups),
+            ))
+    PeerEvaluation.objects.bulk_create(evaluations, batch_size=BATCH_SIZE)
+    refresh_group_vote_tallies(
+        session.id, delta=count_group_votes(ev.response_json for ev in evaluations)
+    )
+
+    # QRアクション点（連携小テスト）と独自評価項目のスキャン
+    scans = []
+    qr_totals = {}
+    column_totals = {}
+    for student in students:
+        if rng.random() >= QR_SCAN_RATE:
+            continue
+        column = rng.choice([None, *columns])
+        for _ in range(rng.randint(1, 3)):
+            scans.append(QRCodeScan(
+                qr_code=qr_codes[student.id],
+                scanned_by=teacher,
+                lesson_session=session,
+                point_column=column,
+                points_awarded=classroom.qr_point_value,
+            ))
+            if column is None:
+                qr_totals[student.id] = qr_totals.get(student.id, 0) + classroom.qr_point_value
+            else:
+                key = (student.id, column.id)
+                column_totals[key] = column_totals.get(key, 0) + classroom.qr_point_value
+    QRCodeScan.objects.bulk_create(scans, batch_size=BATCH_SIZE)
+
+    qr_quiz = Quiz.objects.get(lesson_session=session, is_qr_linked=True)
+    QuizScore.objects.bulk_create([
+        QuizScore(quiz=qr_quiz, student_id=student_id, score=score, graded_by=teacher)
+        for student_id, score in qr_totals.items()
+    ], batch_size=BATCH_SIZE)
+    StudentLessonPoints.objects.bulk_create([
+        StudentLessonPoints(student=student, lesson_session=session, points=rng.randint(1, 5))
+        for student in students
+        if rng.random() < 0.3
+    ], batch_size=BATCH_SIZE)
+    return session, column_totals
+
+
+def generate_synthetic_classroom(student_count, session_count=15, group_size=4, seed=0, label=None):
+    """合成クラスを作成して返す（教員は classroom.teachers.first()）"""
+    rng = random.Random(seed)
+    label = label or synthetic_label(student_count, seed)
+
+    with transaction.atomic(), deferred_recalculation():
+        teacher = CustomUser.objects.create_user(
+            email=_email(label, 'teacher'),
+            full_name=f'{label} 教員',
+            role='teacher',
+        )
+        classroom = ClassRoom.objects.create(
+            class_name=label, year=2026, semester='first', grading_system='original'
+        )
+        classroom.teachers.add(teacher)
+
+        students = bulk_create_students([
+            {
+                'student_number': f'B{seed:02d}{i:05d}',
+                'full_name': f'合成 学生{i}',
+                'furigana': f'ごうせい がくせい{i}',
+                'email': _email(label, f's{i:05d}'),
+            }
+            for i in range(student_count)
+        ])
+        TeacherStudentAssignment.bulk_assign(teacher, students)
+        ClassRoomEnrollment.bulk_enroll(classroom, students)
+        class_points = []
+        for student in students:
+            rate = rng.choice([60.0, 80.0, 90.0, 100.0])
+            class_points.append(StudentClassPoints(
+                student=student,
+                classroom=classroom,
+                attendance_rate=rate,
+                attendance_points=rate * classroom.attendance_max_points / 100,
+            ))
+        StudentClassPoints.objects.bulk_create(class_points, batch_size=BATCH_SIZE)
+        qr_codes = {
+            qr_code.student_id: qr_code
+            for qr_code in StudentQRCode.objects.bulk_create(
+                [StudentQRCode(student=student) for student in students], batch_size=BATCH_SIZE
+            )
+        }
+        columns = [
+            PointColumn.objects.create(classroom=classroom, column_title=title)
+            for title in CUSTOM_COLUMN_TITLES
+        ]
+
+        column_totals = {}
+        start_date = date(2026, 4, 6)
+        for number in range(1, session_count + 1):
+            _, session_column_totals = _create_session(
+                rng, classroom, teacher, number, start_date, students, group_size, qr_codes, columns
+            )
+            for key, points in session_column_totals.items():
+                column_totals[key] = column_totals.get(key, 0) + points
+
+        StudentColumnScore.objects.bulk_create([
+            StudentColumnScore(student_id=student_id, column_id=column_id, score=score)
+            for (student_id, column_id), score in column_totals.items()
+        ], batch_size=BATCH_SIZE)
+
+        # bulk_create はシグナルを発火しないため、集計値はここでまとめて作り直す
+        recalculate_class_points(classroom)
+        rebuild_session_scores(classroom)
+    return classroom
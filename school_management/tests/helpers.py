@@ -0,0 +1,32 @@
+"""
+テスト用の共通ヘルパー
+"""
+from school_management.request_metrics import budget_violations, get_view_budget, query_budget
+
+
+class ViewBudgetMixin:
+    """settings.REQUEST_METRICS_BUDGETS の上限をテストで検証する（TestCase と組み合わせて使う）
+
+    RequestMetricsMiddleware が記録した計測値（response.wsgi_request.request_metrics）を、
+    レスポンスのURL名の上限と比較する。rows にはフィクスチャの規模（学生数など）を渡す
+    （省略時はビューが set_request_rows() で記録した行数）。
+    処理時間はテスト環境では安定しないため、check_time=True の場合だけ判定する。
+    """
+
+    def assertWithinViewBudget(self, response, rows=None, check_time=False):
+        metrics = getattr(response.wsgi_request, 'request_metrics', None)
+        self.assertIsNotNone(metrics, 'RequestMetricsMiddleware が有効になっていません')
+        budget = get_view_budget(metrics.view_name)
+        self.assertIsNotNone(budget, f'{metrics.view_name} の上限が REQUEST_METRICS_BUDGETS にありません')
+        if not check_time:
+            budget = {key: value for key, value in budget.items() if key != 'total_ms'}
+
+        if rows is None:
+            rows = metrics.rows
+        violations = budget_violations(metrics, budget, rows)
+        if violations:
+            self.fail(
+                f'{metrics.view_name} が上限を超えました（rows={rows}, '
+                f'許容クエリ数={query_budget(budget, rows)}）: {", ".join(violations)}'
+            )
+        return metrics
@@ -83,7 +83,7 @@ class ClassEvaluationCsvExportTests(TestCase):
         self.client.force_login(self.teacher)
 
     def _get_csv_rows(self, response):
-        content = response.content.decode('utf-8-sig')
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
         return list(csv.reader(io.StringIO(content)))
 
     def test_simple_mode_returns_one_row_per_student(self):
@@ -181,3 +181,33 @@ class ClassEvaluationCsvExportTests(TestCase):
         rows = self._get_csv_rows(response)
         header = rows[0]
         self.assertIn('第1回_小テスト点', header)
+
+    def test_csv_is_streamed_one_row_per_chunk(self):
+        url = reverse('school_management:class_evaluation_csv_export', args=[self.classroom.id]) + '?mode=simple'
+        response = self.client.get(url)
+
+        self.assertTrue(response.streaming)
+        chunks = [chunk.decode('utf-8') for chunk in response.streaming_content]
+        # BOM、見出し行、学生ごとの行が順に送られる
+        self.assertEqual(chunks[0], '\ufeff')
+        self.assertTrue(chunks[1].startswith('学籍番号'))
+        self.assertEqual(len(chunks), 2 + 2)
+
+    def test_original_mode_rows_match_html_view(self):
+        self.classroom.grading_system = 'original'
+        self.classroom.save()
+
+        url = reverse('school_management:class_evaluation_csv_export', args=[self.classroom.id]) + '?mode=simple'
+        rows = self._get_csv_rows(self.client.get(url))
+        html_response = self.client.get(reverse('school_management:class_evaluation', args=[self.classroom.id]))
+
+        header = rows[0]
+        csv_scores = {
+            row[0]: (row[header.index('最終成績(100点換算)')], row[header.index('足切り')])
+            for row in rows[1:]
+        }
+        for evaluation in html_response.context['student_evaluations']:
+            self.assertEqual(
+                csv_scores[evaluation['student'].student_number],
+                (str(evaluation['final_score_100']), '1' if evaluation['is_below_cutoff'] else '0'),
+            )
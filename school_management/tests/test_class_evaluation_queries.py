@@ -0,0 +1,102 @@
+import uuid
+from datetime import date
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from school_management.models import (
+    ClassRoom, ClassRoomEnrollment, CustomUser, Group, GroupMember, LessonSession,
+    PeerEvaluation, PeerEvaluationSettings, PointColumn, Quiz, QuizScore,
+    StudentColumnScore, StudentLessonPoints,
+)
+from school_management.tests.helpers import ViewBudgetMixin
+
+
+class ClassEvaluationQueryBudgetTest(ViewBudgetMixin, TestCase):
+    def setUp(self):
+        self.teacher = CustomUser.objects.create_user(
+            email='budget-teacher@example.com', full_name='Budget Teacher', role='teacher'
+        )
+        self.classroom = ClassRoom.objects.create(class_name='Budget Class', year=2026, semester='first')
+        self.classroom.teachers.add(self.teacher)
+        self.column = PointColumn.objects.create(classroom=self.classroom, column_title='Bonus')
+        self.sessions = []
+        for number in (1, 2, 3):
+            session = LessonSession.objects.create(
+                classroom=self.classroom, session_number=number, date=date(2026, 4, number)
+            )
+            PeerEvaluationSettings.objects.create(
+                lesson_session=session,
+                enable_member_evaluation=True,
+                member_scores=[3, 1],
+                enable_group_evaluation=True,
+                group_scores=[5, 3],
+            )
+            groups = [Group.objects.create(lesson_session=session, group_number=i) for i in (1, 2)]
+            quiz = Quiz.objects.create(lesson_session=session, quiz_name=f'Quiz {number}', max_score=10)
+            PeerEvaluation.objects.create(
+                lesson_session=session,
+                evaluator_token=uuid.uuid4(),
+                response_json={'other_group_eval': [{'rank': 1, 'group_id': groups[0].id}]},
+            )
+            self.sessions.append((session, groups, quiz))
+        self.student_count = 0
+        self.client.force_login(self.teacher)
+
+    def _add_students(self, count):
+        # コミット時の再計算で授業回別の得点スナップショットも作成される
+        with self.captureOnCommitCallbacks(execute=True):
+            self._create_students(count)
+
+    def _create_students(self, count):
+        for _ in range(count):
+            i = self.student_count
+            self.student_count += 1
+            student = CustomUser.objects.create_user(
+                email=f'budget-student{i}@example.com',
+                full_name=f'Budget Student {i}',
+                role='student',
+                student_number=f'BU{i:03d}',
+            )
+            ClassRoomEnrollment.enroll(self.classroom, student)
+            StudentColumnScore.objects.create(student=student, column=self.column, score=1)
+            for session, groups, quiz in self.sessions:
+                QuizScore.objects.create(quiz=quiz, student=student, score=i, graded_by=self.teacher)
+                StudentLessonPoints.objects.create(student=student, lesson_session=session, points=1)
+                GroupMember.objects.create(group=groups[i % 2], student=student)
+
+    def _count_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                reverse('school_management:class_evaluation', args=[self.classroom.id])
+            )
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response
+
+    def test_query_count_does_not_grow_with_class_size(self):
+        self._add_students(2)
+        small_count, _ = self._count_queries()
+
+        self._add_students(8)
+        large_count, response = self._count_queries()
+
+        self.assertEqual(small_count, large_count)
+        # 上限は settings.REQUEST_METRICS_BUDGETS で管理する
+        self.assertWithinViewBudget(response, rows=10)
+        self.assertEqual(len(response.context['student_evaluations']), 10)
+
+    def test_session_scores_use_preloaded_data(self):
+        self._add_students(2)
+        _, response = self._count_queries()
+
+        evaluations = {e['student'].student_number: e for e in response.context['student_evaluations']}
+        first_session = evaluations['BU000']['session_scores'][0]
+        self.assertEqual(first_session['manual_points'], 1)
+        self.assertTrue(first_session['has_quiz'])
+        # グループ1（1位投票を1票獲得）に所属
+        self.assertEqual(first_session['peer_vote'], 5)
+        second_student_session = evaluations['BU001']['session_scores'][0]
+        self.assertEqual(second_student_session['quiz_score'], 1)
+        self.assertEqual(second_student_session['peer_vote'], 0)
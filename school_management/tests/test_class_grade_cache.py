@@ -0,0 +1,154 @@
+from datetime import date
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from school_management.grade_cache import (
+    bump_classroom_grade_versions, class_grades_cache_key, classroom_grade_version,
+)
+from school_management.models import (
+    ClassRoom, ClassRoomEnrollment, CustomUser, LessonSession, Quiz, QuizScore,
+    StudentLessonPoints,
+)
+
+
+class ClassGradeCacheTest(TestCase):
+    """教員の成績画面（ポイント一覧・評価一覧・CSV出力）のキャッシュと無効化"""
+
+    def setUp(self):
+        self.teacher = CustomUser.objects.create_user(
+            email='cache-teacher@example.com', full_name='Cache Teacher', role='teacher'
+        )
+        self.classroom = ClassRoom.objects.create(class_name='Cache Class', year=2026, semester='first')
+        self.classroom.teachers.add(self.teacher)
+        self.session = LessonSession.objects.create(
+            classroom=self.classroom, session_number=1, date=date(2026, 4, 1)
+        )
+        self.quiz = Quiz.objects.create(lesson_session=self.session, quiz_name='Quiz', max_score=10)
+        self.student = CustomUser.objects.create_user(
+            email='cache-student@example.com',
+            full_name='Cache Student',
+            role='student',
+            student_number='CA001',
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            ClassRoomEnrollment.enroll(self.classroom, self.student)
+            QuizScore.objects.create(
+                quiz=self.quiz, student=self.student, score=4, graded_by=self.teacher
+            )
+        self.client.force_login(self.teacher)
+
+    def _get(self, name, **params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse(f'school_management:{name}', args=[self.classroom.id]), params)
+        self.assertEqual(response.status_code, 200)
+        return response, len(context.captured_queries)
+
+    def _evaluation_total(self):
+        response, _ = self._get('class_evaluation')
+        return response.context['student_evaluations'][0]['total_quiz_score']
+
+    def test_unchanged_evaluation_is_served_from_cache(self):
+        first, first_queries = self._get('class_evaluation')
+        second, second_queries = self._get('class_evaluation')
+
+        self.assertLess(second_queries, first_queries)
+        self.assertEqual(
+            second.context['student_evaluations'][0]['total_points'],
+            first.context['student_evaluations'][0]['total_points'],
+        )
+        self.assertEqual(second.context['total_sessions'], 1)
+
+    def test_grade_write_invalidates_cached_evaluation(self):
+        self.assertEqual(self._evaluation_total(), 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            QuizScore.objects.filter(quiz=self.quiz, student=self.student).update(is_cancelled=True)
+            QuizScore.objects.create(
+                quiz=self.quiz, student=self.student, score=9, graded_by=self.teacher
+            )
+        self.assertEqual(self._evaluation_total(), 9)
+
+        # 授業回の追加（成績表の列の変更）でも無効化される
+        with self.captureOnCommitCallbacks(execute=True):
+            LessonSession.objects.create(
+                classroom=self.classroom, session_number=2, date=date(2026, 4, 8)
+            )
+        response, _ = self._get('class_evaluation')
+        self.assertEqual(response.context['total_sessions'], 2)
+
+    def test_class_points_invalidated_by_lesson_points_and_settings(self):
+        response, _ = self._get('class_points')
+        self.assertEqual(response.context['student_grades'][0]['lesson_total'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            StudentLessonPoints.objects.create(
+                student=self.student, lesson_session=self.session, points=3
+            )
+        response, _ = self._get('class_points')
+        self.assertEqual(response.context['student_grades'][0]['lesson_total'], 3)
+
+        version = classroom_grade_version(self.classroom.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('school_management:update_class_settings', args=[self.classroom.id]),
+                {'grading_system': 'original'},
+            )
+        self.assertNotEqual(classroom_grade_version(self.classroom.id), version)
+        response, _ = self._get('class_points')
+        self.assertEqual(response.context['grading_system'], 'original')
+
+    def test_session_bulk_edit_invalidates_cached_evaluation(self):
+        self._get('class_evaluation')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('school_management:session_bulk_edit', args=[self.classroom.id]),
+                {'date-1': '2026-04-08', 'topic-1': 'Updated Topic'},
+            )
+
+        # bulk_update で更新した日付・テーマが評価一覧に反映される
+        response, _ = self._get('class_evaluation')
+        session = list(response.context['sessions'])[0]
+        self.assertEqual((session.date, session.topic), (date(2026, 4, 8), 'Updated Topic'))
+
+    def test_csv_export_reuses_cached_evaluation(self):
+        _, uncached_queries = self._get('class_evaluation_csv_export', mode='simple')
+        uncached_body = b''.join(self.client.get(
+            reverse('school_management:class_evaluation_csv_export', args=[self.classroom.id]),
+            {'mode': 'simple'},
+        ).streaming_content)
+
+        self._get('class_evaluation')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                reverse('school_management:class_evaluation_csv_export', args=[self.classroom.id]),
+                {'mode': 'simple'},
+            )
+            cached_body = b''.join(response.streaming_content)
+
+        self.assertLess(len(context.captured_queries), uncached_queries)
+        self.assertEqual(cached_body, uncached_body)
+
+    def test_cache_key_separates_test_mode_and_simulation(self):
+        keys = {
+            class_grades_cache_key('class_evaluation', self.classroom),
+            class_grades_cache_key('class_evaluation', self.classroom, test_mode=True),
+            class_grades_cache_key('class_evaluation', self.classroom, True, {'1': {'2': 3}}),
+            class_grades_cache_key('class_evaluation', self.classroom, True, {'1': {'2': 4}}),
+            class_grades_cache_key('class_points', self.classroom),
+        }
+        self.assertEqual(len(keys), 5)
+
+    def test_version_is_shared_between_processes(self):
+        key = class_grades_cache_key('class_evaluation', self.classroom)
+        # 各プロセスのキャッシュが別でも、バージョン番号はDBから読む
+        cache.clear()
+        self.assertEqual(class_grades_cache_key('class_evaluation', self.classroom), key)
+
+        bump_classroom_grade_versions([self.classroom.id], immediate=True)
+        cache.clear()
+        self.assertNotEqual(class_grades_cache_key('class_evaluation', self.classroom), key)
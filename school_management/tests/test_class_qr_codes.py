@@ -0,0 +1,130 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from school_management.models import (
+    ClassRoom, ClassRoomEnrollment, CustomUser, LessonSession, QRCodeScan, StudentQRCode,
+)
+
+
+class ClassQRCodesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = CustomUser.objects.create_user(
+            email='qrsheet-teacher@example.com', full_name='QR Sheet Teacher', role='teacher'
+        )
+        self.classroom = ClassRoom.objects.create(class_name='QR Sheet Class', year=2026, semester='first')
+        self.classroom.teachers.add(self.teacher)
+        self.session = LessonSession.objects.create(classroom=self.classroom, session_number=1)
+        self.student_count = 0
+        self.client.force_login(self.teacher)
+
+    def _add_students(self, count):
+        for _ in range(count):
+            i = self.student_count
+            self.student_count += 1
+            student = CustomUser.objects.create_user(
+                email=f'qrsheet-student{i}@example.com',
+                full_name=f'QR Sheet Student {i}',
+                role='student',
+                student_number=f'QS{i:03d}',
+            )
+            ClassRoomEnrollment.enroll(self.classroom, student)
+
+    def _get_sheet(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                reverse('school_management:class_qr_codes', args=[self.classroom.id]),
+                {'session_id': self.session.id},
+            )
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response
+
+    def test_sheet_creates_missing_qr_codes_and_aggregates_scans(self):
+        self._add_students(2)
+        self._get_sheet()
+
+        self.assertEqual(StudentQRCode.objects.count(), 2)
+        qr_code = StudentQRCode.objects.get(student__student_number='QS000')
+        QRCodeScan.objects.create(
+            qr_code=qr_code, scanned_by=self.teacher, lesson_session=self.session, points_awarded=2
+        )
+        QRCodeScan.objects.create(
+            qr_code=qr_code, scanned_by=self.teacher, lesson_session=self.session, points_awarded=3
+        )
+
+        _, response = self._get_sheet()
+        self.assertEqual(StudentQRCode.objects.count(), 2)
+        data = {item['student'].student_number: item for item in response.context['qr_codes']}
+        self.assertEqual((data['QS000']['scan_count'], data['QS000']['scan_points']), (2, 5))
+        self.assertEqual((data['QS001']['scan_count'], data['QS001']['scan_points']), (0, 0))
+        self.assertTrue(data['QS000']['qr_image'].startswith(
+            reverse('school_management:qr_code_image', args=[qr_code.qr_code_id])
+        ))
+
+    def test_query_count_does_not_grow_with_class_size(self):
+        self._add_students(2)
+        self._get_sheet()
+        small_count, _ = self._get_sheet()
+
+        self._add_students(6)
+        self._get_sheet()
+        large_count, _ = self._get_sheet()
+
+        self.assertEqual(small_count, large_count)
+
+    def test_image_is_cached_and_revalidated_with_etag(self):
+        self._add_students(1)
+        qr_code = StudentQRCode.objects.create(student=CustomUser.objects.get(student_number='QS000'))
+        url = reverse('school_management:qr_code_image', args=[qr_code.qr_code_id])
+        params = {'class_id': self.classroom.id, 'session_id': self.session.id}
+
+        with mock.patch(
+            'school_management.views.attendance.utils.render_qr_code_png', return_value=b'png'
+        ) as render_png:
+            first = self.client.get(url, params)
+            second = self.client.get(url, params)
+            not_modified = self.client.get(url, params, HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first['Content-Type'], 'image/png')
+        self.assertEqual(first.content, b'png')
+        self.assertEqual(second.content, b'png')
+        self.assertEqual(render_png.call_count, 1)
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_image_rejects_invalid_parameters(self):
+        self._add_students(1)
+        qr_code = StudentQRCode.objects.create(student=CustomUser.objects.get(student_number='QS000'))
+        url = reverse('school_management:qr_code_image', args=[qr_code.qr_code_id])
+
+        response = self.client.get(url, {'class_id': 'x'})
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_image_requires_own_class_and_enrolled_student(self):
+        self._add_students(1)
+        qr_code = StudentQRCode.objects.create(student=CustomUser.objects.get(student_number='QS000'))
+        url = reverse('school_management:qr_code_image', args=[qr_code.qr_code_id])
+        other_teacher = CustomUser.objects.create_user(
+            email='qrsheet-other@example.com', full_name='Other Teacher', role='teacher'
+        )
+        other_class = ClassRoom.objects.create(class_name='Other Class', year=2026, semester='first')
+        other_class.teachers.add(self.teacher)
+        other_session = LessonSession.objects.create(classroom=other_class, session_number=1)
+
+        with mock.patch(
+            'school_management.views.attendance.utils.render_qr_code_png', return_value=b'png'
+        ):
+            # 在籍していないクラス・別クラスの授業回は404
+            self.assertEqual(self.client.get(url, {'class_id': other_class.id}).status_code, 404)
+            self.assertEqual(
+                self.client.get(url, {'class_id': self.classroom.id, 'session_id': other_session.id}).status_code,
+                404,
+            )
+            self.client.force_login(other_teacher)
+            self.assertEqual(self.client.get(url, {'class_id': self.classroom.id}).status_code, 404)
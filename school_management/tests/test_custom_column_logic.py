@@ -138,6 +138,24 @@ class CustomColumnLogicTests(TestCase):
         scans = QRCodeScan.objects.filter(qr_code=self.qr_code, point_column=self.column1)
         self.assertEqual(scans.count(), 2)
 
+    def test_qr_scan_resubmission_is_recorded_once(self):
+        """同じ画面から再送信したスキャンは二重に加算されないこと"""
+        url = reverse('school_management:qr_code_scan', args=[self.qr_code.qr_code_id])
+        client_scan_id = self.client.get(url, {'session_id': self.session.id}).context['client_scan_id']
+        data = {
+            'session_id': self.session.id,
+            'point_type': f'custom_{self.column1.id}',
+            'points': 5,
+            'client_scan_id': str(client_scan_id),
+        }
+
+        self.client.post(url, data)
+        response = self.client.post(url, data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(StudentColumnScore.objects.get(student=self.student, column=self.column1).score, 5)
+        self.assertEqual(QRCodeScan.objects.filter(qr_code=self.qr_code).count(), 1)
+
     def test_qr_scan_deletion_decrements_score(self):
         """QRスキャン削除によるスコア減算"""
         # 初期のスコア作成
@@ -1,6 +1,12 @@
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from school_management.models import CustomUser, ClassRoom, StudentClassPoints, ClassRoomEnrollment
+from school_management.grade_cache import bump_student_points_versions, student_dashboard_cache_key
+from school_management.models import (
+    CustomUser, ClassRoom, StudentClassPoints, ClassRoomEnrollment, LessonSession, StudentLessonPoints,
+)
 
 class DashboardViewTest(TestCase):
     def setUp(self):
@@ -27,3 +33,78 @@ class DashboardViewTest(TestCase):
         self.client.force_login(self.student)
         resp = self.client.get(reverse('school_management:dashboard'))
         self.assertIn(resp.status_code, (200, 302))
+
+
+class StudentDashboardCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = CustomUser.objects.create_user(email='dt@example.com', full_name='DT', role='teacher')
+        self.student = CustomUser.objects.create_user(
+            email='ds@example.com', full_name='DS', role='student', student_number='DS1'
+        )
+        self.classrooms = []
+        for i in range(3):
+            classroom = ClassRoom.objects.create(class_name=f'Dashboard Class {i}', year=2026, semester='first')
+            classroom.teachers.add(self.teacher)
+            ClassRoomEnrollment.enroll(classroom, self.student)
+            self.classrooms.append(classroom)
+        # save() は総合ポイントを再計算するため、固定値は bulk_create で用意する
+        StudentClassPoints.objects.bulk_create([
+            StudentClassPoints(student=self.student, classroom=classroom, points=10 + i)
+            for i, classroom in enumerate(self.classrooms)
+        ])
+        self.client.force_login(self.student)
+
+    def _get(self):
+        return self.client.get(reverse('school_management:student_dashboard'))
+
+    def test_query_count_does_not_grow_with_classes(self):
+        # バージョン番号を採番済みの状態で比べる
+        self._get()
+        cache.clear()
+        with CaptureQueriesContext(connection) as few:
+            self._get()
+        cache.clear()
+        for i in range(3, 8):
+            classroom = ClassRoom.objects.create(class_name=f'Dashboard Class {i}', year=2026, semester='first')
+            classroom.teachers.add(self.teacher)
+            ClassRoomEnrollment.enroll(classroom, self.student)
+
+        with CaptureQueriesContext(connection) as many:
+            response = self._get()
+
+        self.assertEqual(len(response.context['class_points_list']), 8)
+        self.assertEqual(len(many.captured_queries), len(few.captured_queries))
+
+    def test_points_version_is_shared_between_processes(self):
+        key = student_dashboard_cache_key(self.student)
+        # 各プロセスのキャッシュが別でも、バージョン番号はDBから読む
+        cache.clear()
+        self.assertEqual(student_dashboard_cache_key(self.student), key)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_student_points_versions([self.student.id])
+        cache.clear()
+        self.assertNotEqual(student_dashboard_cache_key(self.student), key)
+
+    def test_summary_is_cached_until_points_change(self):
+        first = self._get()
+        self.assertEqual([c['points'] for c in first.context['class_points_list']], [10, 11, 12])
+
+        with CaptureQueriesContext(connection) as cached:
+            self._get()
+        self.assertFalse(any('school_management_studentclasspoints' in q['sql'] for q in cached.captured_queries))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            StudentLessonPoints.objects.create(
+                student=self.student,
+                lesson_session=LessonSession.objects.create(classroom=self.classrooms[0], session_number=1),
+                points=7,
+            )
+
+        response = self._get()
+        self.assertEqual(len(response.context['lesson_points']), 1)
+        self.assertEqual(
+            response.context['class_points_list'][0]['points'],
+            StudentClassPoints.objects.get(student=self.student, classroom=self.classrooms[0]).points,
+        )
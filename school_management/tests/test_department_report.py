@@ -0,0 +1,117 @@
+import csv
+import io
+import tempfile
+import zipfile
+from io import StringIO
+from pathlib import Path
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from school_management.models import ClassRoom, CustomUser
+from school_management.synthetic_data import generate_synthetic_classroom
+from school_management.views.grades.class_evaluation import (
+    _build_class_evaluations, _class_evaluations_cache_key,
+)
+from school_management.views.grades.department_report import iter_class_evaluations
+
+
+class DepartmentReportTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = CustomUser.objects.create_user(
+            email='report-admin@example.com', full_name='Report Admin', role='admin'
+        )
+        self.classrooms = [
+            generate_synthetic_classroom(6, session_count=2, seed=seed) for seed in (1, 2)
+        ]
+        # 別の学期のクラスはレポートに含めない
+        ClassRoom.objects.create(class_name='Second Semester', year=2026, semester='second')
+        self.client.force_login(self.admin)
+
+    def _read_csv(self, archive, name):
+        return list(csv.reader(io.StringIO(archive.read(name).decode('utf-8-sig'))))
+
+    def test_summary_matches_class_evaluations(self):
+        response = self.client.get(
+            reverse('school_management:department_report'), {'year': 2026, 'semester': 'first'}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        report = response.context['report']
+        self.assertEqual([item['classroom'] for item in report['classes']], self.classrooms)
+        for item, classroom in zip(report['classes'], self.classrooms):
+            evaluations = _build_class_evaluations(classroom)['student_evaluations']
+            self.assertEqual(item['student_count'], 6)
+            self.assertEqual(item['cutoff_count'], sum(e['is_below_cutoff'] for e in evaluations))
+            self.assertEqual(item['max'], max(e['final_score_100'] for e in evaluations))
+        self.assertEqual(report['summary']['count'], 12)
+        self.assertEqual(sum(bucket['count'] for bucket in report['distribution']), 12)
+
+    def test_report_fills_class_evaluation_cache(self):
+        self.client.get(reverse('school_management:department_report'), {'year': 2026, 'semester': 'first'})
+
+        # 教員が後から評価一覧を開いても再計算しない
+        for classroom in self.classrooms:
+            self.assertIsNotNone(cache.get(_class_evaluations_cache_key(classroom)))
+
+    def test_batched_evaluations_match_class_evaluations(self):
+        for _, _, classroom, data in iter_class_evaluations(2026, 'first'):
+            expected = _build_class_evaluations(classroom)['student_evaluations']
+            self.assertEqual(
+                [(e['student'].id, e['total_points'], e['final_score_100']) for e in data['student_evaluations']],
+                [(e['student'].id, e['total_points'], e['final_score_100']) for e in expected],
+            )
+
+    def _count_report_queries(self):
+        list(iter_class_evaluations(2026, 'first'))
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            list(iter_class_evaluations(2026, 'first'))
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_classes(self):
+        two_classes = self._count_report_queries()
+        self.classrooms += [
+            generate_synthetic_classroom(6, session_count=2, seed=seed) for seed in (3, 4)
+        ]
+
+        self.assertEqual(self._count_report_queries(), two_classes)
+
+    def test_zip_export_contains_each_class(self):
+        response = self.client.get(
+            reverse('school_management:department_report_export'), {'year': 2026, 'semester': 'first'}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        class_files = sorted(name for name in archive.namelist() if name.startswith('classes/'))
+        self.assertEqual(len(class_files), 2)
+        # ヘッダー + 学生6人
+        self.assertEqual(len(self._read_csv(archive, class_files[0])), 7)
+        summary = self._read_csv(archive, 'クラス一覧.csv')
+        self.assertEqual([row[0] for row in summary[1:]], [c.class_name for c in self.classrooms])
+
+    def test_teachers_cannot_open_report(self):
+        self.client.force_login(self.classrooms[0].teachers.first())
+
+        response = self.client.get(reverse('school_management:department_report'))
+
+        self.assertRedirects(response, reverse('school_management:dashboard'), fetch_redirect_response=False)
+
+    def test_command_reports_progress_and_saves_zip(self):
+        stdout, stderr = StringIO(), StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'report.zip'
+            call_command(
+                'build_department_report', year=2026, semester='first', output=str(path),
+                stdout=stdout, stderr=stderr,
+            )
+            with zipfile.ZipFile(path) as archive:
+                self.assertIn('成績分布.csv', archive.namelist())
+
+        self.assertIn('[2/2]', stderr.getvalue())
@@ -1,5 +1,6 @@
 import json
 import uuid
+from django.db import IntegrityError, transaction
 from django.test import TestCase, Client
 from django.urls import reverse
 from django.contrib.auth import get_user_model
@@ -71,8 +72,12 @@ class EvaluationCalculationTests(TestCase):
         self.assertEqual(stats['count'], 1)
         self.assertEqual(stats['average'], 8.0)
         
-        # 3. 複数件のケース & 重複排除（同じクイズの再採点は最新のみ採用）
-        # 同一クイズに別の点数を追加
+        # 3. 複数件のケース & 再採点（旧スコアを取り消して最新のみ採用）
+        # 同一クイズに取り消されていないスコアを2件作ることはできない
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            QuizScore.objects.create(student=self.student, quiz=quiz1, score=10, graded_by=self.teacher)
+        qs1.is_cancelled = True
+        qs1.save()
         qs2 = QuizScore.objects.create(student=self.student, quiz=quiz1, score=10, graded_by=self.teacher)
         
         stats = scp.quiz_stats
@@ -0,0 +1,46 @@
+import statistics
+
+from django.test import SimpleTestCase
+
+from school_management.grade_analytics import (
+    count_passed, curve_score, cutoff_statistics, histogram, summarize,
+)
+
+
+class GradeStatisticsTest(SimpleTestCase):
+    def test_median_matches_statistics_module(self):
+        for values in ([5], [3, 1], [4.5, 1, 9, 2], [7, 7, 0, 12.5, 3]):
+            self.assertEqual(summarize(values)['median'], statistics.median(values))
+
+    def test_quartiles_interpolate_between_neighbours(self):
+        summary = summarize([40, 10, 30, 20])
+
+        self.assertAlmostEqual(summary['p25'], 17.5)
+        self.assertEqual(summary['median'], 25)
+        self.assertAlmostEqual(summary['p75'], 32.5)
+
+    def test_histogram_includes_upper_edge(self):
+        counts, edges = histogram([0, 5, 9.9, 10, 10], bins=2, value_range=(0, 10))
+
+        self.assertEqual(counts, [1, 4])
+        self.assertEqual(edges, [0, 5, 10])
+
+    def test_cutoff_and_curve(self):
+        scores = [10, 20, 30, 40, 100]
+        stats = cutoff_statistics(scores)
+
+        # 中央値30 → 足切りライン15、換算基準は最高点100
+        self.assertEqual(stats['cutoff_line'], 15)
+        self.assertEqual(stats['max_val'], 100)
+        self.assertEqual(stats['class_average_points'], 40.0)
+        self.assertEqual(curve_score(10, stats), (0, True))
+        self.assertEqual(curve_score(40, stats), (40.0, False))
+        self.assertEqual(count_passed(scores, stats), 4)
+
+    def test_empty_scores(self):
+        self.assertEqual(
+            cutoff_statistics([]),
+            {'median': 0, 'cutoff_line': 0, 'max_val': 0, 'class_average_points': 0.0},
+        )
+        self.assertEqual(summarize([])['average'], 0)
+        self.assertEqual(summarize([3, 1, 2])['min'], 1)
@@ -0,0 +1,184 @@
+import uuid
+from datetime import date
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from school_management.grade_engine import (
+    compute_activity_breakdowns,
+    recalculate_class_points,
+)
+from school_management.models import (
+    ClassRoom, ClassRoomEnrollment, ContributionEvaluation, CustomUser, Group,
+    GroupMember, LessonSession, PeerEvaluation, PeerEvaluationSettings, PointColumn,
+    Quiz, QuizScore, SelfEvaluation, StudentClassPoints, StudentColumnScore,
+    StudentLessonPoints,
+)
+
+
+class GradeEngineTest(TestCase):
+    def setUp(self):
+        self.teacher = CustomUser.objects.create_user(
+            email='engine-teacher@example.com', full_name='Engine Teacher', role='teacher'
+        )
+        self.classroom = ClassRoom.objects.create(class_name='Engine Class', year=2026, semester='first')
+        self.classroom.teachers.add(self.teacher)
+        self.session = LessonSession.objects.create(
+            classroom=self.classroom,
+            session_number=1,
+            date=date(2026, 4, 1),
+            has_peer_evaluation=True,
+        )
+        PeerEvaluationSettings.objects.create(
+            lesson_session=self.session,
+            enable_group_evaluation=True,
+            group_scores=[5, 3],
+            group_evaluation_method=PeerEvaluationSettings.EvaluationMethod.DIRECT,
+        )
+        self.quiz = Quiz.objects.create(lesson_session=self.session, quiz_name='Quiz', max_score=10)
+        self.column = PointColumn.objects.create(classroom=self.classroom, column_title='Bonus')
+        self.group1 = Group.objects.create(lesson_session=self.session, group_number=1)
+        self.group2 = Group.objects.create(lesson_session=self.session, group_number=2)
+
+    def _create_students(self, count, offset=0):
+        students = []
+        for i in range(offset, offset + count):
+            student = CustomUser.objects.create_user(
+                email=f'engine-student{i}@example.com',
+                full_name=f'Engine Student {i}',
+                role='student',
+                student_number=f'EN{i:03d}',
+            )
+            ClassRoomEnrollment.enroll(self.classroom, student)
+            StudentClassPoints.objects.get_or_create(student=student, classroom=self.classroom)
+            QuizScore.objects.create(
+                quiz=self.quiz, student=student, score=3, graded_by=self.teacher, is_cancelled=True
+            )
+            QuizScore.objects.create(quiz=self.quiz, student=student, score=i + 1, graded_by=self.teacher)
+            StudentLessonPoints.objects.create(student=student, lesson_session=self.session, points=2)
+            StudentColumnScore.objects.create(student=student, column=self.column, score=1)
+            GroupMember.objects.create(group=self.group1 if i % 2 == 0 else self.group2, student=student)
+            students.append(student)
+        return students
+
+    def test_breakdowns_match_per_student_formula(self):
+        students = self._create_students(3)
+        evaluation = PeerEvaluation.objects.create(
+            lesson_session=self.session,
+            evaluator_token=uuid.uuid4(),
+            evaluator_group=self.group2,
+            response_json={'other_group_eval': [{'rank': 1, 'group_id': self.group1.id}]},
+        )
+        ContributionEvaluation.objects.create(
+            peer_evaluation=evaluation, evaluatee=students[1], contribution_score=4
+        )
+
+        breakdowns = compute_activity_breakdowns(self.classroom, [s.id for s in students])
+
+        # 学生0: 最新の小テスト1点 + 授業2 + 独自1 + グループ1位(5)
+        self.assertEqual(breakdowns[students[0].id]['quiz'], 1)
+        self.assertEqual(breakdowns[students[0].id]['vote'], 5)
+        self.assertEqual(breakdowns[students[0].id]['total'], 9)
+        # 学生1: 小テスト2 + 授業2 + 独自1 + 貢献度4
+        self.assertEqual(breakdowns[students[1].id]['contrib'], 4)
+        self.assertEqual(breakdowns[students[1].id]['total'], 9)
+
+        for student in students:
+            scp = StudentClassPoints.objects.get(student=student, classroom=self.classroom)
+            self.assertEqual(scp.get_activity_points(), breakdowns[student.id]['total'])
+
+    def test_recalculate_class_points_bulk_updates_points(self):
+        students = self._create_students(2)
+        StudentClassPoints.objects.filter(classroom=self.classroom).update(points=0, attendance_points=4.0)
+
+        updated = recalculate_class_points(self.classroom)
+
+        self.assertEqual(updated, 2)
+        for student in students:
+            scp = StudentClassPoints.objects.get(student=student, classroom=self.classroom)
+            self.assertEqual(scp.points, scp.get_activity_points() * 2 + 4)
+
+    def test_recalculate_class_points_creates_missing_rows(self):
+        student = self._create_students(1)[0]
+        StudentClassPoints.objects.filter(student=student).delete()
+
+        recalculate_class_points(self.classroom, [student.id], create_for=[student.id])
+
+        scp = StudentClassPoints.objects.get(student=student, classroom=self.classroom)
+        self.assertEqual(scp.points, scp.get_activity_points() * 2)
+
+    def test_query_count_does_not_grow_with_class_size(self):
+        self._create_students(2)
+        StudentClassPoints.objects.filter(classroom=self.classroom).update(points=0)
+        with CaptureQueriesContext(connection) as small:
+            recalculate_class_points(self.classroom)
+
+        self._create_students(6, offset=2)
+        StudentClassPoints.objects.filter(classroom=self.classroom).update(points=0)
+        with CaptureQueriesContext(connection) as large:
+            recalculate_class_points(self.classroom)
+
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_goal_mode_uses_teacher_score(self):
+        student = self._create_students(1)[0]
+        self.classroom.grading_system = 'goal'
+        self.classroom.save()
+        SelfEvaluation.objects.create(student=student, classroom=self.classroom, teacher_score=70)
+        StudentClassPoints.objects.filter(student=student).update(attendance_points=10.0)
+
+        recalculate_class_points(self.classroom)
+
+        self.assertEqual(StudentClassPoints.objects.get(student=student).points, 80)
+
+    def test_update_class_settings_recalculates_all_students(self):
+        students = self._create_students(2)
+        for student in students:
+            SelfEvaluation.objects.create(student=student, classroom=self.classroom, teacher_score=50)
+        self.client.force_login(self.teacher)
+
+        response = self.client.post(
+            reverse('school_management:update_class_settings', args=[self.classroom.id]),
+            {'grading_system': 'goal'},
+        )
+
+        self.assertEqual(response.status_code, 302)
+        for student in students:
+            self.assertEqual(StudentClassPoints.objects.get(student=student).points, 50)
+
+    def test_update_class_settings_rescales_attendance_points(self):
+        students = self._create_students(2)
+        StudentClassPoints.objects.filter(student=students[0]).update(attendance_rate=50.0)
+        StudentClassPoints.objects.filter(student=students[1]).update(attendance_rate=80.0)
+        self.client.force_login(self.teacher)
+
+        self.client.post(
+            reverse('school_management:update_class_settings', args=[self.classroom.id]),
+            {'attendance_max_points': 40},
+        )
+
+        for student, expected in zip(students, [20.0, 32.0]):
+            scp = StudentClassPoints.objects.get(student=student)
+            self.assertEqual(scp.attendance_points, expected)
+            self.assertEqual(scp.points, scp.get_activity_points() * 2 + int(expected))
+
+    def test_update_class_settings_query_count_does_not_grow_with_class_size(self):
+        self.client.force_login(self.teacher)
+        url = reverse('school_management:update_class_settings', args=[self.classroom.id])
+
+        def post_settings(attendance_max_points, grading_system):
+            with CaptureQueriesContext(connection) as context:
+                self.client.post(url, {
+                    'attendance_max_points': attendance_max_points, 'grading_system': grading_system,
+                })
+            return len(context.captured_queries)
+
+        self._create_students(2)
+        small = post_settings(30, 'original')
+
+        self._create_students(8, offset=2)
+        large = post_settings(40, 'default')
+
+        self.assertEqual(small, large)
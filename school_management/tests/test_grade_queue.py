@@ -0,0 +1,99 @@
+from datetime import date
+from unittest import mock
+
+from django.db import transaction
+from django.test import TestCase
+
+from school_management import grade_engine
+from school_management.grade_queue import deferred_recalculation
+from school_management.models import (
+    ClassRoom, CustomUser, LessonSession, Quiz, QuizScore, StudentClassPoints,
+    StudentLessonPoints,
+)
+
+
+class GradeQueueTest(TestCase):
+    def setUp(self):
+        self.teacher = CustomUser.objects.create_user(
+            email='queue-teacher@example.com', full_name='Queue Teacher', role='teacher'
+        )
+        self.classroom = ClassRoom.objects.create(class_name='Queue Class', year=2026, semester='first')
+        self.session = LessonSession.objects.create(
+            classroom=self.classroom, session_number=1, date=date(2026, 4, 1)
+        )
+        self.quiz = Quiz.objects.create(lesson_session=self.session, quiz_name='Quiz', max_score=10)
+        self.students = [
+            CustomUser.objects.create_user(
+                email=f'queue-student{i}@example.com',
+                full_name=f'Queue Student {i}',
+                role='student',
+                student_number=f'QU{i:03d}',
+            )
+            for i in range(3)
+        ]
+
+    def test_recalculation_runs_on_commit(self):
+        student = self.students[0]
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            QuizScore.objects.create(quiz=self.quiz, student=student, score=4, graded_by=self.teacher)
+            # コミット前はまだ再計算されていない
+            self.assertFalse(StudentClassPoints.objects.filter(student=student).exists())
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(StudentClassPoints.objects.get(student=student).points, 8)
+
+    def test_saves_are_coalesced_per_classroom(self):
+        with mock.patch(
+            'school_management.grade_engine.recalculate_class_points',
+            wraps=grade_engine.recalculate_class_points,
+        ) as recalculate:
+            with self.captureOnCommitCallbacks(execute=True):
+                for student in self.students:
+                    QuizScore.objects.create(quiz=self.quiz, student=student, score=2, graded_by=self.teacher)
+                    StudentLessonPoints.objects.create(student=student, lesson_session=self.session, points=1)
+
+        self.assertEqual(recalculate.call_count, 1)
+        for student in self.students:
+            self.assertEqual(StudentClassPoints.objects.get(student=student).points, 6)
+
+    def test_deferred_block_registers_single_callback(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with deferred_recalculation():
+                with deferred_recalculation():
+                    for student in self.students:
+                        QuizScore.objects.create(quiz=self.quiz, student=student, score=5, graded_by=self.teacher)
+                self.assertEqual(len(callbacks), 0)
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(
+            sorted(StudentClassPoints.objects.values_list('points', flat=True)), [10, 10, 10]
+        )
+
+    def test_rolled_back_marks_are_discarded(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    QuizScore.objects.create(
+                        quiz=self.quiz, student=self.students[0], score=5, graded_by=self.teacher
+                    )
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            # ロールバックで予約が失われたため、次の変更で反映処理を予約し直す
+            QuizScore.objects.create(quiz=self.quiz, student=self.students[1], score=5, graded_by=self.teacher)
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertFalse(StudentClassPoints.objects.filter(student=self.students[0]).exists())
+        self.assertEqual(StudentClassPoints.objects.get(student=self.students[1]).points, 10)
+
+    def test_delete_does_not_create_missing_row(self):
+        student = self.students[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            score = QuizScore.objects.create(quiz=self.quiz, student=student, score=3, graded_by=self.teacher)
+        StudentClassPoints.objects.filter(student=student).delete()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            score.delete()
+
+        self.assertFalse(StudentClassPoints.objects.filter(student=student).exists())
@@ -118,21 +118,24 @@ class ModelsTestCase(TestCase):
         quiz = Quiz.objects.create(lesson_session=self.session, quiz_name="Test Quiz", max_score=10)
 
         # 2. Boundary value: 0
-        score_0 = StudentColumnScore.objects.create(student=self.student, column=column, score=0)
-        quiz_score_0 = QuizScore.objects.create(student=self.student, quiz=quiz, score=0, graded_by=self.teacher)
-        lesson_points_0 = StudentLessonPoints.objects.create(student=self.student, lesson_session=self.session, points=0)
-        
-        self.assertEqual(scp.get_activity_points(), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            score_0 = StudentColumnScore.objects.create(student=self.student, column=column, score=0)
+            quiz_score_0 = QuizScore.objects.create(student=self.student, quiz=quiz, score=0, graded_by=self.teacher)
+            lesson_points_0 = StudentLessonPoints.objects.create(student=self.student, lesson_session=self.session, points=0)
+
+            self.assertEqual(scp.get_activity_points(), 0)
 
-        # Clean up
-        score_0.delete()
-        quiz_score_0.delete()
-        lesson_points_0.delete()
+            # Clean up
+            score_0.delete()
+            quiz_score_0.delete()
+            lesson_points_0.delete()
 
         # 3. Boundary value: -1
-        score_neg = StudentColumnScore.objects.create(student=self.student, column=column, score=-1)
-        quiz_score_neg = QuizScore.objects.create(student=self.student, quiz=quiz, score=-1, graded_by=self.teacher)
-        lesson_points_neg = StudentLessonPoints.objects.create(student=self.student, lesson_session=self.session, points=-1)
+        # 成績の再計算はコミット時にまとめて実行される
+        with self.captureOnCommitCallbacks(execute=True):
+            score_neg = StudentColumnScore.objects.create(student=self.student, column=column, score=-1)
+            quiz_score_neg = QuizScore.objects.create(student=self.student, quiz=quiz, score=-1, graded_by=self.teacher)
+            lesson_points_neg = StudentLessonPoints.objects.create(student=self.student, lesson_session=self.session, points=-1)
 
         # sum is -1 + -1 + -1 = -3
         self.assertEqual(scp.get_activity_points(), -3)
@@ -1,4 +1,7 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from django.contrib.auth import get_user_model
 from school_management.models import (
     LessonSession, ClassRoom, Group, Student, 
@@ -233,3 +236,63 @@ class PeerEvalAggregateLogicTests(TestCase):
             evaluatee=student_d1
         )
         self.assertEqual(evals.count(), 0)
+
+    def test_aggregate_member_scores_query_count_does_not_grow_with_groups(self):
+        """集計のクエリ数はグループ数・メンバー数に依存しない"""
+        def add_evaluation(student, group, ranked_members):
+            PeerEvaluation.objects.create(
+                lesson_session=self.session, student=student, evaluator_group=group, evaluator_token=uuid.uuid4(),
+                response_json={"group_members_eval": [
+                    {"member_id": member.id, "rank": rank} for rank, member in enumerate(ranked_members, 1)
+                ]}
+            )
+
+        def run():
+            ContributionEvaluation.objects.all().delete()
+            with CaptureQueriesContext(connection) as context:
+                _aggregate_member_scores(self.session, self.settings)
+            return len(context.captured_queries)
+
+        add_evaluation(self.student_a1, self.group_a, [self.student_a2, self.student_a3])
+        small = run()
+
+        add_evaluation(self.student_b1, self.group_b, [self.student_b2])
+        add_evaluation(self.student_c2, self.group_c, [self.student_c1])
+        large = run()
+
+        self.assertEqual(small, large)
+        self.assertEqual(
+            ContributionEvaluation.objects.get(evaluatee=self.student_b2).contribution_score, 10
+        )
+
+
+class LegacyPeerTokenTests(TestCase):
+    """旧形式の匿名ピア評価リンク（トークン）のテスト"""
+
+    def setUp(self):
+        self.classroom = ClassRoom.objects.create(class_name="トークンクラス", year=2024, semester="first")
+
+    def test_token_is_set_on_create(self):
+        session = LessonSession.objects.create(classroom=self.classroom, session_number=1)
+
+        session.refresh_from_db()
+        self.assertEqual(session.peer_token, LessonSession.build_peer_token(session.id))
+
+    def test_form_resolves_token_with_single_lookup(self):
+        for number in range(1, 6):
+            LessonSession.objects.create(classroom=self.classroom, session_number=number)
+        target = LessonSession.objects.get(classroom=self.classroom, session_number=3)
+        url = reverse('school_management:peer_evaluation_form', args=[target.peer_token])
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['session'], target)
+        session_queries = [q for q in context.captured_queries if 'peer_token' in q['sql']]
+        self.assertEqual(len(session_queries), 1)
+
+    def test_unknown_token_redirects(self):
+        response = self.client.get(reverse('school_management:peer_evaluation_form', args=['0' * 32]))
+
+        self.assertRedirects(response, reverse('school_management:login'), fetch_redirect_response=False)
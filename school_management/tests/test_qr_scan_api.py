@@ -0,0 +1,169 @@
+import json
+import uuid
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from school_management.models import (
+    ClassRoom, ClassRoomEnrollment, CustomUser, LessonSession, PointColumn, QRCodeScan,
+    QuizScore, StudentClassPoints, StudentColumnScore, StudentQRCode,
+)
+
+
+class QRScanAPITest(TestCase):
+    def setUp(self):
+        self.teacher = CustomUser.objects.create_user(
+            email='scanapi-teacher@example.com', full_name='Scan API Teacher', role='teacher'
+        )
+        self.classroom = ClassRoom.objects.create(
+            class_name='Scan API Class', year=2026, semester='first', qr_point_value=2
+        )
+        self.classroom.teachers.add(self.teacher)
+        self.session = LessonSession.objects.create(classroom=self.classroom, session_number=1)
+        self.column = PointColumn.objects.create(classroom=self.classroom, column_title='Bonus')
+        self.qr_codes = []
+        for i in range(3):
+            student = CustomUser.objects.create_user(
+                email=f'scanapi-student{i}@example.com',
+                full_name=f'Scan API Student {i}',
+                role='student',
+                student_number=f'SA{i:03d}',
+            )
+            ClassRoomEnrollment.enroll(self.classroom, student)
+            self.qr_codes.append(StudentQRCode.objects.create(student=student))
+        self.client.force_login(self.teacher)
+
+    def _post(self, payload):
+        return self.client.post(
+            reverse('school_management:qr_scan_api'),
+            data=json.dumps(payload),
+            content_type='application/json',
+        )
+
+    def _scan(self, qr_code, **extra):
+        return {'qr_code_id': str(qr_code.qr_code_id), 'session_id': self.session.id, **extra}
+
+    def test_bulk_scans_increment_scores(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self._post({'scans': [
+                self._scan(self.qr_codes[0]),
+                self._scan(self.qr_codes[0], points=3),
+                self._scan(self.qr_codes[1], point_type=f'custom_{self.column.id}', points=4),
+            ]})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual(data['created'], 3)
+        self.assertEqual(QRCodeScan.objects.count(), 3)
+        # 点数省略時はクラス設定の点数
+        self.assertEqual(data['results'][0]['points'], 2)
+
+        student0 = self.qr_codes[0].student
+        self.assertEqual(QuizScore.objects.get(student=student0).score, 5)
+        self.assertEqual(StudentColumnScore.objects.get(student=self.qr_codes[1].student).score, 4)
+        # 成績の再計算はコミット時にまとめて実行される
+        self.assertEqual(StudentClassPoints.objects.get(student=student0, classroom=self.classroom).points, 10)
+
+    def test_increment_matches_signal_based_total(self):
+        QRCodeScan.objects.create(
+            qr_code=self.qr_codes[0], scanned_by=self.teacher, lesson_session=self.session, points_awarded=5
+        )
+
+        self._post(self._scan(self.qr_codes[0], points=2))
+
+        student0 = self.qr_codes[0].student
+        self.assertEqual(QuizScore.objects.filter(student=student0).count(), 1)
+        self.assertEqual(QuizScore.objects.get(student=student0).score, 7)
+
+    def test_scan_after_cancelled_score_creates_current_score(self):
+        self._post(self._scan(self.qr_codes[0], points=3))
+        student0 = self.qr_codes[0].student
+        QuizScore.objects.filter(student=student0).update(is_cancelled=True)
+
+        self._post(self._scan(self.qr_codes[0], points=2))
+
+        # 取り消し済みのスコアには加算せず、現在のスコアを新しく作る
+        self.assertEqual(QuizScore.objects.get(student=student0, is_cancelled=True).score, 3)
+        self.assertEqual(QuizScore.objects.get(student=student0, is_cancelled=False).score, 2)
+
+    def test_invalid_scans_are_rejected_individually(self):
+        other_classroom = ClassRoom.objects.create(class_name='Other', year=2026, semester='first')
+        other_session = LessonSession.objects.create(classroom=other_classroom, session_number=1)
+
+        response = self._post({'scans': [
+            self._scan(self.qr_codes[0]),
+            {'qr_code_id': 'not-a-uuid', 'session_id': self.session.id},
+            {'qr_code_id': str(self.qr_codes[1].qr_code_id), 'session_id': other_session.id},
+            self._scan(self.qr_codes[2], point_type='custom_999999'),
+        ]})
+
+        data = response.json()
+        self.assertFalse(data['success'])
+        self.assertEqual(data['created'], 1)
+        self.assertEqual([r['status'] for r in data['results']], ['ok', 'error', 'error', 'error'])
+        self.assertEqual(QRCodeScan.objects.count(), 1)
+
+    def test_replayed_scans_are_not_counted_twice(self):
+        scans = [
+            self._scan(self.qr_codes[0], points=3, client_scan_id=str(uuid.uuid4())),
+            self._scan(self.qr_codes[1], points=1, client_scan_id=str(uuid.uuid4())),
+        ]
+        first = self._post({'scans': scans}).json()
+        # 通信が切れたと判断した端末が、1件追加して同じスキャンを再送する
+        replay = self._post({'scans': scans + [
+            self._scan(self.qr_codes[2], points=2, client_scan_id=str(uuid.uuid4())),
+        ]}).json()
+
+        self.assertTrue(replay['success'])
+        self.assertEqual(replay['created'], 1)
+        self.assertEqual(replay['duplicates'], 2)
+        self.assertEqual([r['status'] for r in replay['results']], ['duplicate', 'duplicate', 'ok'])
+        self.assertEqual(replay['results'][0]['scan_id'], first['results'][0]['scan_id'])
+        self.assertEqual(QRCodeScan.objects.count(), 3)
+        self.assertEqual(QuizScore.objects.get(student=self.qr_codes[0].student).score, 3)
+
+    def test_duplicate_ids_within_batch_are_recorded_once(self):
+        scan = self._scan(self.qr_codes[0], points=3, client_scan_id=str(uuid.uuid4()))
+
+        data = self._post({'scans': [scan, scan]}).json()
+
+        self.assertTrue(data['success'])
+        self.assertEqual([r['status'] for r in data['results']], ['ok', 'duplicate'])
+        self.assertEqual(data['results'][1]['scan_id'], data['results'][0]['scan_id'])
+        self.assertEqual(QuizScore.objects.get(student=self.qr_codes[0].student).score, 3)
+
+    def test_invalid_client_scan_id_is_rejected(self):
+        data = self._post(self._scan(self.qr_codes[0], client_scan_id='not-a-uuid')).json()
+
+        self.assertEqual(data['results'][0]['status'], 'error')
+        self.assertFalse(QRCodeScan.objects.exists())
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        column = f'custom_{self.column.id}'
+        # 全員の小テスト・独自評価項目のスコアを先に作っておき、以降は加算だけにする
+        self._post({'scans': [self._scan(qr_code) for qr_code in self.qr_codes]})
+        self._post({'scans': [self._scan(qr_code, point_type=column) for qr_code in self.qr_codes]})
+
+        with CaptureQueriesContext(connection) as small:
+            self._post({'scans': [self._scan(self.qr_codes[0]), self._scan(self.qr_codes[0], point_type=column)]})
+        with CaptureQueriesContext(connection) as large:
+            self._post({'scans': [
+                self._scan(qr_code, point_type=point_type)
+                for qr_code in self.qr_codes for point_type in ('qr_action', column)
+            ] * 3})
+
+        # 加算は (小テスト/項目, 学生) ごとにまとめて1回の UPDATE で行う
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+        self.assertEqual(QuizScore.objects.get(student=self.qr_codes[1].student).score, 2 + 2 * 3)
+        self.assertEqual(StudentColumnScore.objects.get(student=self.qr_codes[1].student).score, 1 + 3)
+
+    def test_students_cannot_use_api(self):
+        self.client.force_login(self.qr_codes[0].student)
+
+        response = self._post(self._scan(self.qr_codes[0]))
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(QRCodeScan.objects.exists())
@@ -0,0 +1,91 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from school_management.models import (
+    ClassRoom, ClassRoomEnrollment, CustomUser, LessonSession, Quiz, QuizScore,
+    StudentClassPoints,
+)
+
+
+class QuizGradingBulkSaveTest(TestCase):
+    """小テスト採点画面の保存（変更分だけをまとめて保存する）"""
+
+    def setUp(self):
+        self.teacher = CustomUser.objects.create_user(
+            email='grading-teacher@example.com', full_name='Grading Teacher', role='teacher'
+        )
+        self.classroom = ClassRoom.objects.create(class_name='Grading Class', year=2026, semester='first')
+        self.classroom.teachers.add(self.teacher)
+        self.session = LessonSession.objects.create(classroom=self.classroom, session_number=1)
+        self.quiz = Quiz.objects.create(lesson_session=self.session, quiz_name='Quiz', max_score=10)
+        self.students = []
+        self.client.force_login(self.teacher)
+
+    def _add_students(self, count):
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(count):
+                i = len(self.students)
+                student = CustomUser.objects.create_user(
+                    email=f'grading-student{i}@example.com',
+                    full_name=f'Grading Student {i}',
+                    role='student',
+                    student_number=f'GR{i:03d}',
+                )
+                ClassRoomEnrollment.enroll(self.classroom, student)
+                self.students.append(student)
+
+    def _post_scores(self, scores):
+        data = {'action': 'save_scores'}
+        for student, score in scores.items():
+            data[f'score_{student.student_number}'] = score
+        with CaptureQueriesContext(connection) as context:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    reverse('school_management:quiz_grading', args=[self.quiz.id]), data
+                )
+        self.assertEqual(response.status_code, 302)
+        return len(context.captured_queries)
+
+    def test_only_changed_scores_are_replaced(self):
+        self._add_students(3)
+        unchanged, changed, new = self.students
+        self._post_scores({unchanged: 5, changed: 6})
+        kept = QuizScore.objects.get(quiz=self.quiz, student=unchanged)
+        replaced = QuizScore.objects.get(quiz=self.quiz, student=changed)
+
+        self._post_scores({unchanged: 5, changed: 9, new: 'abc'})
+        self._post_scores({new: 4})
+
+        kept.refresh_from_db()
+        replaced.refresh_from_db()
+        self.assertFalse(kept.is_cancelled)
+        self.assertEqual(QuizScore.objects.filter(quiz=self.quiz, student=unchanged).count(), 1)
+        self.assertTrue(replaced.is_cancelled)
+        self.assertEqual(
+            QuizScore.objects.get(quiz=self.quiz, student=changed, is_cancelled=False).score, 9
+        )
+        self.assertEqual(
+            QuizScore.objects.get(quiz=self.quiz, student=new, is_cancelled=False).score, 4
+        )
+
+    def test_saved_scores_are_recalculated(self):
+        self._add_students(2)
+        self._post_scores({self.students[0]: 7, self.students[1]: 3})
+
+        points = dict(
+            StudentClassPoints.objects.filter(classroom=self.classroom).values_list('student_id', 'points')
+        )
+        # 通常評価: 合計 = 授業点 × 2 + 出席点
+        self.assertEqual(points[self.students[0].id], 14)
+        self.assertEqual(points[self.students[1].id], 6)
+
+    def test_query_count_does_not_grow_with_class_size(self):
+        self._add_students(3)
+        small = self._post_scores({student: 1 for student in self.students})
+
+        self._add_students(12)
+        large = self._post_scores({student: 2 for student in self.students})
+
+        self.assertEqual(small, large)
@@ -0,0 +1,115 @@
+import json
+from datetime import date
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from school_management.models import (
+    ClassRoom, ClassRoomEnrollment, CustomUser, LessonSession, Quiz, QuizScore,
+    StudentLessonPoints,
+)
+from school_management.tests.helpers import ViewBudgetMixin
+
+
+class RequestMetricsMiddlewareTest(ViewBudgetMixin, TestCase):
+    """クエリ数・処理時間の計測（Server-Timing・構造化ログ・上限チェック）"""
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = CustomUser.objects.create_user(
+            email='metrics-teacher@example.com', full_name='Metrics Teacher', role='teacher'
+        )
+        self.classroom = ClassRoom.objects.create(class_name='Metrics Class', year=2026, semester='first')
+        self.classroom.teachers.add(self.teacher)
+        self.sessions = []
+        for number in (1, 2):
+            session = LessonSession.objects.create(
+                classroom=self.classroom, session_number=number, date=date(2026, 4, number)
+            )
+            quiz = Quiz.objects.create(lesson_session=session, quiz_name=f'Quiz {number}', max_score=10)
+            self.sessions.append((session, quiz))
+        self.students = []
+        self.client.force_login(self.teacher)
+
+    def _add_students(self, count):
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(count):
+                i = len(self.students)
+                student = CustomUser.objects.create_user(
+                    email=f'metrics-student{i}@example.com',
+                    full_name=f'Metrics Student {i}',
+                    role='student',
+                    student_number=f'ME{i:03d}',
+                )
+                ClassRoomEnrollment.enroll(self.classroom, student)
+                for session, quiz in self.sessions:
+                    QuizScore.objects.create(quiz=quiz, student=student, score=i, graded_by=self.teacher)
+                    StudentLessonPoints.objects.create(student=student, lesson_session=session, points=1)
+                self.students.append(student)
+
+    def _get(self, name, *args):
+        response = self.client.get(reverse(f'school_management:{name}', args=args))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_records_view_name_and_server_timing(self):
+        response = self._get('class_points', self.classroom.id)
+
+        metrics = response.wsgi_request.request_metrics
+        self.assertEqual(metrics.view_name, 'school_management:class_points')
+        self.assertGreater(metrics.query_count, 0)
+        self.assertIn(f'db;dur={metrics.db_ms};desc="{metrics.query_count} queries"', response['Server-Timing'])
+        self.assertIn('total;dur=', response['Server-Timing'])
+
+    def test_over_budget_request_is_logged_as_warning(self):
+        budgets = {'school_management:class_points': {'queries': 1}}
+        with override_settings(REQUEST_METRICS_BUDGETS=budgets):
+            with self.assertLogs('school_management.request_metrics', level='WARNING') as logs:
+                self._get('class_points', self.classroom.id)
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'school_management:class_points')
+        self.assertEqual(record['status'], 200)
+        self.assertTrue(record['over_budget'])
+        self.assertEqual(logs.records[0].request_metrics, record)
+
+    def test_budget_helper_fails_when_view_exceeds_budget(self):
+        self._add_students(3)
+        budgets = {'school_management:class_points': {'queries': 1, 'queries_per_row': 1}}
+        with override_settings(REQUEST_METRICS_BUDGETS=budgets):
+            with self.assertLogs('school_management.request_metrics', level='WARNING') as logs:
+                response = self._get('class_points', self.classroom.id)
+            with self.assertRaises(AssertionError):
+                self.assertWithinViewBudget(response, rows=len(self.students))
+
+        # ミドルウェアも上限の超過を記録している
+        self.assertTrue(json.loads(logs.records[0].getMessage())['over_budget'])
+
+    def test_middleware_uses_rows_recorded_by_view(self):
+        self._add_students(3)
+        budgets = {'school_management:class_detail': {'queries': 1, 'queries_per_row': 1000}}
+        with override_settings(REQUEST_METRICS_BUDGETS=budgets):
+            with self.assertNoLogs('school_management.request_metrics', level='WARNING'):
+                response = self._get('class_detail', self.classroom.id)
+
+        self.assertEqual(response.wsgi_request.request_metrics.rows, 3)
+
+    @override_settings(REQUEST_METRICS_ENABLED=False)
+    def test_disabled_metrics_skip_instrumentation(self):
+        response = self._get('class_points', self.classroom.id)
+        self.assertFalse(hasattr(response.wsgi_request, 'request_metrics'))
+        self.assertNotIn('Server-Timing', response)
+
+    def test_grade_views_stay_within_budget(self):
+        for count in (3, 7):
+            self._add_students(count)
+            rows = len(self.students)
+            for name in ('class_points', 'class_evaluation', 'class_detail'):
+                with self.subTest(view=name, rows=rows):
+                    self.assertWithinViewBudget(self._get(name, self.classroom.id))
+
+            self.client.force_login(self.students[0])
+            with self.subTest(view='student_dashboard', rows=rows):
+                self.assertWithinViewBudget(self._get('student_dashboard'))
+            self.client.force_login(self.teacher)
@@ -0,0 +1,62 @@
+from django.test import SimpleTestCase
+
+from school_management.models import LessonSession, PeerEvaluationSettings
+from school_management.scoring import (
+    build_group_vote_point_map_from_counts,
+    build_member_aggregate_points,
+    count_member_votes,
+    simulate_peer_points,
+)
+
+AGGREGATE = PeerEvaluationSettings.EvaluationMethod.AGGREGATE
+DIRECT = PeerEvaluationSettings.EvaluationMethod.DIRECT
+CLOSED = LessonSession.PeerEvaluationStatus.CLOSED
+OPEN = LessonSession.PeerEvaluationStatus.OPEN
+
+
+class ScoringTest(SimpleTestCase):
+    """ピア評価の配点計算（DBアクセスなし）"""
+
+    def test_group_vote_points_by_method(self):
+        rank_counts = {1: {1: 2}, 2: {1: 1, 2: 1}, 3: {2: 2}}
+        # 内部ポイント(G-N): 1=4, 2=3, 3=2
+        self.assertEqual(
+            build_group_vote_point_map_from_counts([1, 2, 3], rank_counts, AGGREGATE, [5, 3], CLOSED),
+            {1: 5, 2: 3, 3: 0},
+        )
+        self.assertEqual(
+            build_group_vote_point_map_from_counts([1, 2, 3], rank_counts, AGGREGATE, [5, 3], OPEN),
+            {1: 0, 2: 0, 3: 0},
+        )
+        self.assertEqual(
+            build_group_vote_point_map_from_counts([1, 2, 3], rank_counts, DIRECT, [5, 3], OPEN),
+            {1: 10, 2: 8, 3: 6},
+        )
+
+    def test_member_aggregate_points_share_rank_on_ties(self):
+        responses = [
+            {'group_members_eval': [{'member_id': 2, 'rank': 1}, {'member_id': 3, 'rank': 2}]},
+            {'group_members_eval': [{'member_id': 3, 'rank': 1}, {'member_id': 1, 'rank': 2}]},
+            {'group_members_eval': [{'member_id': 1, 'rank': '1'}, {'member_id': 99, 'rank': 1}]},
+        ]
+        # 99 は集計時点のメンバーではないため数えない
+        self.assertEqual(count_member_votes(responses, [1, 2, 3]), {1: {2: 1, 1: 1}, 2: {1: 1}, 3: {2: 1, 1: 1}})
+        self.assertEqual(build_member_aggregate_points([1, 2, 3], responses, [10, 8, 6]), {1: 10, 3: 10, 2: 6})
+        self.assertEqual(build_member_aggregate_points([1], responses, [10]), {})
+
+    def test_simulate_peer_points(self):
+        pe_settings = PeerEvaluationSettings(
+            enable_member_evaluation=True, member_scores=[3, 1],
+            enable_group_evaluation=True, group_scores=[5],
+        )
+        self.assertEqual(
+            simulate_peer_points({'member_rank_1': '2', 'member_rank_2': 1, 'group_rank_1': 1}, pe_settings),
+            (7.0, 5.0),
+        )
+        self.assertEqual(
+            simulate_peer_points({'contrib': '4', 'group_manual': 2}, pe_settings, 'manual'), (4.0, 2.0)
+        )
+        # 旧形式の入力
+        self.assertEqual(simulate_peer_points({'member': 3, 'group': 1}, pe_settings), (3, 1))
+        self.assertEqual(simulate_peer_points('2.5', None), (2.5, 0))
+        self.assertEqual(simulate_peer_points({'contrib': 6}, None), (6.0, 0))
@@ -0,0 +1,155 @@
+import uuid
+from datetime import date
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from school_management.models import (
+    ClassRoom, ClassRoomEnrollment, CustomUser, Group, GroupMember, LessonSession,
+    PeerEvaluation, PeerEvaluationSettings, PointColumn, QRCodeScan, Quiz, QuizScore,
+    StudentLessonPoints, StudentQRCode, StudentSessionScore,
+)
+from school_management.session_scores import ensure_session_scores, rebuild_session_scores
+
+
+class SessionScoreSnapshotTest(TestCase):
+    def setUp(self):
+        self.teacher = CustomUser.objects.create_user(
+            email='snapshot-teacher@example.com', full_name='Snapshot Teacher', role='teacher'
+        )
+        self.classroom = ClassRoom.objects.create(class_name='Snapshot Class', year=2026, semester='first')
+        self.classroom.teachers.add(self.teacher)
+        self.session = LessonSession.objects.create(
+            classroom=self.classroom, session_number=1, date=date(2026, 4, 1)
+        )
+        PeerEvaluationSettings.objects.create(
+            lesson_session=self.session,
+            enable_member_evaluation=True,
+            member_scores=[3, 1],
+            enable_group_evaluation=True,
+            group_scores=[5, 3],
+        )
+        self.quiz = Quiz.objects.create(lesson_session=self.session, quiz_name='Quiz', max_score=10)
+        self.column = PointColumn.objects.create(classroom=self.classroom, column_title='Bonus')
+        self.group1 = Group.objects.create(lesson_session=self.session, group_number=1)
+        self.group2 = Group.objects.create(lesson_session=self.session, group_number=2)
+        self.students = []
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(2):
+                student = CustomUser.objects.create_user(
+                    email=f'snapshot-student{i}@example.com',
+                    full_name=f'Snapshot Student {i}',
+                    role='student',
+                    student_number=f'SS{i:03d}',
+                )
+                ClassRoomEnrollment.enroll(self.classroom, student)
+                GroupMember.objects.create(group=self.group1, student=student)
+                self.students.append(student)
+
+    def _score(self, student):
+        return StudentSessionScore.objects.get(student=student, lesson_session=self.session)
+
+    def test_rebuild_aggregates_each_component(self):
+        student = self.students[0]
+        QuizScore.objects.create(quiz=self.quiz, student=student, score=2, graded_by=self.teacher, is_cancelled=True)
+        QuizScore.objects.create(quiz=self.quiz, student=student, score=7, graded_by=self.teacher)
+        StudentLessonPoints.objects.create(student=student, lesson_session=self.session, points=4)
+        PeerEvaluation.objects.create(
+            lesson_session=self.session,
+            evaluator_token=uuid.uuid4(),
+            evaluator_group=self.group2,
+            response_json={
+                'other_group_eval': [{'rank': 1, 'group_id': self.group1.id}],
+                'group_members_eval': [{'rank': 1, 'member_id': student.id}],
+            },
+        )
+        qr_code = StudentQRCode.objects.create(student=student)
+        QRCodeScan.objects.create(
+            qr_code=qr_code, scanned_by=self.teacher, lesson_session=self.session,
+            point_column=self.column, points_awarded=3,
+        )
+
+        rebuild_session_scores(self.classroom)
+
+        score = self._score(student)
+        # 同一クイズは後から登録されたスコアのみ
+        self.assertEqual((score.quiz_total, score.quiz_count), (7, 1))
+        self.assertEqual(score.lesson_points, 4)
+        self.assertEqual(score.contrib, 3)
+        self.assertEqual(score.vote, 5)
+        self.assertEqual(score.custom_total, 3)
+        # 得点の無い在籍学生も0点の行を持つ
+        self.assertEqual(self._score(self.students[1]).quiz_total, 0)
+
+    def test_signal_updates_snapshot_on_commit(self):
+        student = self.students[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            QuizScore.objects.create(quiz=self.quiz, student=student, score=6, graded_by=self.teacher)
+        self.assertEqual(self._score(student).quiz_total, 6)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            QuizScore.objects.filter(student=student).delete()
+        self.assertEqual(self._score(student).quiz_total, 0)
+
+    def test_settings_change_updates_group_members(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            PeerEvaluation.objects.create(
+                lesson_session=self.session,
+                evaluator_token=uuid.uuid4(),
+                evaluator_group=self.group2,
+                response_json={'other_group_eval': [{'rank': 1, 'group_id': self.group1.id}]},
+            )
+        self.assertEqual(self._score(self.students[1]).vote, 5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pe_settings = self.session.peer_evaluation_settings
+            pe_settings.group_scores = [10, 3]
+            pe_settings.save()
+
+        self.assertEqual(self._score(self.students[1]).vote, 10)
+
+    def test_rebuild_query_count_does_not_grow_with_class_size(self):
+        with CaptureQueriesContext(connection) as small:
+            rebuild_session_scores(self.classroom)
+
+        for i in range(2, 8):
+            student = CustomUser.objects.create_user(
+                email=f'snapshot-student{i}@example.com',
+                full_name=f'Snapshot Student {i}',
+                role='student',
+                student_number=f'SS{i:03d}',
+            )
+            ClassRoomEnrollment.enroll(self.classroom, student)
+            GroupMember.objects.create(group=self.group2, student=student)
+        with CaptureQueriesContext(connection) as large:
+            rebuild_session_scores(self.classroom)
+
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_ensure_fills_students_missing_from_snapshot(self):
+        StudentSessionScore.objects.filter(classroom=self.classroom).delete()
+        StudentLessonPoints.objects.create(student=self.students[1], lesson_session=self.session, points=4)
+        # シグナルで1人分だけ行ができた状態でも、残りの在籍学生の行を作る
+        with self.captureOnCommitCallbacks(execute=True):
+            QuizScore.objects.create(quiz=self.quiz, student=self.students[0], score=6, graded_by=self.teacher)
+        self.assertFalse(StudentSessionScore.objects.filter(student=self.students[1]).exists())
+
+        ensure_session_scores(self.classroom)
+
+        self.assertEqual(self._score(self.students[0]).quiz_total, 6)
+        self.assertEqual(self._score(self.students[1]).lesson_points, 4)
+        with CaptureQueriesContext(connection) as context:
+            ensure_session_scores(self.classroom)
+        self.assertEqual(len(context.captured_queries), 2)
+
+    def test_management_command_rebuilds_class(self):
+        StudentLessonPoints.objects.create(student=self.students[0], lesson_session=self.session, points=2)
+        out = StringIO()
+
+        call_command('rebuild_session_scores', '--class-id', str(self.classroom.id), stdout=out)
+
+        self.assertEqual(self._score(self.students[0]).lesson_points, 2)
+        self.assertIn('1 クラス', out.getvalue())
@@ -1,7 +1,7 @@
 from django.test import TestCase, Client
 from django.urls import reverse
 from django.contrib.auth import get_user_model
-from school_management.models import LessonSession, ClassRoom, ClassRoomEnrollment
+from school_management.models import LessonSession, ClassRoom, ClassRoomEnrollment, PeerEvaluationSimulation
 from school_management.views.peer_eval.results import save_peer_evaluation_simulation
 
 User = get_user_model()
@@ -45,15 +45,13 @@ class SimulationLogicTests(TestCase):
         response = self.client.post(url, data=post_data)
         self.assertEqual(response.status_code, 302) # Redirects
         
-        session = self.client.session
-        sim_data = session.get('peer_sim_points', {})
-        class_id_str = str(self.classroom.id)
-        sess_id_str = str(self.session.id)
-        
-        self.assertIn(class_id_str, sim_data)
-        self.assertIn(sess_id_str, sim_data[class_id_str])
-        
-        student_data = sim_data[class_id_str][sess_id_str]
+        # ログインセッションではなく教員・授業回ごとのテーブルに保存される
+        self.assertNotIn('peer_sim_points', self.client.session)
+        simulation = PeerEvaluationSimulation.objects.get(teacher=self.teacher, lesson_session=self.session)
+        self.assertEqual(simulation.classroom, self.classroom)
+        self.assertEqual(simulation.point_mode, 'settings')
+
+        student_data = simulation.student_points
         
         # Test new rank structure
         self.assertIn('10', student_data)
@@ -87,22 +85,22 @@ class SimulationLogicTests(TestCase):
             group_scores=[4, 2]
         )
 
-        # Inject session data
+        PeerEvaluationSimulation.objects.create(
+            teacher=self.teacher,
+            classroom=self.classroom,
+            lesson_session=self.session,
+            student_points={
+                str(self.student.id): {
+                    'member_rank_1': 2, # 2 votes * 5 points = 10
+                    'member_rank_2': 1, # 1 vote * 3 points = 3
+                    'contrib': 4.5,     # + 4.5 points = 17.5
+                    'group_rank_1': 1,  # 1 vote * 4 points = 4
+                    'group_rank_2': 0   # 0 votes = 0 -> 4
+                }
+            },
+        )
         session = self.client.session
         session['test_mode'] = True
-        session['peer_sim_points'] = {
-            str(self.classroom.id): {
-                str(self.session.id): {
-                    str(self.student.id): {
-                        'member_rank_1': 2, # 2 votes * 5 points = 10
-                        'member_rank_2': 1, # 1 vote * 3 points = 3
-                        'contrib': 4.5,     # + 4.5 points = 17.5
-                        'group_rank_1': 1,  # 1 vote * 4 points = 4
-                        'group_rank_2': 0   # 0 votes = 0 -> 4
-                    }
-                }
-            }
-        }
         session.save()
 
         self.client.force_login(self.teacher)
@@ -143,19 +141,19 @@ class SimulationLogicTests(TestCase):
             group_scores=[8, 4]
         )
 
-        # Inject session data
+        PeerEvaluationSimulation.objects.create(
+            teacher=self.teacher,
+            classroom=self.classroom,
+            lesson_session=self.session,
+            student_points={
+                str(self.student.id): {
+                    'member_rank_1': 1, # 1 vote * 10 points = 10
+                    'group_rank_2': 2   # 2 votes * 4 points = 8
+                }
+            },
+        )
         session = self.client.session
         session['test_mode'] = True
-        session['peer_sim_points'] = {
-            str(self.classroom.id): {
-                str(self.session.id): {
-                    str(self.student.id): {
-                        'member_rank_1': 1, # 1 vote * 10 points = 10
-                        'group_rank_2': 2   # 2 votes * 4 points = 8
-                    }
-                }
-            }
-        }
         session.save()
 
         self.client.force_login(self.teacher)
@@ -175,3 +173,26 @@ class SimulationLogicTests(TestCase):
                 self.assertEqual(s_data['total_peer_score'], 18.0)
                 found = True
         self.assertTrue(found)
+
+    def test_simulation_is_saved_per_teacher_and_cleared(self):
+        other_teacher = User.objects.create_user(
+            email='other-teacher@example.com', password='password123', role='teacher', full_name='Other Teacher'
+        )
+        self.classroom.teachers.add(other_teacher)
+        save_url = reverse('school_management:save_peer_evaluation_simulation', args=[self.session.id])
+
+        self.client.force_login(self.teacher)
+        self.client.post(save_url, data={'sim_contrib_10': '1'})
+        self.client.post(save_url, data={'sim_contrib_10': '2', 'sim_point_mode': 'manual'})
+        self.client.force_login(other_teacher)
+        self.client.post(save_url, data={'sim_contrib_10': '3'})
+
+        # 同じ授業回でも教員ごとに1件（再保存は上書き）
+        simulation = PeerEvaluationSimulation.objects.get(teacher=self.teacher)
+        self.assertEqual(simulation.point_mode, 'manual')
+        self.assertEqual(simulation.student_points, {'10': {'contrib': 2.0}})
+        self.assertEqual(PeerEvaluationSimulation.objects.count(), 2)
+
+        self.client.post(reverse('school_management:clear_peer_evaluation_simulation', args=[self.session.id]))
+
+        self.assertEqual(list(PeerEvaluationSimulation.objects.values_list('teacher', flat=True)), [self.teacher.id])
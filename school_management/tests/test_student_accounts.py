@@ -0,0 +1,111 @@
+from django.contrib.auth.hashers import identify_hasher
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from school_management.models import (
+    ClassRoom, ClassRoomEnrollment, CustomUser, StudentClassPoints, TeacherStudentAssignment,
+)
+from school_management.student_accounts import bulk_create_students
+
+
+class BulkStudentAccountTests(TestCase):
+    def setUp(self):
+        self.teacher = CustomUser.objects.create_user(
+            email='bulk-teacher@example.com', full_name='Bulk Teacher', password='password123', role='teacher'
+        )
+        self.classroom = ClassRoom.objects.create(class_name='Bulk Class', year=2026, semester='first')
+        self.classroom.teachers.add(self.teacher)
+
+    def test_bulk_created_students_use_import_hasher(self):
+        students = bulk_create_students([
+            {'student_number': 'ｂ 001', 'full_name': 'Bulk One', 'email': ' One@Example.com '},
+            {'student_number': 'B002', 'full_name': 'Bulk Two', 'furigana': 'ばるく'},
+        ])
+
+        self.assertTrue(all(student.id for student in students))
+        first = CustomUser.objects.get(id=students[0].id)
+        self.assertEqual(first.student_number, 'B001')
+        self.assertEqual(first.email, 'one@example.com')
+        self.assertEqual(first.role, 'student')
+        self.assertEqual(identify_hasher(first.password).algorithm, 'bulk_import_pbkdf2_sha256')
+        self.assertTrue(first.check_password('student_B001'))
+
+    def test_first_login_rehashes_with_default_hasher(self):
+        student = bulk_create_students([
+            {'student_number': 'B010', 'full_name': 'Bulk Ten', 'email': 'ten@example.com'},
+        ])[0]
+
+        self.assertTrue(self.client.login(email='ten@example.com', password='student_B010'))
+
+        student.refresh_from_db()
+        self.assertEqual(identify_hasher(student.password).algorithm, 'pbkdf2_sha256')
+        self.assertTrue(student.check_password('student_B010'))
+        self.assertFalse(student.check_password('student_B011'))
+
+    def test_csv_import_creates_students_in_bulk(self):
+        self.client.login(email='bulk-teacher@example.com', password='password123')
+        existing = CustomUser.objects.create_user(
+            email=None, full_name='Existing', role='student', student_number='B100'
+        )
+        lines = '\n'.join(f'B{i:03d},Student {i}' for i in range(101, 131))
+
+        response = self.client.post(
+            reverse('school_management:bulk_student_add_csv', args=[self.classroom.id]),
+            {'student_data': f'B100,Existing\n{lines}'},
+        )
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(CustomUser.objects.filter(role='student').count(), 31)
+        self.assertEqual(ClassRoomEnrollment.objects.filter(classroom=self.classroom, is_active=True).count(), 31)
+        self.assertEqual(StudentClassPoints.objects.filter(classroom=self.classroom).count(), 31)
+        self.assertEqual(
+            TeacherStudentAssignment.objects.filter(teacher=self.teacher, is_active=True).count(), 31
+        )
+        self.assertTrue(
+            TeacherStudentAssignment.objects.filter(teacher=self.teacher, student=existing).exists()
+        )
+
+    def _post_csv(self, lines):
+        return self.client.post(
+            reverse('school_management:bulk_student_add_csv', args=[self.classroom.id]),
+            {'student_data': '\n'.join(lines)},
+        )
+
+    def test_csv_validation_query_count_does_not_grow_with_rows(self):
+        self.client.login(email='bulk-teacher@example.com', password='password123')
+        for i in range(40):
+            CustomUser.objects.create_user(
+                email=f'v{i}@example.com', full_name=f'V {i}', role='student', student_number=f'V{i:03d}'
+            )
+
+        with CaptureQueriesContext(connection) as small:
+            self._post_csv(['V000,V 0,v0@example.com', 'V000,Dup'])
+        with CaptureQueriesContext(connection) as large:
+            self._post_csv([f'V{i:03d},V {i},v{i}@example.com' for i in range(40)] + ['V000,Dup'])
+
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+        self.assertFalse(ClassRoomEnrollment.objects.filter(classroom=self.classroom).exists())
+
+    def test_csv_validation_reports_errors_per_line(self):
+        self.client.login(email='bulk-teacher@example.com', password='password123')
+        enrolled = CustomUser.objects.create_user(
+            email='enrolled@example.com', full_name='Enrolled', role='student', student_number='E001'
+        )
+        ClassRoomEnrollment.enroll(self.classroom, enrolled)
+        CustomUser.objects.create_user(
+            email='other@example.com', full_name='Other', role='student', student_number='E002'
+        )
+
+        response = self._post_csv([
+            'E001,Enrolled,enrolled@example.com',
+            'E002,Other,changed@example.com',
+            'E003,New,other@example.com',
+        ])
+
+        messages = [str(m) for m in response.context['messages']]
+        self.assertIn('行1: 学生 "Enrolled"（学籍番号: E001）は既にこのクラスに登録されています', messages)
+        self.assertTrue(any(m.startswith('行2: 学籍番号 "E002" は既に別のメールアドレス') for m in messages))
+        self.assertTrue(any(m.startswith('行3: メールアドレス "other@example.com" は既に別の学籍番号') for m in messages))
+        self.assertFalse(CustomUser.objects.filter(student_number='E003').exists())
@@ -0,0 +1,148 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from school_management import student_imports
+from school_management.models import (
+    ClassRoom, ClassRoomEnrollment, CustomUser, StudentImportJob,
+)
+
+
+@override_settings(STUDENT_IMPORT_ASYNC_THRESHOLD=3)
+class StudentImportJobTests(TestCase):
+    def setUp(self):
+        self.teacher = CustomUser.objects.create_user(
+            email='job-teacher@example.com', full_name='Job Teacher', password='password123', role='teacher'
+        )
+        self.classroom = ClassRoom.objects.create(class_name='Job Class', year=2026, semester='first')
+        self.classroom.teachers.add(self.teacher)
+        self.client.login(email='job-teacher@example.com', password='password123')
+
+    def _post_csv(self, lines):
+        return self.client.post(
+            reverse('school_management:bulk_student_add_csv', args=[self.classroom.id]),
+            {'student_data': '\n'.join(lines)},
+        )
+
+    def test_large_csv_is_queued_and_processed_by_worker(self):
+        response = self._post_csv([f'J{i:03d},Job Student {i}' for i in range(5)])
+
+        job = StudentImportJob.objects.get()
+        self.assertRedirects(response, reverse('school_management:student_import_job', args=[job.id]))
+        self.assertEqual(job.status, StudentImportJob.STATUS_PENDING)
+        self.assertEqual(job.total_rows, 5)
+        # ワーカーが処理するまで学生は作成されない
+        self.assertFalse(CustomUser.objects.filter(role='student').exists())
+
+        call_command('run_student_import_jobs', '--once', stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, StudentImportJob.STATUS_COMPLETED)
+        self.assertEqual((job.validated_rows, job.created_count, job.linked_count, job.failed_count), (5, 5, 0, 0))
+        self.assertEqual(ClassRoomEnrollment.objects.filter(classroom=self.classroom, is_active=True).count(), 5)
+
+        page = self.client.get(reverse('school_management:student_import_job', args=[job.id]))
+        self.assertContains(page, 'jobProgressData')
+        status = self.client.get(reverse('school_management:student_import_job_status', args=[job.id])).json()
+        self.assertTrue(status['job']['is_finished'])
+        self.assertEqual(status['job']['created_count'], 5)
+
+    def test_worker_requeues_job_left_running_by_stopped_worker(self):
+        self._post_csv([f'J{i:03d},Job Student {i}' for i in range(5)])
+        job = StudentImportJob.objects.get()
+        # 直近に取り出されたジョブは他のワーカーが処理中とみなして触らない
+        StudentImportJob.objects.filter(id=job.id).update(
+            status=StudentImportJob.STATUS_RUNNING, started_at=timezone.now()
+        )
+        call_command('run_student_import_jobs', '--once', stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, StudentImportJob.STATUS_RUNNING)
+
+        StudentImportJob.objects.filter(id=job.id).update(started_at=timezone.now() - timedelta(hours=1))
+        call_command('run_student_import_jobs', '--once', stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, StudentImportJob.STATUS_COMPLETED)
+        self.assertEqual(job.created_count, 5)
+
+    def test_progress_is_saved_every_batch(self):
+        self._post_csv([f'J{i:03d},Job Student {i}' for i in range(5)])
+        saved = []
+        save = StudentImportJob.save
+
+        def record_progress(job, *args, **kwargs):
+            saved.append((job.validated_rows, job.created_count))
+            return save(job, *args, **kwargs)
+
+        with mock.patch.object(student_imports, 'BATCH_SIZE', 2), \
+                mock.patch.object(StudentImportJob, 'save', record_progress):
+            call_command('run_student_import_jobs', '--once', stdout=StringIO())
+
+        # チェック済み行数・新規作成数が2行ずつ記録され、最後に完了が記録される
+        self.assertEqual(saved, [(2, 0), (4, 0), (5, 0), (5, 2), (5, 4), (5, 5), (5, 5)])
+        self.assertEqual(StudentImportJob.objects.get().status, StudentImportJob.STATUS_COMPLETED)
+
+    def test_failed_batch_removes_students_created_by_earlier_batches(self):
+        self._post_csv([f'J{i:03d},Job Student {i}' for i in range(5)])
+        create = student_imports.bulk_create_students
+        calls = []
+
+        def fail_second_batch(rows):
+            calls.append(rows)
+            if len(calls) == 2:
+                raise IntegrityError
+            return create(rows)
+
+        with mock.patch.object(student_imports, 'BATCH_SIZE', 2), \
+                mock.patch.object(student_imports, 'bulk_create_students', fail_second_batch):
+            call_command('run_student_import_jobs', '--once', stdout=StringIO())
+
+        job = StudentImportJob.objects.get()
+        self.assertEqual((job.status, job.created_count), (StudentImportJob.STATUS_FAILED, 0))
+        self.assertFalse(CustomUser.objects.filter(role='student').exists())
+
+    def test_class_csv_duplicate_message_is_unchanged(self):
+        self._post_csv(['J001,Job One', 'J002,Job Two', 'J003,Job Three', 'J001,Duplicate'])
+
+        call_command('run_student_import_jobs', '--once', stdout=StringIO())
+
+        self.assertEqual(
+            StudentImportJob.objects.get().errors,
+            ['行4: 学生番号 "J001" が入力内で重複しています（行1）'],
+        )
+
+    def test_job_with_errors_imports_nothing(self):
+        self._post_csv(['J001,Job One', 'J002,Job Two', 'J003', 'J001,Duplicate'])
+
+        call_command('run_student_import_jobs', '--once', stdout=StringIO())
+
+        job = StudentImportJob.objects.get()
+        self.assertEqual(job.status, StudentImportJob.STATUS_FAILED)
+        self.assertEqual(job.failed_count, 2)
+        self.assertEqual(job.errors[0], '行3: 形式が正しくありません - J003')
+        self.assertFalse(CustomUser.objects.filter(role='student').exists())
+
+    def test_small_import_runs_in_request(self):
+        response = self._post_csv(['J001,Job One', 'J002,Job Two'])
+
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(StudentImportJob.objects.exists())
+        self.assertEqual(CustomUser.objects.filter(role='student').count(), 2)
+
+    def test_other_teachers_cannot_see_job(self):
+        self._post_csv([f'J{i:03d},Job Student {i}' for i in range(5)])
+        job = StudentImportJob.objects.get()
+        CustomUser.objects.create_user(
+            email='other-teacher@example.com', full_name='Other', password='password123', role='teacher'
+        )
+        self.client.login(email='other-teacher@example.com', password='password123')
+
+        response = self.client.get(reverse('school_management:student_import_job_status', args=[job.id]))
+
+        self.assertEqual(response.status_code, 404)
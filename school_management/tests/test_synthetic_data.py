@@ -0,0 +1,74 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+
+from school_management.benchmarks import run_benchmarks
+from school_management.models import (
+    ClassRoom, CustomUser, GroupMember, GroupVoteTally, LessonSession, PeerEvaluation,
+    QRCodeScan, StudentClassPoints, StudentSessionScore,
+)
+from school_management.synthetic_data import delete_synthetic_classroom, generate_synthetic_classroom
+
+
+class SyntheticDataTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_generates_classroom_with_grade_data(self):
+        classroom = generate_synthetic_classroom(10, session_count=3, group_size=4, seed=1)
+
+        self.assertEqual(classroom.students.count(), 10)
+        sessions = LessonSession.objects.filter(classroom=classroom)
+        self.assertEqual(sessions.count(), 3)
+        # 全学生がどの授業回でもいずれかのグループに所属する（端数は最後のグループに入る）
+        self.assertEqual(GroupMember.objects.filter(group__lesson_session__in=sessions).count(), 30)
+        self.assertTrue(PeerEvaluation.objects.filter(lesson_session__in=sessions).exists())
+        self.assertTrue(GroupVoteTally.objects.filter(lesson_session__in=sessions).exists())
+        self.assertTrue(QRCodeScan.objects.filter(lesson_session__in=sessions).exists())
+
+        # シグナルを経由しない集計値も作り直されている
+        self.assertEqual(StudentSessionScore.objects.filter(classroom=classroom).count(), 30)
+        self.assertTrue(
+            StudentClassPoints.objects.filter(classroom=classroom, points__gt=0).exists()
+        )
+
+    def test_same_seed_generates_same_structure(self):
+        def structure(label):
+            classroom = generate_synthetic_classroom(8, session_count=2, seed=3, label=label)
+            student_numbers = dict(classroom.students.values_list('id', 'student_number'))
+            return sorted(
+                (
+                    member.group.lesson_session.session_number,
+                    member.group.group_number,
+                    student_numbers[member.student_id],
+                )
+                for member in GroupMember.objects.filter(
+                    group__lesson_session__classroom=classroom
+                ).select_related('group__lesson_session')
+            )
+
+        first = structure('bench-a')
+        delete_synthetic_classroom('bench-a')
+        self.assertFalse(ClassRoom.objects.filter(class_name='bench-a').exists())
+        self.assertFalse(CustomUser.objects.filter(email__startswith='bench-a-').exists())
+        self.assertEqual(structure('bench-b'), first)
+
+    def test_benchmark_reports_hot_paths_and_rolls_back(self):
+        result = run_benchmarks(sizes=[6], session_count=2, repeat=1, explain=True)
+
+        paths = result['results']['6']
+        for name in (
+            'class_points', 'class_evaluation', 'peer_evaluation_results',
+            'close_peer_evaluation', 'signal_cascade',
+        ):
+            with self.subTest(path=name):
+                self.assertEqual(set(paths[name]), {'wall_ms', 'db_ms', 'queries', 'peak_kb'})
+                self.assertGreater(paths[name]['queries'], 0)
+        self.assertLess(paths['class_evaluation_cached']['queries'], paths['class_evaluation']['queries'])
+        self.assertEqual(result['meta']['sessions'], 2)
+        plans = result['explain']['6']
+        self.assertIn('quiz_totals_by_class', plans)
+        if connection.vendor == 'sqlite':
+            # QRポイントの再集計は学生のQRコードから複合インデックスで引く
+            self.assertIn('qrscan_code_session_column', plans['qr_scan_total'])
+        self.assertFalse(ClassRoom.objects.exists())
@@ -0,0 +1,147 @@
+import uuid
+from datetime import date
+
+from django.test import TestCase
+from django.urls import reverse
+
+from school_management.grade_cache import classroom_grade_version
+from school_management.grade_engine import compute_group_vote_points
+from school_management.scoring import build_group_vote_point_map
+from school_management.models import (
+    ClassRoom, CustomUser, Group, GroupMember, GroupVoteTally, LessonSession,
+    PeerEvaluation, PeerEvaluationSettings, StudentClassPoints,
+)
+from school_management.vote_tally import finalize_group_vote_tallies
+
+
+class GroupVoteTallyTest(TestCase):
+    def setUp(self):
+        self.classroom = ClassRoom.objects.create(class_name='Tally Class', year=2026, semester='first')
+        self.session = LessonSession.objects.create(
+            classroom=self.classroom, session_number=1, date=date(2026, 4, 1)
+        )
+        self.settings = PeerEvaluationSettings.objects.create(
+            lesson_session=self.session,
+            enable_group_evaluation=True,
+            group_scores=[5, 3],
+            group_evaluation_method=PeerEvaluationSettings.EvaluationMethod.AGGREGATE,
+        )
+        self.groups = [
+            Group.objects.create(lesson_session=self.session, group_number=i + 1) for i in range(3)
+        ]
+        self.students = []
+        for i, group in enumerate(self.groups):
+            student = CustomUser.objects.create_user(
+                email=f'tally-student{i}@example.com',
+                full_name=f'Tally Student {i}',
+                role='student',
+                student_number=f'TA{i:03d}',
+            )
+            GroupMember.objects.create(group=group, student=student)
+            self.students.append(student)
+
+    def _vote(self, *ranked_groups):
+        return PeerEvaluation.objects.create(
+            lesson_session=self.session,
+            evaluator_token=uuid.uuid4(),
+            response_json={'other_group_eval': [
+                {'rank': rank, 'group_id': group.id} for rank, group in enumerate(ranked_groups, start=1)
+            ]},
+        )
+
+    def _tally(self, group):
+        return GroupVoteTally.objects.get(group=group)
+
+    def test_votes_are_counted_incrementally(self):
+        self._vote(self.groups[0], self.groups[1])
+        evaluation = self._vote(self.groups[1], self.groups[0])
+
+        self.assertEqual(self._tally(self.groups[0]).get_rank_counts(), {1: 1, 2: 1})
+        self.assertEqual(self._tally(self.groups[1]).get_rank_counts(), {1: 1, 2: 1})
+        # G=3: 1位2点 + 2位1点
+        self.assertEqual(self._tally(self.groups[0]).internal_points, 3)
+        self.assertEqual(self._tally(self.groups[2]).get_rank_counts(), {})
+
+        evaluation.delete()
+        self.assertEqual(self._tally(self.groups[1]).get_rank_counts(), {2: 1})
+        self.assertEqual(self._tally(self.groups[1]).internal_points, 1)
+
+    def test_edited_response_replaces_previous_votes(self):
+        evaluation = self._vote(self.groups[0])
+        evaluation.response_json = {'other_group_eval': [{'rank': 1, 'group_id': self.groups[2].id}]}
+        evaluation.save()
+
+        self.assertEqual(self._tally(self.groups[0]).get_rank_counts(), {})
+        self.assertEqual(self._tally(self.groups[2]).get_rank_counts(), {1: 1})
+
+    def test_close_finalizes_awarded_points(self):
+        responses = []
+        for ranked in ((0, 1), (0, 2), (1, 0)):
+            evaluation = self._vote(*(self.groups[i] for i in ranked))
+            responses.append(evaluation.response_json)
+        self.assertFalse(self._tally(self.groups[0]).is_finalized)
+
+        self.session.peer_evaluation_status = LessonSession.PeerEvaluationStatus.CLOSED
+        self.session.save()
+        finalize_group_vote_tallies(self.session.id)
+
+        expected = build_group_vote_point_map(
+            [group.id for group in self.groups],
+            responses,
+            PeerEvaluationSettings.EvaluationMethod.AGGREGATE,
+            [5, 3],
+            LessonSession.PeerEvaluationStatus.CLOSED,
+        )
+        for group in self.groups:
+            tally = self._tally(group)
+            self.assertTrue(tally.is_finalized)
+            self.assertEqual(tally.awarded_points, expected[group.id])
+        self.assertEqual(
+            compute_group_vote_points(self.classroom),
+            {
+                student.id: expected[group.id]
+                for student, group in zip(self.students, self.groups)
+                if expected[group.id] > 0
+            },
+        )
+
+    def test_admin_close_action_recalculates_points_and_cache(self):
+        for ranked in ((0, 1), (0, 2)):
+            self._vote(*(self.groups[i] for i in ranked))
+        points = StudentClassPoints.objects.create(student=self.students[0], classroom=self.classroom)
+        version = classroom_grade_version(self.classroom.id)
+        admin_user = CustomUser.objects.create_superuser(
+            email='tally-admin@example.com', full_name='Tally Admin', password='pass'
+        )
+        self.client.force_login(admin_user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('admin:school_management_lessonsession_changelist'), {
+                'action': 'close_peer_evaluations',
+                '_selected_action': [self.session.id],
+            })
+
+        # update() で締め切っても、確定した投票ポイントが総合ポイントと成績画面のキャッシュに反映される
+        self.assertTrue(self._tally(self.groups[0]).is_finalized)
+        points.refresh_from_db()
+        # 合計ポイントは活動点の2倍
+        self.assertEqual(points.points, self._tally(self.groups[0]).awarded_points * 2)
+        self.assertNotEqual(classroom_grade_version(self.classroom.id), version)
+
+    def test_direct_mode_is_computed_from_counts_before_close(self):
+        self.settings.group_evaluation_method = PeerEvaluationSettings.EvaluationMethod.DIRECT
+        self.settings.save()
+        self._vote(self.groups[0], self.groups[1])
+        self._vote(self.groups[0], self.groups[2])
+
+        self.assertEqual(
+            compute_group_vote_points(self.classroom),
+            {self.students[0].id: 10, self.students[1].id: 3, self.students[2].id: 3},
+        )
+
+    def test_deleting_session_removes_tallies(self):
+        self._vote(self.groups[0], self.groups[1])
+
+        self.session.delete()
+
+        self.assertFalse(GroupVoteTally.objects.exists())
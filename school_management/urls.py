@@ -25,6 +25,8 @@ urlpatterns = [
     path('dashboard/', dashboard.dashboard_view, name='dashboard'),
     path('student-dashboard/', dashboard.student_dashboard, name='student_dashboard'),
     path('admin-panel/teachers/', dashboard.admin_teacher_management, name='admin_teacher_management'),
+    path('admin-panel/department-report/', grades.department_report_view, name='department_report'),
+    path('admin-panel/department-report/export/', grades.department_report_export, name='department_report_export'),
 
     # --- クラス管理 ---
     path('classes/', classes.class_list_view, name='class_list'),
@@ -84,6 +86,8 @@ urlpatterns = [
     path('students/bulk-delete/execute/', students.student_bulk_delete_execute, name='student_bulk_delete_execute'),
     path('students/history/', students.student_link_history_view, name='student_link_history'),
     path('students/history/<int:student_id>/relink/', students.student_relink_view, name='student_relink'),
+    path('students/import-jobs/<int:job_id>/', students.student_import_job, name='student_import_job'),
+    path('students/import-jobs/<int:job_id>/status/', students.student_import_job_status, name='student_import_job_status'),
     path('students/<str:student_number>/', students.student_detail_view, name='student_detail'),
     path('students/<str:student_number>/delete/confirm/', students.student_delete_confirm_view, name='student_delete_confirm'),
     path('students/<str:student_number>/delete/execute/', students.student_delete_execute_view, name='student_delete_execute'),
@@ -131,6 +135,8 @@ urlpatterns = [
     path('qr-codes/', attendance.qr_code_list, name='qr_code_list'),
     path('qr-codes/student/<int:student_id>/', attendance.qr_code_detail, name='qr_code_detail'),
     path('qr-codes/scan/<uuid:qr_code_id>/', attendance.qr_code_scan, name='qr_code_scan'),
+    path('qr-codes/scans/api/', attendance.qr_scan_api, name='qr_scan_api'),
+    path('qr-codes/image/<uuid:qr_code_id>.png', attendance.qr_code_image, name='qr_code_image'),
     path('qr-codes/history/<int:scan_id>/delete/', attendance.delete_qr_scan, name='delete_qr_scan'),
     path('qr-codes/student/<int:student_id>/history/bulk-delete/', attendance.bulk_delete_qr_scans, name='bulk_delete_qr_scans'),
     path('my-qr-code/', attendance.student_qr_code_view, name='student_qr_code'),
@@ -1,3 +1,3 @@
-from .manage import qr_code_list, class_qr_codes, qr_code_detail, delete_qr_scan, bulk_delete_qr_scans
-from .scan import qr_code_scan
+from .manage import qr_code_list, class_qr_codes, qr_code_image, qr_code_detail, delete_qr_scan, bulk_delete_qr_scans
+from .scan import qr_code_scan, qr_scan_api
 from .student import student_qr_code_view
\ No newline at end of file
@@ -3,10 +3,12 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.urls import reverse
 from django.db import models
-from django.views.decorators.http import require_POST
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_POST
 # モデルのインポート
 from ...models import ClassRoom, Student, StudentQRCode, StudentClassPoints, LessonSession, QRCodeScan, StudentColumnScore
-from .utils import generate_qr_code_image
+from .utils import QR_IMAGE_CACHE_TIMEOUT, generate_qr_code_image, get_qr_code_png, qr_code_etag
 
 @login_required
 def qr_code_list(request):
@@ -41,48 +43,125 @@ def class_qr_codes(request, class_id):
         messages.error(request, '権限がありません。')
         return redirect('school_management:dashboard')
     
-    students = classroom.students.all().order_by('student_number')
+    students = list(classroom.students.all().order_by('student_number'))
     session_id = request.GET.get('session_id')
     lesson_session = None
     
     if session_id:
         lesson_session = get_object_or_404(LessonSession, id=session_id)
     
+    # N+1対策: QRコードを一括取得し、未発行の学生分だけまとめて作成
+    student_qr_map = {}
+    for qr_code in StudentQRCode.objects.filter(student__in=students).order_by('id'):
+        student_qr_map.setdefault(qr_code.student_id, qr_code)
+    missing = [
+        StudentQRCode(student=student, is_active=True)
+        for student in students if student.id not in student_qr_map
+    ]
+    if missing:
+        for qr_code in StudentQRCode.objects.bulk_create(missing):
+            student_qr_map[qr_code.student_id] = qr_code
+
+    # N+1対策: スキャン数・獲得ポイントをQRコードごとにまとめて集計
+    scans_query = QRCodeScan.objects.filter(
+        qr_code__in=student_qr_map.values(),
+        scanned_by=request.user,
+        lesson_session__classroom=classroom,
+    )
+    if session_id:
+        scans_query = scans_query.filter(lesson_session_id=session_id)
+    scan_stats = {
+        row['qr_code_id']: row
+        for row in scans_query.values('qr_code_id').annotate(
+            scan_count=models.Count('id'),
+            scan_points=models.Sum('points_awarded'),
+        )
+    }
+
+    class_points_map = dict(
+        StudentClassPoints.objects.filter(classroom=classroom, student__in=students).values_list('student_id', 'points')
+    )
+
+    params = f'?class_id={class_id}'
+    if session_id:
+        params += f'&session_id={session_id}'
+
     qr_codes = []
     for student in students:
-        qr_code, created = StudentQRCode.objects.get_or_create(student=student, defaults={'is_active': True})
+        qr_code = student_qr_map[student.id]
+        stats = scan_stats.get(qr_code.id, {})
         
-        scans_query = qr_code.scans.filter(scanned_by=request.user, lesson_session__classroom=classroom)
-        if session_id:
-            scans_query = scans_query.filter(lesson_session_id=session_id)
-            
-        scan_count = scans_query.count()
-        scan_points = scans_query.aggregate(total=models.Sum('points_awarded'))['total'] or 0
-        
-        base_url = reverse('school_management:qr_code_scan', kwargs={'qr_code_id': qr_code.qr_code_id})
-        params = f'?class_id={class_id}'
-        if session_id:
-            params += f'&session_id={session_id}'
-            
-        scan_url = request.build_absolute_uri(base_url) + params
-        
-        try:
-            class_points = StudentClassPoints.objects.get(student=student, classroom=classroom).points
-        except StudentClassPoints.DoesNotExist:
-            class_points = 0
+        # QRコード画像はキャッシュ可能な専用URLから配信する（ページにbase64で埋め込まない）
+        image_url = reverse('school_management:qr_code_image', kwargs={'qr_code_id': qr_code.qr_code_id}) + params
         
         qr_codes.append({
             'student': student,
             'qr_code': qr_code,
-            'scan_count': scan_count,
-            'scan_points': scan_points,
-            'qr_image': generate_qr_code_image(scan_url),
-            'class_points': class_points
+            'scan_count': stats.get('scan_count', 0),
+            'scan_points': stats.get('scan_points') or 0,
+            'qr_image': image_url,
+            'class_points': class_points_map.get(student.id, 0)
         })
     
     context = {'classroom': classroom, 'qr_codes': qr_codes, 'lesson_session': lesson_session}
     return render(request, 'school_management/class_qr_codes.html', context)
 
+
+def _qr_code_image_scan_url(request, qr_code_id):
+    """QRコード画像に埋め込むスキャン用URLをクエリパラメータから組み立てる
+
+    他のQRコード画面と同じく、担当クラスの在籍学生のQRコードに限る（授業回もそのクラスのものに限る）。
+    ETag の計算と本体の両方から呼ばれるため、結果はリクエストに保持して確認のクエリを1回にする。
+    """
+    cached = getattr(request, '_qr_code_image_scan_url', None)
+    if cached is not None:
+        return cached
+
+    class_id = request.GET.get('class_id', '')
+    session_id = request.GET.get('session_id', '')
+    if not class_id.isdigit() or (session_id and not session_id.isdigit()):
+        raise Http404
+    lookups = {
+        'qr_code_id': qr_code_id,
+        'student__classroom_enrollments__classroom_id': class_id,
+        'student__classroom_enrollments__classroom__teachers': request.user,
+        'student__classroom_enrollments__is_active': True,
+    }
+    if session_id:
+        lookups['student__classroom_enrollments__classroom__lessonsession__id'] = session_id
+    # 在籍・担当・授業回の条件が同じ在籍行に掛かるよう、1回の filter() で指定する
+    owned = StudentQRCode.objects.filter(**lookups)
+    if not owned.exists():
+        raise Http404
+    params = f'?class_id={class_id}'
+    if session_id:
+        params += f'&session_id={session_id}'
+    base_url = reverse('school_management:qr_code_scan', kwargs={'qr_code_id': qr_code_id})
+    request._qr_code_image_scan_url = request.build_absolute_uri(base_url) + params
+    return request._qr_code_image_scan_url
+
+
+def _qr_code_image_etag(request, qr_code_id):
+    if not request.user.is_authenticated or not request.user.is_teacher:
+        return None
+    return qr_code_etag(_qr_code_image_scan_url(request, qr_code_id))
+
+
+@login_required
+@condition(etag_func=_qr_code_image_etag)
+def qr_code_image(request, qr_code_id):
+    """QRコード画像（PNG）の配信
+
+    画像は埋め込むURLだけで決まるため、ETagで再検証し、描画結果はキャッシュから返す。
+    """
+    if not request.user.is_teacher:
+        return HttpResponseForbidden()
+
+    png = get_qr_code_png(_qr_code_image_scan_url(request, qr_code_id))
+    response = HttpResponse(png, content_type='image/png')
+    patch_cache_control(response, private=True, max_age=QR_IMAGE_CACHE_TIMEOUT)
+    return response
+
 @login_required
 def qr_code_detail(request, student_id):
     """学生のQRコード詳細表示"""
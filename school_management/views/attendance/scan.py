@@ -1,11 +1,15 @@
 from datetime import date
+import json
 import logging
+import uuid
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
 from django.http import JsonResponse
-from ...models import ClassRoom, StudentQRCode, QRCodeScan, LessonSession, PointColumn, StudentColumnScore, Quiz, QuizScore
+from django.views.decorators.http import require_POST
+from ...models import ClassRoom, StudentQRCode, LessonSession, PointColumn, Quiz, QuizScore
+from ...qr_scans import MAX_SCANS_PER_REQUEST, record_qr_scans
 
 logger = logging.getLogger(__name__)
 
@@ -71,45 +75,27 @@ def qr_code_scan(request, qr_code_id):
                 messages.error(request, '無効な授業回です。')
                 return redirect('school_management:qr_code_scan', qr_code_id=qr_code_id)
 
-            added_target = ""
-
-            if point_type == 'qr_action':
-                scan = QRCodeScan.objects.create(
-                    qr_code=qr_code, 
-                    scanned_by=request.user,
-                    lesson_session=selected_session
-                )
-                if scan.points_awarded != points_to_add:
-                    scan.points_awarded = points_to_add
-                    scan.save(update_fields=['points_awarded'])
-                
-                added_target = "小テスト"
-                messages.success(request, f'{qr_code.student.full_name}さんの「小テスト」に{points_to_add}ptを追加しました。')
-            elif point_type.startswith('custom_'):
-                column_id = point_type.split('_')[1]
-                column = get_object_or_404(PointColumn, id=column_id, classroom=target_classroom)
-                
-                # 独自評価項目へのポイント付与もスキャン履歴として保存する
-                scan = QRCodeScan.objects.create(
-                    qr_code=qr_code, 
-                    scanned_by=request.user,
-                    lesson_session=selected_session,
-                    point_column=column,
-                    points_awarded=points_to_add
-                )
-                
-                score_obj, created = StudentColumnScore.objects.get_or_create(
-                    student=qr_code.student,
-                    column=column,
-                    defaults={'score': 0}
-                )
-                score_obj.score += points_to_add
-                score_obj.save()
+            # 一括登録APIと同じ経路で記録する（画面表示時に発行したスキャンIDで、再送信・二重送信を1回に数える）
+            result = record_qr_scans(request.user, [{
+                'qr_code_id': qr_code.qr_code_id,
+                'session_id': selected_session.id,
+                'point_type': point_type,
+                'points': points_to_add,
+                'client_scan_id': request.POST.get('client_scan_id'),
+            }])[0]
+            if result['status'] == 'error':
+                messages.error(request, result['error'])
+                return redirect('school_management:qr_code_scan', qr_code_id=qr_code_id)
+
+            if point_type.startswith('custom_'):
+                column = PointColumn.objects.get(id=point_type.split('_', 1)[1])
                 added_target = f"独自項目: {column.column_title}"
-                messages.success(request, f'{qr_code.student.full_name}さんの「{column.column_title}」に{points_to_add}ptを追加しました。')
-                
-            qr_code.last_used_at = timezone.now()
-            qr_code.save()
+            else:
+                added_target = "小テスト"
+            if result['status'] == 'duplicate':
+                messages.info(request, f'{qr_code.student.full_name}さんのこのスキャンは記録済みです。')
+            else:
+                messages.success(request, f'{qr_code.student.full_name}さんの「{added_target}」に{points_to_add}ptを追加しました。')
 
             context = {
                 'success': True,
@@ -134,10 +120,49 @@ def qr_code_scan(request, qr_code_id):
             'sessions': sessions,
             'custom_columns': custom_columns,
             'default_points': default_points,
+            'client_scan_id': uuid.uuid4(),
         }
         return render(request, 'school_management/qr_code_scan.html', context)
         
     except Exception as e:
         logger.error(f"QRコードスキャンエラー: {e}", exc_info=True)
         context = {'qr_code': None, 'error_message': f'QRコードのスキャンに失敗しました: {str(e)}'}
-        return render(request, 'school_management/qr_code_scan.html', context)
\ No newline at end of file
+        return render(request, 'school_management/qr_code_scan.html', context)
+
+
+@login_required
+@require_POST
+def qr_scan_api(request):
+    """QRスキャンの一括登録API（先生専用・JSON）
+
+    リクエスト: {"scans": [{"qr_code_id", "session_id", "point_type", "points", "client_scan_id"}, ...]}
+    （1件だけの場合はスキャンのオブジェクトをそのまま送ってもよい）
+    教室を回りながら連続でスキャンできるよう、画面を返さずに結果だけを返す。
+    端末に保存したスキャンの再送に備え、client_scan_id が記録済みのスキャンは加算せず duplicate を返す。
+    """
+    if not request.user.is_teacher:
+        return JsonResponse({'success': False, 'message': 'QRコードのスキャンは先生のみ可能です。'}, status=403)
+
+    try:
+        data = json.loads(request.body)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return JsonResponse({'success': False, 'message': 'JSONの形式が正しくありません。'}, status=400)
+
+    entries = data.get('scans', [data]) if isinstance(data, dict) else data
+    if not isinstance(entries, list) or not entries:
+        return JsonResponse({'success': False, 'message': 'スキャンデータがありません。'}, status=400)
+    if len(entries) > MAX_SCANS_PER_REQUEST:
+        return JsonResponse(
+            {'success': False, 'message': f'一度に送信できるのは{MAX_SCANS_PER_REQUEST}件までです。'},
+            status=400,
+        )
+
+    results = record_qr_scans(request.user, entries)
+    created = sum(1 for result in results if result['status'] == 'ok')
+    duplicates = sum(1 for result in results if result['status'] == 'duplicate')
+    return JsonResponse({
+        'success': created + duplicates == len(results),
+        'created': created,
+        'duplicates': duplicates,
+        'results': results,
+    })
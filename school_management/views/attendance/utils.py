@@ -1,26 +1,56 @@
 import io
 import base64
+import hashlib
 import qrcode
+from django.core.cache import cache
+
+# QRコード画像のキャッシュ保持期間（秒）。同じURLからは常に同じ画像が生成される
+QR_IMAGE_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+
+def qr_code_etag(url):
+    """QRコード画像のETag（埋め込むURLから決まるため、描画せずに算出できる）"""
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+def render_qr_code_png(url):
+    """QRコードをPNG画像（バイト列）として描画する"""
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(url)
+    qr.make(fit=True)
+
+    img = qr.make_image(fill_color="black", back_color="white")
+
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def get_qr_code_png(url):
+    """QRコードのPNG画像をキャッシュ経由で取得する
+
+    キャッシュキーは埋め込むURL（QRコードID・クラス・授業回のパラメータを含む）から作るため、
+    同じ印刷シートを何度開いても描画は初回だけになる。
+    """
+    cache_key = f'qr_png:{qr_code_etag(url)}'
+    png = cache.get(cache_key)
+    if png is None:
+        png = render_qr_code_png(url)
+        cache.set(cache_key, png, QR_IMAGE_CACHE_TIMEOUT)
+    return png
+
 
 def generate_qr_code_image(url):
     """QRコード画像を生成する共通関数"""
     try:
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(url)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        buffer = io.BytesIO()
-        img.save(buffer, format='PNG')
-        img_str = base64.b64encode(buffer.getvalue()).decode()
-        
+        img_str = base64.b64encode(get_qr_code_png(url)).decode()
+
         return f"data:image/png;base64,{img_str}"
     except Exception as e:
         print(f"QRコード生成エラー: {e}")
-        return None
\ No newline at end of file
+        return None
@@ -4,6 +4,7 @@ from django.views.decorators.http import require_POST
 from django.contrib import messages
 from django.urls import reverse
 from ...models import ClassRoom, LessonSession, PeerEvaluation, StudentClassPoints, PointColumn
+from ...request_metrics import set_request_rows
 
 @login_required
 def class_detail_view(request, class_id):
@@ -27,6 +28,8 @@ def class_detail_view(request, class_id):
     # 動的に属性を付与（テンプレートで student.class_point として参照できるようにする）
     for s in students:
         setattr(s, 'class_point', scp_map.get(s.id))
+    # テンプレートで学生ごとにクエリが発生するため、クエリ数の上限は学生数に比例させる
+    set_request_rows(request, len(students))
 
     #  追加：このクラスの独自の評価項目（列）を取得
     point_columns = classroom.point_columns.all().order_by('created_at')
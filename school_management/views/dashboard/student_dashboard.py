@@ -1,51 +1,82 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from ...models import StudentLessonPoints, StudentClassPoints, ClassRoom, LessonSession
+from django.core.cache import cache
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from ...grade_cache import STUDENT_DASHBOARD_TIMEOUT, student_dashboard_cache_key
+from ...models import StudentLessonPoints, StudentClassPoints, ClassRoom, ClassRoomEnrollment, LessonSession
+
+# 授業ポイント履歴に表示する件数（新しい順）
+LESSON_HISTORY_LIMIT = 20
+
+
+def _build_student_summary(student):
+    """受講クラス（総合ポイント・在籍人数付き）と授業ポイント履歴を集計する"""
+    class_points = StudentClassPoints.objects.filter(
+        student=student, classroom=OuterRef('pk')
+    ).values('points')[:1]
+    student_counts = ClassRoomEnrollment.objects.filter(
+        classroom=OuterRef('pk'), is_active=True
+    ).values('classroom').annotate(count=Count('id')).values('count')[:1]
+
+    # クラスごとの総合ポイント・在籍人数は1回のクエリでまとめて取得する
+    classrooms = list(
+        ClassRoom.objects.filter(
+            enrollments__student=student,
+            enrollments__is_active=True,
+        ).annotate(
+            student_points=Coalesce(Subquery(class_points, output_field=IntegerField()), Value(0)),
+            student_count=Coalesce(Subquery(student_counts, output_field=IntegerField()), Value(0)),
+        ).prefetch_related('teachers').order_by('id')
+    )
+
+    lesson_points = list(
+        StudentLessonPoints.objects.filter(student=student)
+        .select_related('lesson_session__classroom')
+        .order_by('-lesson_session__date', '-id')[:LESSON_HISTORY_LIMIT]
+    )
+    return {
+        'classrooms': classrooms,
+        'lesson_points': lesson_points,
+    }
+
 
 @login_required
 def student_dashboard(request):
-    # 学生が所属するクラスを取得
-    student_classrooms = ClassRoom.objects.filter(
-        enrollments__student=request.user,
-        enrollments__is_active=True,
-    )
-    
+    # 受講クラス・総合ポイント・授業ポイント履歴は成績が変わるまでキャッシュを使う
+    cache_key = student_dashboard_cache_key(request.user)
+    summary = cache.get(cache_key)
+    if summary is None:
+        summary = _build_student_summary(request.user)
+        cache.set(cache_key, summary, STUDENT_DASHBOARD_TIMEOUT)
+
+    student_classrooms = summary['classrooms']
+    classroom_ids = [classroom.id for classroom in student_classrooms]
+
     # 最近の授業回
     recent_sessions = LessonSession.objects.filter(
-        classroom__in=student_classrooms
-    ).order_by('-date')[:10]
-    
+        classroom_id__in=classroom_ids
+    ).select_related('classroom').order_by('-date')[:10]
+
     # ピア評価が必要な授業回
     pending_evaluations = LessonSession.objects.filter(
-        classroom__in=student_classrooms,
+        classroom_id__in=classroom_ids,
         has_peer_evaluation=True
-    ).order_by('-date')
-    
-    # 学生の授業ごとのポイントを取得
-    lesson_points = StudentLessonPoints.objects.filter(
-        student=request.user
-    ).select_related('lesson_session').order_by('-lesson_session__date')
-    
-    # クラスごとのポイントを取得
-    class_points_list = []
-    for classroom in student_classrooms:
-        try:
-            class_points_obj = StudentClassPoints.objects.get(student=request.user, classroom=classroom)
-            class_points = class_points_obj.points
-        except StudentClassPoints.DoesNotExist:
-            class_points = 0
-        
-        class_points_list.append({
-            'classroom': classroom,
-            'points': class_points
-        })
-    
+    ).select_related('classroom').order_by('-date')
+
+    # クラスごとのポイント
+    class_points_list = [
+        {'classroom': classroom, 'points': classroom.student_points}
+        for classroom in student_classrooms
+    ]
+
     context = {
         'student_classrooms': student_classrooms,
         'recent_sessions': recent_sessions,
         'pending_evaluations': pending_evaluations,
-        'total_classes': student_classrooms.count(),
-        'lesson_points': lesson_points,
+        'total_classes': len(student_classrooms),
+        'lesson_points': summary['lesson_points'],
+        'lesson_history_limit': LESSON_HISTORY_LIMIT,
         'class_points_list': class_points_list,
     }
     return render(request, 'school_management/student_dashboard.html', context)
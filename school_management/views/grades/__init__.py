@@ -1,2 +1,3 @@
 from .class_points import class_points_view, update_attendance_rate, update_class_settings
-from .class_evaluation import class_evaluation_view, class_evaluation_csv_export, add_custom_column_points
\ No newline at end of file
+from .class_evaluation import class_evaluation_view, class_evaluation_csv_export, add_custom_column_points
+from .department_report import department_report_view, department_report_export
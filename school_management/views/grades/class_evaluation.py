@@ -1,101 +1,60 @@
 from django.shortcuts import render, get_object_or_404
 import logging
 from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
 from collections import defaultdict
 from django.db.models import Sum
 
 import json
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
-import statistics
 
 # 必要なモデルをインポート
 from ...models import (
-    ClassRoom, LessonSession, Student, StudentLessonPoints, QuizScore, Group,
-    GroupMember, StudentClassPoints, PeerEvaluation, ContributionEvaluation,
+    ClassRoom, ClassRoomEnrollment, LessonSession, Student, StudentClassPoints,
     SelfEvaluation, PointColumn, StudentColumnScore, PeerEvaluationSettings,
-    QRCodeScan, StudentQRCode
+    QRCodeScan, StudentQRCode, StudentSessionScore, PeerEvaluationSimulation
 )
 
+from ...grade_analytics import cutoff_statistics, curve_score
+from ...grade_cache import CLASS_GRADES_TIMEOUT, class_grades_cache_key
+from ...scoring import simulate_class_peer_points
+from ...session_scores import ensure_session_scores, ensure_session_scores_many
+
 logger = logging.getLogger(__name__)
 
 
-def _safe_int(value):
-    try:
-        return int(value)
-    except (TypeError, ValueError):
-        return None
-
-
-def _build_group_vote_point_map(session_groups, session_peer_evals, pe_settings, peer_status):
-    group_point_map = {group_obj.id: 0 for group_obj in session_groups}
-    if not pe_settings or not pe_settings.enable_group_evaluation:
-        return group_point_map
-
-    score_points = pe_settings.group_scores or []
-    if not score_points:
-        return group_point_map
-
-    if pe_settings.group_evaluation_method == PeerEvaluationSettings.EvaluationMethod.AGGREGATE:
-        if peer_status != LessonSession.PeerEvaluationStatus.CLOSED:
-            return group_point_map
-
-        group_internal_points = {group_obj.id: 0 for group_obj in session_groups}
-        group_count = len(session_groups)
-        for pe in session_peer_evals:
-            response = pe.response_json or {}
-            for entry in response.get('other_group_eval', []):
-                gid = _safe_int(entry.get('group_id'))
-                rank = _safe_int(entry.get('rank'))
-                if gid in group_internal_points and rank and 1 <= rank <= group_count:
-                    group_internal_points[gid] += (group_count - rank)
-
-        sorted_groups = sorted(
-            group_internal_points.items(),
-            key=lambda x: x[1],
-            reverse=True,
-        )
-        current_rank = 0
-        prev_points = None
-        for idx, (gid, internal_points) in enumerate(sorted_groups):
-            if internal_points != prev_points:
-                current_rank = idx
-                prev_points = internal_points
-            if current_rank < len(score_points):
-                group_point_map[gid] = score_points[current_rank]
-        return group_point_map
-
-    for pe in session_peer_evals:
-        response = pe.response_json or {}
-        for entry in response.get('other_group_eval', []):
-            gid = _safe_int(entry.get('group_id'))
-            rank = _safe_int(entry.get('rank'))
-            if gid in group_point_map and rank and 1 <= rank <= len(score_points):
-                group_point_map[gid] += score_points[rank - 1]
-    return group_point_map
-
-
-def _build_class_evaluations(request, classroom):
+def _request_simulation(request, classroom):
+    """(テストモードか, クラスのシミュレーション用点数) を返す
+
+    シミュレーション用点数はテストモードのときだけ読み込む。
+    辞書構造: { session_id: { 'point_mode': ..., student_id: points } }
     """
-    クラスごとの評価一覧（成績表）の計算ロジック
+    test_mode = request.session.get('test_mode', False)
+    if not test_mode:
+        return False, {}
+    return True, PeerEvaluationSimulation.load_class_data(request.user, classroom)
 
-    QR採点、ピア評価、各種小テスト、および教員が独自に追加した
-    評価項目の点数を集計する。画面表示用ビューとCSV出力用ビューの
-    両方から呼び出され、計算結果が食い違わないようにする。
+
+def _load_class_evaluation_facts(classroom, test_mode=False, sim_data_class=None):
     """
-    students = classroom.students.all().order_by('student_number')
+    評価一覧（成績表）の計算に必要なデータをクラス単位でまとめて読み込む
 
-    # テストモードか判定
-    test_mode = request.session.get('test_mode', False)
+    学生×授業回のループ内でクエリを発行しないよう、参照するデータは
+    すべてここで一括取得して辞書にしておく。クエリ数は学生数に依存しない。
+    test_mode・sim_data_class を省略した場合はシミュレーションを含まない正式な成績になる。
+    """
+    students = classroom.students.all().order_by('student_number')
 
-    # セッションからシミュレーション用点数を取得
-    # 辞書構造: { class_id: { session_id: { student_id: points } } }
-    sim_data_class = request.session.get('peer_sim_points', {}).get(str(classroom.id), {})
+    sim_data_class = sim_data_class or {}
     has_simulation = len(sim_data_class) > 0
 
     # 授業回の一覧を取得
-    sessions = LessonSession.objects.filter(classroom=classroom).order_by('session_number')
-    session_ids = list(sessions.values_list('id', flat=True))
+    # ピア評価設定は授業回ごとに参照するため一緒に取得しておく
+    sessions = LessonSession.objects.filter(classroom=classroom).select_related(
+        'peer_evaluation_settings'
+    ).order_by('session_number')
+    session_ids = [session.id for session in sessions]
     
     # 教員が追加した「独自の評価項目（列）」の一覧を取得
     point_columns = classroom.point_columns.all().order_by('created_at')
@@ -103,10 +62,6 @@ def _build_class_evaluations(request, classroom):
     # 評価システム（default: 通常, original: カスタマイズ, goal: 目標管理）
     grading_system = classroom.grading_system
 
-    # N+1対策: 関連データを一括で取得
-    all_peer_evals = PeerEvaluation.objects.filter(lesson_session__in=session_ids)
-    all_groups = list(Group.objects.filter(lesson_session__in=session_ids))
-    
     # N+1対策: StudentClassPointsを一括で取得 (select_relatedで最適化)
     student_ids = [s.id for s in students]
     student_class_points_map = {
@@ -117,31 +72,8 @@ def _build_class_evaluations(request, classroom):
         )
     }
 
-    # AGGREGATEモード用の貢献度スコアを事前集計
-    all_contrib_evals = ContributionEvaluation.objects.filter(
-        peer_evaluation__lesson_session__classroom=classroom
-    ).values(
-        'evaluatee_id', 'peer_evaluation__lesson_session_id'
-    ).annotate(
-        total_contrib=Sum('contribution_score')
-    )
-    student_session_contrib_map = defaultdict(dict)
-    for item in all_contrib_evals:
-        student_id = item['evaluatee_id']
-        session_id = item['peer_evaluation__lesson_session_id']
-        score = item['total_contrib']
-        student_session_contrib_map[student_id][session_id] = score
-
-    # セッションIDをキーにした評価データの辞書を作成
-    session_to_evals_map = defaultdict(list)
-    for pe in all_peer_evals:
-        session_to_evals_map[pe.lesson_session_id].append(pe)
-
-    # セッション単位で不変な「グループ投票ポイント」を先に計算して使い回す
-    session_group_point_maps = {}
+    # 授業回ごとのピア評価設定（シミュレーションの配点計算で使用）
     session_peer_settings = {}
-    # NEW: DIRECTモード用の貢献度スコアを事前集計
-    direct_mode_contrib_scores = defaultdict(lambda: defaultdict(int))
     for session in sessions:
         if not session.has_peer_evaluation:
             session_peer_settings[session.id] = None
@@ -152,31 +84,21 @@ def _build_class_evaluations(request, classroom):
             pe_settings = None
         session_peer_settings[session.id] = pe_settings
 
-        # NEW: DIRECTモードのスコア計算
-        if pe_settings and pe_settings.enable_member_evaluation and pe_settings.evaluation_method == PeerEvaluationSettings.EvaluationMethod.DIRECT:
-            member_scores = pe_settings.member_scores or []
-            if member_scores:
-                evals_in_session = session_to_evals_map.get(session.id, [])
-                for ev in evals_in_session:
-                    response = ev.response_json or {}
-                    for entry in response.get('group_members_eval', []):
-                        member_id = _safe_int(entry.get('member_id'))
-                        rank = _safe_int(entry.get('rank'))
-                        if member_id and rank and 1 <= rank <= len(member_scores):
-                            score = member_scores[rank - 1]
-                            direct_mode_contrib_scores[session.id][member_id] += score
-
-        score_points = (
-            pe_settings.group_scores or []
-        ) if pe_settings and pe_settings.enable_group_evaluation else []
-        if score_points:
-            session_group_point_maps[session.id] = _build_group_vote_point_map(
-                # N+1対策: 事前取得したデータを利用
-                session_groups=[g for g in all_groups if g.lesson_session_id == session.id],
-                session_peer_evals=session_to_evals_map.get(session.id, []),
-                pe_settings=pe_settings,
-                peer_status=session.peer_evaluation_status,
-            )
+    # テストモードのシミュレーション点数は学生×授業回の (貢献度, 投票) にまとめて計算しておく
+    sim_peer_points = {}
+    if test_mode and has_simulation:
+        sim_peer_points = simulate_class_peer_points(sim_data_class, session_peer_settings)
+
+    # 学生×授業回の得点（小テスト・授業内ポイント・貢献度・投票）はスナップショットから1クエリで読む
+    # スナップショット未作成のクラス（移行直後）はここで作成する
+    ensure_session_scores(classroom)
+    session_score_map = {
+        (score.student_id, score.lesson_session_id): score
+        for score in StudentSessionScore.objects.filter(classroom=classroom).only(
+            'student_id', 'lesson_session_id', 'quiz_total', 'quiz_count',
+            'lesson_points', 'contrib', 'vote',
+        )
+    }
 
     # 独自評価項目の授業回別の内訳を一括取得（N+1対策）
     # QRコードスキャン（カメラを使わない手動加点も含む）は授業回に紐づいているため、
@@ -188,9 +110,12 @@ def _build_class_evaluations(request, classroom):
         total=Sum('points_awarded')
     )
     # { session_id: { student_id: { column_id: points } } }
-    session_student_custom_map = defaultdict(lambda: defaultdict(dict))
+    # 評価一覧の計算結果ごとキャッシュに保存するため、pickle できる通常の dict で組み立てる
+    session_student_custom_map = {}
     for row in custom_scan_rows:
-        session_student_custom_map[row['lesson_session_id']][row['qr_code__student_id']][row['point_column_id']] = row['total']
+        session_student_custom_map.setdefault(row['lesson_session_id'], {}).setdefault(
+            row['qr_code__student_id'], {}
+        )[row['point_column_id']] = row['total']
 
     # 独自評価項目の学生ごとの合計点を一括取得（N+1対策）
     student_column_scores_map = defaultdict(dict)
@@ -198,45 +123,164 @@ def _build_class_evaluations(request, classroom):
         for scs in StudentColumnScore.objects.filter(column__classroom=classroom):
             student_column_scores_map[scs.student_id][scs.column_id] = scs.score
 
-    # 各学生の評価データを格納するリスト
-    student_evaluations = []
+    # 目標管理モードの教師評価点: { student_id: teacher_score }
+    teacher_score_map = {}
+    if grading_system == 'goal':
+        teacher_score_map = dict(
+            SelfEvaluation.objects.filter(
+                classroom=classroom,
+                student_id__in=student_ids,
+            ).values_list('student_id', 'teacher_score')
+        )
 
-    for student in students:
+    return {
+        'students': students,
+        'sessions': sessions,
+        'point_columns': point_columns,
+        'grading_system': grading_system,
+        'test_mode': test_mode,
+        'has_simulation': has_simulation,
+        'sim_peer_points': sim_peer_points,
+        'student_class_points_map': student_class_points_map,
+        'session_score_map': session_score_map,
+        'session_student_custom_map': session_student_custom_map,
+        'student_column_scores_map': student_column_scores_map,
+        'teacher_score_map': teacher_score_map,
+    }
+
+
+def _load_class_evaluation_facts_many(classrooms):
+    """
+    複数クラスの _load_class_evaluation_facts（テストモードなし）を {classroom_id: facts} で返す
+
+    学部全体の集計用。種類ごとのクエリを全クラス分まとめて1回で発行し、クラスごとに振り分けるため、
+    クエリ数はクラス数に依存しない（スナップショットの作り直しが必要なクラスを除く）。
+    振り分けた結果は _load_class_evaluation_facts と同じ内容（クエリセットの代わりにリスト）になる。
+    """
+    classrooms = list(classrooms)
+    classroom_ids = [classroom.id for classroom in classrooms]
+
+    # 在籍学生（学籍番号順）
+    enrolled = defaultdict(list)
+    for classroom_id, student_id in ClassRoomEnrollment.objects.filter(
+        classroom_id__in=classroom_ids, is_active=True
+    ).values_list('classroom_id', 'student_id'):
+        enrolled[classroom_id].append(student_id)
+    students_by_id = Student.objects.in_bulk({sid for ids in enrolled.values() for sid in ids})
+
+    class_sessions = defaultdict(list)
+    session_classroom = {}
+    for session in LessonSession.objects.filter(classroom_id__in=classroom_ids).select_related(
+        'peer_evaluation_settings'
+    ).order_by('session_number'):
+        class_sessions[session.classroom_id].append(session)
+        session_classroom[session.id] = session.classroom_id
+
+    class_point_columns = defaultdict(list)
+    column_classroom = {}
+    for column in PointColumn.objects.filter(classroom_id__in=classroom_ids).order_by('created_at'):
+        class_point_columns[column.classroom_id].append(column)
+        column_classroom[column.id] = column.classroom_id
+
+    student_class_points_maps = defaultdict(dict)
+    for scp in StudentClassPoints.objects.filter(classroom_id__in=classroom_ids):
+        student_class_points_maps[scp.classroom_id][scp.student_id] = scp
+
+    ensure_session_scores_many(classrooms)
+    session_score_maps = defaultdict(dict)
+    for score in StudentSessionScore.objects.filter(classroom_id__in=classroom_ids).only(
+        'classroom_id', 'student_id', 'lesson_session_id', 'quiz_total', 'quiz_count',
+        'lesson_points', 'contrib', 'vote',
+    ):
+        session_score_maps[score.classroom_id][(score.student_id, score.lesson_session_id)] = score
+
+    session_student_custom_maps = defaultdict(dict)
+    for row in QRCodeScan.objects.filter(
+        lesson_session_id__in=session_classroom, point_column__isnull=False
+    ).values('lesson_session_id', 'qr_code__student_id', 'point_column_id').annotate(
+        total=Sum('points_awarded')
+    ):
+        session_student_custom_maps[session_classroom[row['lesson_session_id']]].setdefault(
+            row['lesson_session_id'], {}
+        ).setdefault(row['qr_code__student_id'], {})[row['point_column_id']] = row['total']
+
+    student_column_scores_maps = defaultdict(lambda: defaultdict(dict))
+    for scs in StudentColumnScore.objects.filter(column_id__in=column_classroom):
+        student_column_scores_maps[column_classroom[scs.column_id]][scs.student_id][scs.column_id] = scs.score
+
+    teacher_score_maps = defaultdict(dict)
+    goal_classroom_ids = [classroom.id for classroom in classrooms if classroom.grading_system == 'goal']
+    if goal_classroom_ids:
+        for classroom_id, student_id, teacher_score in SelfEvaluation.objects.filter(
+            classroom_id__in=goal_classroom_ids
+        ).values_list('classroom_id', 'student_id', 'teacher_score'):
+            if student_id in enrolled[classroom_id]:
+                teacher_score_maps[classroom_id][student_id] = teacher_score
+
+    facts_by_class = {}
+    for classroom in classrooms:
+        students = sorted(
+            (students_by_id[student_id] for student_id in enrolled[classroom.id]),
+            key=lambda student: (student.student_number or '', student.id),
+        )
+        student_ids = {student.id for student in students}
+        facts_by_class[classroom.id] = {
+            'students': students,
+            'sessions': class_sessions[classroom.id],
+            'point_columns': class_point_columns[classroom.id],
+            'grading_system': classroom.grading_system,
+            'test_mode': False,
+            'has_simulation': False,
+            'sim_peer_points': {},
+            'student_class_points_map': {
+                student_id: scp
+                for student_id, scp in student_class_points_maps[classroom.id].items()
+                if student_id in student_ids
+            },
+            'session_score_map': session_score_maps[classroom.id],
+            'session_student_custom_map': session_student_custom_maps[classroom.id],
+            'student_column_scores_map': student_column_scores_maps[classroom.id],
+            'teacher_score_map': teacher_score_maps[classroom.id],
+        }
+    return facts_by_class
+
+
+def _iter_student_evaluations(facts, students=None):
+    """
+    学生ごとの評価データ（授業回ごとの内訳を含む）を1人ずつ生成する
+
+    画面表示とCSV出力で共通の行ビルダー。全員分をリストに溜めないため、
+    CSV出力ではクラスの人数に関係なくメモリ使用量が一定になる。
+    students を省略した場合は facts['students'] を順に処理する。
+    足切り・100点換算はクラス全体の統計が必要なため _apply_final_score() で行う。
+    """
+    sessions = facts['sessions']
+    point_columns = facts['point_columns']
+    grading_system = facts['grading_system']
+    test_mode = facts['test_mode']
+    sim_peer_points = facts['sim_peer_points']
+    student_class_points_map = facts['student_class_points_map']
+    session_score_map = facts['session_score_map']
+    student_column_scores_map = facts['student_column_scores_map']
+    teacher_score_map = facts['teacher_score_map']
+
+    for student in (facts['students'] if students is None else students):
         # 各授業回のデータ（ポイント + ピア評価スコア）を格納する辞書
         session_data = {}
         
         for session in sessions:
             session_key = f"第{session.session_number}回"
             
+            # 授業回別の得点スナップショット（未作成の組は0点）
+            session_score = session_score_map.get((student.id, session.id))
+
             # 1. 授業内手動ポイントを取得（StudentLessonPoints）
-            manual_points = 0
-            lesson_point = StudentLessonPoints.objects.filter(
-                lesson_session=session,
-                student=student
-            ).first()
-            if lesson_point:
-                manual_points = lesson_point.points
+            manual_points = session_score.lesson_points if session_score else 0
             
             # 2. 小テストスコアを取得（QRアクション点もここに含まれる）
-            quiz_score = 0
-            has_quiz = False
-            try:
-                # その授業回の全ての小テストスコアを合算する（重複枠対策）
-                session_quiz_scores = QuizScore.objects.filter(
-                    quiz__lesson_session=session,
-                    student=student,
-                    is_cancelled=False
-                )
-                if session_quiz_scores.exists():
-                    has_quiz = True
-                    # 重複対策: 同一クイズは最新のスコアのみを採用
-                    quiz_score_dict = {}
-                    for qs in session_quiz_scores:
-                        quiz_score_dict[qs.quiz.id] = qs.score
-                    quiz_score = sum(quiz_score_dict.values())
-            except Exception as e:
-                logger.error(f"小テストスコア取得エラー: {e}", exc_info=True)
-                pass
+            # 同一クイズは最新のスコアのみを合算済み（重複枠対策）
+            quiz_score = session_score.quiz_total if session_score else 0
+            has_quiz = bool(session_score and session_score.quiz_count)
             
             # ピア評価スコア
             peer_evaluation_score = 0
@@ -248,87 +292,20 @@ def _build_class_evaluations(request, classroom):
 
             if session.has_peer_evaluation:
                 try:
-                    pe_settings = session_peer_settings.get(session.id)
-
-                    # 3-1. 貢献度スコア (DIRECT or AGGREGATE)
-                    if pe_settings and pe_settings.enable_member_evaluation:
-                        if pe_settings.evaluation_method == PeerEvaluationSettings.EvaluationMethod.DIRECT:
-                            # DIRECTモード: 事前集計したデータを利用
-                            real_contrib_score = direct_mode_contrib_scores.get(session.id, {}).get(student.id, 0)
-                        else: # AGGREGATEモード
-                            # AGGREGATEモード: 事前集計したデータを利用
-                            real_contrib_score = student_session_contrib_map.get(student.id, {}).get(session.id, 0)
-
-                    # 3-2. 投票ポイントの計算
-                    membership = GroupMember.objects.filter(
-                        student=student,
-                        group__lesson_session=session
-                    ).first()
-                    
-                    if membership:
-                        group = membership.group
-                        score_points = (
-                            pe_settings.group_scores or []
-                        ) if pe_settings and pe_settings.enable_group_evaluation else []
-                        if score_points:
-                            group_point_map = session_group_point_maps.get(session.id, {})
-                            real_vote_score = group_point_map.get(group.id, 0)
+                    # 3-1. 貢献度スコア (DIRECT or AGGREGATE) と 3-2. 投票ポイント
+                    # 評価方式・設定に応じた集計はスナップショット作成時に済んでいる
+                    if session_score:
+                        real_contrib_score = session_score.contrib
+                        real_vote_score = session_score.vote
 
                     simulated_contrib_score = real_contrib_score
                     simulated_vote_score = real_vote_score
                     
-                    # シミュレーションによるテスト用スコア計算
-                    if test_mode and has_simulation:
-                        sim_data = sim_data_class.get(str(session.id), {}).get(str(student.id))
-                        if sim_data is not None:
-                            if isinstance(sim_data, dict):
-                                sess_sim_data = sim_data_class.get(str(session.id), {})
-                                point_mode = sess_sim_data.get('point_mode', 'settings')
-                                
-                                sim_contrib_score = 0
-                                if pe_settings and pe_settings.enable_member_evaluation:
-                                    if point_mode == 'settings':
-                                        if pe_settings.member_scores:
-                                            for i, points in enumerate(pe_settings.member_scores):
-                                                rank = i + 1
-                                                count = sim_data.get(f'member_rank_{rank}')
-                                                if count:
-                                                    sim_contrib_score += float(count) * points
-                                    elif point_mode == 'manual':
-                                        contrib_val = sim_data.get('contrib')
-                                        if contrib_val:
-                                            sim_contrib_score += float(contrib_val)
-                                elif not pe_settings or not pe_settings.enable_group_evaluation:
-                                    # When both are disabled, use contrib
-                                    contrib_val = sim_data.get('contrib', sim_data.get('member'))
-                                    if contrib_val:
-                                        sim_contrib_score += float(contrib_val)
-
-                                sim_vote_score = 0
-                                if pe_settings and pe_settings.enable_group_evaluation:
-                                    if point_mode == 'settings':
-                                        if pe_settings.group_scores:
-                                            for i, points in enumerate(pe_settings.group_scores):
-                                                rank = i + 1
-                                                count = sim_data.get(f'group_rank_{rank}')
-                                                if count:
-                                                    sim_vote_score += float(count) * points
-                                    elif point_mode == 'manual':
-                                        group_manual = sim_data.get('group_manual')
-                                        if group_manual:
-                                            sim_vote_score += float(group_manual)
-
-                                simulated_contrib_score = sim_contrib_score
-                                simulated_vote_score = sim_vote_score
-                                
-                                # 互換性フォールバック (member, group)
-                                if sim_contrib_score == 0 and sim_vote_score == 0 and ('member' in sim_data or 'group' in sim_data):
-                                    simulated_contrib_score = sim_data.get('member', 0)
-                                    simulated_vote_score = sim_data.get('group', 0)
-                            else:
-                                simulated_contrib_score = float(sim_data)
-                                simulated_vote_score = 0
-                            is_simulated = True
+                    # シミュレーションによるテスト用スコア（計算済み）
+                    simulated = sim_peer_points.get((student.id, session.id))
+                    if simulated is not None:
+                        simulated_contrib_score, simulated_vote_score = simulated
+                        is_simulated = True
 
                     if test_mode:
                         peer_evaluation_score = simulated_contrib_score + simulated_vote_score
@@ -383,8 +360,8 @@ def _build_class_evaluations(request, classroom):
         # 評価システム（モード）に応じた合計点数の算出
         if grading_system == 'goal':
             # 目標管理モード: 教師評価点 + 出席点
-            self_eval = SelfEvaluation.objects.filter(student=student, classroom=classroom).first()
-            score_points = self_eval.teacher_score if self_eval and self_eval.teacher_score is not None else 0
+            teacher_score = teacher_score_map.get(student.id)
+            score_points = teacher_score if teacher_score is not None else 0
             total_points_calculated = score_points + saved_attendance_points
         else:
             # 通常モード / オリジナルモード: 合計 = (授業点 * 2) + 出席点
@@ -398,8 +375,8 @@ def _build_class_evaluations(request, classroom):
             session_key = f"第{session.session_number}回"
             ordered_session_scores.append(session_data[session_key])
 
-        # 学生ごとの評価データをリストに追加
-        student_evaluations.append({
+        # 学生ごとの評価データを1件ずつ返す
+        yield {
             'student': student,
             'total_points': total_points_calculated,
             'score_points': score_points,
@@ -410,64 +387,90 @@ def _build_class_evaluations(request, classroom):
             'attendance_points': saved_attendance_points,
             'attendance_rate': attendance_rate,
             'session_scores': ordered_session_scores,
-        })
+        }
 
-    # --- クラス全体の統計データ（中央値・最高点）の算出 ---
-    all_raw_scores = [e['total_points'] for e in student_evaluations]
-    if all_raw_scores:
-        # 中央値を取得
-        median_val = statistics.median(all_raw_scores)
-        # 中央値の半分を足切りラインに設定
-        cutoff_line = median_val / 2
-        
-        # 足切りをクリアした学生の中での最高点を取得（換算の基準値）
-        passed_scores = [s for s in all_raw_scores if s > cutoff_line]
-        max_val = max(passed_scores) if passed_scores else 0
-        
-        # 統計の平均点（シミュレーションを反映）
-        class_average_points = round(sum(all_raw_scores) / len(all_raw_scores), 1)
+
+def _class_score_statistics(raw_scores):
+    """クラス全体の統計データ（中央値・足切りライン・換算基準の最高点・平均点）を算出する"""
+    return cutoff_statistics(raw_scores)
+
+
+def _apply_final_score(eval_data, grading_system, score_stats):
+    """評価システムに応じた最終成績の処理（足切りと換算）"""
+    current_raw = eval_data['total_points']
+    
+    # クラスが「オリジナル（カスタマイズ）」モードの場合のみ、足切りと100点換算を実施
+    if grading_system == 'original':
+        # 中央値の半分以下は0点、それ以外は最高得点者が100点になるように換算
+        eval_data['final_score_100'], eval_data['is_below_cutoff'] = curve_score(current_raw, score_stats)
     else:
-        median_val = 0
-        cutoff_line = 0
-        max_val = 0
-        class_average_points = 0.0
+        # 「デフォルト（通常）」や「目標管理」モードの場合は足切りを行わず、素点をそのまま利用
+        eval_data['is_below_cutoff'] = False
+        eval_data['final_score_100'] = round(current_raw, 1)
+    return eval_data
+
+
+def _build_class_evaluations(classroom, test_mode=False, sim_data_class=None):
+    """
+    クラスごとの評価一覧（成績表）の計算ロジック
+
+    QR採点、ピア評価、各種小テスト、および教員が独自に追加した
+    評価項目の点数を集計する。画面表示用ビューとCSV出力用ビューは
+    同じ行ビルダー（_iter_student_evaluations）を使い、計算結果が食い違わないようにする。
+    """
+    return _build_class_evaluations_from_facts(
+        _load_class_evaluation_facts(classroom, test_mode, sim_data_class)
+    )
+
+
+def _build_class_evaluations_from_facts(facts):
+    """読み込み済みのデータ（_load_class_evaluation_facts の戻り値）から評価一覧を計算する"""
+    grading_system = facts['grading_system']
+
+    # 各学生の評価データを格納するリスト
+    student_evaluations = list(_iter_student_evaluations(facts))
+
+    # --- クラス全体の統計データ（中央値・最高点）の算出 ---
+    score_stats = _class_score_statistics(e['total_points'] for e in student_evaluations)
 
     # --- 評価システムに応じた最終成績の処理（足切りと換算） ---
     for eval_data in student_evaluations:
-        current_raw = eval_data['total_points']
-        
-        # クラスが「オリジナル（カスタマイズ）」モードの場合のみ、足切りと100点換算を実施
-        if grading_system == 'original':
-            # 足切り判定 (中央値の半分以下か)
-            if current_raw <= cutoff_line:
-                eval_data['is_below_cutoff'] = True
-                eval_data['final_score_100'] = 0  # 足切りライン以下の場合は0点
-            else:
-                eval_data['is_below_cutoff'] = False
-                # 換算処理: 最高得点者が100点になるように比率で計算
-                if max_val > 0:
-                    eval_data['final_score_100'] = round((current_raw / max_val) * 100, 1)
-                else:
-                    eval_data['final_score_100'] = 0
-        else:
-            # 「デフォルト（通常）」や「目標管理」モードの場合は足切りを行わず、素点をそのまま利用
-            eval_data['is_below_cutoff'] = False
-            eval_data['final_score_100'] = round(current_raw, 1)
+        _apply_final_score(eval_data, grading_system, score_stats)
 
+    # キャッシュに保存するため、クエリセットは評価済みのリストにしておく
     return {
-        'students': students,
-        'sessions': sessions,
-        'point_columns': point_columns,
+        'students': list(facts['students']),
+        'sessions': list(facts['sessions']),
+        'point_columns': list(facts['point_columns']),
         'grading_system': grading_system,
         'student_evaluations': student_evaluations,
-        'class_average_points': class_average_points,
-        'test_mode': test_mode,
-        'has_simulation': has_simulation,
-        'session_student_custom_map': session_student_custom_map,
-        'student_column_scores_map': student_column_scores_map,
+        'class_average_points': score_stats['class_average_points'],
+        'test_mode': facts['test_mode'],
+        'has_simulation': facts['has_simulation'],
+        'session_student_custom_map': facts['session_student_custom_map'],
+        'student_column_scores_map': facts['student_column_scores_map'],
     }
 
 
+def _class_evaluations_cache_key(classroom, test_mode=False, sim_data_class=None):
+    """評価一覧の計算結果のキャッシュキー（テストモード・シミュレーション点数ごとに分ける）"""
+    return class_grades_cache_key('class_evaluation', classroom, test_mode, sim_data_class)
+
+
+def _get_class_evaluations(classroom, test_mode=False, sim_data_class=None):
+    """
+    評価一覧の計算結果を返す
+
+    採点・授業回・クラス設定などが変わるとクラスの成績バージョンが更新されるため、
+    それまでは前回の計算結果をキャッシュから返す（授業中の再読み込みで再計算しない）。
+    """
+    cache_key = _class_evaluations_cache_key(classroom, test_mode, sim_data_class)
+    data = cache.get(cache_key)
+    if data is None:
+        data = _build_class_evaluations(classroom, test_mode, sim_data_class)
+        cache.set(cache_key, data, CLASS_GRADES_TIMEOUT)
+    return data
+
 @login_required
 def class_evaluation_view(request, class_id):
     """
@@ -478,7 +481,7 @@ def class_evaluation_view(request, class_id):
     # 表示モード (simple / detail) - デフォルトは詳細モード
     view_mode = request.GET.get('mode', 'detail')
 
-    data = _build_class_evaluations(request, classroom)
+    data = _get_class_evaluations(classroom, *_request_simulation(request, classroom))
     students = data['students']
     sessions = data['sessions']
     point_columns = data['point_columns']
@@ -490,15 +493,15 @@ def class_evaluation_view(request, class_id):
     session_student_custom_map = data['session_student_custom_map']
     student_column_scores_map = data['student_column_scores_map']
 
-    total_sessions = sessions.count()
+    total_sessions = len(sessions)
 
     # テーブルのカラム幅（colspan）を調整（独自評価項目の数を考慮）
     base_colspan = (total_sessions * 2 + 7) if view_mode == 'detail' else 7
-    table_colspan = base_colspan + point_columns.count()
+    table_colspan = base_colspan + len(point_columns)
 
     # 独自評価項目：列ごとに「全学生 × 授業回」のマトリクスを1つにまとめて作成
     # （1人ずつ開かず、項目ボタン1つでクラス全員分をまとめて確認できるようにする）
-    ordered_sessions = list(sessions)
+    ordered_sessions = sessions
     column_detail_matrices = []
     for col in point_columns:
         rows = []
@@ -548,11 +551,15 @@ def class_evaluation_csv_export(request, class_id):
     - mode=simple: 1行 = 1学生（サマリーのみ）
     - mode=detail: 1行 = 1学生。授業回ごとの内訳・独自評価項目の授業回別内訳を
       すべて列として横に展開する（同じ学生が複数行にまたがらないようにする）
+
+    StreamingHttpResponse で1学生分の行を計算するたびに送り出すため、
+    人数が多いクラスでもメモリ使用量が増えず、最初のバイトがすぐに届く。
+    評価一覧の画面で計算済みの結果がキャッシュにあれば、再計算せずにそれを使う。
     """
     import csv
     from datetime import datetime
     from urllib.parse import quote
-    from django.http import HttpResponse
+    from django.http import StreamingHttpResponse
 
     classroom = get_object_or_404(ClassRoom, id=class_id, teachers=request.user)
 
@@ -560,23 +567,39 @@ def class_evaluation_csv_export(request, class_id):
     if view_mode not in ('simple', 'detail'):
         view_mode = 'detail'
 
-    data = _build_class_evaluations(request, classroom)
-    point_columns = list(data['point_columns'])
-    student_evaluations = data['student_evaluations']
-    sessions = list(data['sessions'])
-    session_student_custom_map = data['session_student_custom_map']
-    grading_system = data['grading_system']
-
-    response = HttpResponse(content_type='text/csv; charset=utf-8')
-    filename = f"評価一覧_{classroom.class_name}_{view_mode}_{datetime.now().strftime('%Y%m%d')}.csv"
-    response['Content-Disposition'] = (
-        f"attachment; filename*=UTF-8''{quote(filename)}"
-    )
+    test_mode, sim_data_class = _request_simulation(request, classroom)
+    cached = cache.get(_class_evaluations_cache_key(classroom, test_mode, sim_data_class))
+    if cached is not None:
+        # 評価一覧の計算結果（足切り・100点換算済み）をそのまま使う
+        point_columns = cached['point_columns']
+        sessions = cached['sessions']
+        session_student_custom_map = cached['session_student_custom_map']
+        grading_system = cached['grading_system']
+
+        def iter_evaluations():
+            return iter(cached['student_evaluations'])
+    else:
+        facts = _load_class_evaluation_facts(classroom, test_mode, sim_data_class)
+        point_columns = list(facts['point_columns'])
+        sessions = list(facts['sessions'])
+        session_student_custom_map = facts['session_student_custom_map']
+        grading_system = facts['grading_system']
+
+        # 足切り・100点換算にはクラス全体の統計が必要なため、
+        # オリジナルモードのときだけ先に合計点だけを求めておく（行データは保持しない）
+        score_stats = None
+        if grading_system == 'original':
+            score_stats = _class_score_statistics(
+                evaluation['total_points']
+                for evaluation in _iter_student_evaluations(facts, facts['students'].iterator())
+            )
 
-    # charset=utf-8-sigを指定すると書き込みのたびにBOMが付与されてしまうため、
-    # 先頭で一度だけBOMを書き込み、以降はcsv.writerでプレーンなutf-8として書き込む
-    response.write('﻿')
-    writer = csv.writer(response)
+        def iter_evaluations():
+            # 1学生分ずつ計算する（全員分をメモリに溜めない）
+            for evaluation in _iter_student_evaluations(facts, facts['students'].iterator()):
+                if score_stats is not None:
+                    _apply_final_score(evaluation, grading_system, score_stats)
+                yield evaluation
 
     # 画面の評価一覧テーブルと同じ列見出しに揃える。
     # 「最終成績(100点換算)」「足切り」は、画面でも「オリジナル(カスタマイズ)」モードの
@@ -617,28 +640,9 @@ def class_evaluation_csv_export(request, class_id):
             + [custom_scores.get(col.id, 0) for col in point_columns]
         )
 
-    if view_mode == 'simple':
-        writer.writerow(summary_headers)
-        for evaluation in student_evaluations:
-            writer.writerow(build_summary_row(evaluation))
-        return response
-
     # 詳細モード: 1行 = 1学生。授業回ごとの内訳・独自評価項目の授業回別内訳を
     # すべて列として横に展開する。
-    session_headers = []
-    for session in sessions:
-        prefix = f'第{session.session_number}回'
-        session_headers += [
-            f'{prefix}_授業日', f'{prefix}_小テスト点',
-            f'{prefix}_ピア貢献', f'{prefix}_ピア投票', f'{prefix}_手動点',
-            f'{prefix}_合計点',
-        ]
-        for col in point_columns:
-            session_headers.append(f'{prefix}_{col.column_title}')
-
-    writer.writerow(summary_headers + session_headers)
-
-    for evaluation in student_evaluations:
+    def build_detail_row(evaluation):
         student = evaluation['student']
         row = build_summary_row(evaluation)
 
@@ -655,12 +659,44 @@ def class_evaluation_csv_export(request, class_id):
                 row.append(
                     session_student_custom_map.get(session.id, {}).get(student.id, {}).get(col.id, 0)
                 )
+        return row
 
-        writer.writerow(row)
-
+    headers = summary_headers
+    build_row = build_summary_row
+    if view_mode == 'detail':
+        for session in sessions:
+            prefix = f'第{session.session_number}回'
+            headers = headers + [
+                f'{prefix}_授業日', f'{prefix}_小テスト点',
+                f'{prefix}_ピア貢献', f'{prefix}_ピア投票', f'{prefix}_手動点',
+                f'{prefix}_合計点',
+            ] + [f'{prefix}_{col.column_title}' for col in point_columns]
+        build_row = build_detail_row
+
+    class Echo:
+        """csv.writer の書き込み先。書き込まれた1行分の文字列をそのまま返す"""
+
+        def write(self, value):
+            return value
+
+    writer = csv.writer(Echo())
+
+    def stream_rows():
+        # charset=utf-8-sigを指定すると書き込みのたびにBOMが付与されてしまうため、
+        # 先頭で一度だけBOMを送り、以降はcsv.writerでプレーンなutf-8として書き込む
+        yield '\ufeff'
+        yield writer.writerow(headers)
+        # 1学生分の行を作るたびに送り出す
+        for evaluation in iter_evaluations():
+            yield writer.writerow(build_row(evaluation))
+
+    response = StreamingHttpResponse(stream_rows(), content_type='text/csv; charset=utf-8')
+    filename = f"評価一覧_{classroom.class_name}_{view_mode}_{datetime.now().strftime('%Y%m%d')}.csv"
+    response['Content-Disposition'] = (
+        f"attachment; filename*=UTF-8''{quote(filename)}"
+    )
     return response
 
-
 @login_required
 @require_POST
 def add_custom_column_points(request, class_id):
@@ -1,75 +1,26 @@
 import logging
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
 from collections import defaultdict
-from django.db.models import Sum
 from django.http import JsonResponse, HttpRequest, HttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
+from django.db import transaction
 from django.urls import reverse
 from django.views.decorators.http import require_POST
 
-from ...models import ClassRoom, CustomUser, StudentClassPoints, StudentLessonPoints, SelfEvaluation, QuizScore, \
-    ContributionEvaluation, GroupMember, PeerEvaluation, PeerEvaluationSettings, LessonSession
+from ...models import ClassRoom, CustomUser, StudentClassPoints, StudentLessonPoints, QuizScore, \
+    PeerEvaluationSettings, StudentSessionScore, PeerEvaluationSimulation
+from ...grade_analytics import summarize
+from ...grade_cache import CLASS_GRADES_TIMEOUT, bump_student_points_versions, class_grades_cache_key
+from ...grade_engine import recalculate_class_points, rescale_attendance_points
+from ...scoring import simulate_class_peer_points
+from ...session_scores import ensure_session_scores
 
 
 logger = logging.getLogger(__name__)
 
 
-def _safe_int(value):
-    try:
-        return int(value)
-    except (TypeError, ValueError):
-        return None
-
-
-def _build_group_vote_point_map(session_groups, session_peer_evals, pe_settings, peer_status):
-    group_point_map = {group_obj.id: 0 for group_obj in session_groups}
-    if not pe_settings or not pe_settings.enable_group_evaluation:
-        return group_point_map
-
-    score_points = pe_settings.group_scores or []
-    if not score_points:
-        return group_point_map
-
-    if pe_settings.group_evaluation_method == PeerEvaluationSettings.EvaluationMethod.AGGREGATE:
-        if peer_status != LessonSession.PeerEvaluationStatus.CLOSED:
-            return group_point_map
-
-        group_internal_points = {group_obj.id: 0 for group_obj in session_groups}
-        group_count = len(session_groups)
-        for pe in session_peer_evals:
-            response = pe.response_json or {}
-            for entry in response.get('other_group_eval', []):
-                gid = _safe_int(entry.get('group_id'))
-                rank = _safe_int(entry.get('rank'))
-                if gid in group_internal_points and rank and 1 <= rank <= group_count:
-                    group_internal_points[gid] += (group_count - rank)
-
-        sorted_groups = sorted(
-            group_internal_points.items(),
-            key=lambda x: x[1],
-            reverse=True,
-        )
-        current_rank = 0
-        prev_points = None
-        for idx, (gid, internal_points) in enumerate(sorted_groups):
-            if internal_points != prev_points:
-                current_rank = idx
-                prev_points = internal_points
-            if current_rank < len(score_points):
-                group_point_map[gid] = score_points[current_rank]
-        return group_point_map
-
-    for pe in session_peer_evals:
-        response = pe.response_json or {}
-        for entry in response.get('other_group_eval', []):
-            gid = _safe_int(entry.get('group_id'))
-            rank = _safe_int(entry.get('rank'))
-            if gid in group_point_map and rank and 1 <= rank <= len(score_points):
-                group_point_map[gid] += score_points[rank - 1]
-    return group_point_map
-
-
 @login_required
 @require_POST
 def update_attendance_rate(request: HttpRequest, class_id: int) -> JsonResponse:
@@ -119,38 +70,19 @@ def update_attendance_rate(request: HttpRequest, class_id: int) -> JsonResponse:
     return JsonResponse({'success': True, 'message': '出席率を保存しました'})
 
 
-@login_required
-def class_points_view(request: HttpRequest, class_id: int) -> HttpResponse:
+def _build_class_points(classroom, test_mode, sim_data_class):
     """
-    クラスごとのポイント一覧を表示するビュー
+    クラスのポイント一覧（学生ごとの内訳とクラス全体の統計）を集計する
+
+    結果はクラスの成績バージョンをキーにキャッシュするため、request には依存させない。
     """
-    classroom = get_object_or_404(ClassRoom, id=class_id, teachers=request.user)
-    grading_system = classroom.grading_system
     students = classroom.students.all().order_by('student_number')
 
-    # テストモードか判定
-    test_mode = request.session.get('test_mode', False)
-    
-    # セッションからシミュレーション用点数を取得
-    # 辞書構造: { class_id: { session_id: { student_id: points } } }
-    sim_data_class = request.session.get('peer_sim_points', {}).get(str(classroom.id), {})
-    has_simulation = len(sim_data_class) > 0
-
-    # ===== N+1問題対策: クラス全体の投票データを一度に取得して事前集計 =====
-    from ...models import Group
-
-    # このクラスの全セッションを取得
-    all_sessions = classroom.lessonsession_set.all()
-    session_ids = list(all_sessions.values_list('id', flat=True))
-
-    # 全セッションのグループと投票データを一括取得
-    all_groups = Group.objects.filter(lesson_session__in=session_ids).select_related('lesson_session')
-    all_peer_evals = PeerEvaluation.objects.filter(lesson_session__in=session_ids)
-
-    # セッションIDをキーにした評価データの辞書を作成
-    session_to_evals_map = defaultdict(list)
-    for pe in all_peer_evals:
-        session_to_evals_map[pe.lesson_session_id].append(pe)
+    # ===== N+1問題対策: クラス全体のデータを一度に取得して事前集計 =====
+    # このクラスの全セッションを取得（ピア評価設定も一緒に取得）
+    all_sessions = list(
+        classroom.lessonsession_set.select_related('peer_evaluation_settings').order_by('session_number')
+    )
 
     # NEW: セッション設定のキャッシュ
     all_sessions_settings = {}
@@ -160,106 +92,52 @@ def class_points_view(request: HttpRequest, class_id: int) -> HttpResponse:
         except PeerEvaluationSettings.DoesNotExist:
             all_sessions_settings[s.id] = None
 
-    # セッションごとのランキング情報をキャッシュ
-    session_rankings_cache = {}
-    # NEW: DIRECTモード用の貢献度スコアを事前集計
-    direct_mode_contrib_scores = defaultdict(lambda: defaultdict(int))
-
-    for sess in all_sessions:
-        sess_id = sess.id
-        # そのセッションのグループを抽出
-        session_groups = [g for g in all_groups if g.lesson_session_id == sess_id]
-        # そのセッションの投票を抽出
-        session_peer_evals = session_to_evals_map.get(sess_id, [])
-
-        # グループごとの投票スコアを計算（response_json + 設定配点）
-        pe_settings = all_sessions_settings.get(sess_id)
-
-        # NEW: DIRECTモードのスコア計算
-        if pe_settings and pe_settings.enable_member_evaluation and pe_settings.evaluation_method == PeerEvaluationSettings.EvaluationMethod.DIRECT:
-            member_scores = pe_settings.member_scores or []
-            if member_scores:
-                for ev in session_peer_evals:
-                    response = ev.response_json or {}
-                    for entry in response.get('group_members_eval', []):
-                        member_id = _safe_int(entry.get('member_id'))
-                        rank = _safe_int(entry.get('rank'))
-                        if member_id and rank and 1 <= rank <= len(member_scores):
-                            score = member_scores[rank - 1]
-                            direct_mode_contrib_scores[sess_id][member_id] += score
-
-        group_scores = _build_group_vote_point_map(
-            session_groups=session_groups,
-            session_peer_evals=session_peer_evals,
-            pe_settings=pe_settings,
-            peer_status=sess.peer_evaluation_status,
-        )
-
-        # キャッシュに保存
-        session_rankings_cache[sess_id] = {
-            'group_scores': group_scores,
-        }
-
-    # NEW: ピア評価の貢献度スコアを事前集計
-    # AGGREGATEモード用の集計
-    all_contrib_evals = ContributionEvaluation.objects.filter(
-        peer_evaluation__lesson_session__classroom=classroom
-    ).values(
-        'evaluatee_id', 'peer_evaluation__lesson_session_id'
-    ).annotate(
-        total_contrib=Sum('contribution_score')
-    )
-    student_session_contrib_map = defaultdict(dict)
-    for item in all_contrib_evals:
-        student_id = item['evaluatee_id']
-        session_id = item['peer_evaluation__lesson_session_id']
-        score = item['total_contrib']
-        student_session_contrib_map[student_id][session_id] = score
-
-    # DIRECTモード用の評価データ辞書
-    session_to_evals_map = defaultdict(list)
-    for pe in all_peer_evals:
-        session_to_evals_map[pe.lesson_session_id].append(pe)
-
-    # N+1対策: 全学生のグループメンバーシップを一括で取得
+    # テストモードのシミュレーション点数は学生×授業回の (貢献度, 投票) にまとめて計算しておく
+    sim_peer_points = {}
+    if test_mode and sim_data_class:
+        sim_peer_points = simulate_class_peer_points(sim_data_class, all_sessions_settings)
+
+    # ピア評価（貢献度・投票）は授業回別の得点スナップショットから読む
+    ensure_session_scores(classroom)
+    session_score_map = {
+        (score.student_id, score.lesson_session_id): score
+        for score in StudentSessionScore.objects.filter(classroom=classroom)
+    }
+
     student_ids = [s.id for s in students]
-    all_group_members = GroupMember.objects.filter(
+
+    # 授業内手動ポイント・小テストの明細（詳細モーダル用）を全学生分まとめて取得
+    student_lesson_points_map = defaultdict(list)
+    for lesson_point in StudentLessonPoints.objects.filter(
         student_id__in=student_ids,
-        group__lesson_session__classroom=classroom
-    ).select_related('group', 'group__lesson_session')
-    
-    # 学生ごとのグループメンバーシップマップ
-    student_group_members_map = defaultdict(list)
-    for gm in all_group_members:
-        student_group_members_map[gm.student_id].append(gm)
+        lesson_session__classroom=classroom
+    ).select_related('lesson_session').order_by('lesson_session__session_number'):
+        student_lesson_points_map[lesson_point.student_id].append(lesson_point)
+
+    # 取り消されていないスコアはクイズごとに1件（unique_current_quiz_score）
+    student_quiz_scores_map = defaultdict(list)
+    for quiz_score in QuizScore.objects.filter(
+        student_id__in=student_ids,
+        quiz__lesson_session__classroom=classroom,
+        is_cancelled=False
+    ).select_related('quiz', 'quiz__lesson_session').order_by('quiz__lesson_session__session_number', 'id'):
+        student_quiz_scores_map[quiz_score.student_id].append(quiz_score)
+
+    student_class_points_map = {
+        scp.student_id: scp
+        for scp in StudentClassPoints.objects.filter(student_id__in=student_ids, classroom=classroom)
+    }
 
     # ===== 各学生のクラス内成績を取得 =====
     student_grades = []
 
     for student in students:
-        # N+1対策: 事前取得したマップから学生のグループメンバーシップを取得
-        student_groups = student_group_members_map.get(student.id, [])
-
         # 1. 授業内手動ポイント (StudentLessonPoints)
-        lesson_points_qs = StudentLessonPoints.objects.filter(
-            student=student,
-            lesson_session__classroom=classroom
-        ).select_related('lesson_session').order_by('lesson_session__session_number')
-        lesson_total = sum(p.points for p in lesson_points_qs)
+        lesson_points_list = student_lesson_points_map.get(student.id, [])
+        lesson_total = sum(p.points for p in lesson_points_list)
 
         # 2. 小テスト/QRポイント (QuizScore)
-        all_quiz_scores = QuizScore.objects.filter(
-            student=student,
-            quiz__lesson_session__classroom=classroom,
-            is_cancelled=False
-        ).select_related('quiz', 'quiz__lesson_session').order_by('quiz__lesson_session__session_number')
-
-        # 重複対策: 同一クイズは最新のみ
-        quiz_score_dict = {}
-        for qs in all_quiz_scores:
-            quiz_score_dict[qs.quiz.id] = qs
-        unique_quiz_scores = list(quiz_score_dict.values())
-        unique_quiz_scores.sort(key=lambda x: x.quiz.lesson_session.session_number)
+        unique_quiz_scores = student_quiz_scores_map.get(student.id, [])
 
         quiz_total = sum(qs.score for qs in unique_quiz_scores)
 
@@ -278,80 +156,21 @@ def class_points_view(request: HttpRequest, class_id: int) -> HttpResponse:
             real_vote_score = 0
             
             try:
-                pe_settings = all_sessions_settings.get(sess_id)
-
-                # 貢献度スコア
-                if pe_settings and pe_settings.enable_member_evaluation:
-                    if pe_settings.evaluation_method == PeerEvaluationSettings.EvaluationMethod.DIRECT:
-                        # DIRECTモード: 事前集計したデータを利用
-                        real_contrib_score = direct_mode_contrib_scores.get(sess_id, {}).get(student.id, 0)
-                    else:  # AGGREGATE
-                        real_contrib_score = student_session_contrib_map.get(student.id, {}).get(sess_id, 0)
-                
-                # 投票ポイント
-                student_group_in_session = next((g for g in student_groups if g.group.lesson_session_id == sess_id), None)
-                if student_group_in_session:
-                    group_id = student_group_in_session.group_id
-                    if sess_id in session_rankings_cache:
-                        ranking_info = session_rankings_cache[sess_id]
-                        real_vote_score = ranking_info['group_scores'].get(group_id, 0)
+                # 貢献度スコア・投票ポイント（評価方式に応じてスナップショット作成時に集計済み）
+                session_score = session_score_map.get((student.id, sess_id))
+                if session_score:
+                    real_contrib_score = session_score.contrib
+                    real_vote_score = session_score.vote
                 
                 simulated_contrib_score = real_contrib_score
                 simulated_vote_score = real_vote_score
                 
-                # シミュレーションによるテスト用スコア計算
+                # シミュレーションによるテスト用スコア（計算済み）
                 is_simulated = False
-                if test_mode and has_simulation:
-                    sim_data = sim_data_class.get(str(sess_id), {}).get(str(student.id))
-                    if sim_data is not None:
-                        if isinstance(sim_data, dict):
-                            sess_sim_data = sim_data_class.get(str(sess_id), {})
-                            point_mode = sess_sim_data.get('point_mode', 'settings')
-                            
-                            sim_contrib_score = 0
-                            if pe_settings and pe_settings.enable_member_evaluation:
-                                if point_mode == 'settings':
-                                    if pe_settings.member_scores:
-                                        for i, points in enumerate(pe_settings.member_scores):
-                                            rank = i + 1
-                                            count = sim_data.get(f'member_rank_{rank}')
-                                            if count:
-                                                sim_contrib_score += float(count) * points
-                                elif point_mode == 'manual':
-                                    contrib_val = sim_data.get('contrib')
-                                    if contrib_val:
-                                        sim_contrib_score += float(contrib_val)
-                            elif not pe_settings or not pe_settings.enable_group_evaluation:
-                                # When both are disabled, use contrib
-                                contrib_val = sim_data.get('contrib', sim_data.get('member'))
-                                if contrib_val:
-                                    sim_contrib_score += float(contrib_val)
-
-                            sim_vote_score = 0
-                            if pe_settings and pe_settings.enable_group_evaluation:
-                                if point_mode == 'settings':
-                                    if pe_settings.group_scores:
-                                        for i, points in enumerate(pe_settings.group_scores):
-                                            rank = i + 1
-                                            count = sim_data.get(f'group_rank_{rank}')
-                                            if count:
-                                                sim_vote_score += float(count) * points
-                                elif point_mode == 'manual':
-                                    group_manual = sim_data.get('group_manual')
-                                    if group_manual:
-                                        sim_vote_score += float(group_manual)
-
-                            simulated_contrib_score = sim_contrib_score
-                            simulated_vote_score = sim_vote_score
-                            
-                            # 互換性フォールバック (member, group)
-                            if sim_contrib_score == 0 and sim_vote_score == 0 and ('member' in sim_data or 'group' in sim_data):
-                                simulated_contrib_score = sim_data.get('member', 0)
-                                simulated_vote_score = sim_data.get('group', 0)
-                        else:
-                            simulated_contrib_score = float(sim_data)
-                            simulated_vote_score = 0
-                        is_simulated = True
+                simulated = sim_peer_points.get((student.id, sess_id))
+                if simulated is not None:
+                    simulated_contrib_score, simulated_vote_score = simulated
+                    is_simulated = True
 
                 if real_contrib_score > 0 or real_vote_score > 0 or simulated_contrib_score > 0 or simulated_vote_score > 0 or is_simulated:
                     session_peer_map[sess_id] = {
@@ -400,20 +219,15 @@ def class_points_view(request: HttpRequest, class_id: int) -> HttpResponse:
         simulated_raw_total_points = lesson_total + quiz_total + simulated_peer_total
 
         # DB保存値（目標管理モード用）
-        try:
-            scp = StudentClassPoints.objects.get(student=student, classroom=classroom)
-            db_points = scp.points
-            attendance_points = scp.attendance_points
-        except StudentClassPoints.DoesNotExist:
-            db_points = 0
-            attendance_points = 0
+        scp = student_class_points_map.get(student.id)
+        attendance_points = scp.attendance_points if scp else 0
 
         # ポイント一覧では、モードに関わらず純粋な獲得ポイント（積み上げ）を表示する
         # テストモードの場合は、シミュレーション用ポイントを表示
         display_points = simulated_raw_total_points if test_mode else real_raw_total_points
 
         # 評価レベル判定（仮: 授業回あたりの平均などで判定していたロジックを維持）
-        session_count = lesson_points_qs.count()
+        session_count = len(lesson_points_list)
         lesson_average = round(lesson_total / session_count, 1) if session_count > 0 else 0
 
         if lesson_average >= 5:
@@ -439,7 +253,7 @@ def class_points_view(request: HttpRequest, class_id: int) -> HttpResponse:
             'attendance_points': attendance_points,
             'average_points': lesson_average,
             'session_count': session_count,
-            'lesson_points': lesson_points_qs,
+            'lesson_points': lesson_points_list,
             'quiz_scores': unique_quiz_scores,
             'peer_details': peer_details,
             'grade_level': grade_level,
@@ -452,26 +266,43 @@ def class_points_view(request: HttpRequest, class_id: int) -> HttpResponse:
     student_grades.sort(key=lambda x: x['total_points'], reverse=True)
 
     # クラス全体の統計
-    total_students = len(student_grades)
-    if total_students > 0:
-        class_average = round(sum(grade['total_points'] for grade in student_grades) / total_students, 1)
-        max_average = max(grade['total_points'] for grade in student_grades)
-        min_average = min(grade['total_points'] for grade in student_grades)
-    else:
-        class_average = 0
-        max_average = 0
-        min_average = 0
+    summary = summarize(grade['total_points'] for grade in student_grades)
 
-    context = {
-        'classroom': classroom,
-        'grading_system': grading_system,
+    return {
         'student_grades': student_grades,
         'class_stats': {
-            'total_students': total_students,
-            'class_average': class_average,
-            'max_average': max_average,
-            'min_average': min_average,
+            'total_students': summary['count'],
+            'class_average': summary['average'],
+            'max_average': summary['max'],
+            'min_average': summary['min'],
         },
+    }
+
+
+@login_required
+def class_points_view(request: HttpRequest, class_id: int) -> HttpResponse:
+    """
+    クラスごとのポイント一覧を表示するビュー
+    """
+    classroom = get_object_or_404(ClassRoom, id=class_id, teachers=request.user)
+
+    # テストモードか判定（シミュレーション用点数はテストモードのときだけ読み込む）
+    test_mode = request.session.get('test_mode', False)
+    sim_data_class = PeerEvaluationSimulation.load_class_data(request.user, classroom) if test_mode else {}
+    has_simulation = len(sim_data_class) > 0
+
+    # 集計結果は成績・授業回・クラス設定が変わるまでキャッシュを使う（授業中の再読み込み対策）
+    cache_key = class_grades_cache_key('class_points', classroom, test_mode, sim_data_class)
+    data = cache.get(cache_key)
+    if data is None:
+        data = _build_class_points(classroom, test_mode, sim_data_class)
+        cache.set(cache_key, data, CLASS_GRADES_TIMEOUT)
+
+    context = {
+        'classroom': classroom,
+        'grading_system': classroom.grading_system,
+        'student_grades': data['student_grades'],
+        'class_stats': data['class_stats'],
         'has_simulation': has_simulation,
         'test_mode': test_mode,
     }
@@ -533,21 +364,21 @@ def update_class_settings(request: HttpRequest, class_id: int) -> HttpResponse:
         except ValueError:
             pass
 
-    classroom.save()
-
-    # 評価システムが変更された場合、全学生のポイントを再計算（モード切替）
-    if recalculate_points:
-        scps = StudentClassPoints.objects.filter(classroom=classroom)
-        for scp in scps:
-            scp.save()  # save()時に calculate_points_internal が走り、モードに応じた計算が行われる
-
-    # 出席点満点が変更された場合、全学生の出席点を再計算
-    if recalculate_attendance:
-        scps = StudentClassPoints.objects.filter(classroom=classroom)
-        for scp in scps:
-            # 出席点 = 出席率 * 満点 / 100
-            scp.attendance_points = (scp.attendance_rate * classroom.attendance_max_points) / 100
-            scp.save()  # save()で合計点も再計算される
+    with transaction.atomic():
+        # クラスの保存時にシグナルで成績画面のキャッシュも無効化される
+        classroom.save()
+
+        # 出席点満点が変更された場合、全学生の出席点（出席率 × 満点 / 100）を1回の UPDATE で更新
+        if recalculate_attendance:
+            rescale_attendance_points(classroom)
+
+        # 評価システム（モード切替）または出席点が変更された場合、全学生の合計点をまとめて再計算
+        if recalculate_points or recalculate_attendance:
+            recalculate_class_points(classroom, invalidate_cache=False)
+            # 出席点・合計点はシグナルを通らずに更新されるため、学生ダッシュボードのキャッシュはここで無効化する
+            bump_student_points_versions(
+                StudentClassPoints.objects.filter(classroom=classroom).values_list('student_id', flat=True)
+            )
 
     # リファラ（元のページ）に応じてリダイレクト先を調整
     referer = request.META.get('HTTP_REFERER', '')
@@ -0,0 +1,276 @@
+"""
+学部全体の成績レポート（管理者用）
+
+年度・学期を指定して、その学期の全クラスの評価一覧をまとめて集計する。
+各クラスの成績は評価一覧と同じ計算（_build_class_evaluations_from_facts）で求め、
+計算結果はクラスの評価一覧のキャッシュに載るため、後から教員が評価一覧を開いても再計算されない。
+レポートにはシミュレーション（テストモード）の点数を含めない。
+
+クラスごとに評価一覧を読み込むとクエリ数がクラス数に比例して増えるため、
+REPORT_BATCH_SIZE クラスずつキャッシュをまとめて確認し、未計算のクラスのデータは
+種類ごとに1回のクエリでまとめて読み込む（_load_class_evaluation_facts_many）。
+
+- 画面: クラスごとの平均・中央値・最高/最低・足切り人数と、学期全体の成績分布
+- ZIP出力: クラス一覧・成績分布・クラスごとの評価一覧（CSV）を1クラス分ずつ送り出す
+"""
+import csv
+import io
+import re
+import zipfile
+from datetime import datetime
+from urllib.parse import quote
+
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.http import StreamingHttpResponse
+from django.shortcuts import redirect, render
+
+from ...grade_analytics import histogram, summarize
+from ...grade_cache import CLASS_GRADES_TIMEOUT, class_grades_cache_keys
+from ...models import ClassRoom
+from .class_evaluation import _build_class_evaluations_from_facts, _load_class_evaluation_facts_many
+
+DISTRIBUTION_BINS = 10
+
+# まとめて読み込むクラス数（1回に読み込むデータ量の上限）
+REPORT_BATCH_SIZE = 20
+
+CLASS_SUMMARY_HEADERS = [
+    'クラス名', '評価方式', '学生数', '平均', '中央値', '最高', '最低', '足切り人数', '素点の平均',
+]
+STUDENT_HEADERS = [
+    '学籍番号', '氏名', 'フリガナ', '最終成績', '素点', '足切り',
+    '出席率', '出席点', '授業点', '小テスト合計', 'ピア評価合計',
+]
+
+
+def report_classrooms(year, semester):
+    """レポート対象のクラス（年度・学期で絞り込み）"""
+    return ClassRoom.objects.filter(year=year, semester=semester).order_by('class_name', 'id')
+
+
+def iter_class_evaluations(year, semester):
+    """対象クラスの評価一覧を1クラスずつ (番号, クラス数, クラス, 評価一覧) で返す"""
+    classrooms = list(report_classrooms(year, semester))
+    for start in range(0, len(classrooms), REPORT_BATCH_SIZE):
+        batch = classrooms[start:start + REPORT_BATCH_SIZE]
+        cache_keys = class_grades_cache_keys('class_evaluation', batch)
+        cached = cache.get_many(cache_keys.values())
+        missing = [classroom for classroom in batch if cache_keys[classroom.id] not in cached]
+        facts_by_class = _load_class_evaluation_facts_many(missing) if missing else {}
+        for index, classroom in enumerate(batch, start + 1):
+            data = cached.get(cache_keys[classroom.id])
+            if data is None:
+                data = _build_class_evaluations_from_facts(facts_by_class[classroom.id])
+                cache.set(cache_keys[classroom.id], data, CLASS_GRADES_TIMEOUT)
+            yield index, len(classrooms), classroom, data
+
+
+def summarize_class(classroom, data):
+    """1クラス分の集計（最終成績の統計と足切り人数）"""
+    evaluations = data['student_evaluations']
+    summary = summarize(evaluation['final_score_100'] for evaluation in evaluations)
+    return {
+        'classroom': classroom,
+        'grading_system': data['grading_system'],
+        'student_count': summary['count'],
+        'average': summary['average'],
+        'median': summary['median'],
+        'max': summary['max'],
+        'min': summary['min'],
+        'cutoff_count': sum(1 for evaluation in evaluations if evaluation['is_below_cutoff']),
+        'class_average_points': data['class_average_points'],
+    }
+
+
+def score_distribution(scores):
+    """最終成績の分布（0点から最高点までを等分した区間ごとの人数）"""
+    scores = list(scores)
+    high = max([100] + scores)
+    counts, edges = histogram(scores, bins=DISTRIBUTION_BINS, value_range=(0, high))
+    return [
+        {'low': round(edges[i], 1), 'high': round(edges[i + 1], 1), 'count': count}
+        for i, count in enumerate(counts)
+    ]
+
+
+def build_department_report(year, semester, progress=None):
+    """学期全体のレポートを作る
+
+    progress を指定すると、1クラス集計するたびに progress(番号, クラス数, クラス) を呼ぶ。
+    """
+    classes = []
+    all_scores = []
+    for index, total, classroom, data in iter_class_evaluations(year, semester):
+        classes.append(summarize_class(classroom, data))
+        all_scores.extend(evaluation['final_score_100'] for evaluation in data['student_evaluations'])
+        if progress:
+            progress(index, total, classroom)
+
+    return {
+        'year': year,
+        'semester': semester,
+        'classes': classes,
+        'summary': summarize(all_scores),
+        'cutoff_count': sum(item['cutoff_count'] for item in classes),
+        'distribution': score_distribution(all_scores),
+    }
+
+
+def _class_summary_row(item):
+    return [
+        item['classroom'].class_name,
+        item['classroom'].get_grading_system_display(),
+        item['student_count'],
+        item['average'],
+        item['median'],
+        item['max'],
+        item['min'],
+        item['cutoff_count'],
+        item['class_average_points'],
+    ]
+
+
+def _student_row(evaluation):
+    student = evaluation['student']
+    return [
+        student.student_number,
+        student.full_name,
+        student.furigana,
+        evaluation['final_score_100'],
+        evaluation['total_points'],
+        1 if evaluation['is_below_cutoff'] else 0,
+        evaluation['attendance_rate'],
+        evaluation['attendance_points'],
+        evaluation['score_points'],
+        evaluation['total_quiz_score'],
+        evaluation['total_peer_score'],
+    ]
+
+
+def _csv_bytes(headers, rows):
+    """BOM付きUTF-8のCSV（Excelでそのまま開けるようにする）"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    writer.writerows(rows)
+    return ('\ufeff' + buffer.getvalue()).encode('utf-8')
+
+
+def _archive_name(index, classroom):
+    # ZIP内のファイル名に使えない文字は置き換える（同名クラスは番号で区別される）
+    name = re.sub(r'[\\/:*?"<>|]', '_', classroom.class_name)
+    return f'classes/{index:03d}_{name}.csv'
+
+
+class _ZipStream:
+    """zipfile の書き込み先。書き込まれたバイト列を溜めておき、drain() で取り出す
+
+    tell() を持たないため、zipfile はシークせずにデータ記述子付きで書き込む。
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_department_report_zip(year, semester, progress=None):
+    """レポートのZIPを1クラス分ずつバイト列で返す
+
+    クラスごとの評価一覧を書き込むたびに送り出し、最後にクラス一覧と成績分布を書き込む。
+    """
+    stream = _ZipStream()
+    classes = []
+    all_scores = []
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for index, total, classroom, data in iter_class_evaluations(year, semester):
+            evaluations = data['student_evaluations']
+            archive.writestr(
+                _archive_name(index, classroom),
+                _csv_bytes(STUDENT_HEADERS, (_student_row(evaluation) for evaluation in evaluations)),
+            )
+            classes.append(summarize_class(classroom, data))
+            all_scores.extend(evaluation['final_score_100'] for evaluation in evaluations)
+            if progress:
+                progress(index, total, classroom)
+            yield stream.drain()
+
+        archive.writestr('クラス一覧.csv', _csv_bytes(
+            CLASS_SUMMARY_HEADERS, (_class_summary_row(item) for item in classes)
+        ))
+        archive.writestr('成績分布.csv', _csv_bytes(
+            ['下限', '上限', '人数'],
+            ([bucket['low'], bucket['high'], bucket['count']] for bucket in score_distribution(all_scores)),
+        ))
+    yield stream.drain()
+
+
+def _report_period(request):
+    """リクエストの年度・学期（未指定なら最新の年度・前期）。不正な値は None を返す"""
+    semesters = dict(ClassRoom.SEMESTER_CHOICES)
+    semester = request.GET.get('semester') or 'first'
+    year = request.GET.get('year')
+    if not year:
+        latest = ClassRoom.objects.order_by('-year').values_list('year', flat=True).first()
+        year = latest or datetime.now().year
+    try:
+        year = int(year)
+    except (TypeError, ValueError):
+        return None, None
+    if semester not in semesters:
+        return None, None
+    return year, semester
+
+
+@login_required
+def department_report_view(request):
+    """学部全体の成績レポート（管理者用）"""
+    if request.user.role != 'admin':
+        messages.error(request, '管理者のみアクセス可能です。')
+        return redirect('school_management:dashboard')
+
+    year, semester = _report_period(request)
+    if year is None:
+        messages.error(request, '年度・学期の指定が正しくありません。')
+        return redirect('school_management:department_report')
+
+    context = {
+        'report': build_department_report(year, semester),
+        'year': year,
+        'semester': semester,
+        'semester_choices': ClassRoom.SEMESTER_CHOICES,
+        'years': ClassRoom.objects.order_by('-year').values_list('year', flat=True).distinct(),
+    }
+    return render(request, 'school_management/department_report.html', context)
+
+
+@login_required
+def department_report_export(request):
+    """学部全体の成績レポートをZIP（クラス一覧・成績分布・クラスごとのCSV）で出力する"""
+    if request.user.role != 'admin':
+        messages.error(request, '管理者のみアクセス可能です。')
+        return redirect('school_management:dashboard')
+
+    year, semester = _report_period(request)
+    if year is None:
+        messages.error(request, '年度・学期の指定が正しくありません。')
+        return redirect('school_management:department_report')
+
+    response = StreamingHttpResponse(
+        iter_department_report_zip(year, semester), content_type='application/zip'
+    )
+    filename = f"成績レポート_{year}_{dict(ClassRoom.SEMESTER_CHOICES)[semester]}_{datetime.now().strftime('%Y%m%d')}.zip"
+    response['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(filename)}"
+    return response
@@ -1,4 +1,3 @@
-import hashlib
 import uuid
 from django.shortcuts import render, redirect
 from django.contrib import messages
@@ -9,13 +8,9 @@ def peer_evaluation_form_view(request, token):
     # トークンからセッション情報を取得（簡易実装)
     
     try:
-        # トークンの検証とセッション取得
-        for session in LessonSession.objects.filter(has_peer_evaluation=True):
-            session_token = hashlib.md5(f"peer_{session.id}".encode()).hexdigest()
-            if session_token == token:
-                target_session = session
-                break
-        else:
+        # トークンの検証とセッション取得（保存済みトークンの索引で1回だけ検索）
+        target_session = LessonSession.objects.filter(has_peer_evaluation=True, peer_token=token).first()
+        if target_session is None:
             messages.error(request, '無効なリンクです。')
             return redirect('school_management:login')
             
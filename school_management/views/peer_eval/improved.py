@@ -15,7 +15,7 @@ from django.db import IntegrityError
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
 from django.utils import timezone
-from django.db.models import Q, Prefetch # Import Q for filtering
+from django.db.models import Count, Q, Prefetch # Import Q for filtering
 from ...models import (
     LessonSession,
     Group,
@@ -23,10 +23,22 @@ from ...models import (
     PeerEvaluation,
     PeerEvaluationSettings,
     ContributionEvaluation,
+    GroupVoteTally,
     Student,
-    StudentClassPoints,
     GoogleOAuthSession,
+    PeerEvaluationSimulation,
 )
+from ...grade_cache import bump_classroom_grade_versions
+from ...grade_engine import recalculate_class_points
+from ...grade_queue import mark_many_dirty
+from ...scoring import (
+    build_group_vote_point_map_from_counts,
+    build_member_aggregate_points,
+    compute_internal_points,
+    direct_rank_points,
+)
+from ...session_scores import rebuild_session_scores
+from ...vote_tally import finalize_group_vote_tallies
 
 
 def _normalize_email(value):
@@ -731,6 +743,8 @@ def close_peer_evaluation(request, session_id):
     if request.method == 'POST':
         lesson_session.peer_evaluation_status = LessonSession.PeerEvaluationStatus.CLOSED
         lesson_session.save()
+        # グループ投票の付与ポイントを確定
+        finalize_group_vote_tallies(lesson_session.id)
         
         # 集計して付与モードの場合、締め切り時に集計を実行
         if lesson_session.peer_evaluation_configured:
@@ -738,9 +752,11 @@ def close_peer_evaluation(request, session_id):
             if pe_settings.enable_member_evaluation and pe_settings.evaluation_method == 'AGGREGATE':
                 _aggregate_member_scores(lesson_session, pe_settings)
 
-        # 締切時点の条件で全学生のクラスポイントを再計算
-        for scp in StudentClassPoints.objects.filter(classroom=lesson_session.classroom).select_related('student'):
-            scp.recalculate_total()
+        # 締切時点の条件で全学生のクラスポイントと授業回別の得点をまとめて再計算
+        recalculate_class_points(lesson_session.classroom)
+        rebuild_session_scores(lesson_session.classroom)
+        # 授業回の保存時の無効化より後に確定・集計した分が、成績画面のキャッシュに残らないようにする
+        bump_classroom_grade_versions([lesson_session.classroom_id])
         
         messages.success(request, 'ピア評価を締め切りました。')
     
@@ -760,75 +776,59 @@ def reopen_peer_evaluation(request, session_id):
 
 
 def _aggregate_member_scores(lesson_session, pe_settings):
-    """集計して付与: グループ内メンバー評価を集計し、ContributionEvaluationを作成"""
+    """集計して付与: グループ内メンバー評価を集計し、ContributionEvaluationを作成
+
+    グループ数に関係なく、読み込み・削除・作成をそれぞれまとめて行う。
+    配点（内部ポイント G-N の降順・同点は同順位）は scoring で計算する。
+    """
     member_score_list = pe_settings.member_scores or []
     if not member_score_list:
         return
-    
-    groups = Group.objects.filter(lesson_session=lesson_session)
-    evals = PeerEvaluation.objects.filter(lesson_session=lesson_session)
-    
+
+    groups = list(Group.objects.filter(lesson_session=lesson_session))
+    if not groups:
+        return
+
+    # まず既存のContributionEvaluationを削除（各グループの集計分）
+    ContributionEvaluation.objects.filter(
+        peer_evaluation__lesson_session=lesson_session,
+        peer_evaluation__evaluator_group__in=groups,
+    ).delete()
+
+    # 現在のグループメンバーのみを対象にする（途中でグループから外れたメンバーへの投票は対象外）
+    group_member_ids = defaultdict(list)
+    for group_id, student_id in GroupMember.objects.filter(
+        group__in=groups
+    ).order_by('id').values_list('group_id', 'student_id'):
+        group_member_ids[group_id].append(student_id)
+
+    group_responses = defaultdict(list)
+    # 集計結果の保存先（グループの最初の回答）
+    group_first_eval_ids = {}
+    for eval_id, group_id, response in PeerEvaluation.objects.filter(
+        lesson_session=lesson_session, evaluator_group__in=groups
+    ).order_by('id').values_list('id', 'evaluator_group_id', 'response_json'):
+        group_responses[group_id].append(response)
+        group_first_eval_ids.setdefault(group_id, eval_id)
+
+    to_create = []
     for group in groups:
-        group_members = list(GroupMember.objects.filter(group=group).select_related('student'))
-        G = len(group_members)
-        
-        # まず既存のContributionEvaluationを削除（このグループの集計分）
-        ContributionEvaluation.objects.filter(
-            peer_evaluation__lesson_session=lesson_session,
-            peer_evaluation__evaluator_group=group,
-        ).delete()
-        
-        if G <= 1:
-            continue
-        
-        # 内部ポイント集計: G-N点 (Nは与えられた順位)
-        # 現在のグループメンバーのみを対象にする（dictで固定し、途中でグループから
-        # 外れたメンバーへの投票が混入しないようにする。defaultdictだと
-        # 存在しないキー参照だけで自動的にエントリが作られてしまうため使わない）
-        internal_points = {member.student_id: 0 for member in group_members}
-        current_member_ids = set(internal_points.keys())
-
-        group_evals = evals.filter(evaluator_group=group)
-        for ev in group_evals:
-            response = ev.response_json or {}
-            for entry in response.get('group_members_eval', []):
-                member_id = _safe_int(entry.get('member_id'))
-                rank = _safe_int(entry.get('rank'))
-                if member_id is None or rank is None:
-                    continue
-                if member_id not in current_member_ids:
-                    # 集計時点でグループに所属していないメンバーへの投票は対象外
-                    continue
-                internal_points[member_id] += (G - rank)
-        
-        # ポイント降順でソート
-        sorted_members = sorted(internal_points.items(), key=lambda x: x[1], reverse=True)
-        
-        # 同点（タイ）対応: 同じポイントのメンバーには同じ順位の点数を付与
-        
-        # ダミーのピア評価を取得（集計結果保存用）
-        aggregate_eval = group_evals.first()
-        if not aggregate_eval:
+        aggregate_eval_id = group_first_eval_ids.get(group.id)
+        if aggregate_eval_id is None:
             continue
-        
-        current_rank = 0
-        prev_points = None
-        for idx, (member_id, points) in enumerate(sorted_members):
-            if points != prev_points:
-                current_rank = idx  # 0-indexed
-                prev_points = points
-            
-            score = member_score_list[current_rank] if current_rank < len(member_score_list) else 0
-            if score > 0:
-                try:
-                    member = Student.objects.get(id=member_id)
-                    ContributionEvaluation.objects.create(
-                        peer_evaluation=aggregate_eval,
-                        evaluatee=member,
-                        contribution_score=score
-                    )
-                except Student.DoesNotExist:
-                    pass
+        points_by_member = build_member_aggregate_points(
+            group_member_ids.get(group.id, []), group_responses[group.id], member_score_list
+        )
+        to_create.extend(
+            ContributionEvaluation(
+                peer_evaluation_id=aggregate_eval_id, evaluatee_id=member_id, contribution_score=score
+            )
+            for member_id, score in points_by_member.items()
+            if score > 0
+        )
+    ContributionEvaluation.objects.bulk_create(to_create)
+    # bulk_create はシグナルを発火しないため、再計算の対象はまとめて登録する
+    mark_many_dirty({ev.evaluatee_id for ev in to_create}, lesson_session.classroom_id)
 
 @login_required
 def peer_evaluation_results(request, session_id):
@@ -840,8 +840,11 @@ def peer_evaluation_results(request, session_id):
     evaluations = PeerEvaluation.objects.filter(lesson_session=lesson_session).select_related('evaluator_group')
     groups = Group.objects.filter(lesson_session=lesson_session)
     
-    # response_jsonからグループ別得票を集計
-    group_vote_counts = defaultdict(lambda: defaultdict(int))  # {group_id: {rank: count}}
+    # グループ別得票はグループ投票集計（GroupVoteTally）から取得する
+    group_vote_counts = {  # {group_id: {rank: count}}
+        tally.group_id: tally.get_rank_counts()
+        for tally in GroupVoteTally.objects.filter(lesson_session=lesson_session)
+    }
     
     pe_settings = None
     if lesson_session.peer_evaluation_configured:
@@ -865,67 +868,39 @@ def peer_evaluation_results(request, session_id):
         for idx, point in enumerate(group_score_list)
     ]
     
-    for ev in evaluations:
-        response = ev.response_json or {}
-        for entry in response.get('other_group_eval', []):
-            gid = entry.get('group_id')
-            rank = entry.get('rank')
-            if gid and rank:
-                group_vote_counts[gid][rank] += 1
-
-    aggregate_group_scores = {}
-    aggregate_internal_points = {}
-    if (
-        pe_settings
-        and pe_settings.enable_group_evaluation
-        and pe_settings.group_evaluation_method == PeerEvaluationSettings.EvaluationMethod.AGGREGATE
-        and lesson_session.peer_evaluation_status == LessonSession.PeerEvaluationStatus.CLOSED
-    ):
-        group_ids = [g.id for g in groups]
-        group_count = len(group_ids)
-        aggregate_internal_points = {gid: 0 for gid in group_ids}
-        for ev in evaluations:
-            response = ev.response_json or {}
-            for entry in response.get('other_group_eval', []):
-                gid = _safe_int(entry.get('group_id'))
-                rank = _safe_int(entry.get('rank'))
-                if gid in aggregate_internal_points and rank is not None and 1 <= rank <= group_count:
-                    aggregate_internal_points[gid] += (group_count - rank)
-
-        sorted_groups_internal = sorted(
-            aggregate_internal_points.items(),
-            key=lambda x: x[1],
-            reverse=True,
-        )
-        current_rank = 0
-        prev_points = None
-        for idx, (gid, internal_points) in enumerate(sorted_groups_internal):
-            if internal_points != prev_points:
-                current_rank = idx
-                prev_points = internal_points
-            aggregate_group_scores[gid] = group_score_list[current_rank] if current_rank < len(group_score_list) else 0
-    
-    group_stats = {}
+    group_ids = [g.id for g in groups]
     is_group_aggregate_mode = (
         pe_settings
         and pe_settings.enable_group_evaluation
         and pe_settings.group_evaluation_method == PeerEvaluationSettings.EvaluationMethod.AGGREGATE
     )
+    aggregate_internal_points = {}
+    if is_group_aggregate_mode:
+        if lesson_session.peer_evaluation_status == LessonSession.PeerEvaluationStatus.CLOSED:
+            aggregate_internal_points = compute_internal_points(group_ids, group_vote_counts)
+        # 締切前は全グループ0点
+        group_total_scores = build_group_vote_point_map_from_counts(
+            group_ids,
+            group_vote_counts,
+            pe_settings.group_evaluation_method,
+            group_score_list,
+            lesson_session.peer_evaluation_status,
+        )
+    else:
+        group_total_scores = direct_rank_points(group_ids, group_vote_counts, group_score_list or [])
+
+    evaluations_given_by_group = dict(
+        evaluations.values('evaluator_group_id').annotate(count=Count('id')).values_list(
+            'evaluator_group_id', 'count'
+        )
+    )
+
+    group_stats = {}
     for group in groups:
         votes = group_vote_counts.get(group.id, {})
-        if aggregate_group_scores:
-            total_score = aggregate_group_scores.get(group.id, 0)
-        elif is_group_aggregate_mode:
-            total_score = 0
-        else:
-            total_score = 0
-            for rank, count in votes.items():
-                normalized_rank = _safe_int(rank)
-                if normalized_rank and 1 <= normalized_rank <= len(group_score_list):
-                    total_score += group_score_list[normalized_rank - 1] * count
+        total_score = group_total_scores.get(group.id, 0)
         votes_by_rank_list = [votes.get(idx + 1, 0) for idx in range(len(group_score_list))]
-        
-        evaluations_given = evaluations.filter(evaluator_group=group).count()
+        evaluations_given = evaluations_given_by_group.get(group.id, 0)
         
         group_stats[group.id] = {
             'group': group,
@@ -983,7 +958,8 @@ def peer_evaluation_results(request, session_id):
     student_rows = []
     submitted_count = 0
     
-    sim_data = request.session.get('peer_sim_points', {}).get(str(lesson_session.classroom.id), {}).get(str(lesson_session.id), {})
+    saved_sim_data = PeerEvaluationSimulation.load_session_data(request.user, lesson_session)
+    sim_data = saved_sim_data or {}
     sim_point_mode = sim_data.get('point_mode', 'settings')
 
     # グループマッピングの作成
@@ -1101,7 +1077,7 @@ def peer_evaluation_results(request, session_id):
             })
 
     test_mode = request.session.get('test_mode', False)
-    has_simulation = str(lesson_session.id) in request.session.get('peer_sim_points', {}).get(str(lesson_session.classroom.id), {})
+    has_simulation = saved_sim_data is not None
 
     context = {
         'lesson_session': lesson_session,
@@ -1,10 +1,14 @@
-from collections import defaultdict
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, get_object_or_404, redirect
 from django.http import HttpRequest, HttpResponse, HttpResponseRedirect
 from django.utils.http import url_has_allowed_host_and_scheme
 from django.views.decorators.http import require_POST
-from ...models import LessonSession, PeerEvaluationSettings, GroupMember, Student
+from django.db.models import Count
+from ...models import (
+    ContributionEvaluation, LessonSession, PeerEvaluationSettings, GroupMember, GroupVoteTally, Student,
+    PeerEvaluationSimulation,
+)
+from ...scoring import compute_internal_points, direct_rank_points
 
 def _safe_int(value):
     try:
@@ -60,16 +64,10 @@ def _build_submission_detail(evaluation, group_name_map, student_name_map, activ
 @login_required
 @require_POST
 def save_peer_evaluation_simulation(request: HttpRequest, session_id: int) -> HttpResponse:
-    """ピア評価のシミュレーション（テスト用）点数をセッションに保存する"""
+    """ピア評価のシミュレーション（テスト用）点数を保存する（教員・授業回ごとに1件）"""
     session = get_object_or_404(LessonSession, id=session_id, classroom__teachers=request.user)
-    class_id = str(session.classroom.id)
-
-    sim_data = request.session.get('peer_sim_points', {})
-    if class_id not in sim_data:
-        sim_data[class_id] = {}
 
     session_sim = {}
-    session_sim['point_mode'] = request.POST.get('sim_point_mode', 'settings')
 
     for key, value in request.POST.items():
         if value.strip():
@@ -140,8 +138,17 @@ def save_peer_evaluation_simulation(request: HttpRequest, session_id: int) -> Ht
                 except ValueError:
                     pass
 
-    sim_data[class_id][str(session_id)] = session_sim
-    request.session['peer_sim_points'] = sim_data
+    PeerEvaluationSimulation.objects.update_or_create(
+        teacher=request.user,
+        lesson_session=session,
+        defaults={
+            'classroom': session.classroom,
+            'point_mode': request.POST.get('sim_point_mode', 'settings'),
+            'student_points': session_sim,
+        },
+    )
+    # 以前はログインセッションに保存していたため、残っていれば削除する
+    request.session.pop('peer_sim_points', None)
 
     from django.contrib import messages
     messages.success(request, 'シミュレーション用のテスト点数を保存しました。')
@@ -158,12 +165,9 @@ def save_peer_evaluation_simulation(request: HttpRequest, session_id: int) -> Ht
 def clear_peer_evaluation_simulation(request: HttpRequest, session_id: int) -> HttpResponse:
     """特定のセッションのシミュレーションデータをクリアする"""
     session = get_object_or_404(LessonSession, id=session_id, classroom__teachers=request.user)
-    class_id = str(session.classroom.id)
 
-    sim_data = request.session.get('peer_sim_points', {})
-    if class_id in sim_data and str(session_id) in sim_data[class_id]:
-        del sim_data[class_id][str(session_id)]
-        request.session['peer_sim_points'] = sim_data
+    PeerEvaluationSimulation.objects.filter(teacher=request.user, lesson_session=session).delete()
+    request.session.pop('peer_sim_points', None)
 
     from django.contrib import messages
     messages.success(request, 'この授業回のシミュレーションデータをクリアしました。')
@@ -208,25 +212,19 @@ def peer_evaluation_results_view(request: HttpRequest, session_id: int) -> HttpR
     
     group_score_list = pe_settings.group_scores if pe_settings else []
     
-    # response_jsonからグループ別得票を集計
-    group_vote_counts = defaultdict(lambda: defaultdict(int))
+    # グループ別得票はグループ投票集計（GroupVoteTally）から取得する
+    group_vote_counts = {
+        tally.group_id: tally.get_rank_counts()
+        for tally in GroupVoteTally.objects.filter(lesson_session=session)
+    }
     
     contribution_scores = {}
     
-    for evaluation in evaluations:
-        response = evaluation.response_json or {}
-        for entry in response.get('other_group_eval', []):
-            gid = _safe_int(entry.get('group_id'))
-            rank = _safe_int(entry.get('rank'))
-            if gid is not None and rank is not None:
-                group_vote_counts[gid][rank] += 1
-        
-        # 貢献度評価集計
-        for contrib_eval in evaluation.contributionevaluation_set.all():
-            student_name = contrib_eval.evaluatee.full_name
-            if student_name not in contribution_scores:
-                contribution_scores[student_name] = []
-            contribution_scores[student_name].append(contrib_eval.contribution_score)
+    # 貢献度評価集計（授業回分をまとめて取得）
+    for student_name, score in ContributionEvaluation.objects.filter(
+        peer_evaluation__lesson_session=session
+    ).order_by('peer_evaluation_id', 'id').values_list('evaluatee__full_name', 'contribution_score'):
+        contribution_scores.setdefault(student_name, []).append(score)
     
     # 平均貢献度計算
     avg_contribution_scores = {}
@@ -245,26 +243,19 @@ def peer_evaluation_results_view(request: HttpRequest, session_id: int) -> HttpR
         and pe_settings.group_evaluation_method == PeerEvaluationSettings.EvaluationMethod.AGGREGATE
         and session.peer_evaluation_status == LessonSession.PeerEvaluationStatus.CLOSED
     ):
-        group_ids = [g.id for g in groups]
-        group_count = len(group_ids)
-        aggregate_internal_points = {gid: 0 for gid in group_ids}
-        for ev in evaluations:
-            response = ev.response_json or {}
-            for entry in response.get('other_group_eval', []):
-                gid = _safe_int(entry.get('group_id'))
-                rank = _safe_int(entry.get('rank'))
-                if gid in aggregate_internal_points and rank is not None and 1 <= rank <= group_count:
-                    aggregate_internal_points[gid] += (group_count - rank)
+        aggregate_internal_points = compute_internal_points([g.id for g in groups], group_vote_counts)
+
+    group_total_scores = direct_rank_points([g.id for g in groups], group_vote_counts, group_score_list or [])
+    evaluations_given_by_group = dict(
+        evaluations.values('evaluator_group_id').annotate(count=Count('id')).values_list(
+            'evaluator_group_id', 'count'
+        )
+    )
 
     for group in groups:
         votes = group_vote_counts.get(group.id, {})
-        total_score = 0
-        for rank, count in votes.items():
-            rank = _safe_int(rank)
-            if rank is not None and 1 <= rank <= len(group_score_list):
-                total_score += group_score_list[rank - 1] * count
-        
-        evaluations_given = evaluations.filter(evaluator_group=group).count()
+        total_score = group_total_scores.get(group.id, 0)
+        evaluations_given = evaluations_given_by_group.get(group.id, 0)
         
         group_stats[group.id] = {
             'group': group,
@@ -298,6 +289,9 @@ def peer_evaluation_results_view(request: HttpRequest, session_id: int) -> HttpR
     enrolled_students = list(Student.objects.filter(id__in=all_participant_ids, role='student').order_by('student_number'))
     group_name_map = {group.id: group.display_name for group in groups}
     student_name_map = {student.id: student.full_name for student in enrolled_students}
+    # この授業回のシミュレーション用の値（学生ごとの入力値）
+    saved_sim_data = PeerEvaluationSimulation.load_session_data(request.user, session)
+    sim_data = saved_sim_data or {}
     submission_rows = []
     submitted_count = 0
     for enrolled_student in enrolled_students:
@@ -308,7 +302,6 @@ def peer_evaluation_results_view(request: HttpRequest, session_id: int) -> HttpR
             
         # シミュレーション用の値を取得（辞書形式を想定）
         student_sim_data = {}
-        sim_data = request.session.get('peer_sim_points', {}).get(str(session.classroom.id), {}).get(str(session.id), {})
         if str(enrolled_student.id) in sim_data:
             data = sim_data[str(enrolled_student.id)]
             if isinstance(data, dict):
@@ -353,7 +346,7 @@ def peer_evaluation_results_view(request: HttpRequest, session_id: int) -> HttpR
     submission_rate = round((submitted_count / total_students) * 100, 1) if total_students else 0
     
     # 現在のセッションのシミュレーション状態
-    has_simulation = str(session.id) in request.session.get('peer_sim_points', {}).get(str(session.classroom.id), {})
+    has_simulation = saved_sim_data is not None
     test_mode = request.session.get('test_mode', False)
 
     context = {
@@ -1,8 +1,45 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db import transaction
+from ...grade_queue import mark_many_dirty
 from ...models import Quiz, QuizScore
 
+
+def _save_quiz_scores(quiz, submitted_scores, teacher):
+    """入力された点数のうち、現在の点数から変わったものだけをまとめて保存する
+
+    submitted_scores: {student_id: score}
+    変更のあった学生の有効な採点結果を1回の UPDATE で取り消し、新しい採点結果を
+    bulk_create で作成する。bulk_create はシグナルを発火しないため、成績の再計算は
+    対象の学生分をまとめて予約する（コミット時に1回だけ実行される）。
+    戻り値: 保存した件数
+    """
+    # 有効な（取り消されていない）採点結果は unique_current_quiz_score 制約で学生ごとに1件だけ
+    current_scores = dict(
+        QuizScore.objects.filter(
+            quiz=quiz, student_id__in=submitted_scores, is_cancelled=False
+        ).values_list('student_id', 'score')
+    )
+    changed = {
+        student_id: score
+        for student_id, score in submitted_scores.items()
+        if current_scores.get(student_id) != score
+    }
+    if not changed:
+        return 0
+
+    with transaction.atomic():
+        QuizScore.objects.filter(
+            quiz=quiz, student_id__in=changed, is_cancelled=False
+        ).update(is_cancelled=True)
+        QuizScore.objects.bulk_create([
+            QuizScore(quiz=quiz, student_id=student_id, score=score, graded_by=teacher)
+            for student_id, score in changed.items()
+        ])
+        mark_many_dirty(changed, quiz.lesson_session.classroom_id, create=True)
+    return len(changed)
+
 @login_required
 def quiz_grading_view(request, quiz_id):
     """小テスト採点"""
@@ -30,25 +67,21 @@ def quiz_grading_view(request, quiz_id):
             # 採点結果保存
             teacher = request.user  # 現在のユーザーを採点者として使用
             
+            submitted_scores = {}
             for student in students:
                 score_value = request.POST.get(f'score_{student.student_number}')
                 if score_value and score_value.strip():
                     try:
                         score = int(score_value)
                         if 0 <= score <= quiz.max_score:
-                            # 既存の採点結果があれば削除
-                            QuizScore.objects.filter(quiz=quiz, student=student, is_cancelled=False).update(is_cancelled=True)
-                            # 新しい採点結果を作成
-                            QuizScore.objects.create(
-                                quiz=quiz,
-                                student=student,
-                                score=score,
-                                graded_by=teacher
-                            )
+                            submitted_scores[student.id] = score
                     except ValueError:
                         pass  # 無効な値は無視
+
+            # 点数が変わった学生だけを取り消し・再登録する（変更の無い学生は触らない）
+            saved_count = _save_quiz_scores(quiz, submitted_scores, teacher)
             
-            messages.success(request, '採点結果を保存しました。')
+            messages.success(request, f'採点結果を保存しました。（更新: {saved_count}件）')
             return redirect('school_management:quiz_grading', quiz_id=quiz_id)
     
     context = {
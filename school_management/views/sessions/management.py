@@ -3,6 +3,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from ...models import ClassRoom, LessonSession, Quiz, QuizScore, QRCodeScan, PeerEvaluation, Group, Attendance, StudentLessonPoints, LessonReport
 from django.db import IntegrityError, transaction
+from ...grade_cache import bump_classroom_grade_versions
 from datetime import datetime
 
 @login_required
@@ -62,10 +63,12 @@ def merge_duplicate_quizzes(request, session_id):
             deleted_quizzes_count = 0
 
             for dup_quiz in duplicate_quizzes:
-                for score_to_move in dup_quiz.quizscore_set.all():
+                # 取り消し済みの履歴は移さず、現在のスコアだけを合算する
+                for score_to_move in dup_quiz.quizscore_set.filter(is_cancelled=False):
                     primary_score, created = QuizScore.objects.get_or_create(
                         quiz=primary_quiz,
                         student=score_to_move.student,
+                        is_cancelled=False,
                         defaults={'score': 0, 'graded_by': score_to_move.graded_by}
                     )
                     primary_score.score += score_to_move.score
@@ -228,6 +231,8 @@ def session_bulk_edit_view(request, class_id):
                         # bulk_updateは更新するフィールドを指定する必要がある
                         # ここではdateとtopicのみを更新対象とする
                         LessonSession.objects.bulk_update(sessions_to_update, ['date', 'topic'])
+                        # bulk_update はシグナルを発火しないため、成績画面・CSV出力のキャッシュはここで無効化する
+                        bump_classroom_grade_versions([classroom.id])
             except IntegrityError as e:
                 messages.error(request, f'データベースの整合性エラーが発生しました。入力内容を確認してください: {e}')
                 return redirect('school_management:class_detail', class_id=classroom.id)
@@ -2,13 +2,14 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.urls import reverse
 from django.contrib import messages
-from django.db.models import Avg
+from django.db.models import Avg, Count, Sum
 from ...models import (
     CustomUser, ClassRoom, LessonSession, QuizScore,
     Attendance, GroupMember, PeerEvaluation, StudentClassPoints,
     StudentGoal, SelfEvaluation, LessonReport, ClassRoomEnrollment, TeacherStudentAssignment,
-    PeerEvaluationSettings
+    PeerEvaluationSettings, PeerEvaluationSimulation
 )
+from ...scoring import simulate_class_peer_points
 
 @login_required
 def student_detail_view(request, student_number):
@@ -45,16 +46,14 @@ def student_detail_view(request, student_number):
         })
     
     # 統計情報を計算 (担当クラスの合計)
-    # 1. 小テスト統計 (重複除外)
-    all_quiz_scores = QuizScore.objects.filter(
+    # 1. 小テスト統計 (現在のスコアはクイズごとに1件なので SQL で集計)
+    quiz_stats = QuizScore.objects.filter(
         student=student,
         quiz__lesson_session__classroom__in=classes, # 担当クラスに限定
         is_cancelled=False
-    ).order_by('graded_at')
-    
-    unique_scores = {qs.quiz_id: qs.score for qs in all_quiz_scores}
-    total_quizzes = len(unique_scores)
-    quiz_total_score = sum(unique_scores.values())
+    ).aggregate(total=Sum('score'), count=Count('id'))
+    total_quizzes = quiz_stats['count']
+    quiz_total_score = quiz_stats['total'] or 0
 
     # 担当クラスのピア評価ポイントを取得
     scp_list = StudentClassPoints.objects.filter(student=student, classroom__in=classes)
@@ -80,27 +79,22 @@ def student_detail_view(request, student_number):
     
     # 3. 最近の活動 (小テストとピア評価を合わせた最新5件) - 担当クラスに限定
     recent_quizzes = []
-    seen_quiz_ids = set()
     # 担当クラスの小テストに限定
     desc_quiz_scores = QuizScore.objects.filter(
         student=student,
         quiz__lesson_session__classroom__in=classes, # 担当クラスに限定
         is_cancelled=False
-    ).select_related('quiz', 'quiz__lesson_session', 'quiz__lesson_session__classroom').order_by('-graded_at')
+    ).select_related('quiz', 'quiz__lesson_session', 'quiz__lesson_session__classroom').order_by('-graded_at')[:5]
     
     for qs in desc_quiz_scores:
-        if qs.quiz_id not in seen_quiz_ids:
-            recent_quizzes.append({
-                'type': 'quiz',
-                'date': qs.graded_at,
-                'title': f"小テスト: {qs.quiz.quiz_name} ({qs.quiz.lesson_session.classroom.class_name})",
-                'score': f"{qs.score}点",
-                'icon': 'fa-pen-alt',
-                'color': 'text-primary'
-            })
-            seen_quiz_ids.add(qs.quiz_id)
-            if len(recent_quizzes) >= 5:
-                break
+        recent_quizzes.append({
+            'type': 'quiz',
+            'date': qs.graded_at,
+            'title': f"小テスト: {qs.quiz.quiz_name} ({qs.quiz.lesson_session.classroom.class_name})",
+            'score': f"{qs.score}点",
+            'icon': 'fa-pen-alt',
+            'color': 'text-primary'
+        })
                 
     recent_peers = []
     # 担当クラスのピア評価に限定
@@ -148,23 +142,13 @@ def class_student_detail_view(request, class_id, student_number):
     # クラス内での学生の成績やアクティビティを取得
     class_sessions = LessonSession.objects.filter(classroom=classroom).order_by('-date')
     
-    # このクラスでのクイズ成績を取得
+    # このクラスでのクイズ成績を取得（最新10件）
     # 授業日が新しい順、かつ採点日時が新しい順に取得（キャンセル済みは除外）
-    all_quiz_scores = QuizScore.objects.filter(
+    quiz_scores = list(QuizScore.objects.filter(
         student=student,
         quiz__lesson_session__classroom=classroom,
         is_cancelled=False
-    ).select_related('quiz', 'quiz__lesson_session').order_by('-quiz__lesson_session__date', '-graded_at')
-    
-    # 重複排除: 同じクイズIDなら最新の1件のみをリストに追加
-    quiz_scores = []
-    seen_quiz_ids = set()
-    for score in all_quiz_scores:
-        if score.quiz.id not in seen_quiz_ids:
-            quiz_scores.append(score)
-            seen_quiz_ids.add(score.quiz.id)
-            if len(quiz_scores) >= 10:  # 最新10件集まったら終了
-                break
+    ).select_related('quiz', 'quiz__lesson_session').order_by('-quiz__lesson_session__date', '-graded_at')[:10])
     
     # このクラスでの出席記録を取得
     attendance_records = Attendance.objects.filter(
@@ -192,73 +176,28 @@ def class_student_detail_view(request, class_id, student_number):
         peer_count = peer_stats['count']
         peer_total = peer_stats['total']
         
-        # テストモード（シミュレーション）の場合はセッションからデータを取得して上書き
-        sim_data_class = request.session.get('peer_sim_points', {}).get(str(classroom.id), {})
-        if request.session.get('test_mode') and sim_data_class:
-            sim_session_ids = [sid for sid in sim_data_class.keys() if str(sid).isdigit()]
-            sim_sessions = {
-                s.id: s for s in LessonSession.objects.filter(id__in=sim_session_ids, classroom=classroom)
+        # テストモード（シミュレーション）の場合は保存済みのシミュレーション点数で上書き
+        student_sim_data = {}
+        if request.session.get('test_mode'):
+            student_key = str(student.id)
+            student_sim_data = {
+                session_id: {'point_mode': session_sim['point_mode'], student_key: session_sim[student_key]}
+                for session_id, session_sim in PeerEvaluationSimulation.load_class_data(request.user, classroom).items()
+                if student_key in session_sim
             }
+        if student_sim_data:
+            session_settings = {}
+            for sess in LessonSession.objects.filter(
+                id__in=[int(session_id) for session_id in student_sim_data], classroom=classroom
+            ).select_related('peer_evaluation_settings'):
+                try:
+                    session_settings[sess.id] = sess.peer_evaluation_settings
+                except PeerEvaluationSettings.DoesNotExist:
+                    session_settings[sess.id] = None
 
-            sim_total = 0
-            sim_count = 0
-            for session_id, session_sim in sim_data_class.items():
-                if not isinstance(session_sim, dict):
-                    continue
-                data = session_sim.get(str(student.id))
-                if data is None:
-                    continue
-
-                if isinstance(data, dict):
-                    sess = sim_sessions.get(int(session_id)) if str(session_id).isdigit() else None
-                    try:
-                        pe_settings = sess.peer_evaluation_settings if sess else None
-                    except PeerEvaluationSettings.DoesNotExist:
-                        pe_settings = None
-                    point_mode = session_sim.get('point_mode', 'settings')
-
-                    contrib = 0.0
-                    if pe_settings and pe_settings.enable_member_evaluation:
-                        if point_mode == 'settings':
-                            if pe_settings.member_scores:
-                                for i, points in enumerate(pe_settings.member_scores):
-                                    rank = i + 1
-                                    count = data.get(f'member_rank_{rank}')
-                                    if count:
-                                        contrib += float(count) * points
-                        elif point_mode == 'manual':
-                            contrib_val = data.get('contrib')
-                            if contrib_val:
-                                contrib += float(contrib_val)
-                    elif not pe_settings or not pe_settings.enable_group_evaluation:
-                        contrib_val = data.get('contrib', data.get('member'))
-                        if contrib_val:
-                            contrib += float(contrib_val)
-
-                    group = 0.0
-                    if pe_settings and pe_settings.enable_group_evaluation:
-                        if point_mode == 'settings':
-                            if pe_settings.group_scores:
-                                for i, points in enumerate(pe_settings.group_scores):
-                                    rank = i + 1
-                                    count = data.get(f'group_rank_{rank}')
-                                    if count:
-                                        group += float(count) * points
-                        elif point_mode == 'manual':
-                            group_manual = data.get('group_manual')
-                            if group_manual:
-                                group += float(group_manual)
-
-                    # 互換性フォールバック (member, group)
-                    if contrib == 0 and group == 0 and ('member' in data or 'group' in data):
-                        contrib = float(data.get('member', 0) or 0)
-                        group = float(data.get('group', 0) or 0)
-
-                    sim_total += (contrib + group)
-                else:
-                    # Legacy fallback
-                    sim_total += float(data)
-                sim_count += 1
+            sim_points = simulate_class_peer_points(student_sim_data, session_settings).values()
+            sim_total = sum(float(contrib or 0) + float(group or 0) for contrib, group in sim_points)
+            sim_count = len(sim_points)
 
             if sim_count > 0:
                 # If we have simulation data, we completely replace the DB peer points with the simulated points for those sessions
@@ -267,7 +206,7 @@ def class_student_detail_view(request, class_id, student_number):
                 peer_count = sim_count
             
         total_count = total_quizzes + peer_count
-        quiz_total = sum({qs.quiz_id: qs.score for qs in all_quiz_scores}.values())
+        quiz_total = quiz_stats['total']
         total_score = quiz_total + peer_total
         avg_score = round(total_score / total_count, 1) if total_count > 0 else 0
         
@@ -293,7 +232,7 @@ def class_student_detail_view(request, class_id, student_number):
         'classroom': classroom,
         'student': student,
         'class_sessions': class_sessions[:5],  # 最新5セッション
-        'quiz_scores': quiz_scores,  # 重複排除済みのリスト（最大10件）
+        'quiz_scores': quiz_scores,  # 最新10件の小テスト成績
         'attendance_records': attendance_records[:10],  # 最新10件の出席記録
         'peer_evaluations': peer_evaluations[:10],  # 最新10件のピア評価
         'goal': goal,
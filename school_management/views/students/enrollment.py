@@ -9,7 +9,10 @@ from django.db import IntegrityError, transaction
 from django.db.models import Q, Count
 from django.urls import reverse
 from django.utils import timezone
-from ...models import ClassRoom, CustomUser, Student, StudentClassPoints, ClassRoomEnrollment, TeacherStudentAssignment
+from ...models import ClassRoom, CustomUser, StudentClassPoints, ClassRoomEnrollment, StudentImportJob
+from ...student_imports import (
+    check_existing_students, enqueue_import, import_students, is_large_import, parse_class_roster,
+)
 
 
 @login_required
@@ -161,96 +164,15 @@ def bulk_student_add_csv(request, class_id):
             messages.error(request, '学生データを入力してください。')
             return render(request, 'school_management/bulk_student_add.html', {'classroom': classroom})
 
-        lines = student_data.split('\n')
-        errors = []
-        pending_students = []
-        seen_student_numbers = {}
-        seen_emails = {}
-        
-        for line_num, line in enumerate(lines, 1):
-            line = line.strip()
-            if not line:
-                continue
-                
-            # タブまたはカンマで分割
-            parts = line.replace('\t', ',').split(',')
-            if len(parts) < 2:
-                errors.append(f'行{line_num}: 形式が正しくありません - {line}')
-                continue
-            
-            student_number = CustomUser.clean_student_number(parts[0])
-            full_name = parts[1].strip() if len(parts) > 1 else ""
-            email = CustomUser.clean_email(parts[2]) if len(parts) > 2 else None
-
-            if not student_number:
-                errors.append(f'行{line_num}: 学生番号が入力されていません')
-                continue
-            
-            #  【修正箇所】名前が空っぽ（必須エラー）の場合、スキップしてエラーにする
-            if not full_name:
-                errors.append(f'行{line_num}: 氏名が入力されていません - {student_number}')
-                continue
-
-            duplicate_student_line = seen_student_numbers.get(student_number)
-            if duplicate_student_line is not None:
-                errors.append(
-                    f'行{line_num}: 学生番号 "{student_number}" が入力内で重複しています（行{duplicate_student_line}）'
-                )
-                continue
-            seen_student_numbers[student_number] = line_num
-
-            if email:
-                seen_email_data = seen_emails.get(email)
-                if seen_email_data:
-                    seen_student_number, seen_line_num = seen_email_data
-                    if seen_student_number != student_number:
-                        errors.append(
-                            f'行{line_num}: メールアドレス "{email}" が入力内で学籍番号の異なる学生（行{seen_line_num}）に使われています。'
-                        )
-                        continue
-                seen_emails[email] = (student_number, line_num)
-
-            pending_students.append({
-                'line_num': line_num,
-                'student_number': student_number,
-                'full_name': full_name,
-                'email': email,
-            })
-
-        if pending_students:
-            # DB全体での重複・不整合チェック
-            for row in pending_students:
-                sn = row['student_number']
-                em = row['email']
-                line_num = row['line_num']
+        if is_large_import(student_data):
+            # 件数が多い場合はジョブとして登録し、ワーカーで処理する
+            job = enqueue_import(request.user, StudentImportJob.SOURCE_CLASS_CSV, student_data, classroom)
+            messages.info(request, f'{job.total_rows}行の一括追加を受け付けました。処理状況はこの画面で確認できます。')
+            return redirect('school_management:student_import_job', job_id=job.id)
 
-                student_by_number = Student.objects.filter(role='student', student_number=sn).first()
-                student_by_email = Student.objects.filter(role='student', email=em).first() if em else None
-
-                # パターンC: 不整合エラー
-                if student_by_number and student_by_email and student_by_number.id != student_by_email.id:
-                    errors.append(
-                        f'行{line_num}: 学籍番号 "{sn}" とメールアドレス "{em}" は、それぞれ別の既存の学生に使用されています。'
-                    )
-                elif student_by_number and em and student_by_number.email != em:
-                    errors.append(
-                        f'行{line_num}: 学籍番号 "{sn}" は既に別のメールアドレス（例: "{student_by_number.email or "登録なし"}"）で登録されています。'
-                    )
-                elif student_by_email and student_by_email.student_number != sn:
-                    errors.append(
-                        f'行{line_num}: メールアドレス "{em}" は既に別の学籍番号（例: "{student_by_email.student_number}"）で登録されています。'
-                    )
-                else:
-                    # エラーがない場合、既存アカウントの重複チェック
-                    existing_student = student_by_number or student_by_email
-                    if existing_student:
-                        if classroom.students.filter(id=existing_student.id).exists():
-                            errors.append(
-                                f'行{line_num}: 学生 "{existing_student.full_name}"（学籍番号: {sn}）は既にこのクラスに登録されています'
-                            )
-                        row['existing_student'] = existing_student
-                    else:
-                        row['existing_student'] = None
+        pending_students, errors = parse_class_roster(student_data)
+        # DB全体での重複・不整合チェック
+        errors += check_existing_students(pending_students, request.user, classroom)
 
         if errors:
             for error in errors[:5]:
@@ -261,42 +183,7 @@ def bulk_student_add_csv(request, class_id):
             return render(request, 'school_management/bulk_student_add.html', {'classroom': classroom})
 
         try:
-            with transaction.atomic():
-                processed_students_map = {}
-                for row in pending_students:
-                    email = row['email']
-                    student_number = row['student_number']
-                    full_name = row['full_name']
-                    existing_student = row.get('existing_student')
-
-                    is_new = False
-                    if not existing_student:
-                        default_password = f"student_{student_number}"
-                        student = Student.objects.create_user(
-                            email=email,
-                            full_name=full_name,
-                            password=default_password,
-                            role='student',
-                            student_number=student_number
-                        )
-                        is_new = True
-                    else:
-                        student = existing_student
-
-                    if student.id not in processed_students_map:
-                        TeacherStudentAssignment.assign(request.user, student)
-                        processed_students_map[student.id] = {'student': student, 'is_new': is_new}
-
-                created_students = [data['student'] for data in processed_students_map.values()]
-                created_count = sum(1 for data in processed_students_map.values() if data['is_new'])
-                linked_count = len(created_students) - created_count
-
-                ClassRoomEnrollment.bulk_enroll(classroom, created_students)
-
-                StudentClassPoints.objects.bulk_create([
-                    StudentClassPoints(student=student, classroom=classroom, points=0)
-                    for student in created_students
-                ], batch_size=500, ignore_conflicts=True)
+            created_count, linked_count = import_students(pending_students, request.user, classroom)
         except IntegrityError:
             messages.error(
                 request,
@@ -307,7 +194,7 @@ def bulk_student_add_csv(request, class_id):
             messages.error(request, '一括追加中にエラーが発生したため、処理を中止してロールバックしました。')
             return render(request, 'school_management/bulk_student_add.html', {'classroom': classroom})
         
-        messages.success(request, f'合計 {len(created_students)}名の学生をクラスに追加しました。（新規作成: {created_count}名, 既存共有: {linked_count}名）')
+        messages.success(request, f'合計 {created_count + linked_count}名の学生をクラスに追加しました。（新規作成: {created_count}名, 既存共有: {linked_count}名）')
         return redirect(f"{reverse('school_management:class_detail', args=[class_id])}?active_tab=students")
     
     context = {
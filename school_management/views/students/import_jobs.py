@@ -0,0 +1,49 @@
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render
+
+from ...models import StudentImportJob
+
+
+def _job_progress(job):
+    """ジョブの進捗（進捗確認APIのレスポンス）"""
+    return {
+        'id': job.id,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'is_finished': job.is_finished,
+        'total_rows': job.total_rows,
+        'validated_rows': job.validated_rows,
+        'created_count': job.created_count,
+        'linked_count': job.linked_count,
+        'failed_count': job.failed_count,
+        'errors': job.errors[:10],
+    }
+
+
+@login_required
+def student_import_job(request, job_id):
+    """学生一括取り込みジョブの処理状況（先生用）"""
+    if not request.user.is_teacher:
+        messages.error(request, 'この機能にアクセスする権限がありません。')
+        return redirect('school_management:dashboard')
+
+    job = get_object_or_404(
+        StudentImportJob.objects.select_related('classroom'), id=job_id, teacher=request.user
+    )
+    context = {
+        'job': job,
+        'progress': _job_progress(job),
+    }
+    return render(request, 'school_management/student_import_job.html', context)
+
+
+@login_required
+def student_import_job_status(request, job_id):
+    """学生一括取り込みジョブの進捗確認API（JSON）"""
+    if not request.user.is_teacher:
+        return JsonResponse({'success': False, 'message': 'この機能にアクセスする権限がありません。'}, status=403)
+
+    job = get_object_or_404(StudentImportJob, id=job_id, teacher=request.user)
+    return JsonResponse({'success': True, 'job': _job_progress(job)})
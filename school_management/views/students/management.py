@@ -6,10 +6,14 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.middleware.csrf import get_token
-from django.db import IntegrityError, transaction
+from django.db import IntegrityError
 from django.utils import timezone
 from django.urls import reverse
-from ...models import CustomUser, Student, ClassRoom, StudentClassPoints, ClassRoomEnrollment, TeacherStudentAssignment
+from ...models import CustomUser, Student, ClassRoom, StudentClassPoints, ClassRoomEnrollment, StudentImportJob, TeacherStudentAssignment
+from ...grade_cache import bump_classroom_grade_versions, bump_student_points_versions
+from ...student_imports import (
+    check_existing_students, enqueue_import, import_students, is_large_import, parse_student_roster,
+)
 
 @login_required
 def student_edit_view(request, student_number):
@@ -93,102 +97,15 @@ def student_create_view(request):
                     'classroom': classroom
                 })
 
-            lines = bulk_student_data.split('\n')
-            errors = []
-            pending_students = []
-            seen_student_numbers = {}
-            seen_emails = {}
+            if is_large_import(bulk_student_data):
+                # 件数が多い場合はジョブとして登録し、ワーカーで処理する
+                job = enqueue_import(request.user, StudentImportJob.SOURCE_STUDENT_CREATE, bulk_student_data, classroom)
+                messages.info(request, f'{job.total_rows}行の一括登録を受け付けました。処理状況はこの画面で確認できます。')
+                return redirect('school_management:student_import_job', job_id=job.id)
 
-            for line_num, line in enumerate(lines, 1):
-                line = line.strip()
-                if not line:
-                    continue
-
-                parts = [part.strip() for part in line.split(',')]
-                if len(parts) < 4:
-                    errors.append(f'行{line_num}: 必要な項目が不足しています（学籍番号,氏名,ふりがな,メールアドレス） - {line}')
-                    continue
-
-                student_number = parts[0]
-                full_name = parts[1]
-                furigana = parts[2]
-                email = parts[3] if parts[3].strip() else None
-
-                # 正規化
-                student_number = Student.clean_student_number(student_number)
-                email = Student.clean_email(email)
-
-                if not student_number or not full_name or not furigana or not email:
-                    errors.append(f'行{line_num}: 学籍番号・氏名・ふりがな・メールアドレスは必須です')
-                    continue
-
-                duplicate_student_line = seen_student_numbers.get(student_number)
-                if duplicate_student_line is not None:
-                    errors.append(
-                        f'行{line_num}: 学籍番号 "{student_number}" が入力内で重複しています（行{duplicate_student_line}）'
-                    )
-                    continue
-                seen_student_numbers[student_number] = line_num
-
-                if email:
-                    seen_email_data = seen_emails.get(email)
-                    if seen_email_data:
-                        seen_student_number, seen_line_num = seen_email_data
-                        if seen_student_number != student_number:
-                            errors.append(
-                                f'行{line_num}: メールアドレス "{email}" が入力内で学籍番号の異なる学生（行{seen_line_num}）に使われています。'
-                            )
-                            continue
-                    seen_emails[email] = (student_number, line_num)
-
-                pending_students.append({
-                    'line_num': line_num,
-                    'student_number': student_number,
-                    'full_name': full_name,
-                    'furigana': furigana,
-                    'email': email,
-                })
-
-            if pending_students:
-                # DB全体での重複・不整合チェック
-                for row in pending_students:
-                    sn = row['student_number']
-                    em = row['email']
-                    line_num = row['line_num']
-
-                    student_by_number = Student.objects.filter(role='student', student_number=sn).first()
-                    student_by_email = Student.objects.filter(role='student', email=em).first() if em else None
-
-                    # パターンC: 不整合エラー
-                    if student_by_number and student_by_email and student_by_number.id != student_by_email.id:
-                        errors.append(
-                            f'行{line_num}: 学籍番号 "{sn}" とメールアドレス "{em}" は、それぞれ別の既存の学生に使用されています。'
-                        )
-                    elif student_by_number and em and student_by_number.email != em:
-                        errors.append(
-                            f'行{line_num}: 学籍番号 "{sn}" は既に別のメールアドレス（例: "{student_by_number.email or "登録なし"}"）で登録されています。'
-                        )
-                    elif student_by_email and student_by_email.student_number != sn:
-                        errors.append(
-                            f'行{line_num}: メールアドレス "{em}" は既に別の学籍番号（例: "{student_by_email.student_number}"）で登録されています。'
-                        )
-                    else:
-                        # エラーがない場合、既存の紐付け重複をチェック
-                        existing_student = student_by_number or student_by_email
-                        if existing_student:
-                            if classroom:
-                                if classroom.students.filter(id=existing_student.id).exists():
-                                    errors.append(
-                                        f'行{line_num}: 学生 "{existing_student.full_name}"（学籍番号: {sn}）は既にこのクラスに登録されています'
-                                    )
-                            else:
-                                if existing_student.managed_by.filter(id=request.user.id).exists():
-                                    errors.append(
-                                        f'行{line_num}: 学籍番号 "{sn}" は既にあなたの管理下に登録されています'
-                                    )
-                            row['existing_student'] = existing_student
-                        else:
-                            row['existing_student'] = None
+            pending_students, errors = parse_student_roster(bulk_student_data)
+            # DB全体での重複・不整合チェック
+            errors += check_existing_students(pending_students, request.user, classroom)
 
             if errors:
                 for error in errors[:10]:
@@ -202,40 +119,7 @@ def student_create_view(request):
                 })
 
             try:
-                with transaction.atomic():
-                    created_count = 0
-                    linked_count = 0
-                    for row in pending_students:
-                        email = row['email']
-                        student_number = row['student_number']
-                        full_name = row['full_name']
-                        furigana = row['furigana']
-                        existing_student = row.get('existing_student')
-                        
-                        if not existing_student:
-                            default_password = f"student_{student_number}"
-                            student = Student.objects.create_user(
-                                email=email,
-                                full_name=full_name,
-                                password=default_password,
-                                student_number=student_number,
-                                furigana=furigana,
-                                role='student'
-                            )
-                            created_count += 1
-                        else:
-                            student = existing_student
-                            if not student.furigana and furigana:
-                                student.furigana = furigana
-                                student.save(update_fields=['furigana'])
-                            linked_count += 1
-                            
-                        TeacherStudentAssignment.assign(request.user, student)
-
-                        if classroom:
-                            ClassRoomEnrollment.enroll(classroom, student)
-                            from school_management.models import StudentClassPoints
-                            StudentClassPoints.objects.get_or_create(student=student, classroom=classroom, defaults={'points': 0})
+                created_count, linked_count = import_students(pending_students, request.user, classroom)
             except IntegrityError as e:
                 messages.error(
                     request,
@@ -350,7 +234,6 @@ def student_create_view(request):
                     # クラス登録の場合：クラスにも紐づけ、ポイント初期化
                     if classroom:
                         ClassRoomEnrollment.enroll(classroom, student)
-                        from school_management.models import StudentClassPoints
                         StudentClassPoints.objects.get_or_create(student=student, classroom=classroom, defaults={'points': 0})
                     
                     if classroom:
@@ -428,6 +311,8 @@ def update_student_points(request, student_id):
                 points=int(points),
                 updated_at=timezone.now(),
             )
+            bump_student_points_versions([student.id])
+            bump_classroom_grade_versions([classroom.id])
 
             return JsonResponse({'success': True, 'message': 'ポイントが更新されました'})
         except Exception as e:
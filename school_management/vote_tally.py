@@ -0,0 +1,126 @@
+"""
+グループ投票集計（GroupVoteTally）の更新
+
+ピア評価の提出・削除のたびに、その回答に含まれる順位別の得票数だけを
+差分として集計に反映する。内部ポイント(G-N)と付与ポイントは授業回の
+グループ数に比例する計算で更新し、締切時に付与ポイントを確定する。
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Group, GroupVoteTally, LessonSession, PeerEvaluationSettings
+from .scoring import (
+    build_group_vote_point_map_from_counts,
+    compute_internal_points,
+    count_group_votes,
+)
+
+
+TALLY_FIELDS = ('rank_counts', 'internal_points', 'awarded_points', 'is_finalized')
+
+
+def _serialize_rank_counts(counts):
+    return {str(rank): count for rank, count in sorted(counts.items()) if count > 0}
+
+
+def diff_group_votes(new_response=None, old_response=None):
+    """回答の変更による得票数の差分を {group_id: {rank: delta}} で返す"""
+    delta = {}
+    for sign, response in ((1, new_response), (-1, old_response)):
+        if not response:
+            continue
+        for gid, counts in count_group_votes([response]).items():
+            group_delta = delta.setdefault(gid, {})
+            for rank, count in counts.items():
+                group_delta[rank] = group_delta.get(rank, 0) + sign * count
+    return delta
+
+
+def refresh_group_vote_tallies(lesson_session_id, delta=None, create_missing=True):
+    """授業回のグループ投票集計を更新する
+
+    delta: {group_id: {rank: 増減数}} 提出・削除された回答の得票数
+    create_missing: 集計行が無いグループの行を作成するか
+        （カスケード削除中に行を復活させないよう、削除時は False にする）
+
+    得票数に delta を加え、内部ポイントと付与ポイントを再計算する。
+    締切済みの授業回では付与ポイントを確定済みとして保存する。
+    同時に提出された回答の差分が上書きし合わないよう、授業回の行をロックしてから
+    集計行を読み直し、同じトランザクション内で書き戻す（集計行が無い場合の作成も同じロックで直列化する）。
+    戻り値: {group_id: awarded_points}
+    """
+    with transaction.atomic():
+        session = LessonSession.objects.select_for_update().filter(pk=lesson_session_id).first()
+        if session is None:
+            return {}
+        return _refresh_locked_tallies(session, delta, create_missing)
+
+
+def _refresh_locked_tallies(session, delta, create_missing):
+    lesson_session_id = session.pk
+
+    group_ids = list(Group.objects.filter(lesson_session_id=lesson_session_id).values_list('id', flat=True))
+    tallies = {
+        tally.group_id: tally
+        for tally in GroupVoteTally.objects.filter(lesson_session_id=lesson_session_id)
+    }
+
+    delta = delta or {}
+    rank_counts = {}
+    for group_id in group_ids:
+        tally = tallies.get(group_id)
+        counts = tally.get_rank_counts() if tally else {}
+        for rank, diff in delta.get(group_id, {}).items():
+            counts[rank] = counts.get(rank, 0) + diff
+        rank_counts[group_id] = {rank: count for rank, count in counts.items() if count > 0}
+
+    try:
+        pe_settings = session.peer_evaluation_settings
+    except PeerEvaluationSettings.DoesNotExist:
+        pe_settings = None
+    if pe_settings and pe_settings.enable_group_evaluation:
+        awarded = build_group_vote_point_map_from_counts(
+            group_ids,
+            rank_counts,
+            pe_settings.group_evaluation_method,
+            pe_settings.group_scores or [],
+            session.peer_evaluation_status,
+        )
+    else:
+        awarded = {group_id: 0 for group_id in group_ids}
+    internal = compute_internal_points(group_ids, rank_counts)
+    is_finalized = session.peer_evaluation_status == LessonSession.PeerEvaluationStatus.CLOSED
+
+    now = timezone.now()
+    to_create = []
+    to_update = []
+    for group_id in group_ids:
+        values = {
+            'rank_counts': _serialize_rank_counts(rank_counts[group_id]),
+            'internal_points': internal[group_id],
+            'awarded_points': awarded[group_id],
+            'is_finalized': is_finalized,
+        }
+        tally = tallies.get(group_id)
+        if tally is None:
+            if create_missing:
+                to_create.append(GroupVoteTally(
+                    lesson_session_id=lesson_session_id, group_id=group_id, **values
+                ))
+            continue
+        if any(getattr(tally, field) != value for field, value in values.items()):
+            for field, value in values.items():
+                setattr(tally, field, value)
+            tally.updated_at = now
+            to_update.append(tally)
+
+    if to_create:
+        GroupVoteTally.objects.bulk_create(to_create, ignore_conflicts=True)
+    if to_update:
+        GroupVoteTally.objects.bulk_update(to_update, [*TALLY_FIELDS, 'updated_at'])
+    return awarded
+
+
+def finalize_group_vote_tallies(lesson_session_id):
+    """締切時に付与ポイントを確定する"""
+    return refresh_group_vote_tallies(lesson_session_id)
@@ -104,12 +104,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'school_management.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'school_management.middleware.GradeRecalculationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -196,6 +198,39 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# この行数を超える学生の一括登録は StudentImportJob としてワーカー（run_student_import_jobs）で処理する
+STUDENT_IMPORT_ASYNC_THRESHOLD = int(os.environ.get('STUDENT_IMPORT_ASYNC_THRESHOLD', '200'))
+# 処理中のまま この分数を過ぎたジョブは、ワーカーが停止したものとみなして待機中に戻す
+STUDENT_IMPORT_JOB_TIMEOUT_MINUTES = int(os.environ.get('STUDENT_IMPORT_JOB_TIMEOUT_MINUTES', '30'))
+
+# リクエストごとのクエリ数・DB時間・処理時間の計測（RequestMetricsMiddleware）
+REQUEST_METRICS_ENABLED = os.environ.get('REQUEST_METRICS_ENABLED', 'True') == 'True'
+REQUEST_METRICS_SERVER_TIMING = os.environ.get('REQUEST_METRICS_SERVER_TIMING', 'True') == 'True'
+
+# URL名ごとのクエリ数・処理時間の上限（書式は school_management/request_metrics.py を参照）
+# 超えたリクエストは WARNING で記録され、テストでは ViewBudgetMixin で失敗にする
+# クエリ数はテストスイートでの実測の最大値（成績画面は変更直後の初回表示で、キャッシュが無く
+# 授業回別得点の欠けた行を作り直す場合の値。キャッシュが効いている場合は4件程度）
+REQUEST_METRICS_BUDGETS = {
+    'school_management:class_evaluation': {'queries': 23, 'total_ms': 1500},
+    'school_management:class_evaluation_csv_export': {'queries': 23, 'total_ms': 1500},
+    'school_management:class_points': {'queries': 23, 'total_ms': 1500},
+    # クラス詳細はテンプレートで学生ごとにクエリが発生している（ビューが学生数を記録する。改善したら queries_per_row を下げる）
+    'school_management:class_detail': {'queries': 10, 'queries_per_row': 10, 'total_ms': 1000},
+    'school_management:student_dashboard': {'queries': 10, 'total_ms': 500},
+}
+
+# 先頭が既定のハッシャー。BulkImportPasswordHasher は学生一括登録の初期パスワード用で、
+# 初回ログイン時に既定のハッシャーで再ハッシュされる
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+    'school_management.hashers.BulkImportPasswordHasher',
+]
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -231,6 +266,17 @@ STORAGES = {
     },
 }
 
+# Cache (QRコード画像など). LocMemCache は MAX_ENTRIES を超えると古いものから削除される (LRU)
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "school-management",
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.environ.get('CACHE_MAX_ENTRIES', '2000')),
+        },
+    },
+}
+
 # WhiteNoise settings
 WHITENOISE_USE_FINDERS = True
 WHITENOISE_AUTOREFRESH = DEBUG
@@ -259,3 +305,19 @@ GOOGLE_OAUTH_CLIENT_ID = os.environ.get('GOOGLE_OAUTH_CLIENT_ID', '').strip()
 GOOGLE_OAUTH_CLIENT_SECRET = os.environ.get('GOOGLE_OAUTH_CLIENT_SECRET', '').strip()
 PEER_EVAL_SESSION_COOKIE_NAME = 'peer_eval_session_id'
 PEER_EVAL_SESSION_TTL_HOURS = int(os.environ.get('PEER_EVAL_SESSION_TTL_HOURS', '24'))
+
+# RequestMetricsMiddleware の構造化ログ。全リクエストを記録する場合は REQUEST_METRICS_LOG_LEVEL=INFO
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'school_management.request_metrics': {
+            'handlers': ['console'],
+            'level': os.environ.get('REQUEST_METRICS_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
@@ -24,7 +24,24 @@ else
 fi
 echo ""
 
-echo "Step 3: Starting Gunicorn server..."
+echo "Step 3: Starting student import worker..."
+# 件数の多い学生一括取り込み（StudentImportJob）を処理するワーカー。
+# 別サービスでワーカーを動かす場合は START_IMPORT_WORKER=False を設定する
+if [ "${START_IMPORT_WORKER:-True}" = "True" ]; then
+    (
+        while true; do
+            python manage.py run_student_import_jobs || true
+            echo "⚠️  Student import worker exited, restarting in 5s..."
+            sleep 5
+        done
+    ) &
+    echo "✅ Student import worker started (pid $!)"
+else
+    echo "Skipped (START_IMPORT_WORKER=$START_IMPORT_WORKER)"
+fi
+echo ""
+
+echo "Step 4: Starting Gunicorn server..."
 echo "Port: $PORT"
 echo "Workers: 2"
 echo "Timeout: 120s"